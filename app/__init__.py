@@ -5,8 +5,6 @@ from pathlib import Path
 from typing import Literal
 
 from flask import Flask
-from sqlalchemy import inspect, text
-from flask_pymongo import PyMongo
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -14,7 +12,27 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
 from flask_babel import Babel
 
-mongo = PyMongo()
+class _LazyPyMongo:
+    """PostgreSQL 模式用不到 pymongo；第一次 init_app 時才載入 flask_pymongo"""
+
+    def __init__(self):
+        self._mongo = None
+
+    def init_app(self, app: Flask, *args, **kwargs) -> None:
+        from flask_pymongo import PyMongo
+
+        self._mongo = PyMongo()
+        self._mongo.init_app(app, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if self._mongo is None:
+            if name in ("db", "cx"):
+                return None
+            raise AttributeError(name)
+        return getattr(self._mongo, name)
+
+
+mongo = _LazyPyMongo()
 db = SQLAlchemy()
 cache = Cache()
 csrf = CSRFProtect()
@@ -44,7 +62,6 @@ def _ensure_default_admin() -> None:
     from werkzeug.security import generate_password_hash
 
     db_type = get_db_type()
-    hashed_password = generate_password_hash("admin")
 
     if db_type == "postgres":
         from app.models import User
@@ -53,7 +70,7 @@ def _ensure_default_admin() -> None:
         if not existing_admin:
             admin = User(
                 User="admin",
-                Password=hashed_password,
+                Password=generate_password_hash("admin"),
                 admin=True,
                 password_changed=False
             )
@@ -65,228 +82,37 @@ def _ensure_default_admin() -> None:
         if not existing_admin:
             mongo.db.user.insert_one({
                 "User": "admin",
-                "Password": hashed_password,
+                "Password": generate_password_hash("admin"),
                 "admin": True,
                 "password_changed": False
             })
             print("✅ 已建立預設管理員帳號: admin / admin (首次登入請修改密碼)")
 
 
-def _ensure_item_maintenance_columns() -> None:
-    """補齊 items 表缺少的保養欄位，避免舊資料庫在重構後直接失敗。"""
-    if get_db_type() != "postgres":
-        return
-
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        # 測試環境會 monkeypatch db.init_app/create_all，此時不需要真的補欄位。
-        return
-    if not inspector.has_table("items"):
-        return
-
-    existing_columns = {column["name"] for column in inspector.get_columns("items")}
-    alter_statements = []
-    if "MaintenanceCategory" not in existing_columns:
-        alter_statements.append('ALTER TABLE items ADD COLUMN "MaintenanceCategory" VARCHAR(50) DEFAULT \'\';')
-    if "MaintenanceIntervalDays" not in existing_columns:
-        alter_statements.append('ALTER TABLE items ADD COLUMN "MaintenanceIntervalDays" INTEGER;')
-    if "LastMaintenanceDate" not in existing_columns:
-        alter_statements.append('ALTER TABLE items ADD COLUMN "LastMaintenanceDate" DATE;')
-
-    for statement in alter_statements:
-        db.session.execute(text(statement))
-
-    if alter_statements:
-        db.session.commit()
 
 
-def _ensure_user_profile_columns() -> None:
-    """補齊 users 表缺少的個人設定欄位，避免舊資料庫在重構後直接失敗。"""
-    if get_db_type() != "postgres":
-        return
 
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("users"):
-        return
 
-    existing_columns = {column["name"] for column in inspector.get_columns("users")}
-    alter_statements = []
-    if "display_name" not in existing_columns:
-        alter_statements.append('ALTER TABLE users ADD COLUMN display_name VARCHAR(100);')
-    if "theme_preference" not in existing_columns:
-        alter_statements.append("ALTER TABLE users ADD COLUMN theme_preference VARCHAR(20) DEFAULT 'light';")
-    if "language" not in existing_columns:
-        alter_statements.append("ALTER TABLE users ADD COLUMN language VARCHAR(10) DEFAULT 'zh_TW';")
 
-    for statement in alter_statements:
-        db.session.execute(text(statement))
 
-    if alter_statements:
-        db.session.commit()
 
 
-def _ensure_dashboard_widgets_column() -> None:
-    """補齊 users 表缺少的 dashboard_widgets 欄位，支援可設定儀表板小工具。"""
-    if get_db_type() != "postgres":
-        return
-
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("users"):
-        return
-
-    existing_columns = {column["name"] for column in inspector.get_columns("users")}
-    if "dashboard_widgets" not in existing_columns:
-        db.session.execute(text('ALTER TABLE users ADD COLUMN dashboard_widgets TEXT;'))
-        db.session.commit()
 
 
-def _ensure_type_parent_column() -> None:
-    """補齊 item_types 表缺少的 parent_id 欄位，支援子分類階層結構。"""
-    if get_db_type() != "postgres":
-        return
 
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("item_types"):
-        return
 
-    existing_columns = {column["name"] for column in inspector.get_columns("item_types")}
-    if "parent_id" not in existing_columns:
-        db.session.execute(text(
-            'ALTER TABLE item_types ADD COLUMN parent_id INTEGER REFERENCES item_types(id) ON DELETE SET NULL;'
-        ))
-        db.session.commit()
 
 
-def _ensure_item_condition_column() -> None:
-    """補齊 items 表缺少的 condition 欄位（物品狀態）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {column["name"] for column in inspector.get_columns("items")}
-    if "condition" not in existing_columns:
-        db.session.execute(text(
-            "ALTER TABLE items ADD COLUMN condition VARCHAR(20) DEFAULT 'good';"
-        ))
-        db.session.commit()
 
 
-def _ensure_item_asset_columns() -> None:
-    """補齊 items 表缺少的資產折舊欄位。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {column["name"] for column in inspector.get_columns("items")}
-    alter_statements = []
-    if "purchase_price" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN purchase_price NUMERIC(10,2);")
-    if "current_value" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN current_value NUMERIC(10,2);")
-    if "depreciation_method" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN depreciation_method VARCHAR(20);")
-    if "depreciation_rate" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN depreciation_rate NUMERIC(5,2);")
-    for statement in alter_statements:
-        db.session.execute(text(statement))
-    if alter_statements:
-        db.session.commit()
 
 
-def _ensure_item_warehouse_column() -> None:
-    """補齊 items 表缺少的 warehouse_id 欄位（Feature 17）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {column["name"] for column in inspector.get_columns("items")}
-    if "warehouse_id" not in existing_columns:
-        db.session.execute(text("ALTER TABLE items ADD COLUMN warehouse_id INTEGER;"))
-        db.session.commit()
 
 
-def _ensure_item_soft_delete_columns() -> None:
-    """補齊 items 表缺少的軟刪除欄位（M6）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {col["name"] for col in inspector.get_columns("items")}
-    alter_statements = []
-    if "is_deleted" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN is_deleted BOOLEAN NOT NULL DEFAULT FALSE;")
-    if "deleted_at" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN deleted_at TIMESTAMP;")
-    for statement in alter_statements:
-        db.session.execute(text(statement))
-    if alter_statements:
-        db.session.commit()
 
 
-def _ensure_item_sort_order_column() -> None:
-    """補齊 items 表缺少的 sort_order 欄位（M10）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {col["name"] for col in inspector.get_columns("items")}
-    if "sort_order" not in existing_columns:
-        db.session.execute(text("ALTER TABLE items ADD COLUMN sort_order INTEGER NOT NULL DEFAULT 0;"))
-        db.session.commit()
 
 
-def _ensure_item_insurance_columns() -> None:
-    """補齊 items 表缺少的保險記錄欄位（M28）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {col["name"] for col in inspector.get_columns("items")}
-    alter_statements = []
-    if "insurance_provider" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN insurance_provider VARCHAR(100);")
-    if "insurance_policy" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN insurance_policy VARCHAR(100);")
-    if "insurance_expiry" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN insurance_expiry DATE;")
-    for statement in alter_statements:
-        db.session.execute(text(statement))
-    if alter_statements:
-        db.session.commit()
 
 
 def _seed_item_templates() -> None:
@@ -367,109 +193,42 @@ def _seed_item_templates() -> None:
         db.session.rollback()
 
 
-def _ensure_item_currency_column() -> None:
-    """補齊 items 表缺少的 currency 欄位（M18 多幣別支援）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {col["name"] for col in inspector.get_columns("items")}
-    if "currency" not in existing_columns:
-        db.session.execute(text("ALTER TABLE items ADD COLUMN currency VARCHAR(5) DEFAULT 'TWD';"))
-        db.session.commit()
 
 
-def _ensure_item_purchase_columns() -> None:
-    """補齊 items 表缺少的購買連結欄位（Feature 21）。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("items"):
-        return
-    existing_columns = {col["name"] for col in inspector.get_columns("items")}
-    alter_statements = []
-    if "purchase_url" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN purchase_url VARCHAR(500);")
-    if "preferred_store" not in existing_columns:
-        alter_statements.append("ALTER TABLE items ADD COLUMN preferred_store VARCHAR(100);")
-    for statement in alter_statements:
-        db.session.execute(text(statement))
-    if alter_statements:
-        db.session.commit()
 
 
-def _ensure_map_columns() -> None:
-    """補齊 items 表缺少的地圖座標欄位，以及 locations 表缺少的平面圖圖片欄位。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
 
-    if inspector.has_table("items"):
-        existing_item_columns = {col["name"] for col in inspector.get_columns("items")}
-        item_statements = []
-        if "map_x" not in existing_item_columns:
-            item_statements.append("ALTER TABLE items ADD COLUMN map_x INTEGER;")
-        if "map_y" not in existing_item_columns:
-            item_statements.append("ALTER TABLE items ADD COLUMN map_y INTEGER;")
-        for stmt in item_statements:
-            db.session.execute(text(stmt))
-        if item_statements:
-            db.session.commit()
 
-    if inspector.has_table("locations"):
-        existing_loc_columns = {col["name"] for col in inspector.get_columns("locations")}
-        if "floor_plan_image" not in existing_loc_columns:
-            db.session.execute(text(
-                "ALTER TABLE locations ADD COLUMN floor_plan_image VARCHAR(255);"
-            ))
-            db.session.commit()
 
 
-def _ensure_email_verify_columns() -> None:
-    """補齊 users 表缺少的 email_verified 與 email_verify_token 欄位。"""
-    if get_db_type() != "postgres":
-        return
-    try:
-        inspector = inspect(db.engine)
-    except RuntimeError:
-        return
-    if not inspector.has_table("users"):
-        return
-    existing_columns = {col["name"] for col in inspector.get_columns("users")}
-    alter_statements = []
-    if "email_verified" not in existing_columns:
-        alter_statements.append("ALTER TABLE users ADD COLUMN email_verified BOOLEAN DEFAULT FALSE;")
-    if "email_verify_token" not in existing_columns:
-        alter_statements.append("ALTER TABLE users ADD COLUMN email_verify_token VARCHAR(100);")
-    for statement in alter_statements:
-        db.session.execute(text(statement))
-    if alter_statements:
-        db.session.commit()
 
 
-def _ensure_fulltext_extensions() -> None:
-    """Install pg_trgm extension for fuzzy full-text search.
+def _release_prefork_connections(app: Flask) -> None:
+    """啟動期間（版本檢查、Redis 探測）開啟的連線在回傳 app 前全部關閉。
 
-    Wrapped in try/except because the connected user may not have superuser
-    privileges; in that case full-text search gracefully falls back to ILIKE.
+    gunicorn --preload 會在 master 建立 app 後才 fork worker，繼承下來的 socket
+    與背景執行緒會被多個程序共用；各連線池在第一次使用時會在 worker 內重新連線。
     """
-    if get_db_type() != "postgres":
-        return
+    if get_db_type() == "postgres":
+        try:
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+        except Exception:
+            pass
+    elif mongo.cx is not None:
+        # 關閉後的 MongoClient 不能再使用，改建立一個尚未連線的新 client
+        mongo.cx.close()
+        mongo.init_app(app)
     try:
-        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
-        db.session.commit()
+        with app.app_context():
+            backend = cache.cache
     except Exception:
-        db.session.rollback()
+        backend = None
+    for client in (getattr(backend, "_write_client", None), getattr(backend, "_read_client", None)):
+        pool = getattr(client, "connection_pool", None)
+        if pool is not None:
+            pool.disconnect()
 
 
 def create_app() -> Flask:
@@ -487,7 +246,8 @@ def create_app() -> Flask:
         print("⚠️  警告：未設定 SECRET_KEY 環境變數，使用隨機值（不建議用於生產環境）")
 
     db_type = get_db_type()
-    
+    from app.utils import schema
+
     app.config.from_mapping(
         # 資料庫設定
         DB_TYPE=db_type,
@@ -502,6 +262,20 @@ def create_app() -> Flask:
             "UPLOAD_FOLDER",
             str(Path(__file__).resolve().parent.parent / "static" / "uploads"),
         ),
+        # QR / 條碼圖片快取（依內容雜湊命名，可安全地在多個 worker 間共用）
+        LABEL_CACHE_DIR=os.environ.get(
+            "LABEL_CACHE_DIR",
+            str(Path(__file__).resolve().parent.parent / "instance" / "label_cache"),
+        ),
+        # 取樣分析器：管理員開啟後輸出 collapsed stack 與 SQL 的目錄；設為 false 則完全不掛勾點
+        PROFILER_ENABLED=os.environ.get("PROFILER_ENABLED", "true").lower() != "false",
+        PROFILER_OUTPUT_DIR=os.environ.get(
+            "PROFILER_OUTPUT_DIR",
+            str(Path(__file__).resolve().parent.parent / "instance" / "profiles"),
+        ),
+        # 上傳圖片：簽章網址有效秒數，以及交給前端代理送檔的 internal location（空字串代表由 Flask 送檔）
+        MEDIA_URL_TTL=int(os.environ.get("MEDIA_URL_TTL", "3600")),
+        MEDIA_ACCEL_REDIRECT=os.environ.get("MEDIA_ACCEL_REDIRECT", ""),
         MAX_CONTENT_LENGTH=16 * 1024 * 1024,
         ALLOWED_EXTENSIONS={"png", "jpg", "jpeg", "gif"},
         SESSION_COOKIE_SECURE=os.environ.get("FLASK_ENV") == "production",
@@ -516,6 +290,12 @@ def create_app() -> Flask:
         TELEGRAM_BOT_TOKEN=os.environ.get("TELEGRAM_BOT_TOKEN", ""),
         TELEGRAM_BOT_USERNAME=os.environ.get("TELEGRAM_BOT_USERNAME", ""),
         TELEGRAM_WEBHOOK_SECRET=os.environ.get("TELEGRAM_WEBHOOK_SECRET", ""),
+        # 登入者快取秒數（0 代表停用），角色/密碼/token 變更時會主動失效
+        PRINCIPAL_CACHE_TTL=int(os.environ.get("PRINCIPAL_CACHE_TTL", "30")),
+        # 類型 / 位置的程序內快取秒數（0 代表停用），異動時透過 Redis pub/sub 或 LISTEN/NOTIFY 失效
+        CACHE_LOCAL_TTL=float(os.environ.get("CACHE_LOCAL_TTL", "60")),
+        # 啟動時資料庫結構落後是否自動套用遷移（production 預設否，由 `flask schema-upgrade` 套用）
+        SCHEMA_AUTO_MIGRATE=schema.auto_migrate_enabled(),
     )
 
     ensure_upload_folder(app)
@@ -523,26 +303,24 @@ def create_app() -> Flask:
     # 根據資料庫類型初始化
     if db_type == "postgres":
         db.init_app(app)
-        with app.app_context():
-            db.create_all()
-            _ensure_item_maintenance_columns()
-            _ensure_user_profile_columns()
-            _ensure_dashboard_widgets_column()
-            _ensure_type_parent_column()
-            _ensure_fulltext_extensions()
-            _ensure_item_condition_column()
-            _ensure_item_asset_columns()
-            _ensure_item_warehouse_column()
-            _ensure_map_columns()
-            _ensure_item_purchase_columns()
-            _ensure_item_currency_column()
-            _ensure_email_verify_columns()
-            _ensure_item_soft_delete_columns()
-            _ensure_item_sort_order_column()
-            _ensure_item_insurance_columns()
     else:
+        from app.utils import metrics
+        metrics.register_mongo_listener()
         mongo.init_app(app)
-    
+
+    # 資料庫結構：啟動時只查一次 alembic_version，遷移與預設資料由 `flask schema-upgrade`（alembic upgrade head）套用
+    schema.init_app(app)
+    with app.app_context():
+        schema.check(app)
+
+    # Prometheus 指標：請求延遲、資料庫查詢次數與耗時、連線池等待時間
+    from app.utils import metrics
+    metrics.init_app(app)
+
+    # 取樣分析器（預設關閉，由管理員針對特定路由開啟）
+    from app.utils import profiler
+    profiler.init_app(app)
+
     csrf.init_app(app)
 
     # Redis Fallback: wrap limiter and cache init so the app starts even without Redis
@@ -553,6 +331,7 @@ def create_app() -> Flask:
         _redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
         _r = _redis_lib.from_url(_redis_url, socket_connect_timeout=2)
         _r.ping()
+        _r.close()
     except Exception:
         # Redis unavailable — fall back to in-memory storage for limiter
         print("⚠️  Redis 不可用，限流器將改用記憶體模式（不支援多進程共享）")
@@ -614,20 +393,18 @@ def create_app() -> Flask:
         logger.warning("configuration_validation_warning", error=str(e))
         config_result = {"valid": False, "errors": str(e), "config": None}
 
+    # 排程器與 webhook / bot dispatcher 只由 run_worker.py 啟動；create_app 不建立背景執行緒，
+    # gunicorn --preload 的 master 與各 web worker 都不會執行排程或投遞
     with app.app_context():
-        if os.environ.get("TEST_MODE") != "true":
-            _ensure_default_admin()
-            _seed_item_templates()
-
-        # 只在明確啟用 scheduler 的進程中初始化（避免多 worker 重複執行）
-        if os.environ.get("ENABLE_SCHEDULER") == "true":
-            from app.utils import scheduler
-            scheduler.init_scheduler()
-
         # 初始化全局錯誤處理器
         from app.utils.error_handler import init_error_handlers
         init_error_handlers(app)
 
+    # 操作日誌嚴格模式：每個請求結束前寫完佇列中的日誌
+    from app.services import log_service
+    if log_service.ACTIVITY_LOG_STRICT:
+        app.teardown_request(log_service.flush_on_teardown)
+
     # Blueprint 註冊
     from app.auth.routes import bp as auth_bp
     from app.items.routes import bp as items_bp
@@ -694,4 +471,6 @@ def create_app() -> Flask:
             return value
         return value.strftime(format)
 
+    _release_prefork_connections(app)
+
     return app
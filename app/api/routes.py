@@ -66,7 +66,9 @@ def api_v1_list_items():
     page_size = min(100, max(1, request.args.get("page_size", 20, type=int)))
 
     filters = {"q": q}
-    result = item_service.list_items(filters, page=page, page_size=page_size)
+    result = item_service.list_items(
+        filters, page=page, page_size=page_size, projection=item_service.ITEM_PROJECTION
+    )
 
     items = result.get("items", [])
     return jsonify({
@@ -1,9 +1,10 @@
 """Health check endpoints for monitoring and Kubernetes readiness"""
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, request, send_file
 from sqlalchemy import text
 from datetime import datetime
 
 from app import db, get_db_type, cache
+from app.utils.auth import admin_required
 
 bp = Blueprint("health", __name__)
 
@@ -149,43 +150,117 @@ def readiness_check():
 @bp.route("/metrics", methods=["GET"])
 def metrics():
     """
-    Simple metrics endpoint
+    Metrics endpoint
 
-    Returns basic application metrics for monitoring dashboards.
-    This is a lightweight alternative to Prometheus integration.
+    Returns Prometheus text exposition by default (request latency, DB query
+    timing, pool checkout wait, cache hit ratios, scheduler and webhook queue
+    gauges). ``?format=json`` or ``Accept: application/json`` returns the
+    legacy JSON summary. Inventory counts come from a snapshot refreshed in
+    the background, so scrapes never run count queries.
     """
-    from app.repositories import item_repo, type_repo, location_repo, user_repo
+    from flask import request
+    from app.utils import metrics as prometheus_metrics
 
+    app = current_app._get_current_object()
+    wants_json = request.args.get("format") == "json" or (
+        request.accept_mimetypes.best_match(["text/plain", "application/json"]) == "application/json"
+    )
     try:
-        # Item counts
-        item_stats = item_repo.get_stats()
-
-        # Type count
-        types_count = len(type_repo.list_types())
-
-        # Location count
-        locations_count = len(list(location_repo.list_locations()))
-
-        # User count (basic)
-        users_count = user_repo.count_all()
+        if not wants_json:
+            body, content_type = prometheus_metrics.render_latest(app)
+            return current_app.response_class(body, status=200, content_type=content_type)
 
+        prometheus_metrics.start_inventory_refresher(app)
+        snapshot = prometheus_metrics.get_inventory()
         metrics = {
             "timestamp": datetime.now().isoformat(),
             "application": "item-manage-system",
             "version": "1.0.0",
-            "counts": {
-                "total_items": item_stats["total"],
-                "items_with_photo": item_stats["with_photo"],
-                "items_with_location": item_stats["with_location"],
-                "items_with_type": item_stats["with_type"],
-                "types": types_count,
-                "locations": locations_count,
-                "users": users_count,
-            }
+            "counts": snapshot.get("counts", {}),
+            "counts_refreshed_at": (
+                datetime.fromtimestamp(snapshot["refreshed_at"]).isoformat()
+                if snapshot.get("refreshed_at") else None
+            ),
         }
 
+        try:
+            from app.services import webhook_service
+            metrics["webhooks"] = webhook_service.get_metrics(include_outbox=False)
+            by_status = snapshot.get("webhook_outbox") or {}
+            metrics["webhooks"]["by_status"] = by_status
+            metrics["webhooks"]["queue_depth"] = by_status.get("pending", 0) + by_status.get("inflight", 0)
+        except Exception:
+            pass
+
+        try:
+            from app.services import log_service
+            metrics["activity_log"] = log_service.get_buffer_stats()
+        except Exception:
+            pass
+
+        try:
+            from app.utils import scheduler
+            metrics["scheduled_jobs"] = scheduler.get_job_stats()
+        except Exception:
+            pass
+
         return jsonify(metrics), 200
     except Exception as e:
         from app.utils.error_handler import log_error
         log_error(f"Failed to gather metrics: {str(e)}")
         return jsonify({"error": "Metrics unavailable"}), 500
+
+
+@bp.route("/admin/profiler", methods=["GET"])
+@admin_required
+def profiler_status():
+    """取樣分析器狀態與最近的分析檔"""
+    from app.utils import profiler
+
+    return jsonify({"session": profiler.current_session(), "profiles": profiler.list_profiles()}), 200
+
+
+@bp.route("/admin/profiler", methods=["POST"])
+@admin_required
+def profiler_arm():
+    """
+    開啟取樣分析器
+
+    JSON body: route（endpoint 名稱、路由樣板或路徑，省略代表所有請求）、
+    requests（接下來幾個符合的請求）、seconds（時間窗）、interval_ms（取樣間隔）
+    """
+    from app.utils import profiler
+
+    data = request.get_json(silent=True) or {}
+    try:
+        session = profiler.arm(
+            route=data.get("route"),
+            requests=data.get("requests"),
+            seconds=data.get("seconds"),
+            interval_ms=data.get("interval_ms") or profiler.DEFAULT_INTERVAL_MS,
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "session": session}), 200
+
+
+@bp.route("/admin/profiler", methods=["DELETE"])
+@admin_required
+def profiler_disarm():
+    from app.utils import profiler
+
+    profiler.disarm()
+    return jsonify({"success": True}), 200
+
+
+@bp.route("/admin/profiler/<name>", methods=["GET"])
+@admin_required
+def profiler_download(name: str):
+    from flask import abort
+    from app.utils import profiler
+
+    path = profiler.profile_path(name)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype="text/plain" if name.endswith(".collapsed") else "application/json",
+                     as_attachment=True, download_name=name)
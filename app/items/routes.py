@@ -1,4 +1,5 @@
-from io import BytesIO, StringIO
+from io import StringIO
+import hashlib
 import json
 import csv
 from datetime import datetime
@@ -10,12 +11,12 @@ from flask import (
     redirect,
     url_for,
     flash,
-    send_from_directory,
     send_file,
     current_app,
     jsonify,
     Response,
     session,
+    has_request_context,
 )
 from flask_babel import gettext as _
 
@@ -34,50 +35,35 @@ from app.utils.auth import login_required, admin_required, get_current_user
 from app.models.item import Item
 from app.models.item_type import ItemType
 from app.models.location import Location
-import qrcode
-import barcode
-from barcode.writer import ImageWriter
 
 bp = Blueprint("items", __name__)
 
 
 
+@bp.url_defaults
+def _sign_upload_urls(endpoint, values):
+    """產生 /uploads 網址時附加登入者的短效簽章，讀圖時免查資料庫"""
+    if endpoint != "items.uploaded_file" or "s" in values or not values.get("filename"):
+        return
+    username = session.get("UserID") if has_request_context() else None
+    if username:
+        from app.services import media_service
+
+        values.update(media_service.signed_params(values["filename"], username))
+
+
 @bp.route("/uploads/<filename>")
 @login_required
 def uploaded_file(filename):
     from flask import abort
-    try:
-        # 檢查檔案是否屬於使用者有權限存取的物品
-        user_id = session.get("UserID", "")
-        user = get_current_user()
-        if not user.get("admin"):
-            from app import get_db_type, mongo
-            db_type = get_db_type()
-            if db_type == "postgres":
-                item = Item.query.filter(
-                    (Item.ItemPic == filename) | (Item.ItemThumb == filename)
-                ).first()
-                if item:
-                    visibility = getattr(item, "visibility", "private") or "private"
-                    if visibility == "private":
-                        shared = item.shared_with or []
-                        owner = item.ItemOwner or ""
-                        if owner != user_id and user_id not in shared:
-                            abort(403)
-            else:
-                item = mongo.db.items.find_one(
-                    {"$or": [{"ItemPic": filename}, {"ItemThumb": filename}]}
-                )
-                if item:
-                    visibility = item.get("visibility", "private") or "private"
-                    if visibility == "private":
-                        shared = item.get("shared_with") or []
-                        owner = item.get("ItemOwner", "")
-                        if owner != user_id and user_id not in shared:
-                            abort(403)
-        return send_from_directory(current_app.config["UPLOAD_FOLDER"], filename)
-    except (FileNotFoundError, OSError):
-        abort(404)
+    from app.services import media_service
+
+    # 檢查檔案是否屬於使用者有權限存取的物品；網址簽章有效時代表頁面產生時已檢查過
+    user_id = session.get("UserID", "")
+    if not media_service.verify_signature(filename, user_id, request.args.get("e"), request.args.get("s")):
+        if not media_service.can_access(get_current_user(), filename):
+            abort(403)
+    return media_service.send_media(filename)
 
 
 _DEFAULT_DASHBOARD_WIDGETS = json.dumps([
@@ -132,7 +118,7 @@ def save_dashboard_widgets():
 def dashboard():
     user = get_current_user()
     settings = user_repo.get_notification_settings(session.get("UserID", ""))
-    expiring = item_service.get_expiring_items(settings.get("notify_days", 30))
+    expiring = item_service.get_expiring_items(settings.get("notify_days", 30), user=user)
     low_stock = item_service.get_low_stock_items()
     replacement = item_service.get_replacement_items(settings)
     stats = item_service.get_stats()
@@ -534,34 +520,78 @@ def item_detail(item_id: str):
     )
 
 
-@bp.route("/items/<item_id>/qrcode")
-@login_required
-def qrcode_image(item_id: str):
+def _label_format() -> str:
+    from flask import abort
+    from app.services import label_service
+
+    fmt = request.args.get("format", "png").lower()
+    if fmt not in label_service.FORMATS:
+        abort(400)
+    return fmt
+
+
+def _label_headers(response, key: str):
+    from app.services import label_service
+
+    response.set_etag(key)
+    response.headers["Cache-Control"] = f"private, max-age={label_service.CACHE_MAX_AGE}, immutable"
+    return response
+
+
+def _send_label(kind: str, item_id: str, payload: str, size: int, suffix: str):
+    """物品 QR / 條碼共用：內容固定，先比對 If-None-Match，命中時不查物品也不產生圖片"""
+    from flask import make_response
+    from app.services import label_service
+
+    fmt = _label_format()
+    key = label_service.image_key(kind, payload, size, fmt)
+    if key in request.if_none_match:
+        return _label_headers(make_response("", 304), key)
+
     item = item_service.get_item(item_id)
     if not item:
         flash(_("找不到物品"), "danger")
         return redirect(url_for("items.home"))
 
-    img = qrcode.make(f"item:{item_id}")
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png", download_name=f"{item_id}_qrcode.png")
+    path, key = label_service.get_image(kind, payload, size, fmt)
+    response = send_file(
+        path,
+        mimetype=label_service.FORMATS[fmt],
+        download_name=f"{item_id}_{suffix}.{fmt}",
+        etag=key,
+        conditional=True,
+    )
+    return _label_headers(response, key)
+
+
+@bp.route("/items/<item_id>/qrcode")
+@login_required
+def qrcode_image(item_id: str):
+    from app.services import label_service
+
+    return _send_label("qr", item_id, label_service.item_payload(item_id), label_service.DEFAULT_QR_BOX_SIZE, "qrcode")
 
 
 @bp.route("/items/<item_id>/barcode")
 @login_required
 def barcode_image(item_id: str):
-    item = item_service.get_item(item_id)
-    if not item:
-        flash(_("找不到物品"), "danger")
-        return redirect(url_for("items.home"))
+    return _send_label("barcode", item_id, item_id, 0, "barcode")
+
+
+@bp.route("/labels/<key>.<fmt>")
+@login_required
+def label_image(key: str, fmt: str):
+    """依內容雜湊提供已產生的標籤圖片；內容不會改變，可長期快取"""
+    from flask import abort
+    from app.services import label_service
 
-    code = barcode.get("code128", item_id, writer=ImageWriter())
-    buf = BytesIO()
-    code.write(buf)
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png", download_name=f"{item_id}_barcode.png")
+    if fmt not in label_service.FORMATS or len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+        abort(404)
+    path = label_service.cached_path(key, fmt)
+    if not path.exists():
+        abort(404)
+    response = send_file(path, mimetype=label_service.FORMATS[fmt], etag=key, conditional=True)
+    return _label_headers(response, key)
 
 
 @bp.route("/notifications")
@@ -569,7 +599,7 @@ def barcode_image(item_id: str):
 def notifications():
     """到期通知頁面"""
     user = get_current_user()
-    result = item_service.get_expiring_items()
+    result = item_service.get_expiring_items(user=user)
     settings = user_repo.get_notification_settings(session.get("UserID", ""))
     low_stock = item_service.get_low_stock_items()
     replacement = item_service.get_replacement_items(settings)
@@ -606,10 +636,42 @@ def notifications_summary():
 @limiter.exempt
 def notification_count():
     """API: 取得通知數量（用於導航欄即時更新）"""
-    counts = item_service.get_notification_count()
+    counts = item_service.get_notification_count(get_current_user())
     return jsonify(counts)
 
 
+@bp.route("/api/expiring")
+@login_required
+def expiring_feed():
+    """API: 到期物品清單（依最早到期日排序、分頁、只含目前使用者可見的物品）"""
+    try:
+        days = max(0, int(request.args.get("days", 30)))
+        page = max(1, int(request.args.get("page", 1)))
+        page_size = min(100, max(1, int(request.args.get("page_size", 20))))
+    except (TypeError, ValueError):
+        return jsonify({"error": _("無效的參數")}), 400
+
+    result = item_service.get_expiring_items(days, user=get_current_user(), page=page, page_size=page_size)
+    return jsonify({
+        "items": result["expired"] + result["near_expiry"],
+        "expired_count": result["expired_count"],
+        "near_count": result["near_count"],
+        "total": result["total_alerts"],
+        "page": result["page"],
+        "page_size": result["page_size"],
+        "total_pages": result["total_pages"],
+    })
+
+
+EXPORT_CSV_FIELDS = [
+    "ItemID", "ItemName", "ItemDesc", "ItemPic", "ItemStorePlace",
+    "ItemType", "ItemOwner", "ItemGetDate", "ItemFloor", "ItemRoom",
+    "ItemZone", "visibility", "shared_with", "Quantity", "SafetyStock", "ReorderLevel",
+    "WarrantyExpiry", "UsageExpiry", "MaintenanceCategory", "MaintenanceIntervalDays",
+    "LastMaintenanceDate",
+]
+
+
 @bp.route("/export/<string:export_format>")
 @admin_required
 def export_items(export_format: str):
@@ -625,7 +687,11 @@ def export_items(export_format: str):
         }.items()
         if value
     }
-    items = item_service.get_all_items_for_export(filters=filters)
+    # CSV 只需要固定欄位；JSON 匯出保留完整資料
+    projection = None
+    if export_format == "csv":
+        projection = {name: 1 for name in EXPORT_CSV_FIELDS}
+    items = item_service.get_all_items_for_export(filters=filters, projection=projection)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     if export_format == "json":
@@ -640,16 +706,8 @@ def export_items(export_format: str):
             flash(_("沒有可匯出的資料"), "warning")
             return redirect(url_for("items.manageitem"))
 
-        fieldnames = [
-            "ItemID", "ItemName", "ItemDesc", "ItemPic", "ItemStorePlace",
-            "ItemType", "ItemOwner", "ItemGetDate", "ItemFloor", "ItemRoom",
-            "ItemZone", "visibility", "shared_with", "Quantity", "SafetyStock", "ReorderLevel",
-            "WarrantyExpiry", "UsageExpiry", "MaintenanceCategory", "MaintenanceIntervalDays",
-            "LastMaintenanceDate",
-        ]
-
         output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction="ignore")
+        writer = csv.DictWriter(output, fieldnames=EXPORT_CSV_FIELDS, extrasaction="ignore")
         writer.writeheader()
         for item in items:
             writer.writerow(item)
@@ -762,34 +820,32 @@ def import_items():
     return redirect(url_for("import.index"))
 
 
+def _hierarchy_response(payload: Dict[str, Any], etag: str):
+    """位置階層共用：If-None-Match 命中時回 304，瀏覽器每次仍會以 ETag 重新驗證"""
+    response = Response(status=304) if request.if_none_match.contains(etag) else jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@bp.route("/api/locations/hierarchy")
+@login_required
+def get_location_hierarchy():
+    """API: 樓層 → 房間 → 區域 階層（含物品數），供級聯選單一次載入後在瀏覽器端篩選"""
+    hierarchy = location_service.get_hierarchy()
+    return _hierarchy_response(hierarchy, hierarchy["etag"])
+
+
 @bp.route("/api/locations/cascade")
 @login_required
 def get_cascade_locations():
     """API: 取得級聯位置選項"""
     floor = request.args.get("floor", "")
     room = request.args.get("room", "")
-    
-    locations = location_service.list_locations()
-    
-    if floor:
-        # 根據樓層篩選房間
-        rooms = sorted({
-            loc.get("room", "") 
-            for loc in locations 
-            if loc.get("floor") == floor and loc.get("room")
-        })
-        return jsonify({"rooms": rooms})
-    
-    if room:
-        # 根據房間篩選區域
-        zones = sorted({
-            loc.get("zone", "") 
-            for loc in locations 
-            if loc.get("room") == room and loc.get("zone")
-        })
-        return jsonify({"zones": zones})
-    
-    return jsonify({"rooms": [], "zones": []})
+
+    hierarchy = location_service.get_hierarchy()
+    etag = f"{hierarchy['etag']}-{hashlib.sha1(f'{floor}|{room}'.encode('utf-8')).hexdigest()[:12]}"
+    return _hierarchy_response(location_service.cascade_options(floor, room), etag)
 
 
 @bp.route("/api/generate-id")
@@ -1007,7 +1063,7 @@ def statistics():
         **(item_service.get_stats() or {}),
     }
 
-    items = item_service.get_all_items_for_export()
+    items = item_service.get_all_items_for_export(projection={"ItemType": 1, "ItemFloor": 1})
 
     type_counts: Dict[str, int] = {}
     floor_counts: Dict[str, int] = {}
@@ -1038,7 +1094,7 @@ def statistics():
     floor_stats.sort(key=lambda item: (-item["count"], item["name"]))
     
     # 到期統計
-    expiry_stats = item_service.get_notification_count()
+    expiry_stats = item_service.get_notification_count(user)
     replacement = item_service.get_replacement_items(notification_settings)
     maintenance_stats = {
         "due": len(replacement.get("due", [])),
@@ -1243,28 +1299,31 @@ def print_labels():
             flash(_("請選擇要列印的物品"), "warning")
             return redirect(url_for("items.print_labels"))
         
-        # 取得物品資料
-        items = []
-        for item_id in item_ids:
-            item = item_service.get_item(item_id)
-            if item:
-                # 產生 QR 碼的 base64
-                img = qrcode.make(f"item:{item_id}")
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                buf.seek(0)
-                import base64
-                qr_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-                item['qr_code'] = f"data:image/png;base64,{qr_base64}"
-                items.append(item)
-        
-        # 取得列印設定 (M20: 支援更多版面參數)
+        # 取得物品資料（單一 IN 查詢，依勾選順序排列）
+        from app.repositories import item_repo
+        from app.services import label_service
+
+        found = {it["ItemID"]: it for it in item_repo.find_items_by_ids(item_ids)}
+        items = [found[item_id] for item_id in dict.fromkeys(item_ids) if item_id in found]
+
         label_size = request.form.get("label_size", "medium")
+        show_qr = request.form.get("show_qr", "on") == "on"
+        if show_qr:
+            box_size = label_service.QR_BOX_SIZES.get(label_size, label_service.QR_BOX_SIZES["medium"])
+            qr_format = "svg" if request.form.get("qr_svg") == "on" else "png"
+            specs = {
+                item["ItemID"]: ("qr", label_service.item_payload(item["ItemID"]), box_size, qr_format)
+                for item in items
+            }
+            keys = label_service.ensure_images(specs.values())
+            for item in items:
+                item["qr_code"] = url_for("items.label_image", key=keys[specs[item["ItemID"]]], fmt=qr_format)
+
+        # 取得列印設定 (M20: 支援更多版面參數)
         show_name = request.form.get("show_name") == "on"
         show_id = request.form.get("show_id") == "on"
         show_location = request.form.get("show_location") == "on"
         show_type = request.form.get("show_type") == "on"
-        show_qr = request.form.get("show_qr", "on") == "on"
         labels_per_row = request.form.get("labels_per_row", "3")
         font_size = request.form.get("font_size", "medium")
 
@@ -1318,28 +1377,55 @@ def adjust_quantity(item_id: str):
         return jsonify({"success": False, "message": _("無效的數量")}), 400
 
     user = get_current_user()
-    user_id = user.get("User", "")
-    success, new_qty, message = item_service.adjust_quantity(item_id, delta, user=user_id, reason=reason)
-
-    if success:
-        item = item_service.get_item(item_id)
-        safety_stock = (item.get("SafetyStock") or 0) if item else 0
-        reorder_level = (item.get("ReorderLevel") or 0) if item else 0
-        
-        status = "ok"
-        if reorder_level > 0 and new_qty <= reorder_level:
-            status = "critical"
-        elif safety_stock > 0 and new_qty <= safety_stock:
-            status = "low"
-        
+    result = item_service.adjust_quantities([(item_id, delta)], user=user.get("User", ""), reason=reason)[0]
+    if result["success"]:
         return jsonify({
             "success": True,
-            "quantity": new_qty,
-            "status": status,
-            "message": message
+            "quantity": result["quantity"],
+            "status": result["status"],
+            "message": result["message"]
         })
-    
-    return jsonify({"success": False, "message": message}), 400
+
+    return jsonify({"success": False, "message": result["message"]}), 400
+
+
+QUANTITY_BATCH_LIMIT = 500
+
+
+@bp.route("/api/quantity/batch", methods=["POST"])
+@admin_required
+def adjust_quantity_batch():
+    """API: 一次套用多筆數量調整（條碼掃描槍連續掃描）
+
+    請求格式：{"adjustments": [{"item_id": "A", "delta": -1}, ...], "reason": "..."}
+    """
+    data = request.get_json() or {}
+    adjustments = data.get("adjustments") or []
+    if not isinstance(adjustments, list) or not adjustments:
+        return jsonify({"success": False, "message": _("未提供更新資料")}), 400
+    if len(adjustments) > QUANTITY_BATCH_LIMIT:
+        return jsonify({"success": False, "message": _("一次最多 %(n)d 筆", n=QUANTITY_BATCH_LIMIT)}), 400
+
+    pairs = []
+    for entry in adjustments:
+        try:
+            item_id = str(entry.get("item_id") or "").strip()
+            delta = int(entry.get("delta", 0))
+        except (AttributeError, ValueError, TypeError):
+            return jsonify({"success": False, "message": _("無效的數量")}), 400
+        if not item_id:
+            return jsonify({"success": False, "message": _("無效的數量")}), 400
+        pairs.append((item_id, delta))
+
+    user = get_current_user()
+    results = item_service.adjust_quantities(pairs, user=user.get("User", ""), reason=data.get("reason"))
+    failed_ids = [r["item_id"] for r in results if not r["success"]]
+    return jsonify({
+        "success": not failed_ids,
+        "results": results,
+        "success_count": len(results) - len(failed_ids),
+        "failed_ids": failed_ids,
+    })
 
 
 @bp.route("/reorder")
@@ -1464,94 +1550,72 @@ def calendar_view():
 @bp.route("/api/calendar/events")
 @login_required
 def calendar_events():
-    """M15: 行事曆事件 API（依月份）"""
-    month_str = request.args.get("month", "")
-    if not month_str:
-        from datetime import date as _date
-        month_str = _date.today().strftime("%Y-%m")
+    """M15: 行事曆事件 API（start/end 為 YYYY-MM-DD，未提供時使用 month=YYYY-MM）"""
+    from app.services import calendar_service
 
+    start_str = request.args.get("start", "")
+    end_str = request.args.get("end", "")
+    month_str = request.args.get("month", "")
     try:
-        year, month = int(month_str[:4]), int(month_str[5:7])
+        if start_str and end_str:
+            start, end = calendar_service.parse_range(start_str, end_str)
+        else:
+            if not month_str:
+                from datetime import date as _date
+                month_str = _date.today().strftime("%Y-%m")
+            start, end = calendar_service.month_range(month_str)
     except (ValueError, IndexError):
-        return jsonify({"error": "invalid month"}), 400
+        return jsonify({"error": "invalid range"}), 400
 
-    from app import get_db_type
-    from datetime import date as _date, timedelta
-    import calendar as _cal
+    events = calendar_service.get_events(get_current_user(), start, end)
+    return jsonify({
+        "month": month_str or start.strftime("%Y-%m"),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "events": events,
+    })
 
-    events: list = []
-    db_type = get_db_type()
 
-    if db_type == "postgres":
-        # 計算月份範圍
-        first_day = _date(year, month, 1)
-        last_day = _date(year, month, _cal.monthrange(year, month)[1])
-
-        # WarrantyExpiry 到期 (紅)
-        warranty_items = Item.query.filter(
-            Item.WarrantyExpiry >= first_day,
-            Item.WarrantyExpiry <= last_day,
-            Item.is_deleted == False,
-        ).all()
-        for item in warranty_items:
-            events.append({
-                "date": item.WarrantyExpiry.strftime("%Y-%m-%d"),
-                "type": "warranty",
-                "color": "red",
-                "label": f"保固到期：{item.ItemName}",
-                "item_id": item.ItemID,
-            })
-
-        # UsageExpiry 到期 (橙)
-        usage_items = Item.query.filter(
-            Item.UsageExpiry >= first_day,
-            Item.UsageExpiry <= last_day,
-            Item.is_deleted == False,
-        ).all()
-        for item in usage_items:
-            events.append({
-                "date": item.UsageExpiry.strftime("%Y-%m-%d"),
-                "type": "usage",
-                "color": "orange",
-                "label": f"使用期限：{item.ItemName}",
-                "item_id": item.ItemID,
-            })
-
-        # 保養到期 (藍) - LastMaintenanceDate + MaintenanceIntervalDays 落在此月
-        maintenance_items = Item.query.filter(
-            Item.LastMaintenanceDate.isnot(None),
-            Item.MaintenanceIntervalDays.isnot(None),
-            Item.is_deleted == False,
-        ).all()
-        for item in maintenance_items:
-            if item.LastMaintenanceDate and item.MaintenanceIntervalDays:
-                due = item.LastMaintenanceDate + timedelta(days=int(item.MaintenanceIntervalDays))
-                if first_day <= due <= last_day:
-                    events.append({
-                        "date": due.strftime("%Y-%m-%d"),
-                        "type": "maintenance",
-                        "color": "blue",
-                        "label": f"保養到期：{item.ItemName}",
-                        "item_id": item.ItemID,
-                    })
-
-        # 借出歸還 (綠) — 尚未還回 (status != returned)
-        from app.models.item_loan import ItemLoan
-        loans = ItemLoan.query.filter(
-            ItemLoan.expected_return >= first_day,
-            ItemLoan.expected_return <= last_day,
-            ItemLoan.status != "returned",
-        ).all()
-        for loan in loans:
-            events.append({
-                "date": loan.expected_return.strftime("%Y-%m-%d"),
-                "type": "loan_return",
-                "color": "green",
-                "label": f"借出歸還：{loan.item_name or loan.item_id}",
-                "item_id": loan.item_id,
-            })
-
-    return jsonify({"month": month_str, "events": events})
+@bp.route("/api/calendar/feed-url")
+@login_required
+def calendar_feed_url():
+    """M15: 取得個人 ICS 訂閱網址"""
+    from app.services import calendar_service
+
+    token = calendar_service.make_feed_token(session.get("UserID", ""))
+    return jsonify({"url": url_for("items.calendar_feed", token=token, _external=True)})
+
+
+@bp.route("/api/calendar/feed-url/reset", methods=["POST"])
+@login_required
+def calendar_feed_url_reset():
+    """M15: 重設 ICS 訂閱網址（舊網址立即失效）"""
+    from app.services import calendar_service
+
+    token = calendar_service.reset_feed_token(session.get("UserID", ""))
+    return jsonify({"url": url_for("items.calendar_feed", token=token, _external=True)})
+
+
+@bp.route("/calendar/feed/<token>.ics")
+@limiter.exempt
+def calendar_feed(token: str):
+    """M15: ICS 訂閱（供外部行事曆定期輪詢，以簽章 token 識別使用者）"""
+    from flask import abort
+    from app.services import calendar_service
+
+    user = calendar_service.resolve_feed_token(token)
+    if not user:
+        abort(404)
+
+    body, etag = calendar_service.get_ics_feed(user)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="text/calendar")
+        response.headers["Content-Disposition"] = "inline; filename=calendar.ics"
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, max-age=300"
+    return response
 
 
 @bp.route("/api/templates")
@@ -3,18 +3,22 @@ import hashlib
 import hmac
 import json
 import secrets
+import time
 from urllib.parse import parse_qs
-from urllib import request as urlrequest
 
 from flask import Blueprint, abort, current_app, jsonify, redirect, request, session, url_for
 from itsdangerous import BadSignature, URLSafeSerializer
 
 from app import csrf, db
 from app.models import LineUserLink, Travel, TravelItem
+from app.services import bot_service
 from app.utils.auth import login_required
 
 bp = Blueprint("line", __name__, url_prefix="/line")
 
+# replyToken 約一分鐘後失效，處理時已超過就改用 push 回覆
+REPLY_TOKEN_TTL_SECONDS = 55
+
 
 def _line_serializer() -> URLSafeSerializer:
     return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="line-account-link")
@@ -33,22 +37,9 @@ def _line_api_post(path: str, payload: dict) -> tuple[bool, dict]:
     token = current_app.config.get("LINE_CHANNEL_ACCESS_TOKEN", "")
     if not token:
         return False, {"error": "line_channel_access_token_missing"}
-
-    req = urlrequest.Request(
-        url=f"https://api.line.me{path}",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}",
-        },
-        method="POST",
+    return bot_service.api_post(
+        "line", f"https://api.line.me{path}", payload, headers={"Authorization": f"Bearer {token}"}
     )
-    try:
-        with urlrequest.urlopen(req, timeout=8) as resp:
-            body = resp.read().decode("utf-8") or "{}"
-            return True, json.loads(body)
-    except Exception as exc:
-        return False, {"error": str(exc)}
 
 
 def _default_quick_reply_items() -> list[dict]:
@@ -187,6 +178,7 @@ def _reply_message(
     text: str,
     extra_quick_reply_items: list[dict] | None = None,
     flex_message: dict | None = None,
+    push_to: str | None = None,
 ) -> None:
     quick_reply_items = list(extra_quick_reply_items or [])
     quick_reply_items.extend(_default_quick_reply_items())
@@ -203,13 +195,17 @@ def _reply_message(
         }
     )
 
-    _line_api_post(
-        "/v2/bot/message/reply",
-        {
-            "replyToken": reply_token,
-            "messages": messages,
-        },
-    )
+    if push_to:
+        result = _line_api_post("/v2/bot/message/push", {"to": push_to, "messages": messages})
+    else:
+        result = _line_api_post(
+            "/v2/bot/message/reply",
+            {
+                "replyToken": reply_token,
+                "messages": messages,
+            },
+        )
+    bot_service.raise_for_reply(*result)
 
 
 def _get_linked_user(line_user_id: str) -> str | None:
@@ -364,6 +360,51 @@ def _handle_postback(line_user_id: str, data: str) -> tuple[str, list[dict], dic
     return "未知操作。", [], None
 
 
+def _chat_id_of(event: dict) -> str:
+    source = event.get("source") or {}
+    return source.get("groupId") or source.get("roomId") or source.get("userId") or ""
+
+
+def _process_event(event: dict) -> None:
+    """由 bot dispatcher 呼叫：處理一筆已入列的事件並回覆"""
+    event_type = event.get("type")
+    source = event.get("source") or {}
+    line_user_id = source.get("userId")
+    reply_token = event.get("replyToken")
+
+    if event_type == "accountLink" and line_user_id:
+        link_info = event.get("link") or {}
+        nonce = link_info.get("nonce")
+        result = link_info.get("result")
+        if result == "ok" and nonce:
+            try:
+                payload = _line_serializer().loads(nonce)
+                target_user_id = payload.get("u")
+                if target_user_id:
+                    _upsert_link(target_user_id, line_user_id)
+            except BadSignature:
+                pass
+        return
+
+    if event_type not in {"message", "postback"} or not line_user_id or not reply_token:
+        return
+    if event_type == "message":
+        message = event.get("message") or {}
+        if message.get("type") != "text":
+            return
+        reply_text, quick_items, flex_message = _handle_text_message(line_user_id, message.get("text", ""))
+    else:
+        postback = event.get("postback") or {}
+        reply_text, quick_items, flex_message = _handle_postback(line_user_id, postback.get("data", ""))
+
+    age = time.time() - (event.get("timestamp") or 0) / 1000
+    push_to = _chat_id_of(event) if age > REPLY_TOKEN_TTL_SECONDS else None
+    _reply_message(reply_token, reply_text, quick_items, flex_message, push_to=push_to)
+
+
+bot_service.register_handler("line", _process_event)
+
+
 @bp.route("/webhook", methods=["POST"])
 @csrf.exempt
 def webhook():
@@ -378,36 +419,12 @@ def webhook():
         body = {}
     events = body.get("events") or []
 
+    # 只入列後立即回應；LINE 重送（isRedelivery）的相同 webhookEventId 會被略過
     for event in events:
-        event_type = event.get("type")
-        source = event.get("source") or {}
-        line_user_id = source.get("userId")
-        reply_token = event.get("replyToken")
-
-        if event_type == "accountLink" and line_user_id:
-            link_info = event.get("link") or {}
-            nonce = link_info.get("nonce")
-            result = link_info.get("result")
-            if result == "ok" and nonce:
-                try:
-                    payload = _line_serializer().loads(nonce)
-                    target_user_id = payload.get("u")
-                    if target_user_id:
-                        _upsert_link(target_user_id, line_user_id)
-                except BadSignature:
-                    pass
-            continue
-
-        if event_type == "message" and line_user_id and reply_token:
-            message = event.get("message") or {}
-            if message.get("type") == "text":
-                reply_text, quick_items, flex_message = _handle_text_message(line_user_id, message.get("text", ""))
-                _reply_message(reply_token, reply_text, quick_items, flex_message)
-
-        if event_type == "postback" and line_user_id and reply_token:
-            postback = event.get("postback") or {}
-            reply_text, quick_items, flex_message = _handle_postback(line_user_id, postback.get("data", ""))
-            _reply_message(reply_token, reply_text, quick_items, flex_message)
+        key = event.get("webhookEventId") or hashlib.sha256(
+            json.dumps(event, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        bot_service.enqueue("line", key, _chat_id_of(event), event)
 
     return jsonify({"ok": True})
 
@@ -14,12 +14,15 @@ from app.models.custom_field import CustomField, CustomFieldValue
 from app.models.group import Group, GroupMember
 from app.models.warehouse import Warehouse
 from app.models.api_token import APIToken
-from app.models.webhook import Webhook
+from app.models.webhook import Webhook, WebhookDelivery
 from app.models.backup_config import BackupConfig
 from app.models.item_version import ItemVersion
 from app.models.item_template import ItemTemplate
 from app.models.transfer import WarehouseTransfer
 from app.models.item_transfer import ItemTransferRequest
+from app.models.alert_schedule import AlertSchedule
+from app.models.bot_update import BotUpdate
+from app.models.user_recommendation import UserRecommendation
 
 __all__ = [
     "User",
@@ -45,9 +48,13 @@ __all__ = [
     "Warehouse",
     "APIToken",
     "Webhook",
+    "WebhookDelivery",
     "BackupConfig",
     "ItemVersion",
     "ItemTemplate",
     "WarehouseTransfer",
     "ItemTransferRequest",
+    "AlertSchedule",
+    "BotUpdate",
+    "UserRecommendation",
 ]
@@ -0,0 +1,49 @@
+"""到期提醒排程模型
+
+每件物品、每種提醒（保固 / 使用期限 / 保養）一列物品排程（username 為空字串），
+使用者收到提醒後另有一列個人排程，記錄下一次應提醒的時間與已發送到提醒階梯的哪一階。
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import String, Integer, Date, DateTime, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app import db
+
+
+class AlertSchedule(db.Model):
+    __tablename__ = "alert_schedules"
+    __table_args__ = (
+        UniqueConstraint("username", "item_id", "kind", name="uq_alert_schedule_entry"),
+        Index("ix_alert_schedules_due", "next_alert_at", "username"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(String(50), nullable=False)
+    item_id: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # warranty / usage / maintenance
+    label: Mapped[Optional[str]] = mapped_column(String(100), default="")
+    due_date: Mapped[date] = mapped_column(Date, nullable=False)
+    # 下一次提醒的階梯天數（0 代表到期當天 / 已過期）與時間；None 代表已全部發送
+    next_offset: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    next_alert_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_offset: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "username": self.username,
+            "item_id": self.item_id,
+            "kind": self.kind,
+            "label": self.label or "",
+            "due_date": self.due_date,
+            "next_offset": self.next_offset,
+            "next_alert_at": self.next_alert_at,
+            "last_offset": self.last_offset,
+            "last_sent_at": self.last_sent_at,
+        }
+
+    def __repr__(self) -> str:
+        return f"<AlertSchedule {self.username}:{self.item_id}:{self.kind}>"
@@ -0,0 +1,53 @@
+"""LINE / Telegram bot 更新佇列"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app import db
+
+
+class BotUpdate(db.Model):
+    """Bot webhook 收件匣（inbox）
+
+    webhook 驗證後只寫入這張表並立即回應，由背景 dispatcher 處理並回覆。
+    (channel, update_key) 來自平台的 update_id / webhookEventId，平台重送時不會重複處理。
+    """
+    __tablename__ = "bot_updates"
+    __table_args__ = (
+        UniqueConstraint("channel", "update_key", name="uq_bot_updates_channel_key"),
+        Index("ix_bot_updates_due", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    channel: Mapped[str] = mapped_column(String(20))  # line / telegram
+    update_key: Mapped[str] = mapped_column(String(100))
+    chat_id: Mapped[str] = mapped_column(String(100), default="")
+    payload: Mapped[str] = mapped_column(Text)  # 原始事件 JSON
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending / inflight / done / dead
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    claim_token: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "channel": self.channel,
+            "update_key": self.update_key,
+            "chat_id": self.chat_id,
+            "payload": self.payload,
+            "status": self.status,
+            "attempts": self.attempts or 0,
+            "next_attempt_at": self.next_attempt_at,
+            "last_error": self.last_error or "",
+            "created_at": self.created_at,
+            "processed_at": self.processed_at,
+        }
+
+    def __repr__(self) -> str:
+        return f"<BotUpdate {self.id}: {self.channel}/{self.update_key}>"
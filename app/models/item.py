@@ -15,12 +15,12 @@ class Item(db.Model):
     ItemID: Mapped[str] = mapped_column(String(50), unique=True, nullable=False, index=True)
     ItemName: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
     ItemDesc: Mapped[Optional[str]] = mapped_column(Text)
-    ItemPic: Mapped[Optional[str]] = mapped_column(String(255), default="")
-    ItemThumb: Mapped[Optional[str]] = mapped_column(String(255), default="")
+    ItemPic: Mapped[Optional[str]] = mapped_column(String(255), default="", index=True)
+    ItemThumb: Mapped[Optional[str]] = mapped_column(String(255), default="", index=True)
     ItemPics: Mapped[Optional[List[str]]] = mapped_column(JSON, default=list)
     ItemStorePlace: Mapped[Optional[str]] = mapped_column(String(255), default="")
     ItemType: Mapped[Optional[str]] = mapped_column(String(50), index=True)
-    ItemOwner: Mapped[Optional[str]] = mapped_column(String(50))
+    ItemOwner: Mapped[Optional[str]] = mapped_column(String(50), index=True)
     ItemGetDate: Mapped[Optional[str]] = mapped_column(String(20))
     ItemFloor: Mapped[Optional[str]] = mapped_column(String(50), index=True)
     ItemRoom: Mapped[Optional[str]] = mapped_column(String(50), index=True)
@@ -35,6 +35,8 @@ class Item(db.Model):
     MaintenanceCategory: Mapped[Optional[str]] = mapped_column(String(50), default="")
     MaintenanceIntervalDays: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     LastMaintenanceDate: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    # 下次保養日（LastMaintenanceDate + MaintenanceIntervalDays），寫入時由 item_repo 維護，供日期區間查詢使用
+    MaintenanceDueDate: Mapped[Optional[date]] = mapped_column(Date, nullable=True, index=True)
     move_history: Mapped[Optional[List[dict]]] = mapped_column(JSON, default=list)
     favorites: Mapped[Optional[List[str]]] = mapped_column(JSON, default=list)
     related_items: Mapped[Optional[List[dict]]] = mapped_column(JSON, default=list)
@@ -67,52 +69,90 @@ class Item(db.Model):
     insurance_expiry: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
-            "ItemID": self.ItemID,
-            "ItemName": self.ItemName,
-            "ItemDesc": self.ItemDesc or "",
-            "ItemPic": self.ItemPic or "",
-            "ItemThumb": self.ItemThumb or "",
-            "ItemPics": list(self.ItemPics or []),
-            "ItemStorePlace": self.ItemStorePlace or "",
-            "ItemType": self.ItemType or "",
-            "ItemOwner": self.ItemOwner or "",
-            "ItemGetDate": self.ItemGetDate or "",
-            "ItemFloor": self.ItemFloor or "",
-            "ItemRoom": self.ItemRoom or "",
-            "ItemZone": self.ItemZone or "",
-            "visibility": self.visibility or "private",
-            "shared_with": list(self.shared_with or []),
-            "Quantity": int(self.Quantity or 0),
-            "SafetyStock": int(self.SafetyStock or 0),
-            "ReorderLevel": int(self.ReorderLevel or 0),
-            "WarrantyExpiry": self.WarrantyExpiry.strftime("%Y-%m-%d") if self.WarrantyExpiry else "",
-            "UsageExpiry": self.UsageExpiry.strftime("%Y-%m-%d") if self.UsageExpiry else "",
-            "MaintenanceCategory": self.MaintenanceCategory or "",
-            "MaintenanceIntervalDays": self.MaintenanceIntervalDays if self.MaintenanceIntervalDays else "",
-            "LastMaintenanceDate": self.LastMaintenanceDate.strftime("%Y-%m-%d") if self.LastMaintenanceDate else "",
-            "move_history": list(self.move_history or []),
-            "favorites": list(self.favorites or []),
-            "related_items": list(self.related_items or []),
-            "size_notes": self.size_notes or {},
-            "condition": self.condition or "good",
-            "purchase_price": float(self.purchase_price) if self.purchase_price is not None else None,
-            "current_value": float(self.current_value) if self.current_value is not None else None,
-            "depreciation_method": self.depreciation_method or "",
-            "depreciation_rate": float(self.depreciation_rate) if self.depreciation_rate is not None else None,
-            "currency": self.currency or "TWD",
-            "warehouse_id": self.warehouse_id,
-            "map_x": self.map_x,
-            "map_y": self.map_y,
-            "purchase_url": self.purchase_url or "",
-            "preferred_store": self.preferred_store or "",
-            "is_deleted": bool(self.is_deleted),
-            "deleted_at": self.deleted_at.strftime("%Y-%m-%d %H:%M:%S") if self.deleted_at else None,
-            "sort_order": int(self.sort_order or 0),
-            "insurance_provider": self.insurance_provider or "",
-            "insurance_policy": self.insurance_policy or "",
-            "insurance_expiry": self.insurance_expiry.strftime("%Y-%m-%d") if self.insurance_expiry else "",
-        }
+        return {name: fmt(getattr(self, name)) for name, fmt in ITEM_FIELD_FORMATTERS.items()}
+
+    @staticmethod
+    def format_row(row: Any) -> Dict[str, Any]:
+        """將只查部分欄位的結果（Row mapping）轉成與 to_dict 相同格式的 dict"""
+        return {name: ITEM_FIELD_FORMATTERS[name](value) for name, value in row.items() if name in ITEM_FIELD_FORMATTERS}
 
     def __repr__(self) -> str:
         return f"<Item {self.ItemID}: {self.ItemName}>"
+
+
+def _text(value: Any) -> str:
+    return value or ""
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _list(value: Any) -> List[Any]:
+    return list(value or [])
+
+
+def _int(value: Any) -> int:
+    return int(value or 0)
+
+
+def _date(value: Any) -> str:
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _default(fallback: Any):
+    return lambda value: value or fallback
+
+
+# to_dict 的欄位與格式；清單頁只查部分欄位時也用同一份格式
+ITEM_FIELD_FORMATTERS = {
+    "ItemID": _identity,
+    "ItemName": _identity,
+    "ItemDesc": _text,
+    "ItemPic": _text,
+    "ItemThumb": _text,
+    "ItemPics": _list,
+    "ItemStorePlace": _text,
+    "ItemType": _text,
+    "ItemOwner": _text,
+    "ItemGetDate": _text,
+    "ItemFloor": _text,
+    "ItemRoom": _text,
+    "ItemZone": _text,
+    "visibility": _default("private"),
+    "shared_with": _list,
+    "Quantity": _int,
+    "SafetyStock": _int,
+    "ReorderLevel": _int,
+    "WarrantyExpiry": _date,
+    "UsageExpiry": _date,
+    "MaintenanceCategory": _text,
+    "MaintenanceIntervalDays": lambda value: value if value else "",
+    "LastMaintenanceDate": _date,
+    "MaintenanceDueDate": _date,
+    "move_history": _list,
+    "favorites": _list,
+    "related_items": _list,
+    "size_notes": lambda value: value or {},
+    "condition": _default("good"),
+    "purchase_price": _optional_float,
+    "current_value": _optional_float,
+    "depreciation_method": _text,
+    "depreciation_rate": _optional_float,
+    "currency": _default("TWD"),
+    "warehouse_id": _identity,
+    "map_x": _identity,
+    "map_y": _identity,
+    "purchase_url": _text,
+    "preferred_store": _text,
+    "is_deleted": bool,
+    "deleted_at": lambda value: value.strftime("%Y-%m-%d %H:%M:%S") if value else None,
+    "sort_order": _int,
+    "insurance_provider": _text,
+    "insurance_policy": _text,
+    "insurance_expiry": _date,
+}
@@ -12,7 +12,7 @@ class ItemLoan(db.Model):
     borrower: Mapped[str] = mapped_column(String(100))
     borrower_contact: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
     lent_date: Mapped[date] = mapped_column(Date)
-    expected_return: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    expected_return: Mapped[Optional[date]] = mapped_column(Date, nullable=True, index=True)
     actual_return: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
     status: Mapped[str] = mapped_column(String(20), default="active")  # active, returned, overdue
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -20,7 +20,10 @@ class StocktakeSession(db.Model):
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     items = relationship("StocktakeItem", backref="session", cascade="all, delete-orphan")
 
-    def to_dict(self):
+    def to_dict(self, item_count: Optional[int] = None):
+        """item_count 由呼叫端以 COUNT 查詢提供時，不載入全部明細"""
+        if item_count is None:
+            item_count = len(self.items) if self.items else 0
         return {
             "id": self.id,
             "name": self.name,
@@ -29,7 +32,7 @@ class StocktakeSession(db.Model):
             "created_at": self.created_at.strftime("%Y-%m-%d %H:%M") if self.created_at else "",
             "committed_at": self.committed_at.strftime("%Y-%m-%d %H:%M") if self.committed_at else "",
             "notes": self.notes or "",
-            "item_count": len(self.items) if self.items else 0,
+            "item_count": item_count,
         }
 
 
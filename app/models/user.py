@@ -40,6 +40,9 @@ class User(UserMixin, db.Model):
     email_verified: Mapped[bool] = mapped_column(Boolean, default=False)
     email_verify_token: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
+    # 行事曆訂閱網址的個人密鑰，重設後舊網址失效
+    calendar_feed_secret: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
     # 密碼修改相關
     password_changed: Mapped[bool] = mapped_column(Boolean, default=False)
     failed_attempts: Mapped[int] = mapped_column(Integer, default=0)
@@ -70,6 +73,7 @@ class User(UserMixin, db.Model):
             "language": self.language or "zh_TW",
             "email_verified": self.email_verified,
             "email_verify_token": self.email_verify_token,
+            "calendar_feed_secret": self.calendar_feed_secret,
             "password_changed": self.password_changed,
             "failed_attempts": self.failed_attempts,
             "locked_until": self.locked_until,
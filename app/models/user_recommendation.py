@@ -0,0 +1,32 @@
+"""使用者推薦快照模型"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Boolean, DateTime, JSON, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app import db
+
+
+class UserRecommendation(db.Model):
+    """每位使用者一列，存放排程器預先算好的推薦清單
+
+    讀取只做主鍵查詢；物品異動時將擁有者的快照標記為 stale，由排程器分批重新計算。
+    """
+    __tablename__ = "user_recommendations"
+
+    user_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    recommendations: Mapped[List[Dict[str, Any]]] = mapped_column(JSON, default=list)
+    stale: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
+    computed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "recommendations": list(self.recommendations or []),
+            "stale": bool(self.stale),
+            "computed_at": self.computed_at,
+        }
+
+    def __repr__(self) -> str:
+        return f"<UserRecommendation {self.user_id}>"
@@ -2,7 +2,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import String, Text, Integer, Boolean, DateTime
+from sqlalchemy import String, Text, Integer, Boolean, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app import db
@@ -43,3 +43,45 @@ class Webhook(db.Model):
 
     def __repr__(self) -> str:
         return f"<Webhook {self.id}: {self.url}>"
+
+
+class WebhookDelivery(db.Model):
+    """Webhook 發送佇列（outbox）
+
+    事件與觸發它的物品異動寫在同一個交易中，由背景 dispatcher 取出投遞，
+    程序重啟後未送出的事件仍會繼續發送。
+    """
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (
+        Index("ix_webhook_outbox_due", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    webhook_id: Mapped[str] = mapped_column(String(50), index=True)
+    event: Mapped[str] = mapped_column(String(100))
+    body: Mapped[str] = mapped_column(Text)  # 已序列化的 JSON，重試時內容與簽章一致
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending / inflight / delivered / dead
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    claim_token: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "webhook_id": self.webhook_id,
+            "event": self.event,
+            "body": self.body,
+            "status": self.status,
+            "attempts": self.attempts or 0,
+            "next_attempt_at": self.next_attempt_at,
+            "last_error": self.last_error or "",
+            "created_at": self.created_at,
+            "delivered_at": self.delivered_at,
+        }
+
+    def __repr__(self) -> str:
+        return f"<WebhookDelivery {self.id}: {self.event} -> {self.webhook_id}>"
@@ -1,7 +1,7 @@
 """通知藍圖模組"""
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, session, current_app
 
-from app.services import notification_service
+from app.services import notification_service, alert_schedule_service, user_service
 from app.repositories import user_repo
 
 bp = Blueprint("notifications", __name__, url_prefix="/notifications")
@@ -89,7 +89,7 @@ def update_settings():
                     continue
         replacement_intervals = parsed
 
-    user_repo.update_notification_settings(
+    user_service.update_notification_settings(
         username=session["UserID"],
         email=email,
         notify_enabled=notify_enabled,
@@ -100,6 +100,11 @@ def update_settings():
         replacement_enabled=replacement_enabled,
         replacement_intervals=replacement_intervals,
     )
+    # 提醒階梯或保養規則可能改變，重新排程該使用者的提醒
+    try:
+        alert_schedule_service.reschedule_users([session["UserID"]])
+    except Exception:
+        current_app.logger.exception("重新排程提醒失敗")
     
     return jsonify({"success": True, "message": "設定已更新"})
  
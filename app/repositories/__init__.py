@@ -27,7 +27,7 @@ from .item_repo import (
 from .type_repo import list_types, insert_type
 from .user_repo import find_by_username, insert_user
 from .location_repo import list_locations
-from .log_repo import insert_log, list_logs, count_logs, get_item_logs, ensure_indexes
+from .log_repo import insert_log, insert_logs, list_logs, count_logs, get_item_logs, ensure_indexes
 
 __all__ = [
     # Factory functions
@@ -74,6 +74,7 @@ __all__ = [
     "insert_user",
     "list_locations",
     "insert_log",
+    "insert_logs",
     "list_logs",
     "count_logs",
     "get_item_logs",
@@ -0,0 +1,148 @@
+"""到期提醒排程資料存取模組"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from app import mongo, db, get_db_type
+from app.models.alert_schedule import AlertSchedule
+
+_FIELDS = (
+    "username", "item_id", "kind", "label", "due_date",
+    "next_offset", "next_alert_at", "last_offset", "last_sent_at",
+)
+
+
+def _mongo_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc["id"] = str(doc.pop("_id"))
+    # Mongo 以 datetime 儲存日期欄位
+    if isinstance(doc.get("due_date"), datetime):
+        doc["due_date"] = doc["due_date"].date()
+    return doc
+
+
+def _mongo_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    doc = {field: row.get(field) for field in _FIELDS}
+    due = doc["due_date"]
+    if due is not None and not isinstance(due, datetime):
+        doc["due_date"] = datetime(due.year, due.month, due.day)
+    return doc
+
+
+def _mongo_scope(item_ids: Optional[Iterable[str]], usernames: Optional[Iterable[str]]) -> Dict[str, Any]:
+    scope: Dict[str, Any] = {}
+    if item_ids is not None:
+        scope["item_id"] = {"$in": list(item_ids)}
+    if usernames is not None:
+        scope["username"] = {"$in": list(usernames)}
+    return scope
+
+
+def _sql_scope(query, item_ids: Optional[Iterable[str]], usernames: Optional[Iterable[str]]):
+    if item_ids is not None:
+        query = query.filter(AlertSchedule.item_id.in_(list(item_ids)))
+    if usernames is not None:
+        query = query.filter(AlertSchedule.username.in_(list(usernames)))
+    return query
+
+
+def get_entries(
+    item_ids: Optional[Iterable[str]] = None,
+    usernames: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """取得指定物品 / 使用者範圍內的排程（皆為 None 時取全部）"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        query = _sql_scope(AlertSchedule.query, item_ids, usernames)
+        return [row.to_dict() for row in query.all()]
+    return [_mongo_doc(doc) for doc in mongo.db.alert_schedules.find(_mongo_scope(item_ids, usernames))]
+
+
+def replace_entries(
+    rows: List[Dict[str, Any]],
+    item_ids: Optional[Iterable[str]] = None,
+    usernames: Optional[Iterable[str]] = None,
+) -> None:
+    """以 rows 取代指定範圍內的排程"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        _sql_scope(AlertSchedule.query, item_ids, usernames).delete(synchronize_session=False)
+        if rows:
+            db.session.bulk_insert_mappings(AlertSchedule, [{f: row.get(f) for f in _FIELDS} for row in rows])
+        db.session.commit()
+        return
+    mongo.db.alert_schedules.delete_many(_mongo_scope(item_ids, usernames))
+    if rows:
+        mongo.db.alert_schedules.insert_many([_mongo_row(row) for row in rows])
+
+
+def add_entries(rows: List[Dict[str, Any]]) -> None:
+    """新增排程（發送後建立的個人排程）"""
+    if not rows:
+        return
+    db_type = get_db_type()
+    if db_type == "postgres":
+        db.session.bulk_insert_mappings(AlertSchedule, [{f: row.get(f) for f in _FIELDS} for row in rows])
+        db.session.commit()
+        return
+    mongo.db.alert_schedules.insert_many([_mongo_row(row) for row in rows])
+
+
+def get_due(usernames: Iterable[str], now: datetime) -> List[Dict[str, Any]]:
+    """取得指定 username（含物品排程）已到提醒時間的排程（走 next_alert_at 索引）"""
+    usernames = list(usernames)
+    if not usernames:
+        return []
+    db_type = get_db_type()
+    if db_type == "postgres":
+        rows = (
+            AlertSchedule.query
+            .filter(AlertSchedule.next_alert_at <= now, AlertSchedule.username.in_(usernames))
+            .order_by(AlertSchedule.next_alert_at.asc())
+            .all()
+        )
+        return [row.to_dict() for row in rows]
+    cursor = mongo.db.alert_schedules.find(
+        {"next_alert_at": {"$lte": now}, "username": {"$in": usernames}}
+    ).sort("next_alert_at", 1)
+    return [_mongo_doc(doc) for doc in cursor]
+
+
+def advance(updates: List[Dict[str, Any]]) -> None:
+    """批次更新已發送排程的下一次提醒與發送狀態（每筆需含 id）"""
+    if not updates:
+        return
+    db_type = get_db_type()
+    if db_type == "postgres":
+        db.session.bulk_update_mappings(AlertSchedule, updates)
+        db.session.commit()
+        return
+    from bson import ObjectId
+    from pymongo import UpdateOne
+
+    mongo.db.alert_schedules.bulk_write([
+        UpdateOne({"_id": ObjectId(u["id"])}, {"$set": {k: v for k, v in u.items() if k != "id"}})
+        for u in updates
+    ])
+
+
+def rollback() -> None:
+    """捨棄失敗的重新排程留在 session 中的異動"""
+    if get_db_type() == "postgres":
+        db.session.rollback()
+
+
+def count() -> int:
+    db_type = get_db_type()
+    if db_type == "postgres":
+        return AlertSchedule.query.count()
+    return mongo.db.alert_schedules.count_documents({})
+
+
+def ensure_indexes() -> None:
+    db_type = get_db_type()
+    if db_type == "postgres":
+        return
+    mongo.db.alert_schedules.create_index(
+        [("username", 1), ("item_id", 1), ("kind", 1)], unique=True, background=True
+    )
+    mongo.db.alert_schedules.create_index([("next_alert_at", 1), ("username", 1)], background=True)
+    mongo.db.alert_schedules.create_index("item_id", background=True)
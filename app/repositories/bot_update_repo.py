@@ -0,0 +1,114 @@
+"""Bot 更新佇列資料存取模組
+
+LINE / Telegram 的帳號綁定與旅行清單只存在 PostgreSQL，佇列也只有 SQL 實作。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app import db
+from app.models.bot_update import BotUpdate
+
+
+def enqueue_update(channel: str, update_key: str, chat_id: str, payload: str) -> bool:
+    """寫入一筆待處理更新；相同 (channel, update_key) 已存在時略過，回傳是否新寫入"""
+    now = datetime.utcnow()
+    values = {
+        "channel": channel,
+        "update_key": update_key[:100],
+        "chat_id": (chat_id or "")[:100],
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+    if insert is not None:
+        result = db.session.execute(
+            insert(BotUpdate).values(**values).on_conflict_do_nothing(index_elements=["channel", "update_key"])
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    from sqlalchemy.exc import IntegrityError
+
+    db.session.add(BotUpdate(**values))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def claim_due_updates(limit: int, token: str, now: datetime, stale_before: datetime) -> List[Dict[str, Any]]:
+    """認領已到處理時間的更新（含逾時未完成的 inflight），多個程序同時執行也不會重複認領"""
+    if limit <= 0:
+        return []
+    from sqlalchemy import and_, or_
+
+    due = or_(
+        and_(BotUpdate.status == "pending", BotUpdate.next_attempt_at <= now),
+        and_(BotUpdate.status == "inflight", BotUpdate.claimed_at < stale_before),
+    )
+    ids = [
+        row.id for row in db.session.query(BotUpdate.id)
+        .filter(due)
+        .order_by(BotUpdate.next_attempt_at.asc(), BotUpdate.id.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    ]
+    if not ids:
+        db.session.commit()
+        return []
+    db.session.query(BotUpdate).filter(BotUpdate.id.in_(ids), due).update(
+        {"status": "inflight", "claim_token": token, "claimed_at": now},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    rows = db.session.query(BotUpdate).filter_by(claim_token=token).order_by(BotUpdate.id.asc()).all()
+    return [row.to_dict() for row in rows]
+
+
+def complete_update(update_id: Any, status: str, attempts: int, next_attempt_at: Optional[datetime] = None,
+                    error: Optional[str] = None) -> None:
+    """更新單筆處理結果：done / pending（待重試或延後）/ dead"""
+    updates: Dict[str, Any] = {
+        "status": status,
+        "attempts": attempts,
+        "claim_token": None,
+        "claimed_at": None,
+        "last_error": (error or "")[:255] or None,
+    }
+    if next_attempt_at is not None:
+        updates["next_attempt_at"] = next_attempt_at
+    if status == "done":
+        updates["processed_at"] = datetime.utcnow()
+    db.session.query(BotUpdate).filter_by(id=update_id).update(updates, synchronize_session=False)
+    db.session.commit()
+
+
+def purge_finished_updates(before: datetime) -> int:
+    """刪除 before 之前建立、已處理或已放棄的更新，回傳刪除筆數"""
+    count = (
+        db.session.query(BotUpdate)
+        .filter(BotUpdate.status.in_(("done", "dead")), BotUpdate.created_at < before)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return count
+
+
+def count_by_status() -> Dict[str, int]:
+    """各狀態的更新數量（佇列深度）"""
+    from sqlalchemy import func
+
+    rows = db.session.query(BotUpdate.status, func.count(BotUpdate.id)).group_by(BotUpdate.status).all()
+    return {status: count for status, count in rows}
@@ -191,6 +191,31 @@ def get_user_group_member_ids(username: str) -> set:
     return members
 
 
+def get_group_member_map() -> Dict[str, set]:
+    """一次取得所有使用者的同群組成員集合（含自身），供批次作業使用"""
+    db_type = get_db_type()
+    groups: Dict[Any, set] = {}
+    if db_type == "postgres":
+        from app.models.group import Group, GroupMember
+
+        for group_id, owner in db.session.query(Group.id, Group.owner).all():
+            groups.setdefault(group_id, set()).add(owner)
+        for group_id, username in db.session.query(GroupMember.group_id, GroupMember.username).all():
+            groups.setdefault(group_id, set()).add(username)
+    else:
+        for doc in mongo.db.groups.find({}, {"owner": 1}):
+            groups.setdefault(str(doc["_id"]), set()).add(doc.get("owner"))
+        for doc in mongo.db.group_members.find({}, {"group_id": 1, "username": 1}):
+            groups.setdefault(str(doc.get("group_id")), set()).add(doc.get("username"))
+
+    member_map: Dict[str, set] = {}
+    for members in groups.values():
+        for username in members:
+            if username:
+                member_map.setdefault(username, {username}).update(m for m in members if m)
+    return member_map
+
+
 def delete_group(group_id) -> bool:
     """刪除群組"""
     db_type = get_db_type()
@@ -2,9 +2,12 @@
 from typing import Dict, Any, Iterable, Optional, List, Tuple, Set
 from datetime import datetime, date, timedelta
 
-from sqlalchemy import or_, and_, text
+from sqlalchemy import Date, Float, Numeric, and_, cast, or_, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from app import mongo, db, get_db_type
 from app.models.item import Item
+from app.repositories import quantity_log_repo
 
 
 def _parse_optional_int(value: Any) -> Optional[int]:
@@ -64,6 +67,33 @@ def _apply_common_filters(query, filter_query: Dict[str, Any], group_member_ids:
     return query
 
 
+def _projected_columns(projection: Optional[Dict[str, Any]]) -> Optional[List[Any]]:
+    """依 Mongo 風格 projection 取出要查詢的欄位；沒有指定包含欄位時回傳 None（載入完整物品）"""
+    if not projection:
+        return None
+    column_names = Item.__mapper__.column_attrs.keys()
+    names = [name for name, include in projection.items() if include and name in column_names]
+    if not names:
+        return None
+    if "ItemID" not in names:
+        names.insert(0, "ItemID")
+    return [getattr(Item, name) for name in names]
+
+
+def _query_items(projection: Optional[Dict[str, Any]]):
+    """有 projection 時只查需要的欄位，避免清單頁載入 move_history 等大型 JSON 欄位"""
+    columns = _projected_columns(projection)
+    if columns is None:
+        return db.session.query(Item), False
+    return db.session.query(*columns), True
+
+
+def _rows_to_dicts(rows: Iterable[Any], projected: bool) -> List[Dict[str, Any]]:
+    if projected:
+        return [Item.format_row(row._mapping) for row in rows]
+    return [item.to_dict() for item in rows]
+
+
 def list_items(
     filter_query: Dict[str, Any],
     projection: Dict[str, Any],
@@ -74,7 +104,7 @@ def list_items(
 ) -> Iterable[Dict[str, Any]]:
     db_type = get_db_type()
     if db_type == "postgres":
-        query = db.session.query(Item)
+        query, projected = _query_items(projection)
         # M6: exclude soft-deleted items
         query = query.filter(Item.is_deleted != True)
         query = _apply_common_filters(query, filter_query, group_member_ids)
@@ -99,7 +129,7 @@ def list_items(
         if limit > 0:
             query = query.limit(limit)
 
-        return [item.to_dict() for item in query.all()]
+        return _rows_to_dicts(query.all(), projected)
 
     # MongoDB: exclude soft-deleted items
     mongo_filter = dict(filter_query)
@@ -131,7 +161,12 @@ def count_items(filter_query: Dict[str, Any], group_member_ids: Optional[Set[str
     return mongo.db.item.count_documents(mongo_filter)
 
 
-def full_text_search(query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+def full_text_search(
+    query: str,
+    page: int = 1,
+    page_size: int = 20,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     """Full-text search across ItemName, ItemDesc, ItemStorePlace.
 
     PostgreSQL: Uses pg_trgm similarity for fuzzy matching + ILIKE fallback.
@@ -143,11 +178,14 @@ def full_text_search(query: str, page: int = 1, page_size: int = 20) -> Dict[str
     if db_type == "postgres":
         pattern = f"%{query}%"
         offset = (page - 1) * page_size
+        columns = _projected_columns(projection)
+        names = [col.key for col in columns] if columns else Item.__mapper__.column_attrs.keys()
+        select_list = ", ".join(f'"{name}"' for name in names)
 
         # Try pg_trgm similarity first; fall back to pure ILIKE if extension absent.
         try:
             sql = text(
-                'SELECT * FROM items WHERE '
+                f'SELECT {select_list} FROM items WHERE '
                 'similarity("ItemName", :q) > 0.1 '
                 'OR "ItemName" ILIKE :pattern '
                 'OR "ItemDesc" ILIKE :pattern '
@@ -172,7 +210,7 @@ def full_text_search(query: str, page: int = 1, page_size: int = 20) -> Dict[str
             # pg_trgm not installed — fall back to pure ILIKE
             db.session.rollback()
             ilike_sql = text(
-                'SELECT * FROM items WHERE '
+                f'SELECT {select_list} FROM items WHERE '
                 '"ItemName" ILIKE :pattern '
                 'OR "ItemDesc" ILIKE :pattern '
                 'OR "ItemStorePlace" ILIKE :pattern '
@@ -192,9 +230,7 @@ def full_text_search(query: str, page: int = 1, page_size: int = 20) -> Dict[str
                 ilike_count_sql, {"pattern": pattern}
             ).scalar() or 0
 
-        # Convert raw rows to dicts using the ORM model's column names
-        col_names = [col.name for col in Item.__table__.columns]
-        items = [dict(zip(col_names, row)) for row in rows]
+        items = [Item.format_row(row._mapping) for row in rows]
         return {"items": items, "total": int(total)}
 
     # MongoDB fallback
@@ -207,11 +243,67 @@ def full_text_search(query: str, page: int = 1, page_size: int = 20) -> Dict[str
     }
     total = mongo.db.item.count_documents(mongo_filter)
     offset = (page - 1) * page_size
-    cursor = mongo.db.item.find(mongo_filter, {"_id": 0}).skip(offset).limit(page_size)
+    cursor = mongo.db.item.find(mongo_filter, projection or {"_id": 0}).skip(offset).limit(page_size)
     return {"items": list(cursor), "total": total}
 
 
+def _maintenance_due(last_date: Any, interval_days: Any) -> Optional[date]:
+    """下次保養日 = 上次保養日 + 保養週期；任一欄位缺少時為 None"""
+    last = _parse_optional_date(last_date)
+    interval = _parse_optional_int(interval_days)
+    if not last or not interval or interval <= 0:
+        return None
+    return last + timedelta(days=interval)
+
+
+def _with_maintenance_due(values: Dict[str, Any], current: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """寫入保養欄位時一併更新 MaintenanceDueDate（MongoDB 存 YYYY-MM-DD 字串以便區間查詢）"""
+    if "LastMaintenanceDate" not in values and "MaintenanceIntervalDays" not in values:
+        return values
+    current = current or {}
+    due = _maintenance_due(
+        values.get("LastMaintenanceDate", current.get("LastMaintenanceDate")),
+        values.get("MaintenanceIntervalDays", current.get("MaintenanceIntervalDays")),
+    )
+    values = dict(values)
+    if get_db_type() == "postgres":
+        values["MaintenanceDueDate"] = due
+    else:
+        values["MaintenanceDueDate"] = due.strftime("%Y-%m-%d") if due else ""
+    return values
+
+
+def backfill_maintenance_due_dates(batch_size: int = 1000) -> int:
+    """MongoDB：為尚未有 MaintenanceDueDate 的物品補上下次保養日，回傳更新筆數
+
+    對應 SQL 遷移 20261019_000009 的 UPDATE；沒有保養資料的物品寫入空字串，之後不會再被選到。
+    """
+    if get_db_type() == "postgres":
+        return 0
+    from pymongo import UpdateOne
+
+    cursor = mongo.db.item.find(
+        {"MaintenanceDueDate": {"$exists": False}},
+        {"_id": 1, "LastMaintenanceDate": 1, "MaintenanceIntervalDays": 1},
+    )
+    updated = 0
+    batch = []
+    for doc in cursor:
+        due = _maintenance_due(doc.get("LastMaintenanceDate"), doc.get("MaintenanceIntervalDays"))
+        batch.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"MaintenanceDueDate": due.strftime("%Y-%m-%d") if due else ""}},
+        ))
+        if len(batch) >= batch_size:
+            updated += mongo.db.item.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += mongo.db.item.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
 def insert_item(item: Dict[str, Any]) -> None:
+    item = _with_maintenance_due(item)
     db_type = get_db_type()
     if db_type == "postgres":
         new_item = Item(**item)
@@ -224,9 +316,17 @@ def insert_item(item: Dict[str, Any]) -> None:
 def update_item_by_id(item_id: str, updates: Dict[str, Any]) -> None:
     db_type = get_db_type()
     if db_type == "postgres":
+        if "LastMaintenanceDate" in updates or "MaintenanceIntervalDays" in updates:
+            row = db.session.query(Item.LastMaintenanceDate, Item.MaintenanceIntervalDays).filter_by(ItemID=item_id).first()
+            updates = _with_maintenance_due(updates, row._asdict() if row else None)
         Item.query.filter_by(ItemID=item_id).update(updates)
         db.session.commit()
     else:
+        if "LastMaintenanceDate" in updates or "MaintenanceIntervalDays" in updates:
+            current = mongo.db.item.find_one(
+                {"ItemID": item_id}, {"LastMaintenanceDate": 1, "MaintenanceIntervalDays": 1}
+            )
+            updates = _with_maintenance_due(updates, current)
         mongo.db.item.update_one({"ItemID": item_id}, {"$set": updates})
 
 
@@ -238,6 +338,53 @@ def find_item_by_id(item_id: str, projection: Optional[Dict[str, Any]] = None) -
     return mongo.db.item.find_one({"ItemID": item_id}, projection)
 
 
+def find_item_by_media(filename: str) -> Optional[Dict[str, Any]]:
+    """依圖片檔名找出所屬物品的權限欄位（ItemPic / ItemThumb 皆有索引）"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        row = (
+            db.session.query(Item.ItemOwner, Item.visibility, Item.shared_with)
+            .filter(or_(Item.ItemPic == filename, Item.ItemThumb == filename))
+            .first()
+        )
+        if row is None:
+            return None
+        return {"ItemOwner": row.ItemOwner, "visibility": row.visibility, "shared_with": row.shared_with}
+    return mongo.db.item.find_one(
+        {"$or": [{"ItemPic": filename}, {"ItemThumb": filename}]},
+        {"_id": 0, "ItemOwner": 1, "visibility": 1, "shared_with": 1},
+    )
+
+
+def find_items_by_ids(item_ids: Iterable[str], projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """以單一查詢取得多筆未刪除物品"""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return []
+    db_type = get_db_type()
+    if db_type == "postgres":
+        query, projected = _query_items(projection)
+        rows = query.filter(Item.ItemID.in_(item_ids), Item.is_deleted != True).all()
+        return _rows_to_dicts(rows, projected)
+    return list(mongo.db.item.find(
+        {"ItemID": {"$in": item_ids}, "is_deleted": {"$ne": True}},
+        projection or {"_id": 0},
+    ))
+
+
+def list_items_by_owner(owner: str, projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """以單一查詢（走 ItemOwner 索引）取得使用者擁有的未刪除物品"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        query, projected = _query_items(projection)
+        rows = query.filter(Item.ItemOwner == owner, Item.is_deleted != True).all()
+        return _rows_to_dicts(rows, projected)
+    return list(mongo.db.item.find(
+        {"ItemOwner": owner, "is_deleted": {"$ne": True}},
+        projection or {"_id": 0},
+    ))
+
+
 def delete_item_by_id(item_id: str) -> bool:
     db_type = get_db_type()
     if db_type == "postgres":
@@ -256,12 +403,16 @@ def ensure_indexes() -> None:
         mongo.db.item.create_index("ItemID", unique=True, background=True)
         mongo.db.item.create_index("ItemName", background=True)
         mongo.db.item.create_index("ItemType", background=True)
+        mongo.db.item.create_index("ItemOwner", background=True)
         mongo.db.item.create_index("ItemFloor", background=True)
         mongo.db.item.create_index("ItemRoom", background=True)
         mongo.db.item.create_index("ItemZone", background=True)
         mongo.db.item.create_index([("ItemFloor", 1), ("ItemRoom", 1), ("ItemZone", 1)], background=True)
         mongo.db.item.create_index("WarrantyExpiry", background=True)
         mongo.db.item.create_index("UsageExpiry", background=True)
+        mongo.db.item.create_index("MaintenanceDueDate", background=True)
+        mongo.db.item.create_index("ItemPic", background=True)
+        mongo.db.item.create_index("ItemThumb", background=True)
 
 
 def get_stats() -> Dict[str, int]:
@@ -292,17 +443,42 @@ def get_all_items_for_export(
     db_type = get_db_type()
     query = filters or {}
     if db_type == "postgres":
-        items_query = db.session.query(Item)
+        items_query, projected = _query_items(projection)
         for key, value in query.items():
             if value is not None:
                 items_query = items_query.filter(getattr(Item, key) == value)
-        items = items_query.all()
-        return [item.to_dict() for item in items]
+        return _rows_to_dicts(items_query.all(), projected)
     if projection is None:
         projection = {"_id": 0}
     return list(mongo.db.item.find(query, projection))
 
 
+def list_asset_items(fields: Iterable[str]) -> List[Dict[str, Any]]:
+    """載入有購入價格的物品（排除回收桶）供資產估值；只查指定欄位。
+
+    資產報表一次處理整個庫存，這裡直接走 Core 查詢、不經 ORM 與 Item.format_row 逐欄格式化，
+    Numeric 欄位也在 SQL 端轉成浮點數，省去逐值建立 Decimal 再轉 float。
+    """
+    names = list(fields)
+    db_type = get_db_type()
+    if db_type == "postgres":
+        columns = []
+        for name in names:
+            column = getattr(Item, name)
+            if isinstance(column.type, Numeric):
+                column = cast(column, Float).label(name)
+            columns.append(column)
+        rows = db.session.connection().execute(
+            select(*columns).where(Item.purchase_price.isnot(None), Item.is_deleted != True)
+        )
+        return [dict(zip(names, row)) for row in rows]
+
+    return list(mongo.db.item.find(
+        {"purchase_price": {"$ne": None}, "is_deleted": {"$ne": True}},
+        {"_id": 0, **{name: 1 for name in names}},
+    ))
+
+
 def toggle_favorite(item_id: str, user_id: str) -> bool:
     db_type = get_db_type()
     if db_type == "postgres":
@@ -436,68 +612,365 @@ def update_item_field(item_id: str, field: str, value: Any) -> bool:
     return result.modified_count > 0
 
 
-def get_expiring_items(days_threshold: int = 30) -> List[Dict[str, Any]]:
-    """Get items expiring within the specified number of days
+def _merge_deltas(deltas: Iterable[Tuple[str, int]]) -> Dict[str, int]:
+    # 掃描槍連續掃到同一物品時合併為一次更新，保留第一次出現的順序
+    merged: Dict[str, int] = {}
+    for item_id, delta in deltas:
+        merged[item_id] = merged.get(item_id, 0) + int(delta)
+    return merged
+
+
+def _quantity_logs(
+    results: Iterable[Dict[str, Any]], user: str, reason: Optional[str], timestamp: datetime
+) -> List[Dict[str, Any]]:
+    """成功且有變動的結果轉成數量日誌"""
+    return [
+        {
+            "item_id": r["item_id"],
+            "item_name": r["item_name"],
+            "user": user,
+            "delta": r["delta"],
+            "old_quantity": r["old_quantity"],
+            "new_quantity": r["new_quantity"],
+            "reason": reason,
+            "timestamp": timestamp,
+        }
+        for r in results if r["ok"] and r["delta"]
+    ]
+
+
+def apply_quantity_deltas(
+    deltas: Iterable[Tuple[str, int]],
+    user: str = "",
+    reason: Optional[str] = None,
+    commit: bool = True,
+) -> List[Dict[str, Any]]:
+    """以原子操作增減物品數量，並寫入數量日誌
 
-    This query is optimized to filter at the database level instead of
-    loading all items and filtering in Python.
+    PostgreSQL 以一次 UPDATE ... SET "Quantity" = "Quantity" + delta ... RETURNING
+    套用整批增減，WHERE 條件確保數量不會小於 0，日誌與更新在同一個交易中寫入；
+    commit=False 時交易留給呼叫端提交（例如先加入 webhook outbox）。
+    MongoDB 以 find_one_and_update + $inc 逐一套用。
+
+    回傳每個物品的結果：ok、error（not_found / insufficient）、old_quantity、
+    new_quantity、delta，以及判斷庫存狀態需要的 SafetyStock / ReorderLevel。
     """
-    db_type = get_db_type()
-    today = date.today()
-    threshold_date = today + timedelta(days=days_threshold)
+    merged = _merge_deltas(deltas)
+    if not merged:
+        return []
+    now = datetime.utcnow()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    if get_db_type() == "postgres":
+        from sqlalchemy import case, func, update
+
+        new_quantity = func.coalesce(Item.Quantity, 0) + case(merged, value=Item.ItemID)
+        rows = db.session.execute(
+            update(Item)
+            .where(Item.ItemID.in_(list(merged)), new_quantity >= 0)
+            .values(Quantity=new_quantity)
+            .returning(Item.ItemID, Item.ItemName, Item.Quantity, Item.SafetyStock, Item.ReorderLevel),
+            execution_options={"synchronize_session": False},
+        ).all()
+        for row in rows:
+            delta = merged[row.ItemID]
+            results[row.ItemID] = {
+                "item_id": row.ItemID,
+                "item_name": row.ItemName or "",
+                "ok": True,
+                "error": None,
+                "old_quantity": row.Quantity - delta,
+                "new_quantity": row.Quantity,
+                "delta": delta,
+                "SafetyStock": row.SafetyStock or 0,
+                "ReorderLevel": row.ReorderLevel or 0,
+            }
+        missing = [item_id for item_id in merged if item_id not in results]
+        if missing:
+            for row in db.session.query(Item.ItemID, Item.ItemName, Item.Quantity).filter(Item.ItemID.in_(missing)):
+                results[row.ItemID] = {
+                    "item_id": row.ItemID,
+                    "item_name": row.ItemName or "",
+                    "ok": False,
+                    "error": "insufficient",
+                    "old_quantity": row.Quantity or 0,
+                    "new_quantity": row.Quantity or 0,
+                    "delta": 0,
+                }
+        quantity_log_repo.insert_logs(_quantity_logs(results.values(), user, reason, now), commit=False)
+        if commit:
+            db.session.commit()
+    else:
+        from pymongo import ReturnDocument
+
+        projection = {"_id": 0, "ItemID": 1, "ItemName": 1, "Quantity": 1, "SafetyStock": 1, "ReorderLevel": 1}
+        for item_id, delta in merged.items():
+            query: Dict[str, Any] = {"ItemID": item_id}
+            if delta < 0:
+                query["Quantity"] = {"$gte": -delta}
+            doc = mongo.db.item.find_one_and_update(
+                query, {"$inc": {"Quantity": delta}}, projection=projection, return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                current = mongo.db.item.find_one({"ItemID": item_id}, projection)
+                if current is not None:
+                    qty = current.get("Quantity") or 0
+                    results[item_id] = {
+                        "item_id": item_id, "item_name": current.get("ItemName", ""), "ok": False,
+                        "error": "insufficient", "old_quantity": qty, "new_quantity": qty, "delta": 0,
+                    }
+                continue
+            qty = doc.get("Quantity") or 0
+            results[item_id] = {
+                "item_id": item_id,
+                "item_name": doc.get("ItemName", ""),
+                "ok": True,
+                "error": None,
+                "old_quantity": qty - delta,
+                "new_quantity": qty,
+                "delta": delta,
+                "SafetyStock": doc.get("SafetyStock") or 0,
+                "ReorderLevel": doc.get("ReorderLevel") or 0,
+            }
+        quantity_log_repo.insert_logs(_quantity_logs(results.values(), user, reason, now))
+
+    return [
+        results.get(item_id) or {
+            "item_id": item_id, "ok": False, "error": "not_found",
+            "old_quantity": 0, "new_quantity": 0, "delta": 0,
+        }
+        for item_id in merged
+    ]
+
+
+def commit() -> None:
+    """提交以 commit=False 留在 session 中的異動（MongoDB 已即時寫入）"""
+    if get_db_type() == "postgres":
+        db.session.commit()
+
+
+def rollback() -> None:
+    """捨棄以 commit=False 留在 session 中的異動"""
+    if get_db_type() == "postgres":
+        db.session.rollback()
 
+
+CALENDAR_DATE_FIELDS = ("WarrantyExpiry", "UsageExpiry", "MaintenanceDueDate")
+_CALENDAR_FIELDS = ("ItemID", "ItemName", "ItemOwner", "visibility", "shared_with") + CALENDAR_DATE_FIELDS
+
+
+def list_items_due_between(start: date, end: date) -> List[Dict[str, Any]]:
+    """取得保固、使用期限或下次保養日落在 [start, end] 的物品（只讀行事曆需要的欄位）
+
+    三個日期欄位各有索引，條件以 OR 組合讓資料庫走索引，不掃描整個物品表。
+    日期欄位回傳 YYYY-MM-DD 字串，不在區間內的日期為空字串。
+    """
+    db_type = get_db_type()
     if db_type == "postgres":
-        expired_items = Item.query.filter(
-            or_(
-                Item.WarrantyExpiry < today,
-                Item.UsageExpiry < today
+        columns = [getattr(Item, name) for name in _CALENDAR_FIELDS]
+        rows = (
+            db.session.query(*columns)
+            .filter(
+                Item.is_deleted != True,
+                or_(*[getattr(Item, name).between(start, end) for name in CALENDAR_DATE_FIELDS]),
             )
-        ).all()
+            .all()
+        )
+        items = []
+        for row in rows:
+            item = row._asdict()
+            for name in CALENDAR_DATE_FIELDS:
+                value = item[name]
+                item[name] = value.strftime("%Y-%m-%d") if value and start <= value <= end else ""
+            item["shared_with"] = list(item["shared_with"] or [])
+            items.append(item)
+        return items
 
-        near_expiry_items = Item.query.filter(
-            and_(
-                Item.WarrantyExpiry >= today,
-                Item.WarrantyExpiry <= threshold_date
-            )
-        ).union(
-            Item.query.filter(
-                and_(
-                    Item.UsageExpiry >= today,
-                    Item.UsageExpiry <= threshold_date
-                )
-            )
-        ).all()
+    start_str, end_str = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    projection = {name: 1 for name in _CALENDAR_FIELDS}
+    projection["_id"] = 0
+    items = list(mongo.db.item.find(
+        {
+            "$or": [{name: {"$gte": start_str, "$lte": end_str}} for name in CALENDAR_DATE_FIELDS],
+            "is_deleted": {"$ne": True},
+        },
+        projection,
+    ))
+    for item in items:
+        for name in CALENDAR_DATE_FIELDS:
+            value = str(item.get(name) or "")[:10]
+            item[name] = value if start_str <= value <= end_str else ""
+    return items
 
-        items = expired_items + near_expiry_items
-        return [item.to_dict() for item in items]
+
+class earliest_date(FunctionElement):
+    """兩個日期中較早者，忽略 NULL（PostgreSQL 的 LEAST 語意）"""
+
+    type = Date()
+    name = "least"
+    inherit_cache = True
+
+
+@compiles(earliest_date)
+def _earliest_date(element, compiler, **kw):
+    return f"LEAST{compiler.process(element.clause_expr, **kw)}"
+
+
+@compiles(earliest_date, "sqlite")
+def _earliest_date_sqlite(element, compiler, **kw):
+    # SQLite 的多參數 min() 遇到 NULL 會回傳 NULL，改以 coalesce 補回單邊日期
+    args = compiler.process(element.clause_expr, **kw)
+    return f"coalesce(min{args}, {args[1:-1]})"
+
+
+EARLIEST_EXPIRY = earliest_date(Item.WarrantyExpiry, Item.UsageExpiry)
+
+
+def _expiry_visibility(scope: Dict[str, Any]):
+    """對應 notification_service._is_visible_to 的 SQL 條件"""
+    username = scope["username"]
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy import cast
+        from sqlalchemy.dialects.postgresql import JSONB
+
+        in_shared_with = cast(Item.shared_with, JSONB).contains([username])
     else:
-        from pymongo import ASCENDING
-
-        expired_items = list(mongo.db.item.find({
-            "$or": [
-                {"WarrantyExpiry": {"$lt": today.strftime("%Y-%m-%d")}},
-                {"UsageExpiry": {"$lt": today.strftime("%Y-%m-%d")}}
-            ]
-        }))
-
-        threshold_str = threshold_date.strftime("%Y-%m-%d")
-        today_str = today.strftime("%Y-%m-%d")
-
-        near_expiry_items = list(mongo.db.item.find({
-            "$or": [
-                {
-                    "WarrantyExpiry": {"$gte": today_str, "$lte": threshold_str}
-                },
-                {
-                    "UsageExpiry": {"$gte": today_str, "$lte": threshold_str}
-                }
-            ]
-        }))
+        from sqlalchemy import String, cast
+
+        in_shared_with = cast(Item.shared_with, String).like(f'%"{username}"%')
+    return or_(
+        Item.ItemOwner.is_(None),
+        Item.ItemOwner == "",
+        Item.ItemOwner.notin_(list(scope["known_users"]) or [""]),
+        Item.ItemOwner == username,
+        in_shared_with,
+        and_(Item.visibility == "shared", Item.ItemOwner.in_(list(scope["members"]) or [username])),
+    )
 
-        items = expired_items + near_expiry_items
-        for item in items:
-            item["_id"] = str(item["_id"])
-        return items
+
+def _with_expiry_fields(item: Dict[str, Any], earliest: Any, today: date) -> Dict[str, Any]:
+    if isinstance(earliest, str):
+        earliest = datetime.strptime(earliest, "%Y-%m-%d").date()
+    warranty, usage = item.get("WarrantyExpiry"), item.get("UsageExpiry")
+    earliest_str = earliest.strftime("%Y-%m-%d")
+    item["earliest_expiry"] = earliest_str
+    item["days_left"] = (earliest - today).days
+    if str(warranty or "")[:10] == str(usage or "")[:10]:
+        item["expiry_kind"] = "both"
+    elif str(warranty or "")[:10] == earliest_str:
+        item["expiry_kind"] = "warranty"
+    else:
+        item["expiry_kind"] = "usage"
+    return item
+
+
+def list_expiring_items(
+    days_threshold: int = 30,
+    scope: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    skip: int = 0,
+    limit: int = 0,
+) -> Dict[str, Any]:
+    """已過期與 days_threshold 天內到期的物品，依最早到期日排序
+
+    PostgreSQL 以單一查詢依 LEAST(WarrantyExpiry, UsageExpiry) 篩選與排序（有對應的
+    運算式索引），總數與已過期數以視窗函數一併取得；MongoDB 以一次 aggregation 的
+    $min 計算最早到期日並以 $facet 同時分頁與計數。不含回收桶中的物品。
+
+    scope 為 {"username", "members", "known_users"} 時只回傳該使用者可見的物品。
+    每筆物品附加 earliest_expiry、days_left（已過期為負數）與 expiry_kind
+    （warranty / usage / both）。
+    """
+    today = date.today()
+    threshold = today + timedelta(days=days_threshold)
+
+    if get_db_type() == "postgres":
+        from sqlalchemy import case, func
+
+        columns = _projected_columns(projection)
+        if columns is None:
+            columns = [Item]
+        total = func.count().over().label("_total")
+        expired = func.sum(case((EARLIEST_EXPIRY < today, 1), else_=0)).over().label("_expired")
+        query = (
+            db.session.query(*columns, EARLIEST_EXPIRY.label("_earliest"), total, expired)
+            .filter(Item.is_deleted != True, EARLIEST_EXPIRY <= threshold)
+        )
+        if scope:
+            query = query.filter(_expiry_visibility(scope))
+        query = query.order_by(EARLIEST_EXPIRY.asc(), Item.ItemID.asc())
+        if skip > 0:
+            query = query.offset(skip)
+        if limit > 0:
+            query = query.limit(limit)
+        rows = query.all()
+        if not rows and skip > 0:
+            # 超出最後一頁時仍回報正確的總數
+            return {**list_expiring_items(days_threshold, scope, projection, 0, 1), "items": []}
+
+        items = []
+        for row in rows:
+            if columns[0] is Item:
+                item = row[0].to_dict()
+            else:
+                item = Item.format_row({k: v for k, v in row._mapping.items() if not k.startswith("_")})
+            items.append(_with_expiry_fields(item, row._earliest, today))
+        counts = (rows[0]._total, int(rows[0]._expired or 0)) if rows else (0, 0)
+        return {"items": items, "total": counts[0], "expired_count": counts[1]}
+
+    today_str, threshold_str = today.strftime("%Y-%m-%d"), threshold.strftime("%Y-%m-%d")
+
+    def _valid(field: str) -> Dict[str, Any]:
+        return {"$cond": [{"$gt": [f"${field}", ""]}, f"${field}", None]}
+
+    match: Dict[str, Any] = {"$and": [
+        {"$or": [{"is_deleted": {"$ne": True}}, {"is_deleted": {"$exists": False}}]},
+        {"$or": [
+            {"WarrantyExpiry": {"$gt": "", "$lte": threshold_str}},
+            {"UsageExpiry": {"$gt": "", "$lte": threshold_str}},
+        ]},
+    ]}
+    if scope:
+        username = scope["username"]
+        match["$and"].append({"$or": [
+            {"ItemOwner": {"$in": [None, ""]}},
+            {"ItemOwner": {"$nin": list(scope["known_users"])}},
+            {"ItemOwner": username},
+            {"shared_with": username},
+            {"visibility": "shared", "ItemOwner": {"$in": list(scope["members"])}},
+        ]})
+    page: List[Dict[str, Any]] = [{"$skip": skip}] if skip > 0 else []
+    if limit > 0:
+        page.append({"$limit": limit})
+    if projection:
+        page.append({"$project": {**projection, "_earliest": 1}})
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"_earliest": {"$min": [_valid("WarrantyExpiry"), _valid("UsageExpiry")]}}},
+        {"$sort": {"_earliest": 1, "ItemID": 1}},
+        {"$facet": {
+            "items": page or [{"$match": {}}],
+            "counts": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "expired": {"$sum": {"$cond": [{"$lt": ["$_earliest", today_str]}, 1, 0]}},
+            }}],
+        }},
+    ]
+    result = next(iter(mongo.db.item.aggregate(pipeline)), {"items": [], "counts": []})
+    items = []
+    for doc in result["items"]:
+        earliest = doc.pop("_earliest")
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        items.append(_with_expiry_fields(doc, earliest, today))
+    counts = result["counts"][0] if result["counts"] else {"total": 0, "expired": 0}
+    return {"items": items, "total": counts["total"], "expired_count": counts["expired"]}
+
+
+def get_expiring_items(days_threshold: int = 30) -> List[Dict[str, Any]]:
+    """已過期與即將到期的物品（依最早到期日排序，不分頁、不限使用者）"""
+    return list_expiring_items(days_threshold)["items"]
 
 
 def search_suggestions(query: str, limit: int = 8) -> List[Dict[str, Any]]:
@@ -577,8 +1050,11 @@ def get_all_items_for_backup() -> List[Dict[str, Any]]:
         return items
 
 
-def soft_delete_item(item_id: str) -> bool:
-    """M6: 軟刪除物品（移至回收站）"""
+def soft_delete_item(item_id: str, commit: bool = True) -> bool:
+    """M6: 軟刪除物品（移至回收站）
+
+    commit=False 時交易留給呼叫端提交（例如先加入 webhook outbox）。
+    """
     db_type = get_db_type()
     now = datetime.now()
     if db_type == "postgres":
@@ -586,7 +1062,8 @@ def soft_delete_item(item_id: str) -> bool:
             "is_deleted": True,
             "deleted_at": now,
         })
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return result > 0
     result = mongo.db.item.update_one(
         {"ItemID": item_id},
@@ -683,6 +1160,9 @@ def restore_items(items: List[Dict[str, Any]], mode: str = "merge") -> int:
                     MaintenanceCategory=item_data.get("MaintenanceCategory", "") or "",
                     MaintenanceIntervalDays=_parse_optional_int(item_data.get("MaintenanceIntervalDays")),
                     LastMaintenanceDate=_parse_optional_date(item_data.get("LastMaintenanceDate")),
+                    MaintenanceDueDate=_maintenance_due(
+                        item_data.get("LastMaintenanceDate"), item_data.get("MaintenanceIntervalDays")
+                    ),
                 )
                 db.session.add(item)
                 count += 1
@@ -694,6 +1174,9 @@ def restore_items(items: List[Dict[str, Any]], mode: str = "merge") -> int:
                         elif key in {"Quantity", "SafetyStock", "ReorderLevel", "MaintenanceIntervalDays"}:
                             value = _parse_optional_int(value)
                         setattr(existing, key, value)
+                existing.MaintenanceDueDate = _maintenance_due(
+                    existing.LastMaintenanceDate, existing.MaintenanceIntervalDays
+                )
                 count += 1
 
         db.session.commit()
@@ -706,13 +1189,14 @@ def restore_items(items: List[Dict[str, Any]], mode: str = "merge") -> int:
             if mode == "replace":
                 mongo.db.item.delete_one({"ItemID": item_id})
 
-            if not mongo.db.item.find_one({"ItemID": item_id}):
-                mongo.db.item.insert_one(item_data)
+            current = mongo.db.item.find_one({"ItemID": item_id})
+            if not current:
+                mongo.db.item.insert_one(_with_maintenance_due(item_data))
                 count += 1
             elif mode == "merge":
                 mongo.db.item.update_one(
                     {"ItemID": item_id},
-                    {"$set": item_data}
+                    {"$set": _with_maintenance_due(item_data, current)}
                 )
                 count += 1
 
@@ -64,6 +64,27 @@ def return_loan(loan_id: int) -> bool:
         return result.modified_count > 0
 
 
+def get_open_loans_due_between(start: date, end: date) -> List[Dict[str, Any]]:
+    """取得預計歸還日落在 [start, end] 且尚未歸還的借出記錄"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        loans = ItemLoan.query.filter(
+            ItemLoan.expected_return.between(start, end),
+            ItemLoan.status != "returned",
+        ).all()
+        return [loan.to_dict() for loan in loans]
+    docs = list(mongo.db.item_loans.find(
+        {
+            "expected_return": {"$gte": start.strftime("%Y-%m-%d"), "$lte": end.strftime("%Y-%m-%d")},
+            "status": {"$ne": "returned"},
+        },
+        {"item_id": 1, "item_name": 1, "expected_return": 1, "lent_by": 1, "borrower": 1},
+    ))
+    for doc in docs:
+        doc["id"] = str(doc.pop("_id"))
+    return docs
+
+
 def get_loans_by_item(item_id: str) -> List[Dict[str, Any]]:
     """取得指定物品的所有借出記錄，依 created_at 降冪排序"""
     db_type = get_db_type()
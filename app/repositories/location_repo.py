@@ -1,36 +1,110 @@
 """位置資料存取模組"""
-from typing import List, Generator, Dict, Any, Optional
+import hashlib
+import json
+from typing import List, Generator, Dict, Any, Optional, Tuple
 from flask import current_app
 
-from app import mongo, db, get_db_type, cache
+from app import mongo, db, get_db_type
+from app.utils import shared_cache
 
 
-def _locations_cache_key() -> str:
-    return f"locations_list_{get_db_type()}"
+def _load_locations() -> List[Dict[str, Any]]:
+    if get_db_type() == "postgres":
+        from app.models.location import Location
+
+        locations = db.session.query(Location).order_by(Location.order).all()
+        return [loc.to_dict() for loc in locations]
+    return list(mongo.db.locations.find().sort("order", 1))
 
 
 def list_locations() -> Generator[Dict[str, Any], None, None]:
     """列出所有位置"""
-    db_type = get_db_type()
-    cache_key = _locations_cache_key()
-
-    cached = cache.get(cache_key)
-    if cached:
-        for loc in cached:
-            yield loc
-        return
+    yield from shared_cache.cached("locations", f"list_{get_db_type()}", _load_locations)
 
-    if db_type == "postgres":
-        from app.models.location import Location
 
-        locations = db.session.query(Location).order_by(Location.order).all()
-        result = [loc.to_dict() for loc in locations]
-    else:
-        result = list(mongo.db.locations.find().sort("order", 1))
+def count_items_by_location() -> Dict[Tuple[str, str, str], int]:
+    """各 (樓層, 房間, 區域) 組合的物品數（不含回收桶），一次 GROUP BY 取得"""
+    if get_db_type() == "postgres":
+        from sqlalchemy import func
+        from app.models.item import Item
 
-    cache.set(cache_key, result, timeout=300)  # 5 minutes cache
-    for loc in result:
-        yield loc
+        rows = (
+            db.session.query(Item.ItemFloor, Item.ItemRoom, Item.ItemZone, func.count(Item.ItemID))
+            .filter(Item.is_deleted != True)
+            .group_by(Item.ItemFloor, Item.ItemRoom, Item.ItemZone)
+            .all()
+        )
+        return {(f or "", r or "", z or ""): n for f, r, z, n in rows}
+
+    pipeline = [
+        {"$match": {"$or": [{"is_deleted": {"$ne": True}}, {"is_deleted": {"$exists": False}}]}},
+        {"$group": {"_id": {"f": "$ItemFloor", "r": "$ItemRoom", "z": "$ItemZone"}, "n": {"$sum": 1}}},
+    ]
+    counts: Dict[Tuple[str, str, str], int] = {}
+    for row in mongo.db.item.aggregate(pipeline):
+        key = (row["_id"].get("f") or "", row["_id"].get("r") or "", row["_id"].get("z") or "")
+        counts[key] = counts.get(key, 0) + row["n"]
+    return counts
+
+
+def _build_hierarchy() -> Dict[str, Any]:
+    locations = _load_locations()
+    counts = count_items_by_location()
+    floor_counts: Dict[str, int] = {}
+    room_counts: Dict[Tuple[str, str], int] = {}
+    for (floor, room, _zone), n in counts.items():
+        floor_counts[floor] = floor_counts.get(floor, 0) + n
+        room_counts[(floor, room)] = room_counts.get((floor, room), 0) + n
+
+    tree: Dict[str, Dict[str, set]] = {}
+    for loc in locations:
+        floor, room, zone = loc.get("floor") or "", loc.get("room") or "", loc.get("zone") or ""
+        zones = tree.setdefault(floor, {}).setdefault(room, set())
+        if zone:
+            zones.add(zone)
+
+    floors = [
+        {
+            "name": floor,
+            "count": floor_counts.get(floor, 0),
+            "rooms": [
+                {
+                    "name": room,
+                    "count": room_counts.get((floor, room), 0),
+                    "zones": [{"name": zone, "count": counts.get((floor, room, zone), 0)} for zone in sorted(zones)],
+                }
+                for room, zones in sorted(rooms.items())
+            ],
+        }
+        for floor, rooms in sorted(tree.items())
+    ]
+
+    # 級聯選單查表用：樓層 → 房間、房間 → 區域（區域以房間名稱跨樓層合併，與原本的篩選規則一致）
+    rooms_by_floor: Dict[str, set] = {}
+    zones_by_room: Dict[str, set] = {}
+    for floor, rooms in tree.items():
+        for room, zones in rooms.items():
+            if floor and room:
+                rooms_by_floor.setdefault(floor, set()).add(room)
+            if room:
+                zones_by_room.setdefault(room, set()).update(zones)
+
+    hierarchy = {
+        "floors": floors,
+        "rooms_by_floor": {k: sorted(v) for k, v in sorted(rooms_by_floor.items())},
+        "zones_by_room": {k: sorted(v) for k, v in sorted(zones_by_room.items()) if v},
+    }
+    body = json.dumps(hierarchy, ensure_ascii=False, sort_keys=True)
+    hierarchy["etag"] = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    return hierarchy
+
+
+def get_hierarchy() -> Dict[str, Any]:
+    """預先計算的 樓層 → 房間 → 區域 階層（含物品數與 ETag）
+
+    隨位置快取的版本失效，只在位置異動時重算；物品數則在快取到期時更新。
+    """
+    return shared_cache.cached("locations", f"hierarchy_{get_db_type()}", _build_hierarchy)
 
 
 def insert_location(doc: Dict[str, Any]) -> None:
@@ -50,7 +124,7 @@ def insert_location(doc: Dict[str, Any]) -> None:
         db.session.commit()
     else:
         mongo.db.locations.insert_one(doc)
-    cache.delete(_locations_cache_key())
+    shared_cache.invalidate("locations")
 
 
 def delete_location(loc_id) -> None:
@@ -66,7 +140,7 @@ def delete_location(loc_id) -> None:
             db.session.commit()
     else:
         mongo.db.locations.delete_one({"_id": loc_id})
-    cache.delete(_locations_cache_key())
+    shared_cache.invalidate("locations")
 
 
 def update_location(loc_id, doc: Dict[str, Any]) -> None:
@@ -89,7 +163,7 @@ def update_location(loc_id, doc: Dict[str, Any]) -> None:
             db.session.commit()
     else:
         mongo.db.locations.update_one({"_id": loc_id}, {"$set": doc})
-    cache.delete(_locations_cache_key())
+    shared_cache.invalidate("locations")
 
 
 def update_order(loc_id, order: int) -> None:
@@ -105,7 +179,7 @@ def update_order(loc_id, order: int) -> None:
             db.session.commit()
     else:
         mongo.db.locations.update_one({"_id": loc_id}, {"$set": {"order": order}})
-    cache.delete(_locations_cache_key())
+    shared_cache.invalidate("locations")
 
 
 def list_choices() -> tuple:
@@ -24,6 +24,29 @@ def insert_log(log_entry: Dict[str, Any]) -> None:
         mongo.db.activity_logs.insert_one(mongo_log_entry)
 
 
+def insert_logs(log_entries: List[Dict[str, Any]]) -> None:
+    """批次寫入日誌：PostgreSQL 以獨立連線做多列 INSERT，MongoDB 用 insert_many
+
+    每筆需帶 created_at（排入佇列時的時間），避免以寫入時間作為操作時間。
+    """
+    if not log_entries:
+        return
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from sqlalchemy import insert
+
+        rows = []
+        for entry in log_entries:
+            row = {k: v for k, v in entry.items() if k != "created_at"}
+            row["timestamp"] = entry["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+            rows.append(row)
+        # 不經過 db.session，避免順帶提交呼叫端尚未完成的交易
+        with db.engine.begin() as conn:
+            conn.execute(insert(Log), rows)
+    else:
+        mongo.db.activity_logs.insert_many([dict(entry) for entry in log_entries], ordered=False)
+
+
 def list_logs(
     filter_query: Optional[Dict[str, Any]] = None,
     limit: int = 50,
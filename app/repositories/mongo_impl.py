@@ -2,9 +2,10 @@
 from typing import List, Dict, Any, Optional, Generator, Tuple
 from datetime import date, timedelta
 
-from app import mongo, cache
+from app import mongo
 from app.models.item import Item
 from app.repositories.base import BaseRepository, TypeRepository, LocationRepository
+from app.utils import shared_cache
 
 
 class MongoItemRepository(BaseRepository):
@@ -82,77 +83,54 @@ class MongoTypeRepository(TypeRepository):
     """MongoDB implementation for Type repository"""
 
     def list_all(self) -> List[Dict[str, Any]]:
-        cache_key = "types_list_mongo"
+        def load():
+            return [{"id": t["_id"], "name": t["name"]} for t in mongo.db.type.find({})]
 
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
-        types = mongo.db.type.find({})
-        result = [{"id": t["_id"], "name": t["name"]} for t in types]
-
-        cache.set(cache_key, result, timeout=300)
-        return result
+        return list(shared_cache.cached("types", "names_mongo", load))
 
     def insert(self, name: str) -> None:
         mongo.db.type.insert_one({"name": name})
-        cache.delete("types_list_mongo")
+        shared_cache.invalidate("types")
 
     def delete(self, name: str) -> bool:
         result = mongo.db.type.delete_one({"name": name})
-        cache.delete("types_list_mongo")
+        shared_cache.invalidate("types")
         return result.deleted_count > 0
 
     def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
-        cache_key = f"type_by_name_{name}"
-
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
-        result = mongo.db.type.find_one({"name": name})
-        if result:
-            result["_id"] = str(result["_id"])
-
-        if result:
-            cache.set(cache_key, result, timeout=300)
+        def load():
+            result = mongo.db.type.find_one({"name": name})
+            if result:
+                result["_id"] = str(result["_id"])
+            return result
 
-        return result
+        return shared_cache.cached("types", f"by_name_mongo:{name}", load)
 
 
 class MongoLocationRepository(LocationRepository):
     """MongoDB implementation for Location repository"""
 
     def list_all(self) -> Generator[Dict[str, Any], None, None]:
-        cache_key = "locations_list_mongo"
-
-        cached = cache.get(cache_key)
-        if cached:
-            for loc in cached:
-                yield loc
-            return
-
-        result = list(mongo.db.locations.find().sort("order", 1))
-        cache.set(cache_key, result, timeout=300)
+        def load():
+            return list(mongo.db.locations.find().sort("order", 1))
 
-        for loc in result:
-            yield loc
+        yield from shared_cache.cached("locations", "list_mongo", load)
 
     def insert(self, doc: Dict[str, Any]) -> None:
         mongo.db.locations.insert_one(doc)
-        cache.delete("locations_list_mongo")
+        shared_cache.invalidate("locations")
 
     def delete(self, loc_id) -> None:
         mongo.db.locations.delete_one({"_id": loc_id})
-        cache.delete("locations_list_mongo")
+        shared_cache.invalidate("locations")
 
     def update(self, loc_id, doc: Dict[str, Any]) -> None:
         mongo.db.locations.update_one({"_id": loc_id}, {"$set": doc})
-        cache.delete("locations_list_mongo")
+        shared_cache.invalidate("locations")
 
     def update_order(self, loc_id, order: int) -> None:
         mongo.db.locations.update_one({"_id": loc_id}, {"$set": {"order": order}})
-        cache.delete("locations_list_mongo")
+        shared_cache.invalidate("locations")
 
     def list_choices(self) -> Tuple[List[str], List[str], List[str]]:
         floors = mongo.db.item.distinct("ItemFloor")
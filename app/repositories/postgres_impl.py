@@ -4,9 +4,10 @@ from typing import List, Dict, Any, Optional, Generator, Tuple
 from sqlalchemy import or_, and_
 from sqlalchemy.orm import Session
 
-from app import db, cache
+from app import db
 from app.models import Item, ItemType, Location
 from app.repositories.base import BaseRepository, TypeRepository, LocationRepository
+from app.utils import shared_cache
 
 
 class PostgresItemRepository(BaseRepository):
@@ -116,68 +117,42 @@ class PostgresTypeRepository(TypeRepository):
     """PostgreSQL implementation for Type repository"""
 
     def list_all(self) -> List[Dict[str, Any]]:
-        cache_key = "types_list_postgres"
+        def load():
+            return [{"id": t.id, "name": t.name} for t in db.session.query(ItemType).all()]
 
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
-        types = db.session.query(ItemType).all()
-        result = [{"id": t.id, "name": t.name} for t in types]
-
-        cache.set(cache_key, result, timeout=300)
-        return result
+        return list(shared_cache.cached("types", "names_postgres", load))
 
     def insert(self, name: str) -> None:
         item_type = ItemType(name=name)
         db.session.add(item_type)
         db.session.commit()
 
-        cache.delete("types_list_postgres")
+        shared_cache.invalidate("types")
 
     def delete(self, name: str) -> bool:
         result = ItemType.query.filter_by(name=name).delete()
         db.session.commit()
 
-        cache.delete("types_list_postgres")
+        shared_cache.invalidate("types")
 
         return result > 0
 
     def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
-        cache_key = f"type_by_name_{name}"
-
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
-        type_obj = ItemType.query.filter_by(name=name).first()
-        result = type_obj.to_dict() if type_obj else None
+        def load():
+            type_obj = ItemType.query.filter_by(name=name).first()
+            return type_obj.to_dict() if type_obj else None
 
-        if result:
-            cache.set(cache_key, result, timeout=300)
-
-        return result
+        return shared_cache.cached("types", f"by_name_postgres:{name}", load)
 
 
 class PostgresLocationRepository(LocationRepository):
     """PostgreSQL implementation for Location repository"""
 
     def list_all(self) -> Generator[Dict[str, Any], None, None]:
-        cache_key = "locations_list_postgres"
-
-        cached = cache.get(cache_key)
-        if cached:
-            for loc in cached:
-                yield loc
-            return
-
-        locations = db.session.query(Location).order_by(Location.order).all()
-        result = [loc.to_dict() for loc in locations]
-
-        cache.set(cache_key, result, timeout=300)
+        def load():
+            return [loc.to_dict() for loc in db.session.query(Location).order_by(Location.order).all()]
 
-        for loc in result:
-            yield loc
+        yield from shared_cache.cached("locations", "list_postgres", load)
 
     def insert(self, doc: Dict[str, Any]) -> None:
         location = Location(
@@ -189,7 +164,7 @@ class PostgresLocationRepository(LocationRepository):
         db.session.add(location)
         db.session.commit()
 
-        cache.delete("locations_list_postgres")
+        shared_cache.invalidate("locations")
 
     def delete(self, loc_id) -> None:
         location = db.session.query(Location).filter_by(id=loc_id).first()
@@ -197,7 +172,7 @@ class PostgresLocationRepository(LocationRepository):
             db.session.delete(location)
             db.session.commit()
 
-        cache.delete("locations_list_postgres")
+        shared_cache.invalidate("locations")
 
     def update(self, loc_id, doc: Dict[str, Any]) -> None:
         location = db.session.query(Location).filter_by(id=loc_id).first()
@@ -212,7 +187,7 @@ class PostgresLocationRepository(LocationRepository):
                 location.order = doc["order"]
             db.session.commit()
 
-        cache.delete("locations_list_postgres")
+        shared_cache.invalidate("locations")
 
     def update_order(self, loc_id, order: int) -> None:
         location = db.session.query(Location).filter_by(id=loc_id).first()
@@ -220,7 +195,7 @@ class PostgresLocationRepository(LocationRepository):
             location.order = order
             db.session.commit()
 
-        cache.delete("locations_list_postgres")
+        shared_cache.invalidate("locations")
 
     def list_choices(self) -> tuple:
         from app.models import Item
@@ -1,5 +1,5 @@
 """數量變動日誌資料存取模組"""
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 from datetime import datetime
 
 from app import mongo, db, get_db_type
@@ -42,6 +42,26 @@ def insert_log(
         })
 
 
+def insert_logs(logs: Iterable[Dict[str, Any]], commit: bool = True) -> int:
+    """批次寫入數量日誌，回傳筆數
+
+    每筆含 item_id、item_name、user、delta、old_quantity、new_quantity、reason，可選 timestamp。
+    PostgreSQL 在 commit=False 時只加入 session，由呼叫端與數量更新一起提交；MongoDB 以 insert_many 寫入。
+    """
+    now = datetime.utcnow()
+    rows = [{**log, "timestamp": log.get("timestamp") or now} for log in logs]
+    if not rows:
+        return 0
+    db_type = get_db_type()
+    if db_type == "postgres":
+        db.session.add_all([QuantityLog(**row) for row in rows])
+        if commit:
+            db.session.commit()
+    else:
+        mongo.db.quantity_logs.insert_many(rows)
+    return len(rows)
+
+
 def get_logs_by_item(item_id: str, limit: int = 20) -> List[Dict[str, Any]]:
     db_type = get_db_type()
     if db_type == "postgres":
@@ -0,0 +1,141 @@
+"""使用者推薦快照資料存取模組"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from app import mongo, db, get_db_type
+from app.models.item import Item
+from app.models.user_recommendation import UserRecommendation
+
+
+def _mongo_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "user_id": doc.get("user_id", ""),
+        "recommendations": list(doc.get("recommendations") or []),
+        "stale": bool(doc.get("stale")),
+        "computed_at": doc.get("computed_at"),
+    }
+
+
+def get(user_id: str) -> Optional[Dict[str, Any]]:
+    """以主鍵（Mongo 為唯一索引）取得使用者的推薦快照"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        row = db.session.get(UserRecommendation, user_id)
+        return row.to_dict() if row else None
+    doc = mongo.db.user_recommendations.find_one({"user_id": user_id}, {"_id": 0})
+    return _mongo_doc(doc) if doc else None
+
+
+def save(user_id: str, recommendations: List[Dict[str, Any]], computed_at: datetime) -> None:
+    """寫入（或覆寫）使用者的推薦快照並清除 stale 標記"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        db.session.merge(UserRecommendation(
+            user_id=user_id,
+            recommendations=recommendations,
+            stale=False,
+            computed_at=computed_at,
+        ))
+        db.session.commit()
+        return
+    mongo.db.user_recommendations.update_one(
+        {"user_id": user_id},
+        {"$set": {"recommendations": recommendations, "stale": False, "computed_at": computed_at}},
+        upsert=True,
+    )
+
+
+def mark_stale_for_items(item_ids: Iterable[str]) -> int:
+    """將這些物品擁有者的快照標記為 stale（單一 UPDATE），回傳受影響的使用者數"""
+    item_ids = [i for i in item_ids if i]
+    if not item_ids:
+        return 0
+    db_type = get_db_type()
+    if db_type == "postgres":
+        owners = select(Item.ItemOwner).where(Item.ItemID.in_(item_ids))
+        count = (
+            UserRecommendation.query
+            .filter(UserRecommendation.user_id.in_(owners), UserRecommendation.stale != True)
+            .update({"stale": True}, synchronize_session=False)
+        )
+        db.session.commit()
+        return count
+    owners = [o for o in mongo.db.item.distinct("ItemOwner", {"ItemID": {"$in": item_ids}}) if o]
+    if not owners:
+        return 0
+    result = mongo.db.user_recommendations.update_many(
+        {"user_id": {"$in": owners}, "stale": {"$ne": True}}, {"$set": {"stale": True}}
+    )
+    return result.modified_count
+
+
+def mark_stale_for_users(user_ids: Iterable[str]) -> int:
+    """將指定使用者的快照標記為 stale（例如物品轉移前的擁有者），回傳受影響的使用者數"""
+    user_ids = list({u for u in user_ids if u})
+    if not user_ids:
+        return 0
+    db_type = get_db_type()
+    if db_type == "postgres":
+        count = (
+            UserRecommendation.query
+            .filter(UserRecommendation.user_id.in_(user_ids), UserRecommendation.stale != True)
+            .update({"stale": True}, synchronize_session=False)
+        )
+        db.session.commit()
+        return count
+    result = mongo.db.user_recommendations.update_many(
+        {"user_id": {"$in": user_ids}, "stale": {"$ne": True}}, {"$set": {"stale": True}}
+    )
+    return result.modified_count
+
+
+def defer(user_id: str, computed_at: datetime) -> None:
+    """重算失敗時只更新 computed_at（保留 stale 與舊的推薦），讓該使用者排到下一批的最後"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        UserRecommendation.query.filter(UserRecommendation.user_id == user_id).update(
+            {"computed_at": computed_at}, synchronize_session=False
+        )
+        db.session.commit()
+        return
+    mongo.db.user_recommendations.update_one({"user_id": user_id}, {"$set": {"computed_at": computed_at}})
+
+
+def mark_all_stale() -> int:
+    """將所有快照標記為 stale（日期型規則每天都會變化）"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        count = UserRecommendation.query.update({"stale": True}, synchronize_session=False)
+        db.session.commit()
+        return count
+    return mongo.db.user_recommendations.update_many({}, {"$set": {"stale": True}}).modified_count
+
+
+def list_stale_users(limit: int) -> List[str]:
+    """取出需要重新計算的使用者（走 stale 索引）"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        rows = (
+            db.session.query(UserRecommendation.user_id)
+            .filter(UserRecommendation.stale == True)
+            .order_by(UserRecommendation.computed_at.asc())
+            .limit(limit)
+            .all()
+        )
+        return [row.user_id for row in rows]
+    cursor = (
+        mongo.db.user_recommendations.find({"stale": True}, {"_id": 0, "user_id": 1})
+        .sort("computed_at", 1)
+        .limit(limit)
+    )
+    return [doc["user_id"] for doc in cursor]
+
+
+def ensure_indexes() -> None:
+    db_type = get_db_type()
+    if db_type == "postgres":
+        return
+    mongo.db.user_recommendations.create_index("user_id", unique=True, background=True)
+    mongo.db.user_recommendations.create_index("stale", background=True)
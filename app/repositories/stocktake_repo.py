@@ -36,13 +36,16 @@ def create_session(name: str, created_by: str, notes: Optional[str] = None) -> A
         return str(result.inserted_id)
 
 
-def get_session(session_id: Any) -> Optional[Dict[str, Any]]:
-    """取得盤點作業及其所有明細"""
+def get_session(session_id: Any, include_items: bool = True) -> Optional[Dict[str, Any]]:
+    """取得盤點作業；include_items=False 時只回傳作業本身與明細筆數（狀態檢查用）"""
     db_type = get_db_type()
     if db_type == "postgres":
         sess = StocktakeSession.query.get(int(session_id))
         if not sess:
             return None
+        if not include_items:
+            count = StocktakeItem.query.filter_by(session_id=sess.id).count()
+            return sess.to_dict(item_count=count)
         d = sess.to_dict()
         d["items"] = [item.to_dict() for item in sess.items]
         return d
@@ -57,6 +60,10 @@ def get_session(session_id: Any) -> Optional[Dict[str, Any]]:
         if doc.get("committed_at") and hasattr(doc["committed_at"], "strftime"):
             doc["committed_at"] = doc["committed_at"].strftime("%Y-%m-%d %H:%M")
 
+        if not include_items:
+            doc["item_count"] = mongo.db.stocktake_items.count_documents({"session_id": str(session_id)})
+            return doc
+
         items = list(mongo.db.stocktake_items.find({"session_id": str(session_id)}))
         for item in items:
             item["id"] = str(item.pop("_id"))
@@ -117,43 +124,48 @@ def update_session_status(session_id: Any, status: str, committed_at: Optional[d
 # ---------------------------------------------------------------------------
 
 def populate_session(session_id: Any) -> int:
-    """從現有庫存自動填入盤點明細，回傳建立的明細筆數"""
+    """從現有庫存（不含垃圾桶）填入盤點明細，回傳建立的明細筆數
+
+    PostgreSQL 以單一 INSERT ... SELECT 完成，MongoDB 以 $merge 管線在伺服器端寫入，
+    不需把整份庫存載入應用程式。
+    """
     db_type = get_db_type()
     if db_type == "postgres":
+        from sqlalchemy import func, insert, literal, select
         from app.models.item import Item
-        items = Item.query.all()
-        count = 0
-        for item in items:
-            si = StocktakeItem(
-                session_id=int(session_id),
-                item_id=item.ItemID,
-                item_name=item.ItemName,
-                expected_qty=item.Quantity or 0,
-                actual_qty=None,
-                status="pending",
+
+        rows = select(
+            literal(int(session_id)),
+            Item.ItemID,
+            func.coalesce(Item.ItemName, ""),
+            func.coalesce(Item.Quantity, 0),
+            literal("pending"),
+        ).where(Item.is_deleted != True)  # noqa: E712
+        result = db.session.execute(
+            insert(StocktakeItem).from_select(
+                ["session_id", "item_id", "item_name", "expected_qty", "status"], rows
             )
-            db.session.add(si)
-            count += 1
+        )
         db.session.commit()
-        return count
+        return result.rowcount
     else:
-        items = list(mongo.db.item.find({}, {"ItemID": 1, "ItemName": 1, "Quantity": 1}))
-        docs = []
-        for item in items:
-            docs.append({
-                "session_id": str(session_id),
-                "item_id": item.get("ItemID", ""),
-                "item_name": item.get("ItemName", ""),
-                "expected_qty": item.get("Quantity", 0) or 0,
-                "actual_qty": None,
-                "status": "pending",
-                "counted_by": None,
-                "counted_at": None,
-                "notes": "",
-            })
-        if docs:
-            mongo.db.stocktake_items.insert_many(docs)
-        return len(docs)
+        mongo.db.item.aggregate([
+            {"$match": {"is_deleted": {"$ne": True}}},
+            {"$project": {
+                "_id": 0,
+                "session_id": {"$literal": str(session_id)},
+                "item_id": {"$ifNull": ["$ItemID", ""]},
+                "item_name": {"$ifNull": ["$ItemName", ""]},
+                "expected_qty": {"$ifNull": ["$Quantity", 0]},
+                "actual_qty": {"$literal": None},
+                "status": {"$literal": "pending"},
+                "counted_by": {"$literal": None},
+                "counted_at": {"$literal": None},
+                "notes": {"$literal": ""},
+            }},
+            {"$merge": {"into": "stocktake_items", "whenMatched": "fail", "whenNotMatched": "insert"}},
+        ])
+        return mongo.db.stocktake_items.count_documents({"session_id": str(session_id)})
 
 
 def record_count(session_id: Any, item_id: str, actual_qty: int, counted_by: str) -> bool:
@@ -193,72 +205,120 @@ def record_count(session_id: Any, item_id: str, actual_qty: int, counted_by: str
 
 
 def mark_discrepancies(session_id: Any) -> int:
-    """將所有已盤點但數量不符的明細標記為 discrepancy，回傳標記筆數"""
+    """將所有已盤點的明細依數量是否相符標記為 discrepancy / counted，回傳變更筆數"""
     db_type = get_db_type()
     if db_type == "postgres":
-        from sqlalchemy import and_
-        items = StocktakeItem.query.filter(
-            StocktakeItem.session_id == int(session_id),
-            StocktakeItem.actual_qty.isnot(None),
-        ).all()
-        count = 0
-        for item in items:
-            correct_status = "discrepancy" if item.actual_qty != item.expected_qty else "counted"
-            if item.status != correct_status:
-                item.status = correct_status
-                count += 1
-        if count:
-            db.session.commit()
-        return count
+        from sqlalchemy import case, update
+
+        correct_status = case(
+            (StocktakeItem.actual_qty != StocktakeItem.expected_qty, "discrepancy"),
+            else_="counted",
+        )
+        result = db.session.execute(
+            update(StocktakeItem)
+            .where(
+                StocktakeItem.session_id == int(session_id),
+                StocktakeItem.actual_qty.isnot(None),
+                StocktakeItem.status != correct_status,
+            )
+            .values(status=correct_status)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
     else:
-        items = list(mongo.db.stocktake_items.find({
-            "session_id": str(session_id),
-            "actual_qty": {"$ne": None},
-        }))
-        count = 0
-        for item in items:
-            correct_status = "discrepancy" if item.get("actual_qty") != item.get("expected_qty", 0) else "counted"
-            if item.get("status") != correct_status:
-                mongo.db.stocktake_items.update_one(
-                    {"_id": item["_id"]},
-                    {"$set": {"status": correct_status}},
-                )
-                count += 1
-        return count
+        correct_status = {"$cond": [
+            {"$ne": ["$actual_qty", {"$ifNull": ["$expected_qty", 0]}]}, "discrepancy", "counted",
+        ]}
+        result = mongo.db.stocktake_items.update_many(
+            {"session_id": str(session_id), "actual_qty": {"$ne": None}},
+            [{"$set": {"status": correct_status}}],
+        )
+        return result.modified_count
 
 
-def apply_counts_to_inventory(session_id: Any) -> int:
-    """將盤點實際數量寫回庫存，回傳更新筆數"""
+def apply_counts_to_inventory(session_id: Any, user: str = "", reason: Optional[str] = None) -> int:
+    """將盤點實際數量寫回庫存，回傳更新筆數
+
+    數量有變動的物品會寫入數量變動日誌。PostgreSQL 在同一個交易中以一次
+    INSERT ... SELECT 寫日誌、一次 UPDATE ... FROM 更新庫存；MongoDB 以一次查詢取得
+    原數量，再以 insert_many / bulk_write 批次寫入。
+    """
     db_type = get_db_type()
+    now = datetime.utcnow()
     if db_type == "postgres":
+        from sqlalchemy import func, insert, literal, select, update
         from app.models.item import Item
-        items = StocktakeItem.query.filter(
+        from app.models.quantity_log import QuantityLog
+
+        counted = (
             StocktakeItem.session_id == int(session_id),
             StocktakeItem.actual_qty.isnot(None),
-        ).all()
-        count = 0
-        for si in items:
-            updated = Item.query.filter_by(ItemID=si.item_id).update(
-                {"Quantity": si.actual_qty}
+            Item.ItemID == StocktakeItem.item_id,
+        )
+        old_qty = func.coalesce(Item.Quantity, 0)
+        logs = select(
+            StocktakeItem.item_id,
+            func.coalesce(Item.ItemName, ""),
+            literal(user),
+            StocktakeItem.actual_qty - old_qty,
+            old_qty,
+            StocktakeItem.actual_qty,
+            literal(reason),
+            literal(now),
+        ).where(*counted, old_qty != StocktakeItem.actual_qty)
+        db.session.execute(
+            insert(QuantityLog).from_select(
+                ["item_id", "item_name", "user", "delta", "old_quantity", "new_quantity", "reason", "timestamp"],
+                logs,
             )
-            if updated:
-                count += 1
+        )
+        result = db.session.execute(
+            update(Item)
+            .where(*counted)
+            .values(Quantity=StocktakeItem.actual_qty)
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
-        return count
+        return result.rowcount
     else:
-        items = list(mongo.db.stocktake_items.find({
-            "session_id": str(session_id),
-            "actual_qty": {"$ne": None},
-        }))
-        count = 0
-        for si in items:
-            result = mongo.db.item.update_one(
-                {"ItemID": si["item_id"]},
-                {"$set": {"Quantity": si["actual_qty"]}},
+        from pymongo import UpdateOne
+
+        counts = {
+            si["item_id"]: si["actual_qty"]
+            for si in mongo.db.stocktake_items.find(
+                {"session_id": str(session_id), "actual_qty": {"$ne": None}},
+                {"item_id": 1, "actual_qty": 1},
             )
-            if result.modified_count:
-                count += 1
-        return count
+        }
+        if not counts:
+            return 0
+        current = mongo.db.item.find(
+            {"ItemID": {"$in": list(counts)}}, {"ItemID": 1, "ItemName": 1, "Quantity": 1}
+        )
+        logs = []
+        updates = []
+        for item in current:
+            old_qty = item.get("Quantity", 0) or 0
+            new_qty = counts[item["ItemID"]]
+            if old_qty == new_qty:
+                continue
+            updates.append(UpdateOne({"ItemID": item["ItemID"]}, {"$set": {"Quantity": new_qty}}))
+            logs.append({
+                "item_id": item["ItemID"],
+                "item_name": item.get("ItemName", ""),
+                "user": user,
+                "delta": new_qty - old_qty,
+                "old_quantity": old_qty,
+                "new_quantity": new_qty,
+                "reason": reason,
+                "timestamp": now,
+            })
+        if not updates:
+            return 0
+        result = mongo.db.item.bulk_write(updates, ordered=False)
+        mongo.db.quantity_logs.insert_many(logs, ordered=False)
+        return result.modified_count
 
 
 def get_session_summary(session_id: Any) -> Dict[str, int]:
@@ -2,27 +2,21 @@
 from typing import List, Optional
 from flask import current_app
 
-from app import mongo, db, get_db_type, cache
+from app import mongo, db, get_db_type
 from app.models.item_type import ItemType
+from app.utils import shared_cache
 
 
-def list_types() -> List[dict]:
-    db_type = get_db_type()
-    cache_key = f"types_list_{db_type}"
-
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-
-    if db_type == "postgres":
+def _load_types() -> List[dict]:
+    if get_db_type() == "postgres":
         types = db.session.query(ItemType).all()
-        result = [{"id": t.id, "name": t.name, "parent_id": t.parent_id} for t in types]
-    else:
-        types = mongo.db.type.find({})
-        result = [{"id": t["_id"], "name": t["name"], "parent_id": t.get("parent_id")} for t in types]
+        return [{"id": t.id, "name": t.name, "parent_id": t.parent_id} for t in types]
+    types = mongo.db.type.find({})
+    return [{"id": t["_id"], "name": t["name"], "parent_id": t.get("parent_id")} for t in types]
+
 
-    cache.set(cache_key, result, timeout=300)  # 5 minutes cache
-    return result
+def list_types() -> List[dict]:
+    return list(shared_cache.cached("types", f"list_{get_db_type()}", _load_types))
 
 
 def insert_type(name: str, parent_id: Optional[int] = None) -> None:
@@ -37,9 +31,7 @@ def insert_type(name: str, parent_id: Optional[int] = None) -> None:
             doc["parent_id"] = parent_id
         mongo.db.type.insert_one(doc)
 
-    # Invalidate cache
-    cache.delete(f"types_list_{db_type}")
-    cache.delete(f"types_tree_{db_type}")
+    shared_cache.invalidate("types")
 
 
 def delete_type(name: str) -> bool:
@@ -50,9 +42,7 @@ def delete_type(name: str) -> bool:
     else:
         result = mongo.db.type.delete_one({"name": name})
 
-    # Invalidate cache
-    cache.delete(f"types_list_{db_type}")
-    cache.delete(f"types_tree_{db_type}")
+    shared_cache.invalidate("types")
 
     return result.deleted_count > 0 if db_type == "postgres" else result.deleted_count > 0
 
@@ -71,8 +61,7 @@ def update_type(old_name: str, new_name: str) -> bool:
         if result.modified_count == 0:
             return False
 
-    cache.delete(f"types_list_{db_type}")
-    cache.delete(f"types_tree_{db_type}")
+    shared_cache.invalidate("types")
     return True
 
 
@@ -137,27 +126,20 @@ def restore_types(types: List, mode: str = "merge") -> int:
     return count
 
 
-def get_type_tree() -> List[dict]:
-    """Return flat list of all types with parent_id for both DB types."""
-    db_type = get_db_type()
-    cache_key = f"types_tree_{db_type}"
-
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-
-    if db_type == "postgres":
+def _load_type_tree() -> List[dict]:
+    if get_db_type() == "postgres":
         types = db.session.query(ItemType).all()
-        result = [{"id": t.id, "name": t.name, "parent_id": t.parent_id} for t in types]
-    else:
-        types = list(mongo.db.type.find({}))
-        result = [
-            {"id": str(t["_id"]), "name": t["name"], "parent_id": t.get("parent_id")}
-            for t in types
-        ]
+        return [{"id": t.id, "name": t.name, "parent_id": t.parent_id} for t in types]
+    types = list(mongo.db.type.find({}))
+    return [
+        {"id": str(t["_id"]), "name": t["name"], "parent_id": t.get("parent_id")}
+        for t in types
+    ]
+
 
-    cache.set(cache_key, result, timeout=300)
-    return result
+def get_type_tree() -> List[dict]:
+    """Return flat list of all types with parent_id for both DB types."""
+    return list(shared_cache.cached("types", f"tree_{get_db_type()}", _load_type_tree))
 
 
 def update_type_parent(type_name: str, parent_name: Optional[str]) -> bool:
@@ -190,6 +172,5 @@ def update_type_parent(type_name: str, parent_name: Optional[str]) -> bool:
         else:
             mongo.db.type.update_one({"name": type_name}, {"$unset": {"parent_id": ""}})
 
-    cache.delete(f"types_list_{db_type}")
-    cache.delete(f"types_tree_{db_type}")
+    shared_cache.invalidate("types")
     return True
@@ -403,6 +403,21 @@ def set_email_verify_token(username: str, token: str) -> None:
         )
 
 
+def set_calendar_feed_secret(username: str, secret: str) -> None:
+    """儲存行事曆訂閱密鑰（覆寫舊值會讓舊的訂閱網址失效）"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        user = User.query.filter_by(User=username).first()
+        if user:
+            user.calendar_feed_secret = secret
+            db.session.commit()
+    else:
+        mongo.db.user.update_one(
+            {"User": username},
+            {"$set": {"calendar_feed_secret": secret}},
+        )
+
+
 def find_by_email_verify_token(token: str) -> Optional[Dict[str, Any]]:
     """依 token 查詢使用者"""
     db_type = get_db_type()
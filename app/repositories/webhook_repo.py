@@ -162,3 +162,188 @@ def update_webhook_status(webhook_id: int, last_triggered: datetime, failure_cou
             {"_id": ObjectId(str(webhook_id))},
             {"$set": update_data},
         )
+
+
+def get_webhooks_by_ids(webhook_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """依 ID 批次取得 webhooks（供 dispatcher 使用，不限擁有者），回傳 {id: webhook}"""
+    if not webhook_ids:
+        return {}
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from app.models.webhook import Webhook
+
+        int_ids = [int(i) for i in webhook_ids if str(i).isdigit()]
+        webhooks = db.session.query(Webhook).filter(Webhook.id.in_(int_ids)).all()
+        return {str(w.id): w.to_dict() for w in webhooks}
+    else:
+        from bson import ObjectId
+
+        docs = mongo.db.webhooks.find({"_id": {"$in": [ObjectId(str(i)) for i in webhook_ids]}})
+        result = {}
+        for doc in docs:
+            doc["id"] = str(doc.pop("_id"))
+            result[doc["id"]] = doc
+        return result
+
+
+# ---------------------------------------------------------------------------
+# Outbox
+# ---------------------------------------------------------------------------
+
+def enqueue_deliveries(rows: List[Dict[str, Any]], commit: bool = True) -> None:
+    """寫入待發送事件。
+
+    PostgreSQL 下 commit=False 只加入目前的 session，隨呼叫端的資料異動一起提交。
+    """
+    if not rows:
+        return
+    now = datetime.utcnow()
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from app.models.webhook import WebhookDelivery
+
+        db.session.add_all([
+            WebhookDelivery(
+                webhook_id=str(row["webhook_id"]),
+                event=row["event"],
+                body=row["body"],
+                status="pending",
+                attempts=0,
+                next_attempt_at=now,
+                created_at=now,
+            )
+            for row in rows
+        ])
+        if commit:
+            db.session.commit()
+    else:
+        mongo.db.webhook_outbox.insert_many([
+            {
+                "webhook_id": str(row["webhook_id"]),
+                "event": row["event"],
+                "body": row["body"],
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            }
+            for row in rows
+        ])
+
+
+def claim_due_deliveries(limit: int, token: str, now: datetime, stale_before: datetime) -> List[Dict[str, Any]]:
+    """認領已到發送時間的事件（含逾時未完成的 inflight），多個程序同時執行也不會重複認領"""
+    if limit <= 0:
+        return []
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from app.models.webhook import WebhookDelivery
+        from sqlalchemy import and_, or_
+
+        due = or_(
+            and_(WebhookDelivery.status == "pending", WebhookDelivery.next_attempt_at <= now),
+            and_(WebhookDelivery.status == "inflight", WebhookDelivery.claimed_at < stale_before),
+        )
+        ids = [
+            row.id for row in db.session.query(WebhookDelivery.id)
+            .filter(due)
+            .order_by(WebhookDelivery.next_attempt_at.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not ids:
+            db.session.commit()
+            return []
+        db.session.query(WebhookDelivery).filter(WebhookDelivery.id.in_(ids), due).update(
+            {"status": "inflight", "claim_token": token, "claimed_at": now},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        rows = db.session.query(WebhookDelivery).filter_by(claim_token=token).all()
+        return [row.to_dict() for row in rows]
+    else:
+        from pymongo import ReturnDocument
+
+        due = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "inflight", "claimed_at": {"$lt": stale_before}},
+        ]}
+        claimed = []
+        for _ in range(limit):
+            doc = mongo.db.webhook_outbox.find_one_and_update(
+                due,
+                {"$set": {"status": "inflight", "claim_token": token, "claimed_at": now}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                break
+            doc["id"] = str(doc.pop("_id"))
+            claimed.append(doc)
+        return claimed
+
+
+def complete_delivery(delivery_id: Any, status: str, attempts: int, next_attempt_at: Optional[datetime] = None,
+                      error: Optional[str] = None) -> None:
+    """更新單筆事件的發送結果：delivered / pending（待重試）/ dead"""
+    now = datetime.utcnow()
+    updates: Dict[str, Any] = {
+        "status": status,
+        "attempts": attempts,
+        "claim_token": None,
+        "claimed_at": None,
+        "last_error": (error or "")[:255] or None,
+    }
+    if next_attempt_at is not None:
+        updates["next_attempt_at"] = next_attempt_at
+    if status == "delivered":
+        updates["delivered_at"] = now
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from app.models.webhook import WebhookDelivery
+
+        db.session.query(WebhookDelivery).filter_by(id=delivery_id).update(updates, synchronize_session=False)
+        db.session.commit()
+    else:
+        from bson import ObjectId
+
+        mongo.db.webhook_outbox.update_one({"_id": ObjectId(str(delivery_id))}, {"$set": updates})
+
+
+def purge_finished_deliveries(before: datetime) -> int:
+    """刪除 before 之前建立、已送達或已放棄的事件，回傳刪除筆數"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from app.models.webhook import WebhookDelivery
+
+        count = (
+            db.session.query(WebhookDelivery)
+            .filter(WebhookDelivery.status.in_(("delivered", "dead")), WebhookDelivery.created_at < before)
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        return count
+    else:
+        result = mongo.db.webhook_outbox.delete_many(
+            {"status": {"$in": ["delivered", "dead"]}, "created_at": {"$lt": before}}
+        )
+        return result.deleted_count
+
+
+def count_outbox_by_status() -> Dict[str, int]:
+    """各狀態的事件數量（佇列深度）"""
+    db_type = get_db_type()
+    if db_type == "postgres":
+        from app.models.webhook import WebhookDelivery
+        from sqlalchemy import func
+
+        rows = (
+            db.session.query(WebhookDelivery.status, func.count(WebhookDelivery.id))
+            .group_by(WebhookDelivery.status)
+            .all()
+        )
+        return {status: count for status, count in rows}
+    else:
+        rows = mongo.db.webhook_outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+        return {row["_id"]: row["count"] for row in rows}
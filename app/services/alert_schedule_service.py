@@ -0,0 +1,392 @@
+"""到期提醒排程服務
+
+依物品的保固到期日、使用期限與保養日預先算出提醒排程並寫入 alert_schedules，
+每次通知排程只讀取已進入提醒期間的項目。排程分兩種列：
+
+- 物品排程（username 為 ITEM_SCOPE）：每件物品、每種提醒一列，筆數與使用者人數無關；
+  next_alert_at 為提醒期間的起點（到期日前 LADDER_HORIZON_DAYS 天）。
+- 個人排程：使用者收到某項提醒後才建立，記錄已發送到提醒階梯的哪一階與下一次提醒時間，
+  不會重複提醒。
+
+讀取時才依物品目前的可見性、群組成員與各使用者的提醒階梯（例如 30/7/1 天）展開，
+新使用者、群組成員或分享名單變更不需要重建排程。保養規則以物品擁有者的設定計算。
+"""
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.repositories import alert_schedule_repo, item_repo, user_repo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LADDER = [30, 14, 7, 3, 1]
+# 物品排程的 username；個人排程使用實際帳號
+ITEM_SCOPE = ""
+# 提醒階梯最多提前的天數，也是物品排程進入提醒期間的起點
+LADDER_HORIZON_DAYS = 90
+# 到期超過此天數的物品排程不再展開（已收到到期提醒的使用者由個人排程記錄）
+ALERT_GRACE_DAYS = 30
+EXPIRY_KINDS = {"warranty": "WarrantyExpiry", "usage": "UsageExpiry"}
+
+SCHEDULE_PROJECTION = {
+    "_id": 0,
+    "ItemID": 1,
+    "ItemName": 1,
+    "ItemType": 1,
+    "ItemGetDate": 1,
+    "ItemOwner": 1,
+    "visibility": 1,
+    "shared_with": 1,
+    "size_notes": 1,
+    "WarrantyExpiry": 1,
+    "UsageExpiry": 1,
+    "MaintenanceCategory": 1,
+    "MaintenanceIntervalDays": 1,
+    "LastMaintenanceDate": 1,
+}
+
+_ensured = False
+_ensure_lock = threading.Lock()
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value.strip():
+        try:
+            return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+def user_ladder(settings: Dict[str, Any]) -> List[int]:
+    """解析使用者的提醒階梯（由大到小，含到期當天的 0），並以 notify_days 與 LADDER_HORIZON_DAYS 為上限"""
+    raw = settings.get("reminder_ladder")
+    parts = raw if isinstance(raw, list) else str(raw or "").split(",")
+    ladder = {int(p) for p in (str(v).strip() for v in parts) if p.isdigit()}
+    if not ladder:
+        ladder = set(DEFAULT_LADDER)
+    notify_days = settings.get("notify_days")
+    if notify_days:
+        ladder = {o for o in ladder if o <= int(notify_days)}
+    ladder = {o for o in ladder if o <= LADDER_HORIZON_DAYS}
+    ladder.add(0)
+    return sorted(ladder, reverse=True)
+
+
+def next_alert(
+    due_date: date,
+    ladder: List[int],
+    last_offset: Optional[int],
+    today: date,
+) -> Tuple[Optional[int], Optional[datetime]]:
+    """計算下一次提醒的階梯天數與時間；全部發送完畢時回傳 (None, None)
+
+    已錯過的多個階梯只補發最近的一階，避免新增物品或排程延遲時連續提醒。
+    """
+    offsets = [o for o in ladder if last_offset is None or o < last_offset]
+    if not offsets:
+        return None, None
+    passed = [o for o in offsets if due_date - timedelta(days=o) <= today]
+    if passed:
+        return min(passed), datetime.combine(today, time.min)
+    offset = max(offsets)
+    return offset, datetime.combine(due_date - timedelta(days=offset), time.min)
+
+
+def _item_due_dates(item: Dict[str, Any], rules: Dict[str, int]) -> Dict[str, Tuple[date, str]]:
+    from app.services import item_service
+
+    dates: Dict[str, Tuple[date, str]] = {}
+    for kind, field in EXPIRY_KINDS.items():
+        due = _to_date(item.get(field))
+        if due:
+            dates[kind] = (due, "")
+    resolved = item_service.resolve_replacement_due(item, rules)
+    if resolved:
+        rule_name, _, due = resolved
+        dates["maintenance"] = (due, rule_name)
+    return dates
+
+
+def _owner_rules(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """各物品擁有者的保養規則；未填擁有者或擁有者不是系統帳號時使用預設規則"""
+    from app.services import item_service
+
+    rules = {}
+    for owner in {item.get("ItemOwner") or "" for item in items}:
+        settings = user_repo.get_notification_settings(owner) if owner else {}
+        rules[owner] = item_service.get_replacement_rules(settings)
+    return rules
+
+
+def _build_rows(items: List[Dict[str, Any]], existing: List[Dict[str, Any]], today: date) -> List[Dict[str, Any]]:
+    """產生物品排程，並保留到期日未變的個人排程（到期日改變時發送狀態重新計算）
+
+    個人排程只在發送後存在；沒有發送紀錄的列（舊版逐使用者展開的排程）在此捨棄。
+    """
+    rules = _owner_rules(items)
+    personal: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for entry in existing:
+        if entry["username"] != ITEM_SCOPE and entry["last_sent_at"] is not None:
+            personal.setdefault((entry["item_id"], entry["kind"]), []).append(entry)
+
+    rows = []
+    for item in items:
+        item_id = item.get("ItemID")
+        if not item_id:
+            continue
+        for kind, (due, label) in _item_due_dates(item, rules[item.get("ItemOwner") or ""]).items():
+            expired = due < today - timedelta(days=ALERT_GRACE_DAYS)
+            rows.append({
+                "username": ITEM_SCOPE,
+                "item_id": item_id,
+                "kind": kind,
+                "label": label,
+                "due_date": due,
+                "next_offset": None,
+                "next_alert_at": None if expired else datetime.combine(
+                    due - timedelta(days=LADDER_HORIZON_DAYS), time.min
+                ),
+                "last_offset": None,
+                "last_sent_at": None,
+            })
+            rows.extend(
+                dict(entry, label=label) for entry in personal.get((item_id, kind), []) if entry["due_date"] == due
+            )
+    return rows
+
+
+def _restep(entries: List[Dict[str, Any]], users: Dict[str, Dict[str, Any]], today: date) -> None:
+    """依使用者目前的提醒階梯重算個人排程的下一次提醒（保留已發送的階梯）"""
+    for entry in entries:
+        user = users.get(entry["username"])
+        if user is None:
+            continue
+        entry["next_offset"], entry["next_alert_at"] = next_alert(
+            entry["due_date"], user_ladder(user), entry["last_offset"], today
+        )
+
+
+def reschedule_items(item_ids: Iterable[str]) -> int:
+    """物品新增 / 編輯 / 刪除後重新排程，回傳排程筆數"""
+    item_ids = [i for i in item_ids if i]
+    if not item_ids:
+        return 0
+    items = item_repo.find_items_by_ids(item_ids, SCHEDULE_PROJECTION)
+    existing = alert_schedule_repo.get_entries(item_ids=item_ids)
+    rows = _build_rows(items, existing, date.today())
+    alert_schedule_repo.replace_entries(rows, item_ids=item_ids)
+    return len(rows)
+
+
+def reschedule_users(usernames: Iterable[str]) -> int:
+    """使用者新增 / 刪除、通知設定或群組成員變更後重新排程
+
+    依新的提醒階梯推進個人排程、移除已刪除使用者的個人排程，並以新的保養規則重排其擁有的物品。
+    可見性在讀取時才判斷，群組與分享名單的變更不需要另外處理。
+    """
+    usernames = [u for u in usernames if u]
+    if not usernames:
+        return 0
+    users = {}
+    for username in usernames:
+        settings = user_repo.get_notification_settings(username)
+        if settings:
+            users[username] = settings
+    entries = [
+        e for e in alert_schedule_repo.get_entries(usernames=usernames)
+        if e["username"] in users and e["last_sent_at"] is not None
+    ]
+    _restep(entries, users, date.today())
+    alert_schedule_repo.replace_entries(entries, usernames=usernames)
+    owned = [
+        item["ItemID"]
+        for username in usernames
+        for item in item_repo.list_items_by_owner(username, {"_id": 0, "ItemID": 1})
+    ]
+    return len(entries) + reschedule_items(owned)
+
+
+def users_changed(usernames: Iterable[str]) -> None:
+    """帳號新增 / 刪除或群組成員異動後重新排程；失敗不影響原本的操作，由每日重建補上"""
+    usernames = list(usernames)
+    try:
+        reschedule_users(usernames)
+    except Exception:
+        alert_schedule_repo.rollback()
+        logger.warning("failed to reschedule alerts for users %s", usernames, exc_info=True)
+
+
+def rebuild_schedule() -> int:
+    """依全部物品重建排程，保留既有發送狀態並移除已刪除使用者的個人排程"""
+    from app.services.notification_service import _build_visibility_context
+
+    alert_schedule_repo.ensure_indexes()
+    known_users, _ = _build_visibility_context()
+    items = list(item_repo.list_items({}, SCHEDULE_PROJECTION))
+    existing = [
+        e for e in alert_schedule_repo.get_entries() if e["username"] == ITEM_SCOPE or e["username"] in known_users
+    ]
+    today = date.today()
+    rows = _build_rows(items, existing, today)
+    _restep(
+        [row for row in rows if row["username"] != ITEM_SCOPE],
+        {u["User"]: u for u in user_repo.get_all_users_for_notification() if u.get("User")},
+        today,
+    )
+    alert_schedule_repo.replace_entries(rows)
+    return len(rows)
+
+
+def ensure_schedule() -> None:
+    """排程表為空時（首次升級或資料還原後）建立一次"""
+    global _ensured
+    if _ensured:
+        return
+    with _ensure_lock:
+        if not _ensured:
+            if alert_schedule_repo.count() == 0:
+                rebuild_schedule()
+            _ensured = True
+
+
+def get_due_alerts(
+    users: Iterable[Dict[str, Any]],
+    now: Optional[datetime] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """取得使用者已到提醒時間的排程，並附上物品資料
+
+    讀取已到期的個人排程與進入提醒期間的物品排程，依物品目前的可見性與各使用者的提醒階梯展開；
+    使用者已有個人排程的項目以個人排程為準。展開的項目沒有 id，發送後由 mark_sent 建立個人排程。
+    """
+    from app.services.notification_service import _build_visibility_context, _is_visible_to
+
+    now = now or datetime.now()
+    today = now.date()
+    users = {u["User"]: u for u in users if u.get("User")}
+    if not users:
+        return {}
+    entries = alert_schedule_repo.get_due(list(users) + [ITEM_SCOPE], now)
+    if not entries:
+        return {}
+    shared = [e for e in entries if e["username"] == ITEM_SCOPE]
+    tracked = set()
+    if shared:
+        tracked = {
+            (e["username"], e["item_id"], e["kind"])
+            for e in alert_schedule_repo.get_entries(item_ids={e["item_id"] for e in shared}, usernames=list(users))
+        }
+    items = {
+        item["ItemID"]: item
+        for item in item_repo.find_items_by_ids({e["item_id"] for e in entries}, SCHEDULE_PROJECTION)
+    }
+    known_users, member_map = _build_visibility_context()
+    ladders = {username: user_ladder(user) for username, user in users.items()}
+
+    def wants(username: str, item: Dict[str, Any], kind: str) -> bool:
+        if kind == "maintenance" and not users[username].get("replacement_enabled", True):
+            return False
+        return _is_visible_to(item, username, member_map.get(username, {username}), known_users)
+
+    due_by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        item = items.get(entry["item_id"])
+        if item is None:
+            continue
+        if entry["username"] != ITEM_SCOPE:
+            if wants(entry["username"], item, entry["kind"]):
+                entry["item"] = item
+                due_by_user.setdefault(entry["username"], []).append(entry)
+            continue
+        for username in users:
+            if (username, entry["item_id"], entry["kind"]) in tracked or not wants(username, item, entry["kind"]):
+                continue
+            offset, alert_at = next_alert(entry["due_date"], ladders[username], None, today)
+            if alert_at is None or alert_at > now:
+                continue
+            due_by_user.setdefault(username, []).append(dict(
+                entry, id=None, username=username, next_offset=offset, next_alert_at=alert_at, item=item,
+            ))
+    return due_by_user
+
+
+def summarize_due(entries: List[Dict[str, Any]], today: Optional[date] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """將到期排程轉成通知內容使用的 expiry_info / replacement_info 結構"""
+    today = today or date.today()
+    expired: Dict[str, Dict[str, Any]] = {}
+    near: Dict[str, Dict[str, Any]] = {}
+    due: List[Dict[str, Any]] = []
+    upcoming: List[Dict[str, Any]] = []
+
+    for entry in entries:
+        item = entry["item"]
+        days_left = (entry["due_date"] - today).days
+        if entry["kind"] == "maintenance":
+            enriched = dict(item)
+            enriched["replacement_rule_name"] = entry.get("label") or ""
+            enriched["replacement_due_date"] = entry["due_date"].strftime("%Y-%m-%d")
+            if days_left <= 0:
+                enriched["days_overdue"] = abs(days_left)
+                due.append(enriched)
+            else:
+                enriched["days_left"] = days_left
+                upcoming.append(enriched)
+        elif days_left < 0:
+            near.pop(item["ItemID"], None)
+            expired[item["ItemID"]] = item
+        elif item["ItemID"] not in expired:
+            near[item["ItemID"]] = item
+
+    expiry_info = {
+        "expired": list(expired.values()),
+        "near_expiry": list(near.values()),
+        "expired_count": len(expired),
+        "near_count": len(near),
+        "total_alerts": len(expired) + len(near),
+    }
+    replacement_info = {
+        "enabled": True,
+        "due": due,
+        "upcoming": upcoming,
+        "total_alerts": len(due) + len(upcoming),
+    }
+    return expiry_info, replacement_info
+
+
+def mark_sent(
+    entries: List[Dict[str, Any]],
+    ladders: Dict[str, List[int]],
+    now: Optional[datetime] = None,
+) -> None:
+    """記錄已發送的階梯並推進到下一次提醒；由物品排程展開的項目在此建立個人排程"""
+    now = now or datetime.now()
+    updates = []
+    created = []
+    for entry in entries:
+        sent_offset = entry.get("next_offset")
+        ladder = ladders.get(entry["username"]) or user_ladder({})
+        offset, alert_at = next_alert(entry["due_date"], ladder, sent_offset, now.date())
+        state = {
+            "last_offset": sent_offset,
+            "last_sent_at": now,
+            "next_offset": offset,
+            "next_alert_at": alert_at,
+        }
+        if entry.get("id") is None:
+            created.append(dict(
+                state,
+                username=entry["username"],
+                item_id=entry["item_id"],
+                kind=entry["kind"],
+                label=entry.get("label") or "",
+                due_date=entry["due_date"],
+            ))
+        else:
+            updates.append(dict(state, id=entry["id"]))
+    alert_schedule_repo.advance(updates)
+    alert_schedule_repo.add_entries(created)
@@ -8,11 +8,24 @@ from typing import Any, Dict, List, Optional, Tuple
 from app.repositories import api_token_repo
 
 
-def _hash_token(token: str) -> str:
+def hash_token(token: str) -> str:
     """以 SHA-256 雜湊 token"""
     return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
+def is_expired(token_data: Dict[str, Any]) -> bool:
+    """檢查 token 是否已過期"""
+    expires_at = token_data.get("expires_at")
+    if not expires_at:
+        return False
+    if isinstance(expires_at, str):
+        try:
+            expires_at = datetime.fromisoformat(expires_at)
+        except ValueError:
+            return False
+    return expires_at < datetime.utcnow()
+
+
 def generate_token(
     user_id: str,
     name: str,
@@ -24,7 +37,7 @@ def generate_token(
     明文 token 只回傳一次，之後無法再取得。
     """
     plaintext = secrets.token_urlsafe(36)  # ~48 chars URL-safe
-    token_hash = _hash_token(plaintext)
+    token_hash = hash_token(plaintext)
     prefix = plaintext[:8]
     scopes_json = json.dumps(scopes) if scopes else None
 
@@ -46,7 +59,7 @@ def validate_token(token: str) -> Optional[Dict[str, Any]]:
     if not token:
         return None
 
-    token_hash = _hash_token(token)
+    token_hash = hash_token(token)
     token_data = api_token_repo.find_by_hash(token_hash)
     if not token_data:
         return None
@@ -54,16 +67,8 @@ def validate_token(token: str) -> Optional[Dict[str, Any]]:
     if not token_data.get("is_active"):
         return None
 
-    # 檢查是否過期
-    expires_at = token_data.get("expires_at")
-    if expires_at:
-        if isinstance(expires_at, str):
-            try:
-                expires_at = datetime.fromisoformat(expires_at)
-            except ValueError:
-                expires_at = None
-        if expires_at and expires_at < datetime.utcnow():
-            return None
+    if is_expired(token_data):
+        return None
 
     # 更新最後使用時間（非同步可接受，若失敗不影響驗證）
     try:
@@ -76,7 +81,11 @@ def validate_token(token: str) -> Optional[Dict[str, Any]]:
 
 def revoke_token(token_id, user_id: str) -> bool:
     """撤銷 token"""
-    return api_token_repo.revoke_token(token_id, user_id)
+    revoked = api_token_repo.revoke_token(token_id, user_id)
+    if revoked:
+        from app.utils.auth import invalidate_principal
+        invalidate_principal(token_id=token_id)
+    return revoked
 
 
 def list_user_tokens(user_id: str) -> List[Dict[str, Any]]:
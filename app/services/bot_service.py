@@ -0,0 +1,355 @@
+"""LINE / Telegram bot 回覆管線
+
+webhook 驗證簽章後只把事件寫入 bot_updates（以平台的 update_id / webhookEventId 去重）
+並立即回應；BotDispatcher 以固定大小的 worker pool 認領事件，交給各頻道註冊的處理函式
+查詢資料並回覆。對外呼叫共用每個頻道的 keep-alive 連線池，並以 token bucket 限制每個
+聊天室與每個頻道的發送速率，超過時延後處理而不佔住 worker。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.repositories import bot_update_repo
+
+BOT_TIMEOUT_SECONDS = 8
+BOT_MAX_WORKERS = int(os.environ.get("BOT_MAX_WORKERS", "4"))
+BOT_MAX_ATTEMPTS = int(os.environ.get("BOT_MAX_ATTEMPTS", "5"))
+BOT_RETRY_BASE_SECONDS = float(os.environ.get("BOT_RETRY_BASE_SECONDS", "2"))
+BOT_RETRY_MAX_SECONDS = 300
+BOT_POLL_SECONDS = float(os.environ.get("BOT_POLL_SECONDS", "2"))
+BOT_CLAIM_TIMEOUT_SECONDS = 120
+# 已處理 / 放棄的更新保留天數（平台重送只會在數分鐘內發生，保留期間仍可去重），由排程器每日清除
+BOT_UPDATE_RETENTION_DAYS = int(os.environ.get("BOT_UPDATE_RETENTION_DAYS", "7"))
+# 每個聊天室的發送速率（則/秒）與可突發的則數；Telegram 對單一聊天室約 1 則/秒
+BOT_CHAT_RATE = float(os.environ.get("BOT_CHAT_RATE", "1"))
+BOT_CHAT_BURST = int(os.environ.get("BOT_CHAT_BURST", "3"))
+# 每個頻道整體的發送速率（Telegram 全域約 30 則/秒）
+BOT_CHANNEL_RATE = float(os.environ.get("BOT_CHANNEL_RATE", "25"))
+
+
+class ReplyError(Exception):
+    """對外回覆失敗；permanent 代表重送也不會成功（例如 4xx），retry_after 為平台要求的等待秒數"""
+
+    def __init__(self, message: str, permanent: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.permanent = permanent
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------------------------
+# 對外呼叫
+# ---------------------------------------------------------------------------
+
+_SESSIONS: Dict[str, Any] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _session_for(channel: str):
+    """每個頻道共用一個 keep-alive 連線池（requests 於第一次發送時才載入）"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(channel)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, BOT_MAX_WORKERS))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSIONS[channel] = session
+        return session
+
+
+def api_post(channel: str, url: str, payload: dict, headers: Optional[Dict[str, str]] = None) -> Tuple[bool, dict]:
+    """POST JSON 到平台 API，回傳 (是否成功, 回應內容)；失敗時內容含 error / status"""
+    try:
+        resp = _session_for(channel).post(
+            url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", **(headers or {})},
+            timeout=BOT_TIMEOUT_SECONDS,
+        )
+    except Exception as exc:
+        return False, {"error": str(exc)}
+    try:
+        body = resp.json() if resp.content else {}
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {"result": body}
+    if resp.status_code < 400:
+        return True, body
+    body.setdefault("error", body.get("description") or body.get("message") or f"HTTP {resp.status_code}")
+    body["status"] = resp.status_code
+    retry_after = resp.headers.get("Retry-After") or (body.get("parameters") or {}).get("retry_after")
+    if retry_after is not None:
+        body["retry_after"] = retry_after
+    return False, body
+
+
+def raise_for_reply(ok: bool, body: dict) -> None:
+    """api_post 失敗時轉成 ReplyError：429 依平台要求延後，其他 4xx 不重試"""
+    if ok:
+        return
+    status = body.get("status")
+    retry_after = body.get("retry_after")
+    raise ReplyError(
+        str(body.get("error") or "reply failed"),
+        permanent=status is not None and 400 <= int(status) < 500 and int(status) != 429,
+        retry_after=float(retry_after) if retry_after is not None else None,
+    )
+
+
+class _RateLimiter:
+    """以 key 為單位的 token bucket；take() 回傳需等待的秒數（0 代表已取得）"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+
+# ---------------------------------------------------------------------------
+# 佇列與 dispatcher
+# ---------------------------------------------------------------------------
+
+_HANDLERS: Dict[str, Callable[[dict], None]] = {}
+
+
+def register_handler(channel: str, handler: Callable[[dict], None]) -> None:
+    """註冊頻道的處理函式（在 app context 中呼叫，回覆失敗時應拋出 ReplyError）"""
+    _HANDLERS[channel] = handler
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(BOT_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)), BOT_RETRY_MAX_SECONDS)
+
+
+class BotDispatcher:
+    """從 bot_updates 認領事件並以固定大小的 worker pool 處理"""
+
+    def __init__(self, app, max_workers: Optional[int] = None, poll_interval: Optional[float] = None,
+                 chat_rate: Optional[float] = None, chat_burst: Optional[int] = None):
+        self.app = app
+        self.max_workers = max(1, max_workers or BOT_MAX_WORKERS)
+        self.poll_interval = poll_interval if poll_interval is not None else BOT_POLL_SECONDS
+        self.chat_limiter = _RateLimiter(
+            BOT_CHAT_RATE if chat_rate is None else chat_rate,
+            BOT_CHAT_BURST if chat_burst is None else chat_burst,
+        )
+        self.channel_limiter = _RateLimiter(BOT_CHANNEL_RATE, max(1, int(BOT_CHANNEL_RATE)))
+        self.counters = {"processed": 0, "retried": 0, "dead": 0, "deferred": 0}
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bot")
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._idle = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="bot-dispatcher", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=True, cancel_futures=False)
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                self.app.logger.warning(f"bot dispatcher poll failed: {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # -- processing --------------------------------------------------------
+
+    def run_once(self) -> int:
+        """認領一批到期事件並交給 worker pool，回傳認領筆數"""
+        with self._lock:
+            capacity = self.max_workers * 2 - self._inflight
+        if capacity <= 0:
+            return 0
+        now = datetime.utcnow()
+        with self.app.app_context():
+            rows = bot_update_repo.claim_due_updates(
+                capacity,
+                uuid.uuid4().hex,
+                now,
+                now - timedelta(seconds=BOT_CLAIM_TIMEOUT_SECONDS),
+            )
+        for row in rows:
+            with self._lock:
+                self._inflight += 1
+            self._pool.submit(self._process, row)
+        return len(rows)
+
+    def drain(self, timeout: float = 30) -> bool:
+        """等待目前佇列中已到期的事件處理完畢（測試與關機使用）"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            claimed = self.run_once()
+            with self._idle:
+                if not claimed and self._inflight == 0:
+                    return True
+                self._idle.wait(0.05)
+        return False
+
+    def _process(self, row: Dict[str, Any]) -> None:
+        try:
+            with self.app.app_context():
+                self._process_row(row)
+        except Exception as e:
+            self.app.logger.warning(f"bot update {row.get('id')} failed: {e}")
+        finally:
+            with self._idle:
+                self._inflight -= 1
+                self._idle.notify_all()
+
+    def _process_row(self, row: Dict[str, Any]) -> None:
+        attempts = int(row.get("attempts") or 0)
+        channel = row["channel"]
+        handler = _HANDLERS.get(channel)
+        if handler is None:
+            bot_update_repo.complete_update(row["id"], "dead", attempts, error=f"no handler for {channel}")
+            self._count("dead")
+            return
+
+        wait = max(self.chat_limiter.take(f"{channel}:{row.get('chat_id') or ''}"),
+                   self.channel_limiter.take(channel))
+        if wait > 0:
+            # 超過速率：不計入嘗試次數，延後再處理，worker 立即釋放
+            bot_update_repo.complete_update(
+                row["id"], "pending", attempts,
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=wait),
+                error="rate limited",
+            )
+            self._count("deferred")
+            return
+
+        try:
+            handler(json.loads(row["payload"]))
+        except Exception as e:
+            attempts += 1
+            permanent = isinstance(e, ReplyError) and e.permanent
+            if permanent or attempts >= BOT_MAX_ATTEMPTS:
+                bot_update_repo.complete_update(row["id"], "dead", attempts, error=str(e))
+                self._count("dead")
+                return
+            delay = e.retry_after if isinstance(e, ReplyError) and e.retry_after else _retry_delay(attempts)
+            bot_update_repo.complete_update(
+                row["id"], "pending", attempts,
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+                error=str(e),
+            )
+            self._count("retried")
+            return
+        bot_update_repo.complete_update(row["id"], "done", attempts + 1)
+        self._count("processed")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+
+_dispatcher: Optional[BotDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher(app) -> BotDispatcher:
+    """啟動（或取得）本程序的 bot dispatcher"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = BotDispatcher(app)
+            _dispatcher.start()
+        return _dispatcher
+
+
+def wake_dispatcher() -> None:
+    """通知本程序已啟動的 dispatcher 有新事件
+
+    dispatcher 只在 worker 程序（run_worker.py）中啟動；web 程序只寫入 bot_updates 並立即回應，
+    不在 web 程序中執行處理函式。
+    """
+    dispatcher = _dispatcher
+    if dispatcher:
+        dispatcher.wake()
+
+
+def stop_dispatcher(timeout: float = 10) -> None:
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher:
+        dispatcher.stop(timeout)
+
+
+def enqueue(channel: str, update_key: str, chat_id: str, payload: Dict[str, Any]) -> bool:
+    """寫入待處理事件並喚醒 dispatcher；重送的事件（相同 update_key）回傳 False"""
+    inserted = bot_update_repo.enqueue_update(
+        channel, update_key, chat_id, json.dumps(payload, ensure_ascii=False)
+    )
+    if inserted:
+        wake_dispatcher()
+    return inserted
+
+
+def purge_finished(retention_days: int = BOT_UPDATE_RETENTION_DAYS) -> int:
+    """刪除超過保留天數的已處理 / 放棄更新，回傳刪除筆數"""
+    return bot_update_repo.purge_finished_updates(datetime.utcnow() - timedelta(days=retention_days))
+
+
+def get_metrics(include_queue: bool = True) -> Dict[str, Any]:
+    """佇列深度與處理統計；include_queue=False 時只讀記憶體中的 dispatcher 數值，不查資料庫"""
+    by_status = {}
+    if include_queue:
+        try:
+            by_status = bot_update_repo.count_by_status()
+        except Exception:
+            pass
+    dispatcher = _dispatcher
+    return {
+        "queue_depth": by_status.get("pending", 0) + by_status.get("inflight", 0),
+        "by_status": by_status,
+        "inflight": dispatcher.inflight if dispatcher else 0,
+        "counters": dict(dispatcher.counters) if dispatcher else {},
+    }
@@ -0,0 +1,228 @@
+"""行事曆服務模組
+
+行事曆事件只查詢可見區間內的日期（保固、使用期限、下次保養日、借出歸還），
+不再載入整個物品表。ICS 訂閱以使用者為單位快取，物品日期異動時才重新產生。
+訂閱 token 綁定使用者的 calendar_feed_secret，重設密鑰即可撤銷外流的訂閱網址。
+"""
+import hashlib
+import hmac
+import secrets
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.repositories import item_repo, loan_repo, user_repo
+
+# 一次查詢允許的最大天數，避免任意區間變成全表掃描
+MAX_RANGE_DAYS = 366
+# ICS 訂閱涵蓋的範圍（相對今天）
+FEED_PAST_DAYS = 30
+FEED_FUTURE_DAYS = 365
+FEED_CACHE_SECONDS = 24 * 3600
+FEED_TOKEN_SALT = "calendar-feed"
+
+_VERSION_KEY = "calendar:version"
+
+_ITEM_EVENT_TYPES = (
+    # (欄位, 事件類型, 顏色, 標籤)
+    ("WarrantyExpiry", "warranty", "red", "保固到期"),
+    ("UsageExpiry", "usage", "orange", "使用期限"),
+    ("MaintenanceDueDate", "maintenance", "blue", "保養到期"),
+)
+
+
+def parse_range(start: str, end: str) -> Tuple[date, date]:
+    """解析 YYYY-MM-DD 區間；格式錯誤或超過 MAX_RANGE_DAYS 時拋出 ValueError"""
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    if end_date < start_date:
+        raise ValueError("end before start")
+    if (end_date - start_date).days > MAX_RANGE_DAYS:
+        raise ValueError("range too large")
+    return start_date, end_date
+
+
+def month_range(month_str: str) -> Tuple[date, date]:
+    """YYYY-MM 轉為該月第一天與最後一天"""
+    year, month = int(month_str[:4]), int(month_str[5:7])
+    first_day = date(year, month, 1)
+    next_month = date(year + (month == 12), month % 12 + 1, 1)
+    return first_day, next_month - timedelta(days=1)
+
+
+def get_events(user: Dict[str, Any], start: date, end: date) -> List[Dict[str, Any]]:
+    """取得區間內對該使用者可見的行事曆事件，依日期排序"""
+    from app.services.notification_service import _build_visibility_context, _is_visible_to
+
+    items = item_repo.list_items_due_between(start, end)
+    if not user.get("admin") and items:
+        username = user.get("User", "")
+        known_users, member_map = _build_visibility_context()
+        members = member_map.get(username, {username})
+        items = [it for it in items if _is_visible_to(it, username, members, known_users)]
+
+    events: List[Dict[str, Any]] = []
+    for item in items:
+        for field, event_type, color, label in _ITEM_EVENT_TYPES:
+            if item.get(field):
+                events.append({
+                    "date": item[field],
+                    "type": event_type,
+                    "color": color,
+                    "label": f"{label}：{item.get('ItemName', '')}",
+                    "item_id": item.get("ItemID"),
+                })
+
+    for loan in loan_repo.get_open_loans_due_between(start, end):
+        events.append({
+            "date": str(loan["expected_return"])[:10],
+            "type": "loan_return",
+            "color": "green",
+            "label": f"借出歸還：{loan.get('item_name') or loan.get('item_id')}",
+            "item_id": loan.get("item_id"),
+        })
+
+    events.sort(key=lambda ev: (ev["date"], ev["type"], ev["item_id"] or ""))
+    return events
+
+
+def invalidate_feeds() -> None:
+    """物品日期或借出異動後呼叫，讓所有 ICS 快取在下次請求時重建"""
+    try:
+        from app import cache
+
+        cache.set(_VERSION_KEY, uuid.uuid4().hex, timeout=0)
+    except Exception:
+        pass
+
+
+def _feed_version() -> str:
+    from app import cache
+
+    version = cache.get(_VERSION_KEY)
+    if not version:
+        version = uuid.uuid4().hex
+        cache.set(_VERSION_KEY, version, timeout=0)
+    # 訂閱範圍隨日期移動，跨日也要重建
+    return f"{version}:{date.today().isoformat()}"
+
+
+def _escape(text: str) -> str:
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """RFC 5545：每行不超過 75 個位元組，續行以空白開頭"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts, current = [], ""
+    for char in line:
+        limit = 75 if not parts else 74
+        if len((current + char).encode("utf-8")) > limit:
+            parts.append(current)
+            current = char
+        else:
+            current += char
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def build_ics(events: List[Dict[str, Any]], stamp: Optional[datetime] = None) -> str:
+    """將事件轉為 iCalendar（全天事件）"""
+    stamp = (stamp or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Item Manage System//Calendar//ZH-TW",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        "X-WR-CALNAME:物品管理系統",
+    ]
+    for ev in events:
+        day = datetime.strptime(ev["date"], "%Y-%m-%d").date()
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{ev['type']}-{ev.get('item_id') or ''}-{day:%Y%m%d}@item-manage-system",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+            f"SUMMARY:{_escape(ev['label'])}",
+            f"CATEGORIES:{ev['type']}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+def get_ics_feed(user: Dict[str, Any]) -> Tuple[str, str]:
+    """取得使用者的 ICS 內容與 ETag；日期未異動時直接回傳快取"""
+    from app import cache
+
+    username = user.get("User", "")
+    version = _feed_version()
+    cache_key = f"calendar:ics:{username}"
+    cached = cache.get(cache_key)
+    if cached and cached.get("version") == version:
+        return cached["body"], cached["etag"]
+
+    today = date.today()
+    events = get_events(user, today - timedelta(days=FEED_PAST_DAYS), today + timedelta(days=FEED_FUTURE_DAYS))
+    body = build_ics(events)
+    etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    cache.set(cache_key, {"version": version, "body": body, "etag": etag}, timeout=FEED_CACHE_SECONDS)
+    return body, etag
+
+
+def _serializer():
+    from flask import current_app
+    from itsdangerous import URLSafeSerializer
+
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=FEED_TOKEN_SALT)
+
+
+def _secret_digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+def _feed_token(username: str, secret: str) -> str:
+    return _serializer().dumps({"u": username, "v": _secret_digest(secret)})
+
+
+def make_feed_token(username: str) -> str:
+    """產生訂閱網址用的簽章 token（行事曆 App 無法登入，以 token 識別使用者）
+
+    token 內含使用者訂閱密鑰的摘要；尚未有密鑰時先建立。
+    """
+    user = user_repo.find_by_username(username) or {}
+    secret = user.get("calendar_feed_secret")
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        user_repo.set_calendar_feed_secret(username, secret)
+    return _feed_token(username, secret)
+
+
+def reset_feed_token(username: str) -> str:
+    """換新訂閱密鑰讓舊網址全部失效，回傳新的 token"""
+    secret = secrets.token_urlsafe(32)
+    user_repo.set_calendar_feed_secret(username, secret)
+    return _feed_token(username, secret)
+
+
+def resolve_feed_token(token: str) -> Optional[Dict[str, Any]]:
+    """驗證訂閱 token，回傳對應的使用者；簽章錯誤或密鑰已重設時回傳 None"""
+    from itsdangerous import BadSignature
+
+    try:
+        claims = _serializer().loads(token)
+    except BadSignature:
+        return None
+    if not isinstance(claims, dict) or not claims.get("u") or not claims.get("v"):
+        return None
+    user = user_repo.find_by_username(claims["u"])
+    secret = (user or {}).get("calendar_feed_secret")
+    if not secret or not hmac.compare_digest(_secret_digest(secret), str(claims["v"])):
+        return None
+    return user
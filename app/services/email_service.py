@@ -1,8 +1,22 @@
-"""Email 通知服務模組"""
+"""Email 通知服務模組
+
+批次通知透過 SMTPSessionPool 重用已驗證的 SMTP 連線，避免每封信都重新
+進行 TLS 交握與登入；郵件內容範本在第一次使用時編譯並快取。
+"""
 import html as html_module
 import os
-from typing import List, Dict, Any, Optional
+import queue
+import smtplib
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from email.message import Message
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional
+
+from jinja2 import Environment, Template
 
 
 def _esc(value: Any) -> str:
@@ -16,6 +30,14 @@ MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "true").lower() == "true"
 MAIL_USERNAME = os.environ.get("MAIL_USERNAME", "")
 MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD", "")
 MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "")
+MAIL_TIMEOUT = float(os.environ.get("MAIL_TIMEOUT", "10"))
+# 單一連線最多發送的郵件數，超過即重新連線（多數 SMTP 服務限制每連線訊息數）
+MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", "100"))
+# 批次發送時同時開啟的 SMTP 連線上限
+MAIL_MAX_CONNECTIONS = int(os.environ.get("MAIL_MAX_CONNECTIONS", "4"))
+
+# 連線中斷或逾時可重新連線後重試；收件人被拒等錯誤重試也無效
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
 
 
 def is_email_configured() -> bool:
@@ -23,12 +45,194 @@ def is_email_configured() -> bool:
     return bool(MAIL_USERNAME and MAIL_PASSWORD)
 
 
+class SMTPDeliverySession:
+    """重用單一已驗證 SMTP 連線的發送工作階段
+
+    連線在第一次發送時建立；發送達 max_messages 封後重新連線，
+    連線中斷時自動重連並重試一次。
+    """
+
+    def __init__(self, max_messages: Optional[int] = None):
+        self.max_messages = max(1, max_messages or MAIL_BATCH_SIZE)
+        self.sent = 0
+        self.connects = 0
+        self._server: Optional[smtplib.SMTP] = None
+        self._sent_on_connection = 0
+
+    def __enter__(self) -> "SMTPDeliverySession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _connect(self) -> None:
+        self.close()
+        server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=MAIL_TIMEOUT)
+        try:
+            if MAIL_USE_TLS:
+                server.starttls()
+            server.login(MAIL_USERNAME, MAIL_PASSWORD)
+        except Exception:
+            _quit_quietly(server)
+            raise
+        self._server = server
+        self._sent_on_connection = 0
+        self.connects += 1
+
+    def send(self, msg: Message) -> None:
+        """發送一封郵件；失敗時拋出例外"""
+        for attempt in range(2):
+            if self._server is None or self._sent_on_connection >= self.max_messages:
+                self._connect()
+            try:
+                self._server.send_message(msg)
+            except smtplib.SMTPRecipientsRefused:
+                raise
+            except _RECONNECT_ERRORS:
+                self._drop()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._drop()
+                raise
+            self._sent_on_connection += 1
+            self.sent += 1
+            return
+
+    def _drop(self) -> None:
+        if self._server is not None:
+            server, self._server = self._server, None
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        if self._server is not None:
+            server, self._server = self._server, None
+            _quit_quietly(server)
+
+
+def _quit_quietly(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+class SMTPSessionPool:
+    """執行緒安全的 SMTP 工作階段池，供並行的批次通知共用連線"""
+
+    def __init__(self, size: Optional[int] = None, max_messages: Optional[int] = None):
+        self.size = max(1, size or MAIL_MAX_CONNECTIONS)
+        self.max_messages = max_messages
+        self._idle: "queue.LifoQueue[SMTPDeliverySession]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._sessions: List[SMTPDeliverySession] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SMTPSessionPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @contextmanager
+    def session(self) -> Iterator[SMTPDeliverySession]:
+        self._slots.acquire()
+        try:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = SMTPDeliverySession(self.max_messages)
+                with self._lock:
+                    self._sessions.append(session)
+            try:
+                yield session
+            finally:
+                self._idle.put(session)
+        finally:
+            self._slots.release()
+
+    def send(self, msg: Message) -> None:
+        with self.session() as session:
+            session.send(msg)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions = list(self._sessions)
+        return {
+            "sessions": len(sessions),
+            "connects": sum(s.connects for s in sessions),
+            "sent": sum(s.sent for s in sessions),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+
+def _deliver(msg: Message, pool: Optional[SMTPSessionPool] = None) -> None:
+    if pool is not None:
+        pool.send(msg)
+        return
+    with SMTPDeliverySession() as session:
+        session.send(msg)
+
+
+def _sender() -> str:
+    return MAIL_DEFAULT_SENDER or MAIL_USERNAME
+
+
+def build_expiry_message(
+    to_email: str,
+    expired_items: List[Dict[str, Any]],
+    near_expiry_items: List[Dict[str, Any]],
+    replacement_due: Optional[List[Dict[str, Any]]] = None,
+    replacement_upcoming: Optional[List[Dict[str, Any]]] = None,
+) -> MIMEMultipart:
+    """建立到期提醒郵件（純文字 + HTML）"""
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"🔔 物品通知摘要 - {datetime.now().strftime('%Y-%m-%d')}"
+    msg["From"] = _sender()
+    msg["To"] = to_email
+
+    # 純文字版本
+    text_content = generate_text_content(
+        expired_items,
+        near_expiry_items,
+        replacement_due=replacement_due,
+        replacement_upcoming=replacement_upcoming,
+    )
+
+    # HTML 版本
+    html_content = generate_html_content(
+        expired_items,
+        near_expiry_items,
+        replacement_due=replacement_due,
+        replacement_upcoming=replacement_upcoming,
+    )
+
+    msg.attach(MIMEText(text_content, "plain", "utf-8"))
+    msg.attach(MIMEText(html_content, "html", "utf-8"))
+    return msg
+
+
 def send_expiry_notification(
     to_email: str,
     expired_items: List[Dict[str, Any]],
     near_expiry_items: List[Dict[str, Any]],
     replacement_due: Optional[List[Dict[str, Any]]] = None,
     replacement_upcoming: Optional[List[Dict[str, Any]]] = None,
+    pool: Optional[SMTPSessionPool] = None,
 ) -> bool:
     """
     發送到期提醒 Email
@@ -37,6 +241,7 @@ def send_expiry_notification(
         to_email: 收件人 Email
         expired_items: 已過期物品列表
         near_expiry_items: 即將到期物品列表
+        pool: 批次發送時共用的 SMTP 工作階段池；未提供時單獨開一條連線
     
     回傳:
         是否發送成功
@@ -46,41 +251,14 @@ def send_expiry_notification(
         return False
     
     try:
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        # 建立郵件
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"🔔 物品通知摘要 - {datetime.now().strftime('%Y-%m-%d')}"
-        msg["From"] = MAIL_DEFAULT_SENDER or MAIL_USERNAME
-        msg["To"] = to_email
-        
-        # 純文字版本
-        text_content = generate_text_content(
-            expired_items,
-            near_expiry_items,
-            replacement_due=replacement_due,
-            replacement_upcoming=replacement_upcoming,
-        )
-        
-        # HTML 版本
-        html_content = generate_html_content(
+        msg = build_expiry_message(
+            to_email,
             expired_items,
             near_expiry_items,
             replacement_due=replacement_due,
             replacement_upcoming=replacement_upcoming,
         )
-        
-        msg.attach(MIMEText(text_content, "plain", "utf-8"))
-        msg.attach(MIMEText(html_content, "html", "utf-8"))
-        
-        # 發送郵件
-        with smtplib.SMTP(MAIL_SERVER, MAIL_PORT) as server:
-            if MAIL_USE_TLS:
-                server.starttls()
-            server.login(MAIL_USERNAME, MAIL_PASSWORD)
-            server.send_message(msg)
+        _deliver(msg, pool)
         
         print(f"✅ Email 發送成功: {to_email}")
         return True
@@ -90,252 +268,190 @@ def send_expiry_notification(
         return False
 
 
-def generate_text_content(
-    expired_items: List[Dict[str, Any]],
-    near_expiry_items: List[Dict[str, Any]],
-    replacement_due: Optional[List[Dict[str, Any]]] = None,
-    replacement_upcoming: Optional[List[Dict[str, Any]]] = None,
-) -> str:
-    """產生純文字內容"""
-    replacement_due = replacement_due or []
-    replacement_upcoming = replacement_upcoming or []
-    lines = [
-        "物品提醒",
-        "=" * 40,
-        "",
-    ]
-    
-    if expired_items:
-        lines.append(f"⚠️ 已過期物品 ({len(expired_items)} 項):")
-        lines.append("-" * 30)
-        for item in expired_items:
-            lines.append(f"  • {item.get('ItemName', '未知物品')}")
-            if item.get("WarrantyExpiry"):
-                lines.append(f"    保固到期: {item['WarrantyExpiry']}")
-            if item.get("UsageExpiry"):
-                lines.append(f"    使用期限: {item['UsageExpiry']}")
-            lines.append("")
-    
-    if near_expiry_items:
-        lines.append(f"⏰ 即將到期物品 ({len(near_expiry_items)} 項):")
-        lines.append("-" * 30)
-        for item in near_expiry_items:
-            lines.append(f"  • {item.get('ItemName', '未知物品')}")
-            if item.get("WarrantyExpiry"):
-                lines.append(f"    保固到期: {item['WarrantyExpiry']}")
-            if item.get("UsageExpiry"):
-                lines.append(f"    使用期限: {item['UsageExpiry']}")
-            lines.append("")
-
-    if replacement_due:
-        lines.append(f"🧺 需保養 / 更換 ({len(replacement_due)} 項):")
-        lines.append("-" * 30)
-        for item in replacement_due:
-            lines.append(f"  • {item.get('ItemName', '未知物品')}")
-            lines.append(f"    規則: {item.get('replacement_rule_name','')}")
-            lines.append(f"    下次保養日: {item.get('replacement_due_date','-')}")
-            lines.append(f"    已逾期 {item.get('days_overdue',0)} 天")
-        lines.append("")
-
-    if replacement_upcoming:
-        lines.append(f"⏳ 即將保養 / 更換 ({len(replacement_upcoming)} 項):")
-        lines.append("-" * 30)
-        for item in replacement_upcoming:
-            lines.append(f"  • {item.get('ItemName', '未知物品')}")
-            lines.append(f"    規則: {item.get('replacement_rule_name','')}")
-            lines.append(f"    下次保養日: {item.get('replacement_due_date','-')}")
-            lines.append(f"    剩餘 {item.get('days_left',0)} 天")
-        lines.append("")
-    
-    lines.extend([
-        "",
-        "請登入系統查看詳情並進行處理。",
-        "",
-        "---",
-        "此郵件由物品管理系統自動發送",
-    ])
-    
-    return "\n".join(lines)
+# ---------------------------------------------------------------------------
+# 郵件範本（模組載入後第一次使用時編譯，之後重複使用）
+# ---------------------------------------------------------------------------
 
+_TEXT_TEMPLATE = """\
+{% macro expiry_rows(items) %}
+{% for item in items %}
+  • {{ item.get('ItemName', '未知物品') }}
+{% if item.get('WarrantyExpiry') %}
+    保固到期: {{ item['WarrantyExpiry'] }}
+{% endif %}
+{% if item.get('UsageExpiry') %}
+    使用期限: {{ item['UsageExpiry'] }}
+{% endif %}
 
-def generate_html_content(
-    expired_items: List[Dict[str, Any]],
-    near_expiry_items: List[Dict[str, Any]],
-    replacement_due: Optional[List[Dict[str, Any]]] = None,
-    replacement_upcoming: Optional[List[Dict[str, Any]]] = None,
-) -> str:
-    """產生 HTML 內容"""
-    expired_rows = ""
-    replacement_due = replacement_due or []
-    replacement_upcoming = replacement_upcoming or []
-    for item in expired_items:
-        expired_rows += f"""
-        <tr>
-            <td style="padding: 12px; border-bottom: 1px solid #eee;">
-                <strong>{_esc(item.get('ItemName', '未知物品'))}</strong>
-            </td>
-            <td style="padding: 12px; border-bottom: 1px solid #eee;">
-                {_esc(item.get('WarrantyExpiry', '-'))}
-            </td>
-            <td style="padding: 12px; border-bottom: 1px solid #eee;">
-                {_esc(item.get('UsageExpiry', '-'))}
-            </td>
-        </tr>
-        """
-
-    near_rows = ""
-    for item in near_expiry_items:
-        near_rows += f"""
-        <tr>
-            <td style="padding: 12px; border-bottom: 1px solid #eee;">
-                <strong>{_esc(item.get('ItemName', '未知物品'))}</strong>
-            </td>
-            <td style="padding: 12px; border-bottom: 1px solid #eee;">
-                {_esc(item.get('WarrantyExpiry', '-'))}
-            </td>
-            <td style="padding: 12px; border-bottom: 1px solid #eee;">
-                {_esc(item.get('UsageExpiry', '-'))}
-            </td>
-        </tr>
-        """
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-    </head>
-    <body style="font-family: 'Noto Sans TC', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; border-radius: 10px 10px 0 0; text-align: center;">
-            <h1 style="margin: 0; font-size: 24px;">🔔 物品通知摘要</h1>
-            <p style="margin: 10px 0 0; opacity: 0.9;">{datetime.now().strftime('%Y年%m月%d日')}</p>
-        </div>
-        
-        <div style="background: #fff; padding: 30px; border: 1px solid #eee; border-top: none; border-radius: 0 0 10px 10px;">
-    """
-    
-    if expired_items:
-        html += f"""
+{% endfor %}
+{% endmacro %}
+{% macro replacement_rows(items, status) %}
+{% for item in items %}
+  • {{ item.get('ItemName', '未知物品') }}
+    規則: {{ item.get('replacement_rule_name', '') }}
+    下次保養日: {{ item.get('replacement_due_date', '-') }}
+    {{ status(item) }}
+{% endfor %}
+
+{% endmacro %}
+物品提醒
+========================================
+
+{% if expired_items %}
+⚠️ 已過期物品 ({{ expired_items|length }} 項):
+------------------------------
+{{ expiry_rows(expired_items) }}
+{%- endif %}
+{% if near_expiry_items %}
+⏰ 即將到期物品 ({{ near_expiry_items|length }} 項):
+------------------------------
+{{ expiry_rows(near_expiry_items) }}
+{%- endif %}
+{% if replacement_due %}
+🧺 需保養 / 更換 ({{ replacement_due|length }} 項):
+------------------------------
+{{ replacement_rows(replacement_due, overdue_label) }}
+{%- endif %}
+{% if replacement_upcoming %}
+⏳ 即將保養 / 更換 ({{ replacement_upcoming|length }} 項):
+------------------------------
+{{ replacement_rows(replacement_upcoming, left_label) }}
+{%- endif %}
+
+請登入系統查看詳情並進行處理。
+
+---
+此郵件由物品管理系統自動發送"""
+
+_CELL = 'style="padding: 12px; border-bottom: 1px solid #eee;"'
+
+_HTML_TEMPLATE = """\
+{% macro header_cell(label, color) %}<th style="padding: 12px; text-align: left; border-bottom: 2px solid {{ color }};">{{ label }}</th>{% endmacro %}
+{% macro section(title, color, background, headers) %}
             <div style="margin-bottom: 30px;">
-                <h2 style="color: #dc3545; font-size: 18px; margin-bottom: 15px;">
-                    ⚠️ 已過期物品 ({len(expired_items)} 項)
+                <h2 style="color: {{ color }}; font-size: 18px; margin-bottom: 15px;">
+                    {{ title }}
                 </h2>
                 <table style="width: 100%; border-collapse: collapse;">
                     <thead>
-                        <tr style="background: #fef2f2;">
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #dc3545;">物品名稱</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #dc3545;">保固到期</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #dc3545;">使用期限</th>
+                        <tr style="background: {{ background }};">
+{% for label in headers %}
+                            {{ header_cell(label, color) }}
+{% endfor %}
                         </tr>
                     </thead>
                     <tbody>
-                        {expired_rows}
+{{ caller() }}
                     </tbody>
                 </table>
             </div>
-        """
-    
-    if near_expiry_items:
-        html += f"""
-            <div style="margin-bottom: 30px;">
-                <h2 style="color: #ffc107; font-size: 18px; margin-bottom: 15px;">
-                    ⏰ 即將到期物品 ({len(near_expiry_items)} 項)
-                </h2>
-                <table style="width: 100%; border-collapse: collapse;">
-                    <thead>
-                        <tr style="background: #fffbeb;">
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #ffc107;">物品名稱</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #ffc107;">保固到期</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #ffc107;">使用期限</th>
+{% endmacro %}
+{% macro expiry_rows(items) %}
+{% for item in items %}
+                        <tr>
+                            <td CELL><strong>{{ item.get('ItemName', '未知物品') }}</strong></td>
+                            <td CELL>{{ item.get('WarrantyExpiry', '-') }}</td>
+                            <td CELL>{{ item.get('UsageExpiry', '-') }}</td>
                         </tr>
-                    </thead>
-                    <tbody>
-                        {near_rows}
-                    </tbody>
-                </table>
-            </div>
-        """
-
-    if replacement_due:
-        due_rows = "".join(
-            f"""
-            <tr>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">{_esc(item.get('ItemName','未知物品'))}</td>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">{_esc(item.get('replacement_rule_name',''))}</td>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">{_esc(item.get('replacement_due_date','-'))}</td>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">已逾期 {_esc(item.get('days_overdue',0))} 天</td>
-            </tr>
-            """
-            for item in replacement_due
-        )
-        html += f"""
-            <div style="margin-bottom: 30px;">
-                <h2 style="color: #0d6efd; font-size: 18px; margin-bottom: 15px;">
-                    🧺 需保養 / 更換 ({len(replacement_due)} 項)
-                </h2>
-                <table style="width: 100%; border-collapse: collapse;">
-                    <thead>
-                        <tr style="background: #eef4ff;">
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #0d6efd;">物品名稱</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #0d6efd;">規則</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #0d6efd;">下次保養日</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #0d6efd;">狀態</th>
+{% endfor %}
+{% endmacro %}
+{% macro replacement_rows(items, status) %}
+{% for item in items %}
+                        <tr>
+                            <td CELL>{{ item.get('ItemName', '未知物品') }}</td>
+                            <td CELL>{{ item.get('replacement_rule_name', '') }}</td>
+                            <td CELL>{{ item.get('replacement_due_date', '-') }}</td>
+                            <td CELL>{{ status(item) }}</td>
                         </tr>
-                    </thead>
-                    <tbody>
-                        {due_rows}
-                    </tbody>
-                </table>
-            </div>
-        """
-
-    if replacement_upcoming:
-        upcoming_rows = "".join(
-            f"""
-            <tr>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">{_esc(item.get('ItemName','未知物品'))}</td>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">{_esc(item.get('replacement_rule_name',''))}</td>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">{_esc(item.get('replacement_due_date','-'))}</td>
-                <td style=\"padding: 12px; border-bottom: 1px solid #eee;\">剩餘 {_esc(item.get('days_left',0))} 天</td>
-            </tr>
-            """
-            for item in replacement_upcoming
-        )
-        html += f"""
-            <div style="margin-bottom: 30px;">
-                <h2 style="color: #20c997; font-size: 18px; margin-bottom: 15px;">
-                    ⏳ 即將保養 / 更換 ({len(replacement_upcoming)} 項)
-                </h2>
-                <table style="width: 100%; border-collapse: collapse;">
-                    <thead>
-                        <tr style="background: #e8fff6;">
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #20c997;">物品名稱</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #20c997;">規則</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #20c997;">下次保養日</th>
-                            <th style="padding: 12px; text-align: left; border-bottom: 2px solid #20c997;">狀態</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {upcoming_rows}
-                    </tbody>
-                </table>
-            </div>
-        """
-    
-    html += """
-            <div style="text-align: center; margin-top: 30px;">
-                <p style="color: #666;">請登入系統查看詳情並進行處理</p>
-            </div>
-        </div>
-        
-        <div style="text-align: center; padding: 20px; color: #999; font-size: 12px;">
-            <p>此郵件由物品管理系統自動發送</p>
+{% endfor %}
+{% endmacro %}
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+</head>
+<body style="font-family: 'Noto Sans TC', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; border-radius: 10px 10px 0 0; text-align: center;">
+        <h1 style="margin: 0; font-size: 24px;">🔔 物品通知摘要</h1>
+        <p style="margin: 10px 0 0; opacity: 0.9;">{{ today }}</p>
+    </div>
+
+    <div style="background: #fff; padding: 30px; border: 1px solid #eee; border-top: none; border-radius: 0 0 10px 10px;">
+{% if expired_items %}
+{% call section('⚠️ 已過期物品 (%d 項)'|format(expired_items|length), '#dc3545', '#fef2f2', expiry_headers) %}{{ expiry_rows(expired_items) }}{% endcall %}
+{% endif %}
+{% if near_expiry_items %}
+{% call section('⏰ 即將到期物品 (%d 項)'|format(near_expiry_items|length), '#ffc107', '#fffbeb', expiry_headers) %}{{ expiry_rows(near_expiry_items) }}{% endcall %}
+{% endif %}
+{% if replacement_due %}
+{% call section('🧺 需保養 / 更換 (%d 項)'|format(replacement_due|length), '#0d6efd', '#eef4ff', replacement_headers) %}{{ replacement_rows(replacement_due, overdue_label) }}{% endcall %}
+{% endif %}
+{% if replacement_upcoming %}
+{% call section('⏳ 即將保養 / 更換 (%d 項)'|format(replacement_upcoming|length), '#20c997', '#e8fff6', replacement_headers) %}{{ replacement_rows(replacement_upcoming, left_label) }}{% endcall %}
+{% endif %}
+        <div style="text-align: center; margin-top: 30px;">
+            <p style="color: #666;">請登入系統查看詳情並進行處理</p>
         </div>
-    </body>
-    </html>
-    """
-    
-    return html
+    </div>
+
+    <div style="text-align: center; padding: 20px; color: #999; font-size: 12px;">
+        <p>此郵件由物品管理系統自動發送</p>
+    </div>
+</body>
+</html>""".replace("CELL", _CELL)
+
+
+@lru_cache(maxsize=None)
+def _template(kind: str) -> Template:
+    """取得已編譯的範本（每個程序只編譯一次）"""
+    env = Environment(autoescape=(kind == "html"), trim_blocks=True, lstrip_blocks=True)
+    source = _HTML_TEMPLATE if kind == "html" else _TEXT_TEMPLATE
+    return env.from_string(source)
+
+
+def _overdue_label(item: Dict[str, Any]) -> str:
+    return f"已逾期 {item.get('days_overdue', 0)} 天"
+
+
+def _left_label(item: Dict[str, Any]) -> str:
+    return f"剩餘 {item.get('days_left', 0)} 天"
+
+
+def generate_text_content(
+    expired_items: List[Dict[str, Any]],
+    near_expiry_items: List[Dict[str, Any]],
+    replacement_due: Optional[List[Dict[str, Any]]] = None,
+    replacement_upcoming: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """產生純文字內容"""
+    return _template("text").render(
+        expired_items=expired_items,
+        near_expiry_items=near_expiry_items,
+        replacement_due=replacement_due or [],
+        replacement_upcoming=replacement_upcoming or [],
+        overdue_label=_overdue_label,
+        left_label=_left_label,
+    )
+
+
+def generate_html_content(
+    expired_items: List[Dict[str, Any]],
+    near_expiry_items: List[Dict[str, Any]],
+    replacement_due: Optional[List[Dict[str, Any]]] = None,
+    replacement_upcoming: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """產生 HTML 內容（範本自動跳脫物品名稱等使用者輸入）"""
+    return _template("html").render(
+        today=datetime.now().strftime('%Y年%m月%d日'),
+        expired_items=expired_items,
+        near_expiry_items=near_expiry_items,
+        replacement_due=replacement_due or [],
+        replacement_upcoming=replacement_upcoming or [],
+        expiry_headers=("物品名稱", "保固到期", "使用期限"),
+        replacement_headers=("物品名稱", "規則", "下次保養日", "狀態"),
+        overdue_label=_overdue_label,
+        left_label=_left_label,
+    )
 
 
 def send_test_email(to_email: str) -> bool:
@@ -344,19 +460,12 @@ def send_test_email(to_email: str) -> bool:
         return False
     
     try:
-        import smtplib
-        from email.mime.text import MIMEText
-        
         msg = MIMEText("這是一封測試郵件，用於確認 Email 設定是否正確。")
         msg["Subject"] = "🔔 物品管理系統 - 測試郵件"
-        msg["From"] = MAIL_DEFAULT_SENDER or MAIL_USERNAME
+        msg["From"] = _sender()
         msg["To"] = to_email
         
-        with smtplib.SMTP(MAIL_SERVER, MAIL_PORT) as server:
-            if MAIL_USE_TLS:
-                server.starttls()
-            server.login(MAIL_USERNAME, MAIL_PASSWORD)
-            server.send_message(msg)
+        _deliver(msg)
         
         return True
     except Exception as e:
@@ -371,13 +480,9 @@ def send_email_verification(to_email: str, verify_url: str) -> bool:
         print(f"⚠️ Email 未設定，驗證連結: {verify_url}")
         return False
     try:
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-
         msg = MIMEMultipart("alternative")
         msg["Subject"] = "物品管理系統 - Email 驗證"
-        msg["From"] = MAIL_DEFAULT_SENDER or MAIL_USERNAME
+        msg["From"] = _sender()
         msg["To"] = to_email
 
         text_body = f"請點擊以下連結驗證您的 Email：\n{verify_url}\n\n連結有效期間不限，驗證後即可享有完整功能。"
@@ -389,11 +494,7 @@ def send_email_verification(to_email: str, verify_url: str) -> bool:
         msg.attach(MIMEText(text_body, "plain", "utf-8"))
         msg.attach(MIMEText(html_body, "html", "utf-8"))
 
-        with smtplib.SMTP(MAIL_SERVER, MAIL_PORT) as server:
-            if MAIL_USE_TLS:
-                server.starttls()
-            server.login(MAIL_USERNAME, MAIL_PASSWORD)
-            server.send_message(msg)
+        _deliver(msg)
         return True
     except Exception as e:
         print(f"❌ Email 驗證信發送失敗: {e}")
@@ -4,6 +4,12 @@ from typing import Any, Dict, List, Optional, Tuple
 from app.repositories import group_repo
 
 
+def _reschedule_alerts(username: str) -> None:
+    """群組成員異動後重新排程到期提醒"""
+    from app.services import alert_schedule_service
+    alert_schedule_service.users_changed([username])
+
+
 def create_group(name: str, owner: str) -> Tuple[bool, str, Any]:
     """建立群組，擁有者自動成為 admin 成員。回傳 (success, message, group_id)"""
     name = name.strip()
@@ -51,6 +57,7 @@ def invite_member(
         return False, f"{username} 已是群組成員"
 
     group_repo.add_member(group_id, username, role)
+    _reschedule_alerts(username)
     return True, f"已成功邀請 {username} 加入群組"
 
 
@@ -79,6 +86,7 @@ def remove_member(
 
     success = group_repo.remove_member(group_id, username)
     if success:
+        _reschedule_alerts(username)
         return True, f"已移除成員 {username}"
     return False, f"找不到成員 {username}"
 
@@ -88,6 +96,11 @@ def get_user_group_member_ids(username: str) -> set:
     return group_repo.get_user_group_member_ids(username)
 
 
+def get_group_member_map() -> Dict[str, set]:
+    """回傳 {username: 同群組成員集合}，未加入群組的使用者不會出現在結果中"""
+    return group_repo.get_group_member_map()
+
+
 def get_group_detail(group_id: int) -> Optional[Dict[str, Any]]:
     """取得群組詳細資訊，包含成員列表"""
     group = group_repo.get_group(group_id)
@@ -1,12 +1,16 @@
+import logging
+import math
 from datetime import date, datetime
-from typing import Any, Dict, List, Optional, Tuple
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from app.repositories import item_repo, type_repo
-from app.repositories import quantity_log_repo
 from app.services import group_service
 from app.utils import storage, image
 from app.validators import items as item_validator
 
+logger = logging.getLogger(__name__)
+
 
 ITEM_PROJECTION = {
     "_id": 0,
@@ -41,6 +45,30 @@ ITEM_PROJECTION = {
     "depreciation_rate": 1,
 }
 
+# 清單 / 搜尋頁只需要卡片上顯示與排序用的欄位，不載入 move_history、ItemPics 等大型 JSON 欄位
+ITEM_LIST_PROJECTION = {
+    key: value
+    for key, value in ITEM_PROJECTION.items()
+    if key not in {"ItemPics", "move_history", "related_items", "size_notes"}
+}
+ITEM_LIST_PROJECTION.update({"Quantity": 1, "SafetyStock": 1, "ReorderLevel": 1})
+
+# 資產報表需要的欄位（報表只顯示名稱、類別與價值，不載入圖片與位置欄位）
+ASSET_PROJECTION = {
+    "_id": 0,
+    "ItemID": 1,
+    "ItemName": 1,
+    "ItemType": 1,
+    "ItemGetDate": 1,
+    "purchase_price": 1,
+    "depreciation_method": 1,
+    "depreciation_rate": 1,
+    "currency": 1,
+}
+
+# 資產報表預估未來幾年的價值
+ASSET_SCHEDULE_YEARS = 10
+
 
 def get_maintenance_suggestion(item_name: str = "", item_type: str = "") -> Optional[Dict[str, Any]]:
     searchable_text = f"{(item_name or '').strip()} {(item_type or '').strip()}"
@@ -201,9 +229,10 @@ def list_items(
     page: int = 1,
     page_size: int = DEFAULT_PAGE_SIZE,
     current_username: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
-    查詢物品列表，支援分頁
+    查詢物品列表，支援分頁；projection 預設為 ITEM_LIST_PROJECTION
     
     回傳格式:
     {
@@ -226,7 +255,7 @@ def list_items(
         visibility=filters.get("visibility", ""),
         condition=filters.get("condition", ""),
     )
-    projection = ITEM_PROJECTION.copy()
+    projection = dict(projection or ITEM_LIST_PROJECTION)
     sort = None
     sort_param = filters.get("sort")
     if sort_param == "warranty":
@@ -265,6 +294,57 @@ def list_items(
     }
 
 
+def _stage_webhook_event(event_name: str, payload: Dict[str, Any]) -> None:
+    """在物品異動提交前將 webhook 事件寫入 outbox，兩者於同一交易提交
+
+    寫入失敗時回滾整個交易並往上拋出，物品異動不會在缺少事件的情況下單獨提交。
+    """
+    from app.services import webhook_service
+    try:
+        webhook_service.fire_event(event_name, payload, commit=False)
+    except Exception:
+        item_repo.rollback()
+        logger.exception("failed to stage webhook event %s for %s", event_name, payload.get("item_id"))
+        raise
+
+
+def _wake_webhook_dispatcher() -> None:
+    """物品異動提交後通知本程序的 dispatcher（只有 worker 程序有 dispatcher）"""
+    from app.services import webhook_service
+    webhook_service.wake_dispatcher()
+
+
+def _previous_owners(existing: Optional[Dict[str, Any]], updates: Dict[str, Any]) -> List[str]:
+    """更新會改變擁有者時回傳原擁有者，其推薦快照也要重算"""
+    old_owner = (existing or {}).get("ItemOwner")
+    if old_owner and "ItemOwner" in updates and updates["ItemOwner"] != old_owner:
+        return [old_owner]
+    return []
+
+
+def _mark_recommendations_stale(item_ids: List[str], previous_owners: Iterable[str] = ()) -> None:
+    """物品異動後讓擁有者（含轉移前的擁有者）的預算推薦於下次排程重算；失敗不影響物品操作本身"""
+    try:
+        from app.services import recommendation_service
+        recommendation_service.items_changed(item_ids, previous_owners)
+    except Exception:
+        item_repo.rollback()
+        logger.warning("failed to mark recommendations stale for items %s", item_ids, exc_info=True)
+
+
+def _refresh_due_dates(item_ids: List[str], previous_owners: Iterable[str] = ()) -> None:
+    """物品異動後更新到期提醒排程、讓行事曆訂閱快取與推薦失效；失敗不影響物品操作本身"""
+    try:
+        from app.services import alert_schedule_service
+        alert_schedule_service.reschedule_items(item_ids)
+    except Exception:
+        item_repo.rollback()
+        logger.warning("failed to reschedule alerts for items %s", item_ids, exc_info=True)
+    from app.services import calendar_service
+    calendar_service.invalidate_feeds()
+    _mark_recommendations_stale(item_ids, previous_owners)
+
+
 def create_item(form_data: Dict[str, Any], file_storage, extra_files=None) -> Tuple[bool, str]:
     valid_types = _filter_valid_types()
     from app.services import location_service
@@ -311,16 +391,13 @@ def create_item(form_data: Dict[str, Any], file_storage, extra_files=None) -> Tu
     if extra_pics:
         form_data["ItemPics"] = extra_pics
 
+    _stage_webhook_event("item.created", {
+        "item_id": form_data.get("ItemID", ""),
+        "item_name": form_data.get("ItemName", ""),
+    })
     item_repo.insert_item(form_data)
-
-    try:
-        from app.services import webhook_service
-        webhook_service.fire_event("item.created", {
-            "item_id": form_data.get("ItemID", ""),
-            "item_name": form_data.get("ItemName", ""),
-        })
-    except Exception:
-        pass
+    _wake_webhook_dispatcher()
+    _refresh_due_dates([form_data.get("ItemID", "")])
 
     return True, "物品新增成功"
 
@@ -345,6 +422,7 @@ def update_item_place(item_id: str, updates: Dict[str, Any]) -> None:
             item_repo.add_move_history(item_id, old_location, new_location)
     
     item_repo.update_item_by_id(item_id, updates)
+    _mark_recommendations_stale([item_id])
 
 
 def update_item(item_id: str, form_data: Dict[str, Any], file_storage=None, extra_files=None) -> Tuple[bool, str]:
@@ -419,16 +497,13 @@ def update_item(item_id: str, form_data: Dict[str, Any], file_storage=None, extr
         if _date_key in form_data and form_data[_date_key] == "":
             form_data[_date_key] = None
 
+    _stage_webhook_event("item.updated", {
+        "item_id": item_id,
+        "item_name": existing.get("ItemName", ""),
+    })
     item_repo.update_item_by_id(item_id, form_data)
-
-    try:
-        from app.services import webhook_service
-        webhook_service.fire_event("item.updated", {
-            "item_id": item_id,
-            "item_name": existing.get("ItemName", ""),
-        })
-    except Exception:
-        pass
+    _wake_webhook_dispatcher()
+    _refresh_due_dates([item_id], _previous_owners(existing, form_data))
 
     return True, "物品更新成功"
 
@@ -439,22 +514,30 @@ def delete_item(item_id: str) -> Tuple[bool, str]:
     if not existing:
         return False, "找不到該物品"
 
-    if item_repo.soft_delete_item(item_id):
-        try:
-            from app.services import webhook_service
-            webhook_service.fire_event("item.deleted", {
+    # 軟刪除成功才加入 item.deleted 事件，兩者同一交易提交；失敗則整個交易回滾
+    try:
+        deleted = item_repo.soft_delete_item(item_id, commit=False)
+        if deleted:
+            _stage_webhook_event("item.deleted", {
                 "item_id": item_id,
                 "item_name": existing.get("ItemName", ""),
             })
-        except Exception:
-            pass
-        return True, "物品已移至回收站"
-    return False, "刪除失敗"
+    except Exception:
+        item_repo.rollback()
+        raise
+    if not deleted:
+        item_repo.rollback()
+        return False, "刪除失敗"
+    item_repo.commit()
+    _wake_webhook_dispatcher()
+    _refresh_due_dates([item_id])
+    return True, "物品已移至回收站"
 
 
 def restore_item(item_id: str) -> Tuple[bool, str]:
     """M6: 從回收站還原物品"""
     if item_repo.restore_item_from_trash(item_id):
+        _refresh_due_dates([item_id])
         return True, "物品已還原"
     return False, "還原失敗"
 
@@ -517,91 +600,107 @@ def _annotate_expiry(items: List[Dict[str, Any]]) -> None:
             it[key] = status
 
 
-def get_expiring_items(days_threshold: int = 30, ladder: Optional[List[int]] = None) -> Dict[str, Any]:
+EXPIRY_PROJECTION = {
+    "_id": 0,
+    "ItemID": 1,
+    "ItemName": 1,
+    "ItemPic": 1,
+    "ItemThumb": 1,
+    "ItemStorePlace": 1,
+    "ItemType": 1,
+    "ItemOwner": 1,
+    "ItemFloor": 1,
+    "ItemRoom": 1,
+    "ItemZone": 1,
+    "visibility": 1,
+    "shared_with": 1,
+    "WarrantyExpiry": 1,
+    "UsageExpiry": 1,
+}
+
+
+def _expiry_scope(user: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """非管理員只看得到自己、shared_with 與同群組 shared 的物品（與到期通知相同規則）"""
+    if not user or user.get("admin"):
+        return None
+    from app.services.notification_service import _build_visibility_context
+
+    username = user.get("User", "")
+    known_users, member_map = _build_visibility_context()
+    return {"username": username, "members": member_map.get(username, {username}), "known_users": known_users}
+
+
+def get_expiring_items(
+    days_threshold: int = 30,
+    ladder: Optional[List[int]] = None,
+    user: Optional[Dict[str, Any]] = None,
+    page: int = 0,
+    page_size: int = 0,
+) -> Dict[str, Any]:
     """
-    取得即將到期和已過期的物品
-    
+    取得即將到期和已過期的物品（依最早到期日排序）
+
+    user 為非管理員時只回傳該使用者可見的物品；page_size > 0 時分頁，
+    expired / near_expiry 為該頁內容，計數則是全部符合的數量。
+
     回傳格式:
     {
         "expired": [...],       # 已過期物品
-        "near_expiry": [...],   # 即將到期物品（30天內）
+        "near_expiry": [...],   # 即將到期物品（days_threshold 天內）
         "expired_count": 數量,
         "near_count": 數量,
         "total_alerts": 總警報數量,
     }
     """
-    today = date.today()
-    today_str = today.strftime("%Y-%m-%d")
-    
     # 保留 ladder 參數以相容通知服務呼叫簽名。
     _ = ladder
-    
-    # 使用 DB 層級的優化查詢取得到期/即將到期物品
-    db_items = item_repo.get_expiring_items(days_threshold)
-    _annotate_expiry(db_items)
-    all_items = db_items
-    
+
+    page = max(1, page or 1)
+    skip = (page - 1) * page_size if page_size > 0 else 0
+    result = item_repo.list_expiring_items(
+        days_threshold,
+        scope=_expiry_scope(user),
+        projection=EXPIRY_PROJECTION,
+        skip=skip,
+        limit=page_size,
+    )
+    items = result["items"]
+    _annotate_expiry(items)
+
+    today = date.today()
     expired_items = []
     near_expiry_items = []
-    
-    for item in all_items:
-        warranty_status = item.get("WarrantyStatus", "none")
-        usage_status = item.get("UsageStatus", "none")
-        
+    for item in items:
         # 標記到期類型
         item["expiry_types"] = []
-        
-        if warranty_status == "expired":
-            item["expiry_types"].append("warranty_expired")
-        elif warranty_status == "near":
-            item["expiry_types"].append("warranty_near")
-            
-        if usage_status == "expired":
-            item["expiry_types"].append("usage_expired")
-        elif usage_status == "near":
-            item["expiry_types"].append("usage_near")
-        
-        # 分類
-        if warranty_status == "expired" or usage_status == "expired":
-            expired_items.append(item)
-        elif warranty_status == "near" or usage_status == "near":
-            near_expiry_items.append(item)
-    
-    # 按到期日期排序
-    def _normalize_expiry_value(val: Any) -> str:
-        if isinstance(val, datetime):
-            return val.date().strftime("%Y-%m-%d")
-        if isinstance(val, date):
-            return val.strftime("%Y-%m-%d")
-        if isinstance(val, str):
-            txt = val.strip()
-            if not txt:
-                return "9999-12-31"
+        for field, kind in (("WarrantyExpiry", "warranty"), ("UsageExpiry", "usage")):
             try:
-                return datetime.strptime(txt, "%Y-%m-%d").strftime("%Y-%m-%d")
+                days = (datetime.strptime(str(item.get(field) or "")[:10], "%Y-%m-%d").date() - today).days
             except ValueError:
-                return "9999-12-31"
-        return "9999-12-31"
-
-    def get_earliest_expiry(item):
-        dates = []
-        for field in ["WarrantyExpiry", "UsageExpiry"]:
-            val = item.get(field)
-            normalized = _normalize_expiry_value(val)
-            if normalized != "9999-12-31":
-                dates.append(normalized)
-        return min(dates) if dates else "9999-12-31"
-    
-    expired_items.sort(key=get_earliest_expiry)
-    near_expiry_items.sort(key=get_earliest_expiry)
-    
-    return {
+                continue
+            if days < 0:
+                item["expiry_types"].append(f"{kind}_expired")
+            elif days <= days_threshold:
+                item["expiry_types"].append(f"{kind}_near")
+        # 依最早到期日分類；查詢已依最早到期日排序
+        (expired_items if item["days_left"] < 0 else near_expiry_items).append(item)
+
+    expired_count = result["expired_count"]
+    near_count = result["total"] - expired_count
+    response = {
         "expired": expired_items,
         "near_expiry": near_expiry_items,
-        "expired_count": len(expired_items),
-        "near_count": len(near_expiry_items),
-        "total_alerts": len(expired_items) + len(near_expiry_items),
+        "expired_count": expired_count,
+        "near_count": near_count,
+        "total_alerts": result["total"],
     }
+    if page_size > 0:
+        response.update(
+            page=page,
+            page_size=page_size,
+            total_pages=max(1, (result["total"] + page_size - 1) // page_size),
+        )
+    return response
 
 
 DEFAULT_REPLACEMENT_RULES = {
@@ -637,6 +736,11 @@ def _parse_replacement_rules(raw_rules: Any) -> Dict[str, int]:
     return {**DEFAULT_REPLACEMENT_RULES, **parsed}
 
 
+def get_replacement_rules(settings: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """取得使用者設定合併預設值後的保養 / 更換規則（名稱 → 天數）"""
+    return _parse_replacement_rules((settings or {}).get("replacement_intervals"))
+
+
 def _match_default_keyword_rule(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     suggestion = get_maintenance_suggestion(item.get("ItemName", ""), item.get("ItemType", ""))
     if not suggestion:
@@ -647,7 +751,62 @@ def _match_default_keyword_rule(item: Dict[str, Any]) -> Optional[Dict[str, Any]
     }
 
 
+REPLACEMENT_PROJECTION = {
+    "_id": 0,
+    "ItemID": 1,
+    "ItemName": 1,
+    "ItemType": 1,
+    "ItemGetDate": 1,
+    "ItemOwner": 1,
+    "visibility": 1,
+    "shared_with": 1,
+    "size_notes": 1,
+    "MaintenanceCategory": 1,
+    "MaintenanceIntervalDays": 1,
+    "LastMaintenanceDate": 1,
+}
+
+
+def resolve_replacement_due(item: Dict[str, Any], rules: Dict[str, int]) -> Optional[Tuple[str, int, date]]:
+    """推算單一物品的保養 / 更換規則，回傳 (規則名稱, 間隔天數, 下次保養日)；無適用規則時回傳 None"""
+    name = str(item.get("ItemName") or "").strip()
+    if not name:
+        return None
+    got_date_raw = item.get("ItemGetDate")
+    if not isinstance(got_date_raw, str) or not got_date_raw:
+        return None
+    try:
+        got_date = datetime.strptime(got_date_raw, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+    matched_rule_name = name
+    base_date = got_date
+    explicit_maintenance = _extract_maintenance(item)
+    interval_days = explicit_maintenance.get("interval_days")
+    if interval_days:
+        matched_rule_name = explicit_maintenance.get("category") or "自訂保養"
+        last_date_raw = explicit_maintenance.get("last_date")
+        if last_date_raw:
+            try:
+                base_date = datetime.strptime(last_date_raw, "%Y-%m-%d").date()
+            except ValueError:
+                base_date = got_date
+    else:
+        interval_days = rules.get(name)
+    if interval_days is None:
+        default_rule = _match_default_keyword_rule(item)
+        if not default_rule:
+            return None
+        interval_days = int(default_rule["days"])
+        matched_rule_name = str(default_rule["rule_name"])
+
+    due_date = base_date.fromordinal(base_date.toordinal() + int(interval_days))
+    return matched_rule_name, int(interval_days), due_date
+
+
 def get_replacement_items(settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """計算保養 / 更換提醒"""
     settings = settings or {}
     enabled = bool(settings.get("replacement_enabled", True))
     if not enabled:
@@ -658,58 +817,18 @@ def get_replacement_items(settings: Optional[Dict[str, Any]] = None) -> Dict[str
             "total_alerts": 0,
         }
 
-    rules = _parse_replacement_rules(settings.get("replacement_intervals"))
-    projection = {
-        "_id": 0,
-        "ItemID": 1,
-        "ItemName": 1,
-        "ItemType": 1,
-        "ItemGetDate": 1,
-        "size_notes": 1,
-        "MaintenanceCategory": 1,
-        "MaintenanceIntervalDays": 1,
-        "LastMaintenanceDate": 1,
-    }
-    all_items = list(item_repo.list_items({}, projection))
+    rules = get_replacement_rules(settings)
+    all_items = list(item_repo.list_items({}, REPLACEMENT_PROJECTION))
     today = date.today()
     upcoming_window_days = 14
     due_items: List[Dict[str, Any]] = []
     upcoming_items: List[Dict[str, Any]] = []
 
     for item in all_items:
-        name = str(item.get("ItemName") or "").strip()
-        if not name:
+        resolved = resolve_replacement_due(item, rules)
+        if resolved is None:
             continue
-        got_date_raw = item.get("ItemGetDate")
-        if not isinstance(got_date_raw, str) or not got_date_raw:
-            continue
-        try:
-            got_date = datetime.strptime(got_date_raw, "%Y-%m-%d").date()
-        except ValueError:
-            continue
-
-        matched_rule_name = name
-        base_date = got_date
-        explicit_maintenance = _extract_maintenance(item)
-        interval_days = explicit_maintenance.get("interval_days")
-        if interval_days:
-            matched_rule_name = explicit_maintenance.get("category") or "自訂保養"
-            last_date_raw = explicit_maintenance.get("last_date")
-            if last_date_raw:
-                try:
-                    base_date = datetime.strptime(last_date_raw, "%Y-%m-%d").date()
-                except ValueError:
-                    base_date = got_date
-        else:
-            interval_days = rules.get(name)
-        if interval_days is None:
-            default_rule = _match_default_keyword_rule(item)
-            if not default_rule:
-                continue
-            interval_days = int(default_rule["days"])
-            matched_rule_name = str(default_rule["rule_name"])
-
-        due_date = base_date.fromordinal(base_date.toordinal() + int(interval_days))
+        matched_rule_name, interval_days, due_date = resolved
         days_left = (due_date - today).days
         enriched = dict(item)
         enriched["replacement_rule_name"] = matched_rule_name
@@ -795,12 +914,12 @@ def annotate_maintenance_alerts(items: List[Dict[str, Any]], settings: Optional[
             item["MaintenanceDaysLeft"] = days_left
 
 
-def get_notification_count() -> Dict[str, int]:
+def get_notification_count(user: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
     """
-    快速取得通知數量（用於導航欄顯示）
+    快速取得通知數量（用於導航欄顯示）；只取一筆，數量由查詢一併計算
     """
     try:
-        result = get_expiring_items()
+        result = get_expiring_items(user=user, page_size=1)
     except Exception:
         return {"expired": 0, "near": 0, "total": 0}
     return {
@@ -815,8 +934,11 @@ def get_stats() -> Dict[str, int]:
     return item_repo.get_stats()
 
 
-def get_all_items_for_export(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    return item_repo.get_all_items_for_export(filters=filters)
+def get_all_items_for_export(
+    filters: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    return item_repo.get_all_items_for_export(filters=filters, projection=projection)
 
 
 def import_items(items: List[Dict[str, Any]]) -> Tuple[int, int]:
@@ -826,6 +948,7 @@ def import_items(items: List[Dict[str, Any]]) -> Tuple[int, int]:
     """
     success = 0
     failed = 0
+    previous_owners: List[str] = []
     
     for item_data in items:
         try:
@@ -839,6 +962,7 @@ def import_items(items: List[Dict[str, Any]]) -> Tuple[int, int]:
             if existing:
                 # 更新現有物品
                 item_repo.update_item_by_id(item_data["ItemID"], item_data)
+                previous_owners.extend(_previous_owners(existing, item_data))
             else:
                 # 新增物品
                 item_repo.insert_item(item_data)
@@ -846,6 +970,7 @@ def import_items(items: List[Dict[str, Any]]) -> Tuple[int, int]:
         except Exception:
             failed += 1
     
+    _refresh_due_dates([item.get("ItemID", "") for item in items], previous_owners)
     return success, failed
 
 
@@ -857,7 +982,7 @@ def full_text_search(query: str, page: int = 1, page_size: int = 20) -> Dict[str
 
     Returns dict with 'items' list and 'total' count.
     """
-    result = item_repo.full_text_search(query, page=page, page_size=page_size)
+    result = item_repo.full_text_search(query, page=page, page_size=page_size, projection=ITEM_LIST_PROJECTION)
     _annotate_expiry(result["items"])
     _annotate_maintenance_fields(result["items"])
     return result
@@ -1011,9 +1136,68 @@ def bulk_move_items(item_ids: List[str], target_location: str) -> Tuple[int, Lis
         else:
             failed_ids.append(item_id)
             
+    _mark_recommendations_stale([i for i in item_ids if i not in failed_ids])
     return success_count, failed_ids
 
 
+QUANTITY_MESSAGES = {
+    "not_found": "找不到該物品",
+    "insufficient": "庫存不足",
+}
+
+
+def stock_status(quantity: int, safety_stock: int, reorder_level: int) -> str:
+    """依安全庫存與補貨門檻判斷庫存狀態：ok / low / critical"""
+    if reorder_level > 0 and quantity <= reorder_level:
+        return "critical"
+    if safety_stock > 0 and quantity <= safety_stock:
+        return "low"
+    return "ok"
+
+
+def adjust_quantities(
+    adjustments: List[Tuple[str, int]],
+    user: str = "",
+    reason: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """原子地套用一批 (物品 ID, 數量變化)，同一物品的多筆變化會先合併
+
+    數量不會小於 0：會讓數量變成負數的調整不套用，回傳 error="insufficient"。
+    PostgreSQL 下數量、數量日誌與 webhook 事件在同一個交易中提交。
+
+    Returns:
+        每個物品一筆：item_id、success、quantity、status、message
+    """
+    results = item_repo.apply_quantity_deltas(adjustments, user=user, reason=reason, commit=False)
+    try:
+        for r in results:
+            if r["ok"] and r["delta"]:
+                _stage_webhook_event("item.quantity.changed", {
+                    "item_id": r["item_id"],
+                    "item_name": r["item_name"],
+                    "old_quantity": r["old_quantity"],
+                    "new_quantity": r["new_quantity"],
+                    "delta": r["delta"],
+                })
+    except Exception:
+        item_repo.rollback()
+        raise
+    item_repo.commit()
+    _wake_webhook_dispatcher()
+    _mark_recommendations_stale([r["item_id"] for r in results if r["ok"] and r["delta"]])
+
+    return [
+        {
+            "item_id": r["item_id"],
+            "success": r["ok"],
+            "quantity": r["new_quantity"],
+            "status": stock_status(r["new_quantity"], r.get("SafetyStock", 0), r.get("ReorderLevel", 0)),
+            "message": f"數量已更新為 {r['new_quantity']}" if r["ok"] else QUANTITY_MESSAGES[r["error"]],
+        }
+        for r in results
+    ]
+
+
 def adjust_quantity(item_id: str, delta: int, user: str = "", reason: Optional[str] = None) -> Tuple[bool, int, str]:
     """調整物品數量
 
@@ -1026,40 +1210,8 @@ def adjust_quantity(item_id: str, delta: int, user: str = "", reason: Optional[s
     Returns:
         (成功與否, 新數量, 訊息)
     """
-    item = item_repo.find_item_by_id(item_id)
-    if not item:
-        return False, 0, "找不到該物品"
-
-    current_qty = item.get("Quantity", 0) or 0
-    new_qty = max(0, current_qty + delta)  # 不允許負數庫存
-
-    success = item_repo.update_item_field(item_id, "Quantity", new_qty)
-    if success:
-        try:
-            quantity_log_repo.insert_log(
-                item_id=item_id,
-                item_name=item.get("ItemName", ""),
-                user=user,
-                delta=new_qty - current_qty,
-                old_qty=current_qty,
-                new_qty=new_qty,
-                reason=reason,
-            )
-        except Exception:
-            pass
-        try:
-            from app.services import webhook_service
-            webhook_service.fire_event("item.quantity.changed", {
-                "item_id": item_id,
-                "item_name": item.get("ItemName", ""),
-                "old_quantity": current_qty,
-                "new_quantity": new_qty,
-                "delta": new_qty - current_qty,
-            })
-        except Exception:
-            pass
-        return True, new_qty, f"數量已更新為 {new_qty}"
-    return False, current_qty, "更新失敗"
+    result = adjust_quantities([(item_id, delta)], user=user, reason=reason)[0]
+    return result["success"], result["quantity"], result["message"]
 
 
 def get_low_stock_items() -> Dict[str, Any]:
@@ -1077,12 +1229,7 @@ def get_low_stock_items() -> Dict[str, Any]:
             "total_alerts": 總警報數量,
         }
     """
-    projection = ITEM_PROJECTION.copy()
-    projection["Quantity"] = 1
-    projection["SafetyStock"] = 1
-    projection["ReorderLevel"] = 1
-    
-    all_items = list(item_repo.list_items({}, projection))
+    all_items = list(item_repo.list_items({}, ITEM_LIST_PROJECTION))
     
     low_stock_items = []
     need_reorder_items = []
@@ -1153,9 +1300,30 @@ def bulk_update_quantity(updates: List[Dict[str, Any]]) -> Tuple[int, List[str]]
         except (ValueError, TypeError):
             failed_ids.append(item_id)
     
+    _mark_recommendations_stale([u.get("item_id") for u in updates if u.get("item_id") not in failed_ids])
     return success_count, failed_ids
 
 
+def _years_held(get_date_raw: Any, today: date) -> Optional[float]:
+    """購入至今的年數（不小於 0）；日期缺漏或格式錯誤時回傳 None"""
+    if not get_date_raw:
+        return None
+    try:
+        get_date = datetime.strptime(get_date_raw, "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        return None
+    return max(0.0, (today - get_date).days / 365.25)
+
+
+def _depreciated_value(price: float, rate: float, method: str, years: float) -> Optional[float]:
+    """未四捨五入、未限制下限的折舊後價值；不支援的折舊方法回傳 None"""
+    if method == "straight_line":
+        return price - (price * rate / 100 * years)
+    if method == "declining_balance":
+        return price * (max(0.0, 1 - rate / 100) ** years)
+    return None
+
+
 def calculate_current_value(item: Dict[str, Any]) -> Optional[float]:
     """Calculate current depreciated value of an item.
 
@@ -1168,83 +1336,164 @@ def calculate_current_value(item: Dict[str, Any]) -> Optional[float]:
     purchase_price = item.get("purchase_price")
     depreciation_rate = item.get("depreciation_rate")
     depreciation_method = item.get("depreciation_method") or ""
-    get_date_raw = item.get("ItemGetDate") or ""
 
-    if purchase_price is None or not depreciation_rate or not depreciation_method or not get_date_raw:
+    if purchase_price is None or not depreciation_rate or not depreciation_method:
         return None
 
     try:
         purchase_price = float(purchase_price)
         rate = float(depreciation_rate)
-        get_date = datetime.strptime(get_date_raw, "%Y-%m-%d").date()
     except (ValueError, TypeError):
         return None
 
-    today = date.today()
-    years = (today - get_date).days / 365.25
-    if years < 0:
-        years = 0
-
-    if depreciation_method == "straight_line":
-        value = purchase_price - (purchase_price * rate / 100 * years)
-    elif depreciation_method == "declining_balance":
-        value = purchase_price * ((1 - rate / 100) ** years)
-    else:
+    years = _years_held(item.get("ItemGetDate"), date.today())
+    if years is None:
         return None
 
+    value = _depreciated_value(purchase_price, rate, depreciation_method, years)
+    if value is None:
+        return None
     return max(0.0, round(value, 2))
 
 
-def get_asset_report() -> Dict[str, Any]:
-    """Return summary asset report for all items with purchase_price set.
+def value_assets(
+    items: Iterable[Dict[str, Any]],
+    today: Optional[date] = None,
+    horizon: int = ASSET_SCHEDULE_YEARS,
+) -> Dict[str, Any]:
+    """整批估算資產：一次迴圈算出每件物品現值、總計、類別小計與未來 1..horizon 年的價值預估。
 
-    Returns:
-        {
-            "total_purchase_value": float,
-            "total_current_value": float,
-            "depreciation_this_year": float,
-            "items_with_value": [...],  # sorted by current_value desc
-        }
+    算法與 calculate_current_value 相同，購入日期相同的物品共用解析結果；未來價值不逐物品逐年計算，
+    而是先依折舊型態分桶累加：
+    - 無折舊資料：價值固定
+    - 定率遞減：同一年折舊率的價值加總後乘上 (1 - rate) ** k
+    - 直線法：依「幾年後歸零」分桶，第 k 年只計入尚未歸零的桶，值為 Σ價值 - k × Σ年折舊額
+
+    沒有有效購入價格的物品會被略過；其餘物品就地加上 purchase_price（float）、
+    calculated_current_value 與 depreciation_amount 後放入 items_with_value。
     """
-    all_items = item_repo.get_all_items_for_export()
-    items_with_value = []
+    today = today or date.today()
+    years_cache: Dict[Any, Optional[float]] = {}
+    items_with_value: List[Dict[str, Any]] = []
+    by_category: Dict[str, List[float]] = {}
     total_purchase = 0.0
     total_current = 0.0
+    flat_total = 0.0
+    declining: Dict[float, float] = {}
+    line_value = [0.0] * (horizon + 2)
+    line_slope = [0.0] * (horizon + 2)
 
-    for item in all_items:
-        price = item.get("purchase_price")
-        if price is None:
-            continue
+    for item in items:
         try:
-            price = float(price)
+            price = float(item.get("purchase_price"))
         except (TypeError, ValueError):
             continue
 
-        calculated = calculate_current_value(item)
-        current = calculated if calculated is not None else price
-        depreciation_amount = round(price - current, 2)
-
-        enriched = dict(item)
-        enriched["purchase_price"] = price
-        enriched["calculated_current_value"] = current
-        enriched["depreciation_amount"] = depreciation_amount
-        items_with_value.append(enriched)
+        raw_value = None
+        rate = item.get("depreciation_rate")
+        method = item.get("depreciation_method")
+        if rate and method:
+            raw_date = item.get("ItemGetDate")
+            if raw_date in years_cache:
+                years = years_cache[raw_date]
+            else:
+                years = years_cache[raw_date] = _years_held(raw_date, today)
+            if years is not None:
+                try:
+                    rate = float(rate)
+                except (TypeError, ValueError):
+                    rate = 0.0
+                if rate:
+                    raw_value = _depreciated_value(price, rate, method, years)
+
+        if raw_value is None:
+            current = price
+            flat_total += price
+        else:
+            current = round(raw_value, 2) if raw_value > 0 else 0.0
+            if method == "declining_balance":
+                factor = max(0.0, 1 - rate / 100)
+                declining[factor] = declining.get(factor, 0.0) + raw_value
+            elif raw_value > 0:
+                slope = price * rate / 100
+                bucket = horizon + 1 if slope <= 0 else min(horizon + 1, math.ceil(raw_value / slope))
+                line_value[bucket] += raw_value
+                line_slope[bucket] += slope
+
+        item["purchase_price"] = price
+        item["calculated_current_value"] = current
+        item["depreciation_amount"] = round(price - current, 2)
+        items_with_value.append(item)
         total_purchase += price
         total_current += current
 
-    items_with_value.sort(key=lambda x: x.get("calculated_current_value", 0), reverse=True)
+        category = item.get("ItemType") or ""
+        totals = by_category.get(category)
+        if totals is None:
+            totals = by_category[category] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += price
+        totals[2] += current
+
+    schedule = []
+    for year in range(1, horizon + 1):
+        total = flat_total
+        total += sum(value * factor ** year for factor, value in declining.items())
+        total += sum(
+            line_value[bucket] - year * line_slope[bucket] for bucket in range(year + 1, horizon + 2)
+        )
+        schedule.append({
+            "year": year,
+            "calendar_year": today.year + year,
+            "value": round(max(0.0, total), 2),
+        })
 
-    # Depreciation this year: approximate as total_purchase * avg_rate / 100
-    depreciation_this_year = round(total_purchase - total_current, 2) if items_with_value else 0.0
+    categories = [
+        {
+            "category": name,
+            "count": count,
+            "purchase_value": round(purchase, 2),
+            "current_value": round(current, 2),
+            "depreciation_amount": round(purchase - current, 2),
+        }
+        for name, (count, purchase, current) in by_category.items()
+    ]
+    categories.sort(key=lambda c: c["current_value"], reverse=True)
 
     return {
         "total_purchase_value": round(total_purchase, 2),
         "total_current_value": round(total_current, 2),
-        "depreciation_this_year": depreciation_this_year,
         "items_with_value": items_with_value,
+        "by_category": categories,
+        "schedule": schedule,
     }
 
 
+def get_asset_report() -> Dict[str, Any]:
+    """Return summary asset report for all items with purchase_price set.
+
+    Returns:
+        {
+            "total_purchase_value": float,
+            "total_current_value": float,
+            "depreciation_this_year": float,
+            "items_with_value": [...],  # sorted by current_value desc
+            "by_category": [...],  # totals per ItemType, sorted by current_value desc
+            "schedule": [...],  # projected total value for the next ASSET_SCHEDULE_YEARS years
+        }
+    """
+    fields = [name for name, include in ASSET_PROJECTION.items() if include and name != "_id"]
+    report = value_assets(item_repo.list_asset_items(fields))
+    report["items_with_value"].sort(key=itemgetter("calculated_current_value"), reverse=True)
+
+    # Depreciation this year: approximate as total_purchase * avg_rate / 100
+    report["depreciation_this_year"] = (
+        round(report["total_purchase_value"] - report["total_current_value"], 2)
+        if report["items_with_value"] else 0.0
+    )
+    return report
+
+
 def bulk_update_last_maintenance(item_ids: List[str], maintenance_date: str) -> Tuple[int, List[str]]:
     """批量更新上次保養日"""
     success_count = 0
@@ -1271,6 +1520,7 @@ def bulk_update_last_maintenance(item_ids: List[str], maintenance_date: str) ->
         item_repo.update_item_by_id(item_id, updates)
         success_count += 1
 
+    _refresh_due_dates([i for i in item_ids if i not in failed_ids])
     return success_count, failed_ids
 
 
@@ -1447,100 +1697,8 @@ def get_item_versions(item_id: str) -> List[Dict[str, Any]]:
 
 
 def get_recommendations(user_id: str) -> List[Dict[str, Any]]:
-    """M30: 根據使用模式產生智慧推薦。"""
-    recommendations: List[Dict[str, Any]] = []
-    today = date.today()
-
-    try:
-        from app import get_db_type
-        db_type = get_db_type()
-
-        if db_type == "postgres":
-            from app.models.item import Item
-            items = Item.query.filter_by(ItemOwner=user_id, is_deleted=False).all()
-
-            for item in items:
-                # 1. Items with expired warranty → suggest renewal
-                if item.WarrantyExpiry and item.WarrantyExpiry < today:
-                    recommendations.append({
-                        "type": "warranty_expired",
-                        "icon": "fas fa-shield-alt",
-                        "color": "danger",
-                        "title": f"保固已過期：{item.ItemName}",
-                        "detail": f"保固於 {item.WarrantyExpiry} 到期",
-                        "item_id": item.ItemID,
-                        "item_name": item.ItemName,
-                    })
-
-                # 2. Low stock items → suggest reorder
-                if (item.ReorderLevel or 0) > 0 and (item.Quantity or 0) <= (item.ReorderLevel or 0):
-                    recommendations.append({
-                        "type": "low_stock",
-                        "icon": "fas fa-boxes",
-                        "color": "warning",
-                        "title": f"庫存不足：{item.ItemName}",
-                        "detail": f"目前庫存 {item.Quantity}，補貨門檻 {item.ReorderLevel}",
-                        "item_id": item.ItemID,
-                        "item_name": item.ItemName,
-                    })
-
-                # 3. Maintenance overdue → suggest maintenance
-                if item.MaintenanceIntervalDays and item.LastMaintenanceDate:
-                    from datetime import timedelta
-                    next_maintenance = item.LastMaintenanceDate + timedelta(days=item.MaintenanceIntervalDays)
-                    if next_maintenance <= today:
-                        recommendations.append({
-                            "type": "maintenance_overdue",
-                            "icon": "fas fa-screwdriver-wrench",
-                            "color": "info",
-                            "title": f"保養逾期：{item.ItemName}",
-                            "detail": f"應於 {next_maintenance} 前完成保養",
-                            "item_id": item.ItemID,
-                            "item_name": item.ItemName,
-                        })
-
-                # 4. Items not accessed in 6+ months → suggest declutter (based on get date)
-                if item.ItemGetDate:
-                    try:
-                        get_date = datetime.strptime(str(item.ItemGetDate), "%Y-%m-%d").date()
-                        months_owned = (today - get_date).days / 30
-                        if months_owned >= 6 and (item.Quantity or 0) == 0:
-                            recommendations.append({
-                                "type": "declutter",
-                                "icon": "fas fa-recycle",
-                                "color": "secondary",
-                                "title": f"考慮整理：{item.ItemName}",
-                                "detail": f"此物品已存放超過 {int(months_owned)} 個月且數量為零",
-                                "item_id": item.ItemID,
-                                "item_name": item.ItemName,
-                            })
-                    except (ValueError, TypeError):
-                        pass
-
-        else:
-            # MongoDB fallback – basic implementation
-            from app import mongo
-            cursor = mongo.db.items.find(
-                {"ItemOwner": user_id, "is_deleted": {"$ne": True}},
-                {"ItemID": 1, "ItemName": 1, "Quantity": 1, "ReorderLevel": 1,
-                 "WarrantyExpiry": 1, "MaintenanceIntervalDays": 1, "LastMaintenanceDate": 1},
-            )
-            for item in cursor:
-                qty = item.get("Quantity") or 0
-                reorder = item.get("ReorderLevel") or 0
-                if reorder > 0 and qty <= reorder:
-                    recommendations.append({
-                        "type": "low_stock",
-                        "icon": "fas fa-boxes",
-                        "color": "warning",
-                        "title": f"庫存不足：{item.get('ItemName', '')}",
-                        "detail": f"目前庫存 {qty}",
-                        "item_id": item.get("ItemID", ""),
-                        "item_name": item.get("ItemName", ""),
-                    })
-
-    except Exception:
-        pass
+    """M30: 根據使用模式產生智慧推薦（由排程器預先計算，見 recommendation_service）。"""
+    from app.services import recommendation_service
 
-    return recommendations[:10]
+    return recommendation_service.get_recommendations(user_id)
 
@@ -0,0 +1,143 @@
+"""標籤圖片服務模組
+
+QR / 條碼圖片只依內容（種類、編碼字串、尺寸、格式）決定，因此以內容雜湊為 key
+快取在磁碟上，同一台主機的所有 worker 共用。大量列印時缺少的圖片交給有上限的
+process pool 平行產生，頁面只引用快取網址而非內嵌 base64。
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+KINDS = ("qr", "barcode")
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+# 列印標籤尺寸對應的 QR 模組像素
+QR_BOX_SIZES = {"small": 4, "medium": 6, "large": 8}
+DEFAULT_QR_BOX_SIZE = 10
+# 內容只由雜湊決定，瀏覽器與標籤機可長期快取
+CACHE_MAX_AGE = 365 * 24 * 3600
+# 超過此數量的缺圖才啟用 process pool，少量時直接在本程序產生較快
+LABEL_POOL_THRESHOLD = int(os.environ.get("LABEL_POOL_THRESHOLD", "32"))
+LABEL_RENDER_WORKERS = int(os.environ.get("LABEL_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# (kind, payload, size, fmt)
+LabelSpec = Tuple[str, str, int, str]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def item_payload(item_id: str) -> str:
+    """物品 QR 碼內容（掃描後由前端解析 item: 前綴）"""
+    return f"item:{item_id}"
+
+
+def image_key(kind: str, payload: str, size: int, fmt: str = "png") -> str:
+    """圖片內容的雜湊，作為快取檔名與網址"""
+    raw = f"{kind}\x00{payload}\x00{size}\x00{fmt}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def render(kind: str, payload: str, size: int, fmt: str = "png") -> bytes:
+    """產生圖片位元組；為模組層級函式，可在 process pool 中執行"""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown label format: {fmt}")
+    buf = BytesIO()
+    if kind == "qr":
+        import qrcode
+
+        qr = qrcode.QRCode(box_size=size or DEFAULT_QR_BOX_SIZE, border=4)
+        qr.add_data(payload)
+        qr.make(fit=True)
+        if fmt == "svg":
+            # 向量輸出，不需點陣化；列印時任意縮放都清晰
+            from qrcode.image.svg import SvgPathImage
+
+            qr.make_image(image_factory=SvgPathImage).save(buf)
+        else:
+            qr.make_image().save(buf, format="PNG")
+    elif kind == "barcode":
+        import barcode
+        from barcode.writer import ImageWriter, SVGWriter
+
+        writer = SVGWriter() if fmt == "svg" else ImageWriter()
+        barcode.get("code128", payload, writer=writer).write(buf)
+    else:
+        raise ValueError(f"unknown label kind: {kind}")
+    return buf.getvalue()
+
+
+def _cache_dir() -> Path:
+    from flask import current_app
+
+    path = Path(current_app.config["LABEL_CACHE_DIR"])
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def cached_path(key: str, fmt: str = "png") -> Path:
+    return _cache_dir() / key[:2] / f"{key}.{fmt}"
+
+
+def _store(path: Path, data: bytes) -> None:
+    """先寫暫存檔再改名，避免其他 worker 讀到寫一半的檔案"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def get_image(kind: str, payload: str, size: int, fmt: str = "png") -> Tuple[Path, str]:
+    """取得（必要時產生）圖片，回傳快取檔路徑與 key"""
+    key = image_key(kind, payload, size, fmt)
+    path = cached_path(key, fmt)
+    if not path.exists():
+        _store(path, render(kind, payload, size, fmt))
+    return path, key
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+
+            # spawn：避免在多執行緒的 web worker 中 fork
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, LABEL_RENDER_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def ensure_images(specs: Iterable[LabelSpec]) -> Dict[LabelSpec, str]:
+    """確保所有圖片都已在快取中，回傳 spec → key；缺圖多時以 process pool 平行產生"""
+    keys: Dict[LabelSpec, str] = {}
+    missing: List[Tuple[LabelSpec, Path]] = []
+    for spec in dict.fromkeys(specs):
+        key = image_key(*spec)
+        keys[spec] = key
+        path = cached_path(key, spec[3])
+        if not path.exists():
+            missing.append((spec, path))
+
+    if len(missing) > LABEL_POOL_THRESHOLD and LABEL_RENDER_WORKERS > 1:
+        chunksize = max(1, len(missing) // (LABEL_RENDER_WORKERS * 4))
+        rendered = _get_pool().map(render, *zip(*[spec for spec, _ in missing]), chunksize=chunksize)
+    else:
+        rendered = (render(*spec) for spec, _ in missing)
+
+    for (spec, path), data in zip(missing, rendered):
+        _store(path, data)
+    return keys
@@ -3,6 +3,7 @@ from typing import Any, Dict, List, Optional, Tuple
 from datetime import date, datetime
 
 from app.repositories import loan_repo
+from app.services import calendar_service
 
 
 def lend_item(
@@ -50,6 +51,7 @@ def lend_item(
     }
 
     loan_id = loan_repo.create_loan(data)
+    calendar_service.invalidate_feeds()
     return True, "借出記錄已建立", loan_id
 
 
@@ -57,6 +59,7 @@ def return_item(loan_id: int) -> Tuple[bool, str]:
     """標記物品已歸還"""
     success = loan_repo.return_loan(loan_id)
     if success:
+        calendar_service.invalidate_feeds()
         return True, "已標記為歸還"
     return False, "找不到借出記錄"
 
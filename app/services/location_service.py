@@ -1,7 +1,6 @@
 from typing import List, Dict, Any, Tuple, Optional
 
 from app.repositories import location_repo
-from bson import ObjectId
 from app import get_db_type
 
 
@@ -22,6 +21,21 @@ def list_choices() -> Tuple[List[str], List[str], List[str]]:
     return floors, rooms, zones
 
 
+def get_hierarchy() -> Dict[str, Any]:
+    """樓層 → 房間 → 區域 階層（含各層物品數），以及級聯選單的查表與 etag"""
+    return location_repo.get_hierarchy()
+
+
+def cascade_options(floor: str = "", room: str = "") -> Dict[str, List[str]]:
+    """級聯選單：依樓層取房間，或依房間取區域"""
+    hierarchy = get_hierarchy()
+    if floor:
+        return {"rooms": hierarchy["rooms_by_floor"].get(floor, [])}
+    if room:
+        return {"zones": hierarchy["zones_by_room"].get(room, [])}
+    return {"rooms": [], "zones": []}
+
+
 def create_location(doc: Dict[str, Any]) -> Tuple[bool, str]:
     """建立新位置選項，回傳 (成功, 訊息)"""
     # 檢查是否有至少一個欄位
@@ -41,6 +55,8 @@ def create_location(doc: Dict[str, Any]) -> Tuple[bool, str]:
 
 
 def delete_location(loc_id: str) -> None:
+    from bson import ObjectId
+
     try:
         oid = ObjectId(loc_id)
     except Exception:
@@ -49,6 +65,8 @@ def delete_location(loc_id: str) -> None:
 
 
 def update_location(loc_id: str, doc: Dict[str, Any]) -> None:
+    from bson import ObjectId
+
     try:
         oid = ObjectId(loc_id)
     except Exception:
@@ -58,6 +76,8 @@ def update_location(loc_id: str, doc: Dict[str, Any]) -> None:
 
 def update_order(order_list: List[Dict[str, Any]]) -> None:
     """更新位置排序"""
+    from bson import ObjectId
+
     for item in order_list:
         try:
             oid = ObjectId(item.get("id"))
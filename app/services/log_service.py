@@ -1,9 +1,29 @@
-"""操作日誌服務模組"""
+"""操作日誌服務模組
+
+日誌只追加不修改，因此先排入程序內佇列，由背景執行緒依筆數或時間間隔批次寫入；
+程序結束時會清空佇列。設定 ACTIVITY_LOG_STRICT=true 時每個請求結束前同步寫入。
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import deque
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 from app.repositories import log_repo
 
+logger = logging.getLogger(__name__)
+
+# false 時每筆日誌直接同步寫入（舊行為）
+ACTIVITY_LOG_BUFFERED = os.environ.get("ACTIVITY_LOG_BUFFERED", "true").lower() == "true"
+# true 時在請求結束前寫完該程序佇列中的日誌
+ACTIVITY_LOG_STRICT = os.environ.get("ACTIVITY_LOG_STRICT", "false").lower() == "true"
+ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get("ACTIVITY_LOG_BATCH_SIZE", "200"))
+ACTIVITY_LOG_FLUSH_MS = int(os.environ.get("ACTIVITY_LOG_FLUSH_MS", "500"))
+# 佇列上限；寫入端跟不上時新日誌會被丟棄並計數
+ACTIVITY_LOG_MAX_PENDING = int(os.environ.get("ACTIVITY_LOG_MAX_PENDING", "10000"))
+
 
 # 操作類型常量
 ACTION_CREATE = "create"
@@ -28,8 +48,167 @@ def log_action(
         "item_id": item_id,
         "item_name": item_name,
         "details": details or {},
+        "created_at": datetime.now(),
     }
-    log_repo.insert_log(log_entry)
+    if not ACTIVITY_LOG_BUFFERED:
+        log_repo.insert_logs([log_entry])
+        return
+    _get_buffer().append(log_entry)
+
+
+class ActivityLogBuffer:
+    """操作日誌寫入緩衝：達批次筆數或間隔時間即以單次多列寫入送出"""
+
+    def __init__(
+        self,
+        app=None,
+        batch_size: int = ACTIVITY_LOG_BATCH_SIZE,
+        flush_ms: int = ACTIVITY_LOG_FLUSH_MS,
+        max_pending: int = ACTIVITY_LOG_MAX_PENDING,
+    ):
+        self.app = app
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_ms) / 1000
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        # 同時只允許一個 flush，確保日誌依排入順序寫入
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "failed_batches": 0}
+
+    def start(self) -> "ActivityLogBuffer":
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._loop, name="activity-log-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止背景執行緒並寫完剩餘日誌"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def append(self, entry: Dict[str, Any]) -> bool:
+        """排入一筆日誌；佇列已滿時丟棄並回傳 False"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.counters["dropped"] += 1
+                return False
+            # 第二個欄位為已嘗試寫入次數
+            self._pending.append((entry, 0))
+            self.counters["enqueued"] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """把目前佇列中的日誌全部寫出，回傳寫入筆數"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return written
+                if not self._write(batch):
+                    return written
+                written += len(batch)
+
+    def _write(self, batch) -> bool:
+        entries = [entry for entry, _ in batch]
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    log_repo.insert_logs(entries)
+            else:
+                log_repo.insert_logs(entries)
+        except Exception as e:
+            logger.warning("activity log flush failed: %s", e)
+            self._requeue(batch)
+            return False
+        with self._lock:
+            self.counters["written"] += len(batch)
+            self.counters["batches"] += 1
+        return True
+
+    def _requeue(self, batch) -> None:
+        """寫入失敗的批次放回佇列前端重試一次，第二次失敗即丟棄"""
+        with self._lock:
+            self.counters["failed_batches"] += 1
+            retry = [(entry, attempts + 1) for entry, attempts in batch if attempts == 0]
+            room = max(0, self.max_pending - len(self._pending))
+            kept = retry[:room]
+            self._pending.extendleft(reversed(kept))
+            self.counters["dropped"] += len(batch) - len(kept)
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, "pending": len(self._pending)}
+
+
+_buffer: Optional[ActivityLogBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def _get_buffer() -> ActivityLogBuffer:
+    """取得本程序的日誌緩衝，第一次使用時綁定目前的 app 並啟動背景寫入"""
+    global _buffer
+    if _buffer is None:
+        from flask import current_app
+
+        with _buffer_lock:
+            if _buffer is None:
+                buffer = ActivityLogBuffer(app=current_app._get_current_object())
+                buffer.start()
+                atexit.register(buffer.stop)
+                _buffer = buffer
+    return _buffer
+
+
+def flush_pending() -> int:
+    """同步寫出尚在佇列中的日誌"""
+    return _buffer.flush() if _buffer is not None else 0
+
+
+def shutdown() -> None:
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.stop()
+
+
+def get_buffer_stats() -> Dict[str, Any]:
+    """佇列長度、已寫入與丟棄筆數"""
+    if _buffer is None:
+        return {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "failed_batches": 0, "pending": 0}
+    return _buffer.stats()
+
+
+def flush_on_teardown(exc=None) -> None:
+    """ACTIVITY_LOG_STRICT 模式下於請求結束時呼叫"""
+    try:
+        flush_pending()
+    except Exception as e:
+        logger.warning("activity log flush at request end failed: %s", e)
 
 
 def log_item_create(user: str, item_id: str, item_name: str) -> None:
@@ -114,21 +293,25 @@ def log_export(user: str, format: str, count: int) -> None:
 
 def get_recent_logs(limit: int = 50) -> List[Dict[str, Any]]:
     """取得最近的操作日誌"""
+    flush_pending()
     return log_repo.list_logs(limit=limit)
 
 
 def get_item_history(item_id: str) -> List[Dict[str, Any]]:
     """取得物品的操作歷史"""
+    flush_pending()
     return log_repo.get_item_logs(item_id)
 
 
 def get_user_logs(username: str, limit: int = 50) -> List[Dict[str, Any]]:
     """取得使用者的操作日誌"""
+    flush_pending()
     return log_repo.list_logs({"user": username}, limit=limit)
 
 
 def get_logs_paginated(page: int = 1, page_size: int = 20) -> Dict[str, Any]:
     """分頁取得操作日誌"""
+    flush_pending()
     total = log_repo.count_logs()
     total_pages = max(1, (total + page_size - 1) // page_size)
     page = max(1, min(page, total_pages))
@@ -0,0 +1,88 @@
+"""上傳圖片服務模組
+
+列表頁的每張縮圖原本都要依檔名查一次物品確認權限。頁面產生網址時已經過可見性
+過濾，因此改在網址上附加短效簽章（綁定檔名與登入者），驗證時不需查資料庫；
+沒有簽章的請求才退回以索引欄位查詢。檔案可交給前端代理以 X-Accel-Redirect 送出。
+"""
+import mimetypes
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+from app.repositories import item_repo
+
+MEDIA_SIGNATURE_SALT = "uploads"
+
+
+def _ttl() -> int:
+    from flask import current_app
+
+    return max(60, int(current_app.config.get("MEDIA_URL_TTL", 3600)))
+
+
+def _signer():
+    from flask import current_app
+    from itsdangerous import Signer
+
+    return Signer(current_app.config["SECRET_KEY"], salt=MEDIA_SIGNATURE_SALT)
+
+
+def _signed_value(filename: str, username: str, expires: int) -> bytes:
+    return f"{filename}\x00{username}\x00{expires}".encode("utf-8")
+
+
+def signed_params(filename: str, username: str, now: Optional[float] = None) -> Dict[str, Any]:
+    """產生網址參數；到期時間對齊 TTL 區間，同一區間內網址不變，瀏覽器快取才有效"""
+    ttl = _ttl()
+    expires = (int(now if now is not None else time.time()) // ttl + 2) * ttl
+    signature = _signer().get_signature(_signed_value(filename, username, expires)).decode("ascii")
+    return {"e": expires, "s": signature}
+
+
+def verify_signature(filename: str, username: str, expires: Any, signature: Any,
+                     now: Optional[float] = None) -> bool:
+    if not username or not expires or not signature:
+        return False
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < (now if now is not None else time.time()):
+        return False
+    return _signer().verify_signature(_signed_value(filename, username, expires), str(signature).encode("ascii"))
+
+
+def can_access(user: Dict[str, Any], filename: str) -> bool:
+    """無簽章時的權限檢查：私人物品的圖片只有擁有者與被分享者可看"""
+    if user.get("admin"):
+        return True
+    item = item_repo.find_item_by_media(filename)
+    if not item:
+        return True
+    if (item.get("visibility") or "private") != "private":
+        return True
+    username = user.get("User", "")
+    return item.get("ItemOwner", "") == username or username in (item.get("shared_with") or [])
+
+
+def send_media(filename: str):
+    """送出上傳檔案；設定 MEDIA_ACCEL_REDIRECT 時只回傳標頭，由 nginx 送檔並處理 ETag / 304"""
+    from flask import abort, current_app, send_from_directory
+    from werkzeug.security import safe_join
+
+    folder = current_app.config["UPLOAD_FOLDER"]
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    ttl = _ttl()
+    accel_prefix = current_app.config.get("MEDIA_ACCEL_REDIRECT")
+    if accel_prefix:
+        response = current_app.response_class()
+        response.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{quote(filename)}"
+        response.mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    else:
+        response = send_from_directory(folder, filename, max_age=ttl)
+    response.headers["Cache-Control"] = f"private, max-age={ttl}"
+    return response
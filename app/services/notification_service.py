@@ -1,8 +1,11 @@
 """通知服務模組"""
-import json
-from typing import Dict, Any, List
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, date, timedelta
-from urllib import request as urlrequest
 
 from flask import current_app
 
@@ -10,7 +13,16 @@ from app import get_db_type
 from app.repositories import user_repo
 from app.services import item_service
 from app.services import email_service
+from app.services import alert_schedule_service
 from app.models import LineUserLink, TelegramUserLink
+from app.utils import metrics
+
+# 批次通知的並行發送上限與聊天通道逾時秒數
+NOTIFY_MAX_WORKERS = int(os.environ.get("NOTIFY_MAX_WORKERS", "16"))
+CHAT_TIMEOUT_SECONDS = 8
+
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
 
 
 def _parse_reminder_ladder(value):
@@ -42,46 +54,70 @@ def _build_plain_notification_text(expiry_info: Dict[str, Any], replacement_info
     return "\n".join(lines)
 
 
-def _line_push(line_user_id: str, text: str) -> bool:
-    token = current_app.config.get("LINE_CHANNEL_ACCESS_TOKEN", "")
+def _http_session():
+    """取得共用的 HTTP session（keep-alive 連線池，供通知 worker 共用）"""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        with _HTTP_SESSION_LOCK:
+            if _HTTP_SESSION is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=NOTIFY_MAX_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+
+def _post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> bool:
+    try:
+        resp = _http_session().post(url, json=payload, headers=headers or {}, timeout=CHAT_TIMEOUT_SECONDS)
+        return resp.ok
+    except Exception:
+        return False
+
+
+def _line_push(line_user_id: str, text: str, token: Optional[str] = None) -> bool:
+    if token is None:
+        token = current_app.config.get("LINE_CHANNEL_ACCESS_TOKEN", "")
     if not token or not line_user_id:
         return False
-    req = urlrequest.Request(
-        url="https://api.line.me/v2/bot/message/push",
-        data=json.dumps(
-            {
-                "to": line_user_id,
-                "messages": [{"type": "text", "text": text[:1000]}],
-            }
-        ).encode("utf-8"),
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}",
+    return _post_json(
+        "https://api.line.me/v2/bot/message/push",
+        {
+            "to": line_user_id,
+            "messages": [{"type": "text", "text": text[:1000]}],
         },
-        method="POST",
+        headers={"Authorization": f"Bearer {token}"},
     )
-    try:
-        with urlrequest.urlopen(req, timeout=8):
-            return True
-    except Exception:
-        return False
 
 
-def _telegram_send(chat_id: str, text: str) -> bool:
-    token = current_app.config.get("TELEGRAM_BOT_TOKEN", "")
+def _telegram_send(chat_id: str, text: str, token: Optional[str] = None) -> bool:
+    if token is None:
+        token = current_app.config.get("TELEGRAM_BOT_TOKEN", "")
     if not token or not chat_id:
         return False
-    req = urlrequest.Request(
-        url=f"https://api.telegram.org/bot{token}/sendMessage",
-        data=json.dumps({"chat_id": chat_id, "text": text[:4000]}).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
+    return _post_json(
+        f"https://api.telegram.org/bot{token}/sendMessage",
+        {"chat_id": chat_id, "text": text[:4000]},
     )
-    try:
-        with urlrequest.urlopen(req, timeout=8):
-            return True
-    except Exception:
-        return False
+
+
+def _load_chat_targets(usernames: Iterable[str], channels: set[str]) -> Dict[str, Dict[str, List[str]]]:
+    """一次載入多位使用者的 LINE / Telegram 綁定，回傳 {channel: {username: [target_id]}}"""
+    targets: Dict[str, Dict[str, List[str]]] = {"line": {}, "telegram": {}}
+    names = list(usernames)
+    if get_db_type() != "postgres" or not names:
+        return targets
+    if "line" in channels:
+        for link in LineUserLink.query.filter(LineUserLink.user_id.in_(names)).all():
+            targets["line"].setdefault(link.user_id, []).append(link.line_user_id)
+    if "telegram" in channels:
+        for link in TelegramUserLink.query.filter(TelegramUserLink.user_id.in_(names)).all():
+            targets["telegram"].setdefault(link.user_id, []).append(link.chat_id)
+    return targets
 
 
 def _send_chat_notifications(username: str, channels: set[str], text: str) -> Dict[str, bool]:
@@ -97,101 +133,269 @@ def _send_chat_notifications(username: str, channels: set[str], text: str) -> Di
     return status
 
 
+def _record_channel_result(stats: Dict[str, Dict[str, Any]], channel: str, ok: bool, elapsed_ms: float) -> None:
+    entry = stats.setdefault(channel, {"sent": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0})
+    entry["sent" if ok else "failed"] += 1
+    entry["total_ms"] += elapsed_ms
+    entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+
+def _finalize_channel_stats(stats: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    for entry in stats.values():
+        attempts = entry["sent"] + entry["failed"]
+        entry["avg_ms"] = round(entry["total_ms"] / attempts, 2) if attempts else 0.0
+        entry["total_ms"] = round(entry["total_ms"], 2)
+        entry["max_ms"] = round(entry["max_ms"], 2)
+    return stats
+
+
+def _days_until_expiry(item: Dict[str, Any], today: date) -> Optional[int]:
+    """回傳物品最近一個尚未過期日期距今的天數"""
+    days = []
+    for field in ("WarrantyExpiry", "UsageExpiry"):
+        val = item.get(field)
+        if isinstance(val, datetime):
+            val = val.date()
+        elif isinstance(val, str) and val.strip():
+            try:
+                val = datetime.strptime(val.strip(), "%Y-%m-%d").date()
+            except ValueError:
+                continue
+        if isinstance(val, date) and val >= today:
+            days.append((val - today).days)
+    return min(days) if days else None
+
+
+def _is_visible_to(item: Dict[str, Any], username: str, group_members: set, known_users: set) -> bool:
+    """判斷物品提醒是否屬於該使用者。
+
+    擁有者本人、shared_with 名單，以及同群組成員的 shared 物品可見；
+    未填擁有者或擁有者不是系統帳號的物品視為家庭共用，所有人都會收到。
+    """
+    owner = item.get("ItemOwner") or ""
+    if not owner or owner not in known_users:
+        return True
+    if owner == username or username in (item.get("shared_with") or []):
+        return True
+    return (item.get("visibility") or "private") == "shared" and owner in group_members
+
+
+def _build_visibility_context() -> Tuple[set, Dict[str, set]]:
+    from app.services import group_service, user_service
+
+    known_users = {u.get("User") for u in user_service.list_users() if u.get("User")}
+    return known_users, group_service.get_group_member_map()
+
+
+def _scope_alerts(
+    username: str,
+    settings: Dict[str, Any],
+    expiry_info: Dict[str, Any],
+    replacement_info: Dict[str, Any],
+    known_users: set,
+    member_map: Dict[str, set],
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """將整批計算的提醒依擁有者與群組可見性切分給單一使用者"""
+    today = date.today()
+    notify_days = settings.get("notify_days") or 30
+    members = member_map.get(username, {username})
+
+    def visible(item: Dict[str, Any]) -> bool:
+        return _is_visible_to(item, username, members, known_users)
+
+    expired = [it for it in expiry_info["expired"] if visible(it)]
+    near = [
+        it for it in expiry_info["near_expiry"]
+        if visible(it) and (_days_until_expiry(it, today) or 0) <= notify_days
+    ]
+    due = [it for it in replacement_info["due"] if visible(it)]
+    upcoming = [it for it in replacement_info["upcoming"] if visible(it)]
+
+    scoped_expiry = {
+        "expired": expired,
+        "near_expiry": near,
+        "expired_count": len(expired),
+        "near_count": len(near),
+        "total_alerts": len(expired) + len(near),
+    }
+    scoped_replacement = {
+        "enabled": replacement_info.get("enabled", True),
+        "due": due,
+        "upcoming": upcoming,
+        "total_alerts": len(due) + len(upcoming),
+    }
+    return scoped_expiry, scoped_replacement
+
+
+def _alerts_for_user(
+    username: str,
+    settings: Dict[str, Any],
+    expiry_info: Dict[str, Any],
+    replacement_info: Dict[str, Any],
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """單一使用者的提醒切分（手動發送與摘要頁使用）"""
+    from app.services import group_service, user_service
+
+    known_users = {u.get("User") for u in user_service.list_users() if u.get("User")}
+    member_map = {username: group_service.get_user_group_member_ids(username)}
+    return _scope_alerts(username, settings, expiry_info, replacement_info, known_users, member_map)
+
+
+def _deliver_all(tasks: List[Tuple[str, str, Callable[[], bool]]]) -> Tuple[Dict[str, Dict[str, bool]], Dict[str, Dict[str, Any]]]:
+    """以固定大小的 worker pool 執行發送工作。
+
+    tasks 為 (username, channel, send_fn) 列表；回傳每位使用者的通道結果與通道統計。
+    """
+    outcomes: Dict[str, Dict[str, bool]] = {}
+    stats: Dict[str, Dict[str, Any]] = {}
+
+    def run(task):
+        username, channel, send_fn = task
+        started = time.perf_counter()
+        try:
+            ok = bool(send_fn())
+        except Exception:
+            ok = False
+        return username, channel, ok, (time.perf_counter() - started) * 1000
+
+    if not tasks:
+        return outcomes, stats
+
+    workers = max(1, min(NOTIFY_MAX_WORKERS, len(tasks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notify") as pool:
+        for username, channel, ok, elapsed_ms in pool.map(run, tasks):
+            user_status = outcomes.setdefault(username, {})
+            user_status[channel] = user_status.get(channel, False) or ok
+            _record_channel_result(stats, channel, ok, elapsed_ms)
+            metrics.record_notification(channel, ok, elapsed_ms / 1000)
+    return outcomes, stats
+
+
 def check_and_send_notifications() -> Dict[str, Any]:
     """
     檢查並發送到期通知
-    
+
+    到期與保養提醒由 alert_schedules 排程驅動：只讀取已到提醒時間的項目，
+    發送成功後依各使用者的提醒階梯推進，不會重複提醒；
+    各通道訊息透過固定大小的 worker pool、共用 HTTP 連線池與 SMTP 工作階段池並行發送。
+
     回傳:
         {
             "success_users": 成功發送的用戶數量,
             "failed_users": 失敗的用戶數量,
             "total_notifications": 總通知數,
-            "details": 用戶詳細資訊列表
+            "details": 用戶詳細資訊列表,
+            "channel_stats": 各通道發送 / 失敗次數與耗時 (ms)
         }
     """
     today = date.today()
     today_str = today.strftime("%Y-%m-%d")
-    
+    current_time = datetime.now().strftime("%H:%M")
+
     # 取得所有啟用通知的使用者
     users = user_repo.get_all_users_for_notification()
-    
+
     results = {
         "success_users": 0,
         "failed_users": 0,
         "total_notifications": 0,
         "details": [],
+        "channel_stats": {},
     }
-    
+
+    pending = []
     for user in users:
         username = user.get("User")
-        user_email = user.get("email", "")
-        notify_days = user.get("notify_days", 30)
-        notify_time = user.get("notify_time", "09:00")
-        notify_channels = user.get("notify_channels", []) or ["email"]
-        reminder_ladder = user.get("reminder_ladder")
-        last_notification_date = user.get("last_notification_date", "")
-        
         user_result = {
             "username": username,
-            "email": user_email,
+            "email": user.get("email", ""),
             "sent": False,
             "reason": "",
             "items_count": 0,
         }
-        
+        results["details"].append(user_result)
+
         if not username:
             user_result["reason"] = "找不到使用者"
-            results["details"].append(user_result)
             continue
-        
+
         # 檢查今天是否已發送通知
-        if last_notification_date == today_str:
+        if user.get("last_notification_date", "") == today_str:
             user_result["reason"] = "今日已發送通知"
-            results["details"].append(user_result)
             continue
 
         # 檢查是否到達通知時間
-        current_time = datetime.now().strftime("%H:%M")
-        if current_time < notify_time:
+        if current_time < (user.get("notify_time") or "09:00"):
             user_result["reason"] = "尚未到達通知時間"
-            results["details"].append(user_result)
             continue
-        
-        expiry_info = item_service.get_expiring_items(
-            days_threshold=notify_days,
-            ladder=_parse_reminder_ladder(reminder_ladder),
-        )
-        replacement_info = item_service.get_replacement_items(user)
+
+        pending.append((user, user_result))
+
+    if not pending:
+        return results
+
+    # 只讀取已到提醒時間的排程，而非每次重新掃描所有物品
+    alert_schedule_service.ensure_schedule()
+    due_by_user = alert_schedule_service.get_due_alerts(user for user, _ in pending)
+
+    line_token = current_app.config.get("LINE_CHANNEL_ACCESS_TOKEN", "")
+    telegram_token = current_app.config.get("TELEGRAM_BOT_TOKEN", "")
+    all_channels = set()
+    for user, _ in pending:
+        all_channels.update(user.get("notify_channels") or ["email"])
+    chat_targets = _load_chat_targets((user["User"] for user, _ in pending), all_channels)
+
+    tasks: List[Tuple[str, str, Callable[[], bool]]] = []
+    planned = []
+    # 整批郵件共用少量已登入的 SMTP 連線，而非每封信重新交握
+    smtp_pool = email_service.SMTPSessionPool()
+    for user, user_result in pending:
+        username = user["User"]
+        notify_channels = set(user.get("notify_channels") or ["email"])
+
+        entries = due_by_user.get(username, [])
+        expiry_info, replacement_info = alert_schedule_service.summarize_due(entries, today)
         total_alerts = expiry_info["total_alerts"] + replacement_info["total_alerts"]
-        
+
         if total_alerts == 0:
             user_result["reason"] = "無到期或保養提醒"
-            results["details"].append(user_result)
             continue
-        
-        # 發送通知
-        sent = False
+
+        if "email" in notify_channels and user.get("email"):
+            tasks.append((username, "email", functools.partial(
+                email_service.send_expiry_notification,
+                to_email=user["email"],
+                expired_items=expiry_info["expired"],
+                near_expiry_items=expiry_info["near_expiry"],
+                replacement_due=replacement_info["due"],
+                replacement_upcoming=replacement_info["upcoming"],
+                pool=smtp_pool,
+            )))
+        text = _build_plain_notification_text(expiry_info, replacement_info)
+        if "line" in notify_channels:
+            for target in chat_targets["line"].get(username, []):
+                tasks.append((username, "line", functools.partial(_line_push, target, text, line_token)))
+        if "telegram" in notify_channels:
+            for target in chat_targets["telegram"].get(username, []):
+                tasks.append((username, "telegram", functools.partial(_telegram_send, target, text, telegram_token)))
+        planned.append((username, user_result, total_alerts, user, entries))
+
+    try:
+        outcomes, stats = _deliver_all(tasks)
+    finally:
+        smtp_pool.close()
+    results["channel_stats"] = _finalize_channel_stats(stats)
+
+    sent_entries = []
+    ladders = {}
+    for username, user_result, total_alerts, user, entries in planned:
         channel_status = {"email": False, "line": False, "telegram": False}
-        if "email" in notify_channels:
-            if user_email:
-                channel_status["email"] = email_service.send_expiry_notification(
-                    to_email=user_email,
-                    expired_items=expiry_info["expired"],
-                    near_expiry_items=expiry_info["near_expiry"],
-                    replacement_due=replacement_info["due"],
-                    replacement_upcoming=replacement_info["upcoming"],
-                )
-        chat_status = _send_chat_notifications(
-            username,
-            set(notify_channels or []),
-            _build_plain_notification_text(expiry_info, replacement_info),
-        )
-        channel_status.update(chat_status)
-        sent = any(channel_status.values())
-        
-        if sent:
-            # 更新最後通知日期
+        channel_status.update(outcomes.get(username, {}))
+        if any(channel_status.values()):
+            # 更新最後通知日期，並將已發送的排程推進到下一階
             user_repo.update_last_notification_date(username, today_str)
+            sent_entries.extend(entries)
+            ladders[username] = alert_schedule_service.user_ladder(user)
             results["success_users"] += 1
             results["total_notifications"] += total_alerts
             user_result["sent"] = True
@@ -200,9 +404,8 @@ def check_and_send_notifications() -> Dict[str, Any]:
             results["failed_users"] += 1
             user_result["reason"] = "發送失敗"
         user_result["channel_status"] = channel_status
-        
-        results["details"].append(user_result)
-    
+
+    alert_schedule_service.mark_sent(sent_entries, ladders)
     return results
 
 
@@ -228,13 +431,16 @@ def send_manual_notification(username: str) -> Dict[str, Any]:
     notify_channels = settings.get("notify_channels", []) or ["email"]
     reminder_ladder = settings.get("reminder_ladder")
     
-    # 取得到期物品
-    expiry_info = item_service.get_expiring_items(
-        days_threshold=notify_days,
-        ladder=_parse_reminder_ladder(reminder_ladder),
+    # 取得屬於該使用者的到期物品與保養提醒
+    expiry_info, replacement_info = _alerts_for_user(
+        username,
+        settings,
+        item_service.get_expiring_items(
+            days_threshold=notify_days,
+            ladder=_parse_reminder_ladder(reminder_ladder),
+        ),
+        item_service.get_replacement_items(settings),
     )
-    
-    replacement_info = item_service.get_replacement_items(settings)
     total_alerts = expiry_info["total_alerts"] + replacement_info["total_alerts"]
 
     if total_alerts == 0:
@@ -301,13 +507,16 @@ def get_notification_summary(username: str) -> Dict[str, Any]:
     notify_days = settings.get("notify_days", 30)
     reminder_ladder = settings.get("reminder_ladder")
     
-    expiry_info = item_service.get_expiring_items(
-        days_threshold=notify_days,
-        ladder=_parse_reminder_ladder(reminder_ladder),
+    expiry_info, replacement_info = _alerts_for_user(
+        username,
+        settings,
+        item_service.get_expiring_items(
+            days_threshold=notify_days,
+            ladder=_parse_reminder_ladder(reminder_ladder),
+        ),
+        item_service.get_replacement_items(settings),
     )
 
-    replacement_info = item_service.get_replacement_items(settings)
-
     # 借出逾期
     overdue_loans = []
     try:
@@ -0,0 +1,258 @@
+"""智慧推薦服務（M30）
+
+推薦由排程器預先算好存入 user_recommendations，每位使用者一列；API 只做一次主鍵查詢。
+物品新增 / 編輯 / 移動 / 數量變更後，擁有者的快照會被標記為 stale，排程器每幾分鐘只重算
+這些使用者；日期型規則（保固過期、保養逾期）每天都會變化，另由每日任務將全部快照標記為 stale。
+
+推薦項目：
+- 保固過期、庫存低於補貨門檻、保養逾期、久置且數量為零（與原本規則相同）
+- 建議歸位：同類物品大多放在同一房間（共置 + 類別親和度，近期移入的位置加權），
+  放在別處且近期沒有被刻意移動過的物品會建議移回
+排序分數 = 規則基礎分 + 物品類別在使用者物品中的占比 + 近期移動過的加分。
+"""
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.repositories import item_repo, recommendation_repo
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_LIMIT = 10
+# 每次排程最多重算的使用者數
+REFRESH_BATCH_SIZE = 200
+RECENT_MOVE_DAYS = 30
+DECLUTTER_DAYS = 180
+# 同類物品至少幾件、且主要位置占比達多少時才建議歸位
+RELOCATE_MIN_ITEMS = 3
+RELOCATE_MIN_SHARE = 0.5
+RECENT_MOVE_WEIGHT = 1
+
+BASE_SCORES = {
+    "low_stock": 60,
+    "warranty_expired": 50,
+    "maintenance_overdue": 40,
+    "relocate": 30,
+    "declutter": 10,
+}
+AFFINITY_SCORE = 20
+RECENT_MOVE_SCORE = 10
+
+RECOMMENDATION_PROJECTION = {
+    "_id": 0,
+    "ItemID": 1,
+    "ItemName": 1,
+    "ItemType": 1,
+    "ItemGetDate": 1,
+    "ItemStorePlace": 1,
+    "ItemFloor": 1,
+    "ItemRoom": 1,
+    "Quantity": 1,
+    "ReorderLevel": 1,
+    "WarrantyExpiry": 1,
+    "MaintenanceIntervalDays": 1,
+    "LastMaintenanceDate": 1,
+    "move_history": 1,
+}
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value.strip():
+        try:
+            return datetime.strptime(value.strip()[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+def _room_of(place: str) -> str:
+    """位置字串（樓層/房間/區域）取到房間為止"""
+    return "/".join(part for part in (place or "").split("/")[:2] if part)
+
+
+def _location_of(item: Dict[str, Any]) -> str:
+    if item.get("ItemRoom"):
+        return "/".join(part for part in (item.get("ItemFloor"), item.get("ItemRoom")) if part)
+    return _room_of(item.get("ItemStorePlace") or "")
+
+
+def _recent_moves(item: Dict[str, Any], since: date) -> List[Dict[str, Any]]:
+    return [
+        move for move in (item.get("move_history") or [])
+        if isinstance(move, dict) and (_to_date(move.get("date")) or date.min) >= since
+    ]
+
+
+def _entry(kind: str, icon: str, color: str, title: str, detail: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": kind,
+        "icon": icon,
+        "color": color,
+        "title": title,
+        "detail": detail,
+        "item_id": item.get("ItemID", ""),
+        "item_name": item.get("ItemName", ""),
+    }
+
+
+def _rule_entries(item: Dict[str, Any], today: date) -> List[Dict[str, Any]]:
+    """單一物品的規則型推薦（保固、庫存、保養、久置）"""
+    name = item.get("ItemName", "")
+    entries = []
+
+    warranty = _to_date(item.get("WarrantyExpiry"))
+    if warranty and warranty < today:
+        entries.append(_entry(
+            "warranty_expired", "fas fa-shield-alt", "danger",
+            f"保固已過期：{name}", f"保固於 {warranty} 到期", item,
+        ))
+
+    quantity = int(item.get("Quantity") or 0)
+    reorder = int(item.get("ReorderLevel") or 0)
+    if reorder > 0 and quantity <= reorder:
+        entries.append(_entry(
+            "low_stock", "fas fa-boxes", "warning",
+            f"庫存不足：{name}", f"目前庫存 {quantity}，補貨門檻 {reorder}", item,
+        ))
+
+    interval = item.get("MaintenanceIntervalDays")
+    last_maintenance = _to_date(item.get("LastMaintenanceDate"))
+    if interval and last_maintenance:
+        next_maintenance = last_maintenance + timedelta(days=int(interval))
+        if next_maintenance <= today:
+            entries.append(_entry(
+                "maintenance_overdue", "fas fa-screwdriver-wrench", "info",
+                f"保養逾期：{name}", f"應於 {next_maintenance} 前完成保養", item,
+            ))
+
+    get_date = _to_date(item.get("ItemGetDate"))
+    if get_date and quantity == 0 and (today - get_date).days >= DECLUTTER_DAYS:
+        months_owned = (today - get_date).days // 30
+        entries.append(_entry(
+            "declutter", "fas fa-recycle", "secondary",
+            f"考慮整理：{name}", f"此物品已存放超過 {months_owned} 個月且數量為零", item,
+        ))
+    return entries
+
+
+def _home_locations(items: List[Dict[str, Any]], since: date) -> Dict[str, Dict[str, Any]]:
+    """各類別的主要存放房間：依目前共置的件數，加上近期移入該房間的次數加權"""
+    weights: Dict[str, Counter] = {}
+    placed: Dict[str, Counter] = {}
+    for item in items:
+        item_type = item.get("ItemType") or ""
+        location = _location_of(item)
+        if not item_type or not location:
+            continue
+        placed.setdefault(item_type, Counter())[location] += 1
+        counter = weights.setdefault(item_type, Counter())
+        counter[location] += 1
+        for move in _recent_moves(item, since):
+            destination = _room_of(move.get("to_location") or "")
+            if destination:
+                counter[destination] += RECENT_MOVE_WEIGHT
+
+    homes = {}
+    for item_type, counter in weights.items():
+        total = sum(placed[item_type].values())
+        if total < RELOCATE_MIN_ITEMS:
+            continue
+        location, weight = counter.most_common(1)[0]
+        if weight / sum(counter.values()) >= RELOCATE_MIN_SHARE:
+            homes[item_type] = {"location": location, "count": placed[item_type][location], "total": total}
+    return homes
+
+
+def build_recommendations(
+    items: Iterable[Dict[str, Any]],
+    today: Optional[date] = None,
+    limit: int = RECOMMENDATION_LIMIT,
+) -> List[Dict[str, Any]]:
+    """由使用者擁有的物品算出排序後的推薦清單（不存取資料庫）"""
+    today = today or date.today()
+    items = list(items)
+    if not items:
+        return []
+    since = today - timedelta(days=RECENT_MOVE_DAYS)
+    type_counts = Counter(item.get("ItemType") or "" for item in items)
+    homes = _home_locations(items, since)
+
+    scored = []
+    for item in items:
+        item_type = item.get("ItemType") or ""
+        moved_recently = bool(_recent_moves(item, since))
+        entries = _rule_entries(item, today)
+
+        home = homes.get(item_type)
+        location = _location_of(item)
+        if home and location and location != home["location"] and not moved_recently:
+            entries.append(_entry(
+                "relocate", "fas fa-arrows-alt", "primary",
+                f"建議歸位：{item.get('ItemName', '')}",
+                f"同類「{item_type}」物品多放在 {home['location']}（{home['count']}/{home['total']} 件）",
+                item,
+            ))
+
+        bonus = (AFFINITY_SCORE * type_counts[item_type] / len(items) if item_type else 0)
+        bonus += RECENT_MOVE_SCORE if moved_recently else 0
+        for entry in entries:
+            entry["score"] = round(BASE_SCORES[entry["type"]] + bonus, 2)
+            scored.append(entry)
+
+    scored.sort(key=lambda e: (-e["score"], e["item_name"], e["type"]))
+    return scored[:limit]
+
+
+def refresh_user(user_id: str) -> List[Dict[str, Any]]:
+    """重新計算並儲存單一使用者的推薦"""
+    items = item_repo.list_items_by_owner(user_id, RECOMMENDATION_PROJECTION)
+    recommendations = build_recommendations(items)
+    recommendation_repo.save(user_id, recommendations, datetime.utcnow())
+    return recommendations
+
+
+def refresh_stale(limit: int = REFRESH_BATCH_SIZE) -> int:
+    """重算被標記為 stale 的使用者，回傳處理人數
+
+    單一使用者失敗時記錄警告並把該快照的 computed_at 推到現在：仍保留 stale，排到佇列最後，
+    不會讓同一位使用者每次都卡住整批重算。
+    """
+    user_ids = recommendation_repo.list_stale_users(limit)
+    for user_id in user_ids:
+        try:
+            refresh_user(user_id)
+        except Exception:
+            item_repo.rollback()
+            logger.warning("recommendation refresh failed for user %s", user_id, exc_info=True)
+            recommendation_repo.defer(user_id, datetime.utcnow())
+    return len(user_ids)
+
+
+def expire_all() -> int:
+    """將全部快照標記為 stale，交給 refresh_stale 分批重算"""
+    recommendation_repo.ensure_indexes()
+    return recommendation_repo.mark_all_stale()
+
+
+def items_changed(item_ids: Iterable[str], previous_owners: Iterable[str] = ()) -> int:
+    """物品異動後標記擁有者的快照需要重算；物品轉移時原擁有者的快照也一併標記"""
+    count = recommendation_repo.mark_stale_for_items(item_ids)
+    previous_owners = [owner for owner in previous_owners if owner]
+    if previous_owners:
+        count += recommendation_repo.mark_stale_for_users(previous_owners)
+    return count
+
+
+def get_recommendations(user_id: str) -> List[Dict[str, Any]]:
+    """讀取預先算好的推薦；使用者第一次查詢（尚無快照）時才同步計算"""
+    if not user_id:
+        return []
+    snapshot = recommendation_repo.get(user_id)
+    if snapshot is None:
+        return refresh_user(user_id)
+    return snapshot["recommendations"]
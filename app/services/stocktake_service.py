@@ -29,7 +29,7 @@ def create_session(
 
 def start_session(session_id: Any) -> Tuple[bool, str]:
     """開始盤點（draft → in_progress）"""
-    sess = stocktake_repo.get_session(session_id)
+    sess = stocktake_repo.get_session(session_id, include_items=False)
     if not sess:
         return False, "找不到盤點作業"
     if sess["status"] != "draft":
@@ -47,7 +47,7 @@ def record_count(
     counted_by: str,
 ) -> Tuple[bool, str]:
     """記錄實際盤點數量"""
-    sess = stocktake_repo.get_session(session_id)
+    sess = stocktake_repo.get_session(session_id, include_items=False)
     if not sess:
         return False, "找不到盤點作業"
     if sess["status"] not in ("in_progress",):
@@ -73,7 +73,7 @@ def record_count(
 
 def complete_counting(session_id: Any) -> Tuple[bool, str]:
     """完成盤點（in_progress → review），標記差異"""
-    sess = stocktake_repo.get_session(session_id)
+    sess = stocktake_repo.get_session(session_id, include_items=False)
     if not sess:
         return False, "找不到盤點作業"
     if sess["status"] != "in_progress":
@@ -85,14 +85,16 @@ def complete_counting(session_id: Any) -> Tuple[bool, str]:
     return False, "狀態更新失敗"
 
 
-def commit_session(session_id: Any) -> Tuple[bool, str]:
-    """提交盤點（review → committed），將實際數量寫回庫存"""
-    sess = stocktake_repo.get_session(session_id)
+def commit_session(session_id: Any, committed_by: str = "") -> Tuple[bool, str]:
+    """提交盤點（review → committed），將實際數量寫回庫存並記錄數量變動"""
+    sess = stocktake_repo.get_session(session_id, include_items=False)
     if not sess:
         return False, "找不到盤點作業"
     if sess["status"] != "review":
         return False, f"目前狀態 {sess['status']} 無法提交"
-    updated = stocktake_repo.apply_counts_to_inventory(session_id)
+    updated = stocktake_repo.apply_counts_to_inventory(
+        session_id, user=committed_by, reason=f"盤點：{sess['name']}"
+    )
     now = datetime.utcnow()
     ok = stocktake_repo.update_session_status(session_id, "committed", committed_at=now)
     if ok:
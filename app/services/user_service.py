@@ -15,6 +15,18 @@ MAX_FAILED_ATTEMPTS = 5
 LOCKOUT_DURATION_MINUTES = 15
 
 
+def _invalidate_cached_user(username: str) -> None:
+    """使登入者快取失效（角色、密碼或個人資料變更後呼叫）"""
+    from app.utils.auth import invalidate_principal
+    invalidate_principal(username=username)
+
+
+def _reschedule_alerts(username: str) -> None:
+    """帳號新增或刪除後重新排程到期提醒（新帳號可能是既有物品的擁有者）"""
+    from app.services import alert_schedule_service
+    alert_schedule_service.users_changed([username])
+
+
 def is_account_locked(username: str) -> Tuple[bool, str]:
     """檢查帳號是否被鎖定
     
@@ -102,6 +114,7 @@ def _upgrade_password(username: str, plain_password: str) -> None:
     """將明文密碼升級為雜湊密碼"""
     hashed = generate_password_hash(plain_password)
     user_repo.update_password(username, hashed)
+    _invalidate_cached_user(username)
 
 
 def hash_password(plain_password: str) -> str:
@@ -135,6 +148,7 @@ def create_user(username: str, password: str, admin: bool = False) -> bool:
         "admin": admin,
         "password_changed": True,  # 新用戶已自行設定密碼
     })
+    _reschedule_alerts(username)
     return True
 
 
@@ -205,6 +219,7 @@ def change_password(username: str, old_password: str, new_password: str) -> Tupl
     
     # 標記為已修改密碼
     user_repo.mark_password_changed(username)
+    _invalidate_cached_user(username)
     
     # 記錄操作
     log_service.log_action("update", username, details={"message": "修改個人密碼"})
@@ -236,6 +251,7 @@ def force_change_password(username: str, new_password: str) -> Tuple[bool, str]:
     
     # 標記為已修改密碼
     user_repo.mark_password_changed(username)
+    _invalidate_cached_user(username)
     
     # 記錄操作
     log_service.log_action("update", username, details={"message": "首次登入設定密碼"})
@@ -268,6 +284,7 @@ def admin_reset_password(target_username: str) -> Tuple[bool, str, str]:
     
     # 標記為需要修改密碼（下次登入時強制修改）
     user_repo.mark_password_not_changed(target_username)
+    _invalidate_cached_user(target_username)
     
     # 記錄安全性事件
     from flask import session
@@ -313,10 +330,17 @@ def update_profile(username: str, data: dict) -> Tuple[bool, str]:
         "language": language,
         "email": email,
     })
+    _invalidate_cached_user(username)
     log_service.log_action("update", username, details={"message": "更新個人設定"})
     return True, "個人設定已儲存"
 
 
+def update_notification_settings(username: str, **settings) -> None:
+    """更新通知設定（email、通知開關等也在登入者快取中，更新後需使快取失效）"""
+    user_repo.update_notification_settings(username=username, **settings)
+    _invalidate_cached_user(username)
+
+
 def list_users() -> list:
     """取得所有使用者列表"""
     return user_repo.list_all_users()
@@ -351,6 +375,7 @@ def verify_email(token: str) -> Tuple[bool, str]:
         return False, "驗證連結無效或已過期"
     username = user.get("User")
     user_repo.mark_email_verified(username)
+    _invalidate_cached_user(username)
     return True, "Email 驗證成功！"
 
 
@@ -372,6 +397,8 @@ def delete_user(actor_username: str, target_username: str) -> Tuple[bool, str]:
     deleted = user_repo.delete_user(target_username)
     if not deleted:
         return False, "刪除失敗"
+    _invalidate_cached_user(target_username)
+    _reschedule_alerts(target_username)
 
     log_service.log_action("delete", actor_username, item_name=target_username, details={
         "message": f"管理員刪除了使用者 {target_username}"
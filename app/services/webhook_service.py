@@ -1,13 +1,22 @@
-"""Webhook 服務模組"""
+"""Webhook 服務模組
+
+事件先寫入 webhook_outbox（與物品異動同一交易），再由 WebhookDispatcher 以固定大小的
+worker pool 投遞：每個主機共用 keep-alive 連線並限制同時請求數，失敗以指數退避重試，
+連續失敗的主機會暫時斷路。
+"""
 import hashlib
 import hmac
 import json
+import os
 import secrets
 import threading
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-import requests
 
 from app.repositories import webhook_repo
 
@@ -19,37 +28,308 @@ ALL_EVENTS = [
     "item.quantity.changed",
 ]
 
+WEBHOOK_TIMEOUT_SECONDS = 10
+WEBHOOK_MAX_WORKERS = int(os.environ.get("WEBHOOK_MAX_WORKERS", "8"))
+WEBHOOK_PER_HOST_LIMIT = int(os.environ.get("WEBHOOK_PER_HOST_LIMIT", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.environ.get("WEBHOOK_RETRY_BASE_SECONDS", "5"))
+WEBHOOK_RETRY_MAX_SECONDS = 3600
+WEBHOOK_POLL_SECONDS = float(os.environ.get("WEBHOOK_POLL_SECONDS", "2"))
+# 已送達 / 放棄的事件保留天數，由排程器每日清除
+WEBHOOK_OUTBOX_RETENTION_DAYS = int(os.environ.get("WEBHOOK_OUTBOX_RETENTION_DAYS", "14"))
+# 認領後超過此秒數仍未完成（程序中止），其他 dispatcher 可重新認領
+WEBHOOK_CLAIM_TIMEOUT_SECONDS = 300
+# 同一主機連續失敗達門檻即斷路，冷卻期間不發送
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS = 60
 
-def _send_webhook(wh: Dict[str, Any], event_name: str, payload: Dict[str, Any]) -> bool:
-    """實際傳送 HTTP POST 到 webhook URL，回傳是否成功"""
-    body = json.dumps({
+
+def _sign(secret: str, body: str) -> str:
+    return hmac.new((secret or "").encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _build_body(event_name: str, payload: Dict[str, Any]) -> str:
+    return json.dumps({
         "event": event_name,
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "data": payload,
     }, ensure_ascii=False)
 
-    secret = wh.get("secret", "")
-    sig = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
 
+_SESSIONS: Dict[str, Any] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _host_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _session_for(host: str):
+    """每個 webhook 主機共用一個 keep-alive 連線池（requests 於第一次發送時才載入）"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, WEBHOOK_PER_HOST_LIMIT))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSIONS[host] = session
+        return session
+
+
+def _post_body(wh: Dict[str, Any], event_name: str, body: str) -> Tuple[bool, str]:
+    """以主機共用連線 POST 已序列化的事件，回傳 (是否成功, 錯誤訊息)"""
     try:
-        resp = requests.post(
+        resp = _session_for(_host_of(wh["url"])).post(
             wh["url"],
-            data=body,
+            data=body.encode("utf-8"),
             headers={
                 "Content-Type": "application/json",
-                "X-Webhook-Signature": f"sha256={sig}",
+                "X-Webhook-Signature": f"sha256={_sign(wh.get('secret', ''), body)}",
                 "X-Webhook-Event": event_name,
             },
-            timeout=10,
+            timeout=WEBHOOK_TIMEOUT_SECONDS,
         )
-        return resp.status_code < 400
-    except Exception:
+    except Exception as e:
+        return False, str(e)
+    if resp.status_code < 400:
+        return True, ""
+    return False, f"HTTP {resp.status_code}"
+
+
+def _send_webhook(wh: Dict[str, Any], event_name: str, payload: Dict[str, Any]) -> bool:
+    """實際傳送 HTTP POST 到 webhook URL，回傳是否成功"""
+    ok, _ = _post_body(wh, event_name, _build_body(event_name, payload))
+    return ok
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)), WEBHOOK_RETRY_MAX_SECONDS)
+
+
+class _CircuitBreaker:
+    """以主機為單位的斷路器"""
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, cooldown: float = CIRCUIT_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def open_until(self, host: str) -> Optional[float]:
+        """斷路中回傳恢復時間（time.time()），否則 None"""
+        with self._lock:
+            until = self._open_until.get(host)
+            if until and until > time.time():
+                return until
+            return None
+
+    def record(self, host: str, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._failures.pop(host, None)
+                self._open_until.pop(host, None)
+                return
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.threshold:
+                self._open_until[host] = time.time() + self.cooldown
+
+    def open_hosts(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            return sorted(h for h, until in self._open_until.items() if until > now)
+
+
+class WebhookDispatcher:
+    """從 outbox 認領事件並以固定大小的 worker pool 投遞"""
+
+    def __init__(
+        self,
+        app,
+        max_workers: Optional[int] = None,
+        per_host_limit: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.app = app
+        self.max_workers = max(1, max_workers or WEBHOOK_MAX_WORKERS)
+        self.per_host_limit = max(1, per_host_limit or WEBHOOK_PER_HOST_LIMIT)
+        self.poll_interval = poll_interval if poll_interval is not None else WEBHOOK_POLL_SECONDS
+        self.breaker = _CircuitBreaker()
+        self.counters = {"delivered": 0, "retried": 0, "dead": 0, "deferred": 0}
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webhook")
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_waiting = False
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._idle = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="webhook-dispatcher", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=True, cancel_futures=False)
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                self.app.logger.warning(f"webhook dispatcher poll failed: {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # -- delivery ----------------------------------------------------------
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def run_once(self) -> int:
+        """認領一批到期事件並交給 worker pool，回傳送進 pool 的筆數
+
+        每主機併發上限在送進 pool 前以非阻塞方式取得；主機已滿的事件立即放回 outbox
+        （不計入嘗試次數），pool 執行緒不會停在等待某個慢主機上。
+        """
+        with self._lock:
+            capacity = self.max_workers * 2 - self._inflight
+        if capacity <= 0:
+            return 0
+        now = datetime.utcnow()
+        submitted = 0
+        with self.app.app_context():
+            rows = webhook_repo.claim_due_deliveries(
+                capacity,
+                uuid.uuid4().hex,
+                now,
+                now - timedelta(seconds=WEBHOOK_CLAIM_TIMEOUT_SECONDS),
+            )
+            webhooks = webhook_repo.get_webhooks_by_ids(sorted({str(r["webhook_id"]) for r in rows}))
+            for row in rows:
+                wh = webhooks.get(str(row["webhook_id"]))
+                slot = self._slot(_host_of(wh["url"])) if wh else None
+                if slot is not None and not slot.acquire(blocking=False):
+                    webhook_repo.complete_delivery(
+                        row["id"], "pending", int(row.get("attempts") or 0),
+                        next_attempt_at=now, error=row.get("last_error"),
+                    )
+                    self._host_waiting = True
+                    continue
+                with self._lock:
+                    self._inflight += 1
+                self._pool.submit(self._deliver, row, wh, slot)
+                submitted += 1
+        return submitted
+
+    def drain(self, timeout: float = 30) -> bool:
+        """等待目前佇列中已到期的事件處理完畢（測試與關機使用）"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            claimed = self.run_once()
+            with self._idle:
+                if not claimed and self._inflight == 0:
+                    return True
+                self._idle.wait(0.05)
         return False
 
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return slot
+
+    def _deliver(
+        self,
+        row: Dict[str, Any],
+        wh: Optional[Dict[str, Any]],
+        slot: Optional[threading.BoundedSemaphore] = None,
+    ) -> None:
+        try:
+            with self.app.app_context():
+                self._deliver_row(row, wh)
+        except Exception as e:
+            self.app.logger.warning(f"webhook delivery {row.get('id')} failed: {e}")
+        finally:
+            if slot is not None:
+                slot.release()
+                # 有事件因主機已滿被放回時，空出名額就立即再輪詢一次
+                if self._host_waiting:
+                    self._host_waiting = False
+                    self._wake.set()
+            with self._idle:
+                self._inflight -= 1
+                self._idle.notify_all()
+
+    def _deliver_row(self, row: Dict[str, Any], wh: Optional[Dict[str, Any]]) -> None:
+        attempts = int(row.get("attempts") or 0)
+        if not wh or not wh.get("is_active", True):
+            webhook_repo.complete_delivery(row["id"], "dead", attempts, error="webhook removed or inactive")
+            self._count("dead")
+            return
+
+        host = _host_of(wh["url"])
+        open_until = self.breaker.open_until(host)
+        if open_until:
+            # 斷路中：不計入嘗試次數，延到冷卻結束後再送
+            webhook_repo.complete_delivery(
+                row["id"], "pending", attempts,
+                next_attempt_at=datetime.utcfromtimestamp(open_until),
+                error="circuit open",
+            )
+            self._count("deferred")
+            return
+
+        ok, error = _post_body(wh, row["event"], row["body"])
+        self.breaker.record(host, ok)
+        attempts += 1
+
+        if ok:
+            webhook_repo.complete_delivery(row["id"], "delivered", attempts)
+            self._count("delivered")
+            _update_webhook_health(wh, success=True)
+        elif attempts >= WEBHOOK_MAX_ATTEMPTS:
+            webhook_repo.complete_delivery(row["id"], "dead", attempts, error=error)
+            self._count("dead")
+            _update_webhook_health(wh, success=False)
+        else:
+            webhook_repo.complete_delivery(
+                row["id"], "pending", attempts,
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=_retry_delay(attempts)),
+                error=error,
+            )
+            self._count("retried")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
 
-def _fire_single(wh: Dict[str, Any], event_name: str, payload: Dict[str, Any]) -> None:
-    """Fire one webhook in the background and update its status."""
-    success = _send_webhook(wh, event_name, payload)
+def _update_webhook_health(wh: Dict[str, Any], success: bool) -> None:
+    """事件最終送達時歸零失敗次數；重試用盡才累計（連續 5 次會停用該 webhook）"""
     try:
         wh_id = wh.get("id")
         if wh_id is not None:
@@ -59,19 +339,85 @@ def _fire_single(wh: Dict[str, Any], event_name: str, payload: Dict[str, Any]) -
         pass
 
 
-def fire_event(event_name: str, payload: Dict[str, Any]) -> None:
-    """找出所有訂閱 event_name 的啟用 webhooks，非同步各自觸發。"""
+_dispatcher: Optional[WebhookDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher(app) -> WebhookDispatcher:
+    """啟動（或取得）本程序的 webhook dispatcher"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = WebhookDispatcher(app)
+            _dispatcher.start()
+        return _dispatcher
+
+
+def wake_dispatcher() -> None:
+    """通知本程序已啟動的 dispatcher 有新事件
+
+    dispatcher 只在 worker 程序（run_worker.py）中啟動；web 程序沒有 dispatcher，
+    事件留在 outbox 由 worker 輪詢發送，不會在 web 程序中建立投遞執行緒。
+    """
+    dispatcher = _dispatcher
+    if dispatcher:
+        dispatcher.wake()
+
+
+def stop_dispatcher(timeout: float = 10) -> None:
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher:
+        dispatcher.stop(timeout)
+
+
+def get_metrics(include_outbox: bool = True) -> Dict[str, Any]:
+    """佇列深度與投遞統計；include_outbox=False 時只讀記憶體中的 dispatcher 數值，不查資料庫"""
+    by_status = {}
+    if include_outbox:
+        try:
+            by_status = webhook_repo.count_outbox_by_status()
+        except Exception:
+            pass
+    dispatcher = _dispatcher
+    return {
+        "queue_depth": by_status.get("pending", 0) + by_status.get("inflight", 0),
+        "by_status": by_status,
+        "inflight": dispatcher.inflight if dispatcher else 0,
+        "counters": dict(dispatcher.counters) if dispatcher else {},
+        "open_circuits": dispatcher.breaker.open_hosts() if dispatcher else [],
+    }
+
+
+def fire_event(event_name: str, payload: Dict[str, Any], commit: bool = True) -> int:
+    """將事件寫入所有訂閱 event_name 的啟用 webhooks 的 outbox，回傳寫入筆數。
+
+    commit=False 時（PostgreSQL）事件只加入目前的 session，須在呼叫端的物品異動
+    提交前呼叫，兩者便會在同一個交易中寫入；呼叫端提交後再呼叫 wake_dispatcher()。
+    此時查詢失敗會往上拋出，由呼叫端回滾整個交易。
+    """
     try:
         webhooks = webhook_repo.get_webhooks_for_event(event_name)
     except Exception:
-        return
-    for wh in webhooks:
-        t = threading.Thread(
-            target=_fire_single,
-            args=(wh, event_name, payload),
-            daemon=True,
-        )
-        t.start()
+        if not commit:
+            raise
+        return 0
+    if not webhooks:
+        return 0
+    body = _build_body(event_name, payload)
+    webhook_repo.enqueue_deliveries(
+        [{"webhook_id": wh["id"], "event": event_name, "body": body} for wh in webhooks],
+        commit=commit,
+    )
+    if commit:
+        wake_dispatcher()
+    return len(webhooks)
+
+
+def purge_finished(retention_days: int = WEBHOOK_OUTBOX_RETENTION_DAYS) -> int:
+    """刪除超過保留天數的已送達 / 放棄事件，回傳刪除筆數"""
+    return webhook_repo.purge_finished_deliveries(datetime.utcnow() - timedelta(days=retention_days))
 
 
 def create_webhook(user_id: str, url: str, events: List[str], secret: str) -> int:
@@ -102,7 +102,8 @@ def stocktake_complete(session_id: int):
 @admin_required
 def stocktake_commit(session_id: int):
     """提交盤點，更新庫存數量"""
-    ok, msg = stocktake_service.commit_session(session_id)
+    user = get_current_user()
+    ok, msg = stocktake_service.commit_session(session_id, committed_by=user.get("User", ""))
     if ok:
         flash(msg, "success")
     else:
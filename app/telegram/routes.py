@@ -1,14 +1,14 @@
-import json
+import hashlib
 import secrets
 from datetime import datetime, timezone
 from urllib import parse as urlparse
-from urllib import request as urlrequest
 
 from flask import Blueprint, abort, current_app, jsonify, redirect, request, session, url_for
 from itsdangerous import BadSignature, URLSafeSerializer
 
 from app import csrf, db
 from app.models import TelegramUserLink, Travel, TravelItem
+from app.services import bot_service
 from app.utils.auth import login_required
 
 bp = Blueprint("telegram", __name__, url_prefix="/telegram")
@@ -22,25 +22,14 @@ def _telegram_api(method: str, payload: dict) -> tuple[bool, dict]:
     token = current_app.config.get("TELEGRAM_BOT_TOKEN", "")
     if not token:
         return False, {"error": "telegram_bot_token_missing"}
-    req = urlrequest.Request(
-        url=f"https://api.telegram.org/bot{token}/{method}",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with urlrequest.urlopen(req, timeout=8) as resp:
-            body = json.loads(resp.read().decode("utf-8") or "{}")
-            return True, body
-    except Exception as exc:
-        return False, {"error": str(exc)}
+    return bot_service.api_post("telegram", f"https://api.telegram.org/bot{token}/{method}", payload)
 
 
 def _send_message(chat_id: str, text: str, inline_keyboard: list[list[dict]] | None = None) -> None:
     payload = {"chat_id": chat_id, "text": text[:4000]}
     if inline_keyboard:
         payload["reply_markup"] = {"inline_keyboard": inline_keyboard}
-    _telegram_api("sendMessage", payload)
+    bot_service.raise_for_reply(*_telegram_api("sendMessage", payload))
 
 
 def _get_linked_user(telegram_user_id: str) -> str | None:
@@ -184,18 +173,8 @@ def _handle_callback(telegram_user_id: str, callback_data: str) -> tuple[str, li
     return "未知操作。", None
 
 
-@bp.route("/webhook", methods=["POST"])
-@csrf.exempt
-def webhook():
-    secret = current_app.config.get("TELEGRAM_WEBHOOK_SECRET", "")
-    if not secret:
-        return jsonify({"error": "webhook_secret_not_configured"}), 401
-    header_secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
-    if header_secret != secret:
-        return jsonify({"error": "invalid_secret"}), 401
-
-    payload = request.get_json(silent=True) or {}
-
+def _process_update(payload: dict) -> None:
+    """由 bot dispatcher 呼叫：處理一筆已入列的 update 並回覆"""
     message = payload.get("message")
     if message:
         from_user = message.get("from") or {}
@@ -219,6 +198,30 @@ def webhook():
             reply_text, keyboard = _handle_callback(telegram_user_id, callback_data)
             _send_message(chat_id, reply_text, keyboard)
 
+
+bot_service.register_handler("telegram", _process_update)
+
+
+def _chat_id_of(payload: dict) -> str:
+    message = payload.get("message") or (payload.get("callback_query") or {}).get("message") or {}
+    return str((message.get("chat") or {}).get("id") or "")
+
+
+@bp.route("/webhook", methods=["POST"])
+@csrf.exempt
+def webhook():
+    secret = current_app.config.get("TELEGRAM_WEBHOOK_SECRET", "")
+    if not secret:
+        return jsonify({"error": "webhook_secret_not_configured"}), 401
+    header_secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if header_secret != secret:
+        return jsonify({"error": "invalid_secret"}), 401
+
+    payload = request.get_json(silent=True) or {}
+    # 只入列後立即回應；Telegram 重送的相同 update_id 會被略過
+    update_id = payload.get("update_id")
+    key = str(update_id) if update_id is not None else hashlib.sha256(request.get_data()).hexdigest()
+    bot_service.enqueue("telegram", key, _chat_id_of(payload), payload)
     return jsonify({"ok": True})
 
 
@@ -2,9 +2,71 @@
 from functools import wraps
 from typing import Any, Callable, Dict, Optional
 
-from flask import flash, jsonify, redirect, request, session, url_for, g
+from flask import current_app, flash, g, has_app_context, jsonify, redirect, request, session, url_for
 
 from app.services import user_service
+from app.utils.cache import TTLCache
+
+# 跨請求的登入者快取（每個 app / worker 一份），TTL 由 PRINCIPAL_CACHE_TTL 設定；
+# 失效事件經 shared_cache 廣播到所有 worker，沒有廣播通道時項目只保留 PRINCIPAL_UNSYNCED_TTL 秒
+PRINCIPAL_CACHE_MAXSIZE = 1024
+DEFAULT_PRINCIPAL_CACHE_TTL = 30
+PRINCIPAL_UNSYNCED_TTL = 5.0
+PRINCIPAL_EVENT = "principal"
+
+
+def _principal_cache() -> Optional[TTLCache]:
+    """取得目前 app 的登入者快取，不存在時建立並訂閱其他 worker 的失效事件。"""
+    if not has_app_context():
+        return None
+    cache = current_app.extensions.get("principal_cache")
+    if cache is None:
+        from app.utils import shared_cache
+
+        ttl = current_app.config.get("PRINCIPAL_CACHE_TTL", DEFAULT_PRINCIPAL_CACHE_TTL)
+        cache = current_app.extensions.setdefault(
+            "principal_cache", TTLCache(maxsize=PRINCIPAL_CACHE_MAXSIZE, ttl=float(ttl))
+        )
+        shared_cache.subscribe(PRINCIPAL_EVENT, lambda data: _drop_principal(cache, **data), cache.clear)
+    return cache
+
+
+def _principal_ttl(cache: TTLCache) -> float:
+    """收得到廣播時使用設定的 TTL，否則縮短為 PRINCIPAL_UNSYNCED_TTL"""
+    from app.utils import shared_cache
+
+    return cache.ttl if shared_cache.is_synced() else min(cache.ttl, PRINCIPAL_UNSYNCED_TTL)
+
+
+def _drop_principal(cache: TTLCache, username: Optional[str] = None, token_id: Any = None) -> None:
+    if username is not None:
+        cache.delete(f"user:{username}")
+        cache.delete_where(
+            lambda key, value: str(key).startswith("token:") and value.get("user_id") == username
+        )
+    if token_id is not None:
+        cache.delete_where(
+            lambda key, value: str(key).startswith("token:") and str(value.get("id")) == str(token_id)
+        )
+
+
+def invalidate_principal(username: Optional[str] = None, token_id: Any = None) -> None:
+    """使快取中的登入者資訊失效，並廣播給其他 worker。
+
+    角色、密碼、個人資料或 API token 變更後呼叫；指定 username 時會一併清除
+    該使用者所有 token 的快取。
+    """
+    cache = _principal_cache()
+    if cache is not None:
+        from app.utils import shared_cache
+
+        _drop_principal(cache, username, token_id)
+        shared_cache.broadcast(PRINCIPAL_EVENT, {
+            "username": username,
+            "token_id": None if token_id is None else str(token_id),
+        })
+    if has_app_context():
+        g.pop("_current_user", None)
 
 
 def _normalize_user_payload(user: Optional[Dict[str, Any]], user_id: Optional[str]) -> Dict[str, Any]:
@@ -21,8 +83,42 @@ def get_current_user() -> Dict[str, Any]:
     user_id = session.get("UserID")
     if not user_id:
         return _normalize_user_payload(None, None)
-    user = user_service.get_user(user_id)
-    return _normalize_user_payload(user, user_id)
+
+    # 同一請求內只解析一次（裝飾器與路由本體會重複呼叫）
+    memo = g.get("_current_user")
+    if memo is not None and memo[0] == user_id:
+        return dict(memo[1])
+
+    cache = _principal_cache()
+    cache_key = f"user:{user_id}"
+    payload = cache.get(cache_key) if cache is not None else None
+    if payload is None:
+        user = user_service.get_user(user_id)
+        payload = _normalize_user_payload(user, user_id)
+        if user and cache is not None:
+            cache.set(cache_key, payload, ttl=_principal_ttl(cache))
+
+    g._current_user = (user_id, payload)
+    return dict(payload)
+
+
+def _resolve_api_token(token: str) -> Optional[Dict[str, Any]]:
+    """驗證 API token，命中快取時不查詢資料庫。"""
+    from app.services import api_token_service
+
+    cache = _principal_cache()
+    cache_key = f"token:{api_token_service.hash_token(token)}"
+    token_data = cache.get(cache_key) if cache is not None else None
+    if token_data is not None:
+        if api_token_service.is_expired(token_data):
+            cache.delete(cache_key)
+            return None
+        return token_data
+
+    token_data = api_token_service.validate_token(token)
+    if token_data and cache is not None:
+        cache.set(cache_key, token_data, ttl=_principal_ttl(cache))
+    return token_data
 
 
 def login_required(f: Callable) -> Callable:
@@ -67,9 +163,7 @@ def api_token_or_login_required(f: Callable) -> Callable:
         auth_header = request.headers.get("Authorization", "")
         if auth_header.startswith("Bearer "):
             token = auth_header[len("Bearer "):]
-            from app.services import api_token_service
-            from flask import jsonify
-            token_data = api_token_service.validate_token(token)
+            token_data = _resolve_api_token(token)
             if not token_data:
                 return jsonify({"error": "無效或已過期的 API Token"}), 401
             g.api_user_id = token_data.get("user_id", "")
@@ -0,0 +1,241 @@
+"""程序內快取工具
+
+提供小型、具 TTL 與容量上限的 LRU 快取，用於熱門但可容忍短暫過期的資料
+（例如已驗證的登入者資訊）。每個 gunicorn worker 各自持有一份，
+跨 worker 的一致性依賴較短的 TTL 與寫入時的主動失效。
+
+TwoTierCache 在共用快取（Flask-Caching）前加上一層程序內 LRU，鍵值帶有命名空間
+版本號；失效時換新版本並廣播，各 worker 收到後捨棄舊版本的本機項目
+（見 app.utils.shared_cache）。
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """執行緒安全的 TTL + LRU 快取。
+
+    Args:
+        maxsize: 最多保留的項目數，超過時淘汰最久未使用的項目
+        ttl: 項目存活秒數；小於等於 0 代表停用快取
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """刪除所有符合條件的項目，回傳刪除數量。"""
+        with self._lock:
+            doomed = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+            for key in doomed:
+                del self._data[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+        }
+
+
+_MISSING = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = _MISSING
+
+
+class TwoTierCache:
+    """程序內 LRU + 共用快取的兩層快取，鍵值以命名空間版本區隔。
+
+    Args:
+        namespace: 命名空間（例如 "types"），失效時整個命名空間一起換版本
+        shared: 共用快取，需提供 get / set / add（Flask-Caching 的 Cache）
+        local_ttl: 本機項目存活秒數（有廣播時）
+        shared_ttl: 共用快取項目存活秒數
+        unsynced_ttl: 沒有廣播通道時本機項目與版本號的存活秒數
+        lock_seconds: 跨 worker 重算鎖的存活秒數
+    """
+
+    def __init__(self, namespace: str, shared: Any, local_ttl: float = 60.0, shared_ttl: int = 300,
+                 maxsize: int = 256, unsynced_ttl: float = 5.0, lock_seconds: float = 2.0):
+        self.namespace = namespace
+        self.shared = shared
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.shared_ttl = shared_ttl
+        self.unsynced_ttl = unsynced_ttl
+        self.lock_seconds = lock_seconds
+        # 由廣播監聽端設定：True 代表版本號一定會被推送過來，不必回共用快取確認
+        self.synced = False
+        self.shared_hits = 0
+        self.computes = 0
+        self._version: Optional[str] = None
+        self._version_checked = 0.0
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version_key(self) -> str:
+        return f"{self.namespace}:version"
+
+    def _shared_call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception:
+            # 共用快取失效時仍可運作，只是各 worker 自行重算
+            return None
+
+    def version(self) -> str:
+        now = time.monotonic()
+        version = self._version
+        if version is not None and (self.synced or now - self._version_checked < self.unsynced_ttl):
+            return version
+        shared = self._shared_call("get", self.version_key)
+        if shared is None:
+            self._shared_call("add", self.version_key, uuid.uuid4().hex, timeout=0)
+            shared = self._shared_call("get", self.version_key) or version or "0"
+        self.apply_version(shared)
+        self._version_checked = now
+        return shared
+
+    def apply_version(self, version: str) -> None:
+        """切換到指定版本（本機或廣播觸發），捨棄舊版本的本機項目"""
+        if version == self._version:
+            return
+        self._version = version
+        current = f"{self.namespace}:{version}:"
+        self.local.delete_where(lambda key, value: not str(key).startswith(current))
+
+    def reset(self) -> None:
+        """廣播中斷後可能漏掉通知，捨棄本機項目並重新讀取版本"""
+        self._version = None
+        self.local.clear()
+
+    def invalidate(self) -> str:
+        """換新版本；回傳新版本號，由呼叫端負責廣播"""
+        version = uuid.uuid4().hex
+        self._shared_call("set", self.version_key, version, timeout=0)
+        self.apply_version(version)
+        self._version_checked = time.monotonic()
+        return version
+
+    def get(self, key: str, compute: Callable[[], Any]) -> Any:
+        """取得快取值；兩層都沒有時由單一呼叫者重算，其餘等待結果"""
+        full_key = f"{self.namespace}:{self.version()}:{key}"
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = _Flight()
+        if not leader:
+            flight.done.wait(self.lock_seconds * 5)
+            if flight.value is not _MISSING:
+                return flight.value
+            return compute()
+
+        try:
+            value = self._load(full_key, compute)
+            flight.value = value
+            self.local.set(full_key, value, ttl=None if self.synced else min(self.local.ttl, self.unsynced_ttl))
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(full_key, None)
+            flight.done.set()
+
+    def _load(self, full_key: str, compute: Callable[[], Any]) -> Any:
+        value = self._shared_call("get", full_key)
+        if value is not None:
+            self.shared_hits += 1
+            return value
+        lock_key = f"{full_key}:lock"
+        if self._shared_call("add", lock_key, 1, timeout=max(1, int(self.lock_seconds))) is False:
+            # 其他 worker 正在重算：短暫等待共用快取出現結果
+            deadline = time.monotonic() + self.lock_seconds
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self._shared_call("get", full_key)
+                if value is not None:
+                    self.shared_hits += 1
+                    return value
+        try:
+            self.computes += 1
+            value = compute()
+            self._shared_call("set", full_key, value, timeout=self.shared_ttl)
+            return value
+        finally:
+            self._shared_call("delete", lock_key)
+
+    def stats(self) -> Dict[str, Any]:
+        local = self.local.stats()
+        hits = local["hits"] + self.shared_hits
+        total = hits + self.computes
+        return {
+            "size": local["size"],
+            "hits": hits,
+            "local_hits": local["hits"],
+            "shared_hits": self.shared_hits,
+            "misses": self.computes,
+            "hit_ratio": (hits / total) if total else 0.0,
+            "synced": self.synced,
+        }
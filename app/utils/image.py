@@ -4,10 +4,10 @@ import os
 import uuid
 from typing import Optional, Tuple
 
-import requests
-from PIL import Image
 from flask import current_app
 
+# Pillow 與 requests 只在處理圖片時才載入，避免每個 worker 啟動都付出載入成本
+
 
 def compress_image(
     filename: str,
@@ -33,6 +33,8 @@ def compress_image(
         # Skip animated GIFs — compression would lose frames
         return filename
 
+    from PIL import Image
+
     try:
         with Image.open(src_path) as img:
             # Convert palette/RGBA to RGB for JPEG saving
@@ -75,6 +77,8 @@ def create_thumbnail(filename: str, size: int = 300) -> Optional[str]:
 
     thumb_name = f"thumb_{filename}"
     thumb_path = os.path.join(upload_folder, thumb_name)
+    from PIL import Image
+
     try:
         with Image.open(src_path) as img:
             if img.mode in ("RGBA", "P", "LA"):
@@ -99,6 +103,8 @@ def download_and_save_image(url: str) -> Optional[Tuple[str, str]]:
     Validates content type is image. Max 16 MB. Timeout 10 s.
     Returns None on any failure.
     """
+    import requests
+
     try:
         response = requests.get(url, timeout=10, stream=True)
         response.raise_for_status()
@@ -156,6 +162,8 @@ def decode_base64_image(data: str) -> Optional[Tuple[str, str]]:
 
     Returns (filename, thumb_filename) or None on failure.
     """
+    from PIL import Image
+
     try:
         ext = "jpg"
         payload = data.strip()
@@ -0,0 +1,204 @@
+"""跨程序領導者鎖模組
+
+排程任務在多個副本（或同一副本的多個 gunicorn worker）中只能有一個在執行。
+Redis 以 SET NX PX 搭配 token 續約；PostgreSQL 以 session 層級的 advisory lock，
+持有鎖的連線中斷時鎖會自動釋放。
+"""
+import hashlib
+import logging
+import os
+import uuid
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# auto / redis / postgres / none
+LEADER_LOCK_BACKEND = os.environ.get("LEADER_LOCK_BACKEND", "auto").lower()
+LEADER_LOCK_TTL_SECONDS = int(os.environ.get("LEADER_LOCK_TTL_SECONDS", "30"))
+
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLeaderLock:
+    """Redis 租約鎖：持有者需在 TTL 內續約，否則其他程序可接手"""
+
+    backend = "redis"
+
+    def __init__(self, client, name: str, ttl_seconds: int = LEADER_LOCK_TTL_SECONDS):
+        self.client = client
+        self.key = f"leader:{name}"
+        self.ttl_ms = ttl_seconds * 1000
+        self.token = uuid.uuid4().hex
+        self.held = False
+
+    def acquire(self) -> bool:
+        try:
+            self.held = bool(self.client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        except Exception as e:
+            logger.warning("leader lock acquire failed: %s", e)
+            self.held = False
+        return self.held
+
+    def refresh(self) -> bool:
+        """續約並回傳是否仍持有鎖"""
+        if not self.held:
+            return False
+        try:
+            self.held = bool(self.client.eval(_RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms))
+        except Exception as e:
+            logger.warning("leader lock refresh failed: %s", e)
+            self.held = False
+        return self.held
+
+    def release(self) -> None:
+        if not self.held:
+            return
+        self.held = False
+        try:
+            self.client.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            logger.warning("leader lock release failed: %s", e)
+
+
+class PostgresAdvisoryLock:
+    """PostgreSQL advisory lock：以專用連線持有，連線存活即代表仍是領導者"""
+
+    backend = "postgres"
+
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        # advisory lock 的 key 為 bigint，由名稱雜湊取得
+        self.key = int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+        self._conn = None
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None
+
+    def acquire(self) -> bool:
+        from sqlalchemy import text
+
+        if self._conn is not None:
+            return True
+        conn = None
+        try:
+            conn = self.engine.connect()
+            ok = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            conn.commit()
+        except Exception as e:
+            logger.warning("leader lock acquire failed: %s", e)
+            ok = False
+        if ok:
+            self._conn = conn
+        elif conn is not None:
+            conn.close()
+        return bool(ok)
+
+    def refresh(self) -> bool:
+        from sqlalchemy import text
+
+        if self._conn is None:
+            return False
+        try:
+            self._conn.execute(text("SELECT 1")).scalar()
+            self._conn.commit()
+            return True
+        except Exception as e:
+            logger.warning("leader lock connection lost: %s", e)
+            self._discard()
+            return False
+
+    def release(self) -> None:
+        from sqlalchemy import text
+
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            self._conn.commit()
+        except Exception as e:
+            logger.warning("leader lock release failed: %s", e)
+        self._discard()
+
+    def _discard(self) -> None:
+        conn, self._conn = self._conn, None
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class LocalLeaderLock:
+    """無共享儲存時的退路：本程序永遠是領導者（僅適用單一副本部署）"""
+
+    backend = "none"
+
+    def __init__(self):
+        self.held = False
+
+    def acquire(self) -> bool:
+        self.held = True
+        return True
+
+    def refresh(self) -> bool:
+        return self.held
+
+    def release(self) -> None:
+        self.held = False
+
+
+def _redis_client():
+    redis_url = os.environ.get("REDIS_URL", "")
+    if not redis_url.startswith(("redis://", "rediss://", "unix://")):
+        return None
+    try:
+        import redis
+
+        client = redis.from_url(redis_url, socket_connect_timeout=2, socket_timeout=5)
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+
+def _postgres_engine():
+    from app import db, get_db_type
+
+    if get_db_type() != "postgres":
+        return None
+    try:
+        engine = db.engine
+    except Exception:
+        return None
+    return engine if engine.dialect.name == "postgresql" else None
+
+
+def make_leader_lock(name: str, backend: Optional[str] = None):
+    """依 LEADER_LOCK_BACKEND 建立鎖；auto 時優先 Redis，其次 PostgreSQL（需在 app context 內呼叫）"""
+    backend = (backend or LEADER_LOCK_BACKEND).lower()
+    if backend in ("auto", "redis"):
+        client = _redis_client()
+        if client is not None:
+            return RedisLeaderLock(client, name)
+        if backend == "redis":
+            raise RuntimeError("LEADER_LOCK_BACKEND=redis 但 REDIS_URL 無法連線")
+    if backend in ("auto", "postgres"):
+        engine = _postgres_engine()
+        if engine is not None:
+            return PostgresAdvisoryLock(engine, name)
+        if backend == "postgres":
+            raise RuntimeError("LEADER_LOCK_BACKEND=postgres 但目前未使用 PostgreSQL")
+    logger.warning("no shared leader lock backend available; assuming a single scheduler instance")
+    return LocalLeaderLock()
@@ -0,0 +1,475 @@
+"""Prometheus 指標模組
+
+請求延遲（依路由樣板與狀態碼）、資料庫查詢次數與耗時（SQLAlchemy 引擎事件、
+pymongo command listener）、連線池取得連線的等待時間、程序內快取命中率、
+各通道通知發送次數與耗時、排程與 webhook 佇列等指標以 Prometheus 文字格式輸出。
+
+物品數量等需要查詢資料庫的庫存指標由背景執行緒定期更新並寫入共用快取，
+抓取 /metrics 時只讀取快照，不會即時計算。
+
+gunicorn 多 worker 部署時設定 PROMETHEUS_MULTIPROC_DIR，計數器與直方圖會
+彙整所有 worker；連線池、快取等即時數值則來自回應這次抓取的 worker。
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_CACHE_KEY = "metrics:inventory"
+# 庫存指標更新間隔（秒）
+INVENTORY_REFRESH_SECONDS = float(os.environ.get("METRICS_INVENTORY_REFRESH_SECONDS", "60"))
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "ims_http_request_duration_seconds",
+    "HTTP request latency by route template and status",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "ims_http_request_db_queries",
+    "Database queries issued per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+DB_QUERY_SECONDS = Histogram(
+    "ims_db_query_duration_seconds",
+    "Database query duration",
+    ["backend", "operation"],
+    buckets=_QUERY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter(
+    "ims_db_query_errors_total",
+    "Failed database queries",
+    ["backend", "operation"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "ims_db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=_QUERY_BUCKETS,
+)
+NOTIFICATION_SENDS = Counter(
+    "ims_notification_sends_total",
+    "Notification send attempts by channel and outcome",
+    ["channel", "outcome"],
+)
+NOTIFICATION_SEND_SECONDS = Histogram(
+    "ims_notification_send_duration_seconds",
+    "Notification send latency by channel",
+    ["channel"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+_local = threading.local()
+_engines: "weakref.WeakSet" = weakref.WeakSet()
+_inventory: Dict[str, Any] = {}
+_refresher: Optional["InventoryRefresher"] = None
+_refresher_lock = threading.Lock()
+_mongo_listener_registered = False
+
+
+def _count_query() -> None:
+    if getattr(_local, "queries", None) is not None:
+        _local.queries += 1
+
+
+def _sql_operation(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    operation = head[0].upper() if head else ""
+    return operation if operation in _SQL_OPERATIONS else "OTHER"
+
+
+# ---------------------------------------------------------------------------
+# SQLAlchemy
+# ---------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    DB_QUERY_SECONDS.labels("sql", _sql_operation(statement)).observe(time.perf_counter() - started)
+    _count_query()
+
+
+def _handle_error(exception_context):
+    statement = exception_context.statement or ""
+    DB_QUERY_ERRORS.labels("sql", _sql_operation(statement)).inc()
+
+
+def _instrument_pool(pool) -> None:
+    """包裝 pool.connect 以量測等待取得連線的時間（SQLAlchemy 沒有「開始取得」事件）"""
+    if getattr(pool, "_metrics_instrumented", False):
+        return
+    original = pool.connect
+
+    def connect():
+        started = time.perf_counter()
+        try:
+            return original()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+    pool.connect = connect
+    pool._metrics_instrumented = True
+
+
+def instrument_engine(engine) -> None:
+    """為 SQLAlchemy 引擎加上查詢與連線池指標（可重複呼叫）"""
+    from sqlalchemy import event
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+        # dispose() 會換一個新的 pool，重新包裝
+        event.listen(engine, "engine_disposed", lambda eng: _instrument_pool(eng.pool))
+    _instrument_pool(engine.pool)
+    _engines.add(engine)
+
+
+# ---------------------------------------------------------------------------
+# pymongo
+# ---------------------------------------------------------------------------
+
+def _mongo_listener():
+    from pymongo import monitoring
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            DB_QUERY_SECONDS.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+            _count_query()
+
+        def failed(self, event):
+            DB_QUERY_SECONDS.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+            DB_QUERY_ERRORS.labels("mongo", event.command_name).inc()
+            _count_query()
+
+    return MongoCommandMetrics()
+
+
+def register_mongo_listener() -> None:
+    """需在建立 MongoClient 之前呼叫，之後建立的 client 才會回報指令耗時"""
+    global _mongo_listener_registered
+    if _mongo_listener_registered:
+        return
+    from pymongo import monitoring
+
+    monitoring.register(_mongo_listener())
+    _mongo_listener_registered = True
+
+
+# ---------------------------------------------------------------------------
+# 通知發送
+# ---------------------------------------------------------------------------
+
+def record_notification(channel: str, ok: bool, seconds: float) -> None:
+    """記錄一次通知發送的結果與耗時（email / line / telegram）"""
+    NOTIFICATION_SENDS.labels(channel, "sent" if ok else "failed").inc()
+    NOTIFICATION_SEND_SECONDS.labels(channel).observe(seconds)
+
+
+# ---------------------------------------------------------------------------
+# 背景更新的庫存指標
+# ---------------------------------------------------------------------------
+
+def compute_inventory() -> Dict[str, Any]:
+    """查詢庫存與佇列數量（需在 app context 內呼叫）"""
+    from app.repositories import item_repo, location_repo, type_repo, user_repo
+
+    stats = item_repo.get_stats()
+    snapshot: Dict[str, Any] = {
+        "refreshed_at": time.time(),
+        "counts": {
+            "total_items": stats.get("total", 0),
+            "items_with_photo": stats.get("with_photo", 0),
+            "items_with_location": stats.get("with_location", 0),
+            "items_with_type": stats.get("with_type", 0),
+            "types": len(type_repo.list_types()),
+            "locations": len(list(location_repo.list_locations())),
+            "users": user_repo.count_all(),
+        },
+        "webhook_outbox": {},
+        "bot_updates": {},
+    }
+    try:
+        from app.repositories import webhook_repo
+
+        snapshot["webhook_outbox"] = webhook_repo.count_outbox_by_status()
+    except Exception:
+        pass
+    try:
+        from app.repositories import bot_update_repo
+
+        snapshot["bot_updates"] = bot_update_repo.count_by_status()
+    except Exception:
+        pass
+    return snapshot
+
+
+def _store_inventory(snapshot: Dict[str, Any]) -> None:
+    _inventory.clear()
+    _inventory.update(snapshot)
+    try:
+        from app import cache
+
+        cache.set(INVENTORY_CACHE_KEY, snapshot, timeout=int(INVENTORY_REFRESH_SECONDS * 5))
+    except Exception:
+        pass
+
+
+def get_inventory() -> Dict[str, Any]:
+    """最近一次背景更新的快照；優先讀共用快取（可能由其他 worker 更新）"""
+    try:
+        from app import cache
+
+        shared = cache.get(INVENTORY_CACHE_KEY)
+        if shared and shared.get("refreshed_at", 0) >= _inventory.get("refreshed_at", 0):
+            return shared
+    except Exception:
+        pass
+    return dict(_inventory)
+
+
+def refresh_inventory(app, force: bool = False) -> bool:
+    """更新庫存快照；其他 worker 剛更新過時略過，回傳是否有實際查詢"""
+    with app.app_context():
+        if not force:
+            current = get_inventory()
+            if time.time() - current.get("refreshed_at", 0) < INVENTORY_REFRESH_SECONDS * 0.9:
+                return False
+        _store_inventory(compute_inventory())
+        return True
+
+
+class InventoryRefresher:
+    """定期更新庫存指標的背景執行緒"""
+
+    def __init__(self, app, interval: float = INVENTORY_REFRESH_SECONDS):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "InventoryRefresher":
+        self._thread = threading.Thread(target=self._run, name="metrics-inventory", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                refresh_inventory(self.app)
+            except Exception as e:
+                logger.warning("inventory metrics refresh failed: %s", e)
+            self._stop.wait(self.interval)
+
+
+def start_inventory_refresher(app) -> InventoryRefresher:
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = InventoryRefresher(app).start()
+        return _refresher
+
+
+def stop_inventory_refresher() -> None:
+    global _refresher
+    with _refresher_lock:
+        refresher, _refresher = _refresher, None
+    if refresher is not None:
+        refresher.stop()
+
+
+# ---------------------------------------------------------------------------
+# 抓取時讀取的即時數值（只讀記憶體或快取，不查資料庫）
+# ---------------------------------------------------------------------------
+
+class RuntimeCollector:
+    def __init__(self, app):
+        self.app = app
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        with self.app.app_context():
+            yield from self._pool_metrics()
+            yield from self._cache_metrics()
+            yield from self._inventory_metrics()
+            yield from self._webhook_metrics()
+            yield from self._scheduler_metrics()
+
+    def _pool_metrics(self):
+        checked_out = GaugeMetricFamily("ims_db_pool_checked_out", "Connections currently checked out", labels=["engine"])
+        size = GaugeMetricFamily("ims_db_pool_size", "Configured pool size", labels=["engine"])
+        for engine in list(_engines):
+            pool = engine.pool
+            label = engine.url.host or engine.url.database or engine.url.drivername
+            if hasattr(pool, "checkedout"):
+                checked_out.add_metric([label], pool.checkedout())
+            if hasattr(pool, "size"):
+                size.add_metric([label], pool.size())
+        yield checked_out
+        yield size
+
+    def _cache_metrics(self):
+        from app.utils.cache import TTLCache, TwoTierCache
+
+        hits = CounterMetricFamily("ims_cache_hits", "In-process cache hits", labels=["cache"])
+        misses = CounterMetricFamily("ims_cache_misses", "In-process cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("ims_cache_hit_ratio", "In-process cache hit ratio", labels=["cache"])
+        entries = GaugeMetricFamily("ims_cache_entries", "In-process cache entries", labels=["cache"])
+        for name, value in self.app.extensions.items():
+            if isinstance(value, (TTLCache, TwoTierCache)):
+                stats = value.stats()
+                hits.add_metric([name], stats["hits"])
+                misses.add_metric([name], stats["misses"])
+                ratio.add_metric([name], stats["hit_ratio"])
+                entries.add_metric([name], stats["size"])
+        yield from (hits, misses, ratio, entries)
+
+    def _inventory_metrics(self):
+        snapshot = get_inventory()
+        counts = GaugeMetricFamily("ims_inventory", "Inventory counts (refreshed in background)", labels=["kind"])
+        for kind, value in (snapshot.get("counts") or {}).items():
+            counts.add_metric([kind], value)
+        yield counts
+        outbox = GaugeMetricFamily("ims_webhook_outbox", "Webhook outbox rows by status", labels=["status"])
+        for status, value in (snapshot.get("webhook_outbox") or {}).items():
+            outbox.add_metric([status], value)
+        yield outbox
+        updates = GaugeMetricFamily("ims_bot_updates", "Bot update queue rows by status", labels=["status"])
+        for status, value in (snapshot.get("bot_updates") or {}).items():
+            updates.add_metric([status], value)
+        yield updates
+        yield GaugeMetricFamily(
+            "ims_inventory_refreshed_timestamp_seconds", "Last inventory refresh", value=snapshot.get("refreshed_at", 0)
+        )
+
+    def _webhook_metrics(self):
+        from app.services import webhook_service
+
+        stats = webhook_service.get_metrics(include_outbox=False)
+        yield GaugeMetricFamily("ims_webhook_inflight", "Webhook deliveries in flight", value=stats["inflight"])
+        delivered = CounterMetricFamily("ims_webhook_deliveries", "Webhook delivery outcomes", labels=["outcome"])
+        for outcome, value in stats["counters"].items():
+            delivered.add_metric([outcome], value)
+        yield delivered
+        yield GaugeMetricFamily("ims_webhook_open_circuits", "Hosts with an open circuit breaker",
+                                value=len(stats["open_circuits"]))
+
+        from app.services import bot_service
+
+        stats = bot_service.get_metrics(include_queue=False)
+        yield GaugeMetricFamily("ims_bot_inflight", "Bot updates being processed", value=stats["inflight"])
+        outcomes = CounterMetricFamily("ims_bot_updates_processed", "Bot update outcomes", labels=["outcome"])
+        for outcome, value in stats["counters"].items():
+            outcomes.add_metric([outcome], value)
+        yield outcomes
+
+    def _scheduler_metrics(self):
+        from app.services import log_service
+        from app.utils import scheduler
+
+        runs = CounterMetricFamily("ims_scheduler_job_runs", "Scheduled job runs", labels=["job"])
+        failures = CounterMetricFamily("ims_scheduler_job_failures", "Scheduled job failures", labels=["job"])
+        missed = CounterMetricFamily("ims_scheduler_job_missed", "Scheduled job runs skipped as misfired", labels=["job"])
+        duration = GaugeMetricFamily("ims_scheduler_job_last_duration_seconds", "Last job duration", labels=["job"])
+        lag = GaugeMetricFamily("ims_scheduler_job_last_lag_seconds", "Last job start delay", labels=["job"])
+        for job_id, stats in scheduler.get_job_stats().items():
+            runs.add_metric([job_id], stats.get("runs", 0))
+            failures.add_metric([job_id], stats.get("failures", 0))
+            missed.add_metric([job_id], stats.get("missed", 0))
+            duration.add_metric([job_id], stats.get("last_duration_seconds") or 0)
+            lag.add_metric([job_id], stats.get("last_lag_seconds") or 0)
+        yield from (runs, failures, missed, duration, lag)
+
+        pending = log_service.get_buffer_stats().get("pending", 0)
+        yield GaugeMetricFamily("ims_activity_log_pending", "Buffered activity log entries", value=pending)
+
+
+# ---------------------------------------------------------------------------
+# Flask 整合
+# ---------------------------------------------------------------------------
+
+def _route_label() -> str:
+    from flask import request
+
+    # 依路由樣板而非實際路徑分組，避免物品 ID 等造成標籤數量爆炸
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+def _before_request() -> None:
+    _local.started = time.perf_counter()
+    _local.queries = 0
+
+
+def _after_request(response):
+    from flask import request
+
+    started = getattr(_local, "started", None)
+    if started is not None:
+        route = _route_label()
+        HTTP_REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+        HTTP_REQUEST_QUERIES.labels(route).observe(_local.queries or 0)
+    _local.started = None
+    _local.queries = None
+    return response
+
+
+def init_app(app) -> None:
+    """掛上請求計時並為已建立的 SQLAlchemy 引擎加上查詢指標"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.extensions["metrics_collector"] = RuntimeCollector(app)
+    try:
+        from app import db
+
+        with app.app_context():
+            for engine in db.engines.values():
+                instrument_engine(engine)
+    except Exception:
+        # 測試環境可能沒有實際初始化資料庫
+        pass
+
+
+def render_latest(app):
+    """產生 Prometheus 文字格式，回傳 (內容, Content-Type)"""
+    start_inventory_refresher(app)
+    registry = CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        for collector in (HTTP_REQUEST_SECONDS, HTTP_REQUEST_QUERIES, DB_QUERY_SECONDS,
+                          DB_QUERY_ERRORS, DB_POOL_CHECKOUT_SECONDS, NOTIFICATION_SENDS,
+                          NOTIFICATION_SEND_SECONDS):
+            registry.register(collector)
+    registry.register(app.extensions.get("metrics_collector") or RuntimeCollector(app))
+    return generate_latest(registry), CONTENT_TYPE_LATEST
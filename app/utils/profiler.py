@@ -0,0 +1,383 @@
+"""正式環境用的取樣分析器
+
+管理員可針對某個路由（endpoint 名稱、路由樣板或實際路徑）開啟取樣，分析接下來
+N 個符合的請求或一段時間內的請求。取樣期間以背景執行緒定期擷取處理請求的執行緒
+呼叫堆疊，輸出 collapsed stack（可直接匯入 speedscope 或 flamegraph.pl），並附上
+該請求執行的 SQL 語句。
+
+未開啟時請求只多一次模組變數判斷；SQL 監聽器只在開啟期間掛上。開啟狀態存在
+共用快取中，每個 worker 的監看執行緒定期同步，不經過請求路徑。監看執行緒在
+worker 處理第一個請求時才啟動，gunicorn --preload 的 master 不會帶著執行緒 fork。
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_KEY = "profiler:session"
+TAKEN_CACHE_KEY = "profiler:taken"
+POLL_SECONDS = float(os.environ.get("PROFILER_POLL_SECONDS", "2"))
+DEFAULT_INTERVAL_MS = 5
+MIN_INTERVAL_MS = 1
+MAX_REQUESTS = 500
+MAX_SECONDS = 3600
+MAX_SQL_STATEMENTS = 500
+MAX_SQL_LENGTH = 2000
+PROFILE_NAME_RE = re.compile(r"^[\w.\-]+\.(collapsed|json)$")
+
+# 請求路徑上唯一會讀取的狀態；None 代表未開啟
+_active: Optional[Dict[str, Any]] = None
+_local = threading.local()
+_state_lock = threading.Lock()
+_taken = 0
+_inflight = 0
+_sql_engines: List[Any] = []
+_watcher: Optional[threading.Thread] = None
+
+
+class StackSampler(threading.Thread):
+    """定期擷取指定執行緒的呼叫堆疊並累計次數"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join(timeout=1.0)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class RequestProfile:
+    def __init__(self, session: Dict[str, Any], endpoint: str, method: str, path: str):
+        self.session_id = session["id"]
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.status: Optional[int] = None
+        self.sql: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), session["interval"])
+        self.sampler.start()
+
+    def finish(self, output_dir: Path) -> Path:
+        duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        if not self.sampler.samples:
+            # 比取樣間隔還短的請求至少記下一筆，避免檔案是空的
+            self.sampler.counts[self.endpoint or "request"] += 1
+        output_dir.mkdir(parents=True, exist_ok=True)
+        safe_endpoint = re.sub(r"[^\w.\-]", "_", self.endpoint or "unmatched")
+        stem = f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(self.started_at))}-{os.getpid()}-{uuid.uuid4().hex[:6]}-{safe_endpoint}"
+        collapsed = output_dir / f"{stem}.collapsed"
+        collapsed.write_text(self.sampler.collapsed(), encoding="utf-8")
+        meta = {
+            "session": self.session_id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "samples": self.sampler.samples,
+            "interval_ms": round(self.sampler.interval * 1000, 3),
+            "sql_count": len(self.sql),
+            "sql_total_ms": round(sum(q["duration_ms"] for q in self.sql), 3),
+            "sql": self.sql[:MAX_SQL_STATEMENTS],
+        }
+        (output_dir / f"{stem}.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        return collapsed
+
+
+# ---------------------------------------------------------------------------
+# SQL 擷取（只在開啟期間掛上監聽器）
+# ---------------------------------------------------------------------------
+
+def _sql_before(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, "profile", None) is not None and context is not None:
+        context._profiler_started = time.perf_counter()
+
+
+def _sql_after(conn, cursor, statement, parameters, context, executemany):
+    profile = getattr(_local, "profile", None)
+    started = getattr(context, "_profiler_started", None)
+    if profile is None or started is None:
+        return
+    profile.sql.append({
+        "statement": statement[:MAX_SQL_LENGTH],
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        "executemany": bool(executemany),
+    })
+
+
+def _attach_sql_listeners() -> None:
+    """為目前 app 的引擎掛上 SQL 監聽器（只在開始取樣某個請求時呼叫）"""
+    from sqlalchemy import event
+
+    try:
+        from app import db
+
+        engines = list(db.engines.values())
+    except Exception:
+        return
+    with _state_lock:
+        for engine in engines:
+            if not event.contains(engine, "after_cursor_execute", _sql_after):
+                event.listen(engine, "before_cursor_execute", _sql_before)
+                event.listen(engine, "after_cursor_execute", _sql_after)
+                _sql_engines.append(engine)
+
+
+def _detach_sql_listeners() -> None:
+    """關閉後且沒有取樣中的請求時移除監聽器，恢復零額外負擔"""
+    from sqlalchemy import event
+
+    with _state_lock:
+        if _active is not None or _inflight:
+            return
+        while _sql_engines:
+            engine = _sql_engines.pop()
+            event.remove(engine, "before_cursor_execute", _sql_before)
+            event.remove(engine, "after_cursor_execute", _sql_after)
+
+
+def _activate(session: Optional[Dict[str, Any]]) -> None:
+    global _active, _taken
+    with _state_lock:
+        if session is not None and (_active is None or _active["id"] != session["id"]):
+            _taken = 0
+        _active = session
+    if session is None:
+        _detach_sql_listeners()
+
+
+# ---------------------------------------------------------------------------
+# 開啟 / 關閉
+# ---------------------------------------------------------------------------
+
+def _cache():
+    from app import cache
+
+    return cache
+
+
+def arm(route: Optional[str] = None, requests: Optional[int] = None, seconds: Optional[float] = None,
+        interval_ms: float = DEFAULT_INTERVAL_MS) -> Dict[str, Any]:
+    """開啟取樣：requests 與 seconds 至少需指定一個；皆指定時先達到者結束"""
+    if not requests and not seconds:
+        raise ValueError("requests or seconds is required")
+    if requests is not None and not 0 < int(requests) <= MAX_REQUESTS:
+        raise ValueError(f"requests must be between 1 and {MAX_REQUESTS}")
+    if seconds is not None and not 0 < float(seconds) <= MAX_SECONDS:
+        raise ValueError(f"seconds must be between 1 and {MAX_SECONDS}")
+    window = float(seconds) if seconds else float(MAX_SECONDS)
+    session = {
+        "id": uuid.uuid4().hex,
+        "route": (route or "").strip() or None,
+        "requests": int(requests) if requests else None,
+        "armed_at": time.time(),
+        "expires_at": time.time() + window,
+        "interval": max(MIN_INTERVAL_MS, float(interval_ms)) / 1000.0,
+    }
+    try:
+        cache = _cache()
+        cache.set(TAKEN_CACHE_KEY, 0, timeout=int(window) + 60)
+        cache.set(SESSION_CACHE_KEY, session, timeout=int(window) + 60)
+    except Exception as e:
+        logger.warning("profiler session not shared across workers: %s", e)
+    _activate(session)
+    return session
+
+
+def disarm() -> None:
+    try:
+        _cache().delete(SESSION_CACHE_KEY)
+    except Exception:
+        pass
+    _activate(None)
+
+
+def current_session() -> Optional[Dict[str, Any]]:
+    return _active
+
+
+def _claim(session: Dict[str, Any]) -> bool:
+    """取得一個取樣名額；名額以共用快取計數，所有 worker 合計不超過 requests"""
+    global _taken
+    limit = session.get("requests")
+    if not limit:
+        return True
+    try:
+        taken = _cache().inc(TAKEN_CACHE_KEY)
+    except Exception:
+        taken = None
+    if taken is None:
+        with _state_lock:
+            _taken += 1
+            taken = _taken
+    if taken > limit:
+        disarm()
+        return False
+    if taken == limit:
+        # 最後一個名額：本請求照常取樣，之後不再比對
+        disarm()
+    return True
+
+
+def _matches(route: Optional[str], endpoint: Optional[str], rule: Optional[str], path: str) -> bool:
+    if not route:
+        return True
+    return route in (endpoint, rule, path)
+
+
+# ---------------------------------------------------------------------------
+# 輸出檔案
+# ---------------------------------------------------------------------------
+
+def output_dir() -> Path:
+    from flask import current_app
+
+    return Path(current_app.config["PROFILER_OUTPUT_DIR"])
+
+
+def list_profiles(limit: int = 100) -> List[Dict[str, Any]]:
+    directory = output_dir()
+    if not directory.is_dir():
+        return []
+    files = sorted(directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+    profiles = []
+    for collapsed in files:
+        meta_path = collapsed.with_suffix(".json")
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+        meta.pop("sql", None)
+        profiles.append({"name": collapsed.name, "meta": meta_path.name, **meta})
+    return profiles
+
+
+def profile_path(name: str) -> Optional[Path]:
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = output_dir() / name
+    return path if path.is_file() else None
+
+
+# ---------------------------------------------------------------------------
+# Flask 整合
+# ---------------------------------------------------------------------------
+
+def _before_request() -> None:
+    global _inflight
+    if _watcher is None:
+        _start_watcher()
+    session = _active
+    if session is None:
+        return
+    if time.time() > session["expires_at"]:
+        _activate(None)
+        return
+    from flask import request
+
+    endpoint = request.endpoint or ""
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    if endpoint.startswith("health.profiler") or not _matches(session["route"], endpoint, rule, request.path):
+        return
+    if not _claim(session):
+        return
+    with _state_lock:
+        _inflight += 1
+    _attach_sql_listeners()
+    _local.profile = RequestProfile(session, endpoint, request.method, request.path)
+
+
+def _after_request(response):
+    profile = getattr(_local, "profile", None)
+    if profile is not None:
+        profile.status = response.status_code
+    return response
+
+
+def _teardown_request(exc=None) -> None:
+    global _inflight
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return
+    _local.profile = None
+    try:
+        from flask import current_app
+
+        path = profile.finish(Path(current_app.config["PROFILER_OUTPUT_DIR"]))
+        logger.info("profiled %s %s -> %s", profile.method, profile.path, path)
+    except Exception as e:
+        logger.warning("failed to write profile: %s", e)
+    finally:
+        with _state_lock:
+            _inflight -= 1
+        _detach_sql_listeners()
+
+
+def _watch(app) -> None:
+    """定期從共用快取同步開啟狀態（其他 worker 開啟或關閉時）"""
+    while True:
+        time.sleep(POLL_SECONDS)
+        try:
+            with app.app_context():
+                session = _cache().get(SESSION_CACHE_KEY)
+        except Exception:
+            continue
+        current = _active
+        if (session or {}).get("id") != (current or {}).get("id"):
+            _activate(session)
+
+
+def _start_watcher() -> None:
+    global _watcher
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    with _state_lock:
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch, args=(app,), name="profiler-watch", daemon=True)
+            _watcher.start()
+
+
+def init_app(app) -> None:
+    """掛上請求勾點；PROFILER_ENABLED=false 時完全不掛"""
+    if not app.config.get("PROFILER_ENABLED", True):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
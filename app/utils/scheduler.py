@@ -1,24 +1,122 @@
-"""通知任務調度模組"""
+"""通知任務調度模組
+
+排程器只在取得領導者鎖的程序中執行（見 app.utils.leader），其餘程序待命並定期嘗試接手。
+每次任務執行都會在 app context 內進行，並記錄執行時間與相對排定時間的延遲。
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
 
 from app.services import notification_service
 
+logger = logging.getLogger(__name__)
+
+# 領導者續約 / 待命程序嘗試接手的間隔，需小於 LEADER_LOCK_TTL_SECONDS
+LEADER_RENEW_SECONDS = float(os.environ.get("LEADER_RENEW_SECONDS", "10"))
+# 領導者交接期間錯過的排程，在此秒數內仍會補跑一次
+JOB_MISFIRE_GRACE_SECONDS = 300
+JOB_STATS_CACHE_KEY = "scheduler:job_stats"
+
 
 scheduler = None
 
+_stats_lock = threading.Lock()
+_job_stats: Dict[str, Dict[str, Any]] = {}
+_submitted_lag: Dict[str, float] = {}
+
+
+def _stats_for(job_id: str) -> Dict[str, Any]:
+    return _job_stats.setdefault(job_id, {
+        "runs": 0,
+        "failures": 0,
+        "missed": 0,
+        "last_started_at": None,
+        "last_duration_seconds": None,
+        "last_lag_seconds": None,
+        "max_lag_seconds": 0.0,
+        "last_error": None,
+    })
+
+
+def _on_job_event(event) -> None:
+    """記錄排定時間到實際送出執行的延遲，以及因過久未執行而略過的次數"""
+    with _stats_lock:
+        if event.code == EVENT_JOB_MISSED:
+            _stats_for(event.job_id)["missed"] += 1
+            return
+        scheduled = event.scheduled_run_times[0]
+        _submitted_lag[event.job_id] = max(0.0, (datetime.now(scheduled.tzinfo) - scheduled).total_seconds())
+
+
+def _publish_stats(app) -> None:
+    """寫入共用快取，讓 web 程序的 /metrics 也看得到 worker 的任務統計"""
+    try:
+        from app import cache
+
+        with app.app_context():
+            cache.set(JOB_STATS_CACHE_KEY, get_job_stats(local_only=True), timeout=0)
+    except Exception:
+        pass
+
+
+def _instrumented(app, job_id: str, func: Callable[[], Any]) -> Callable[[], None]:
+    """包裝任務：在 app context 內執行並記錄執行時間、延遲與失敗"""
+
+    def run() -> None:
+        started_at = datetime.now()
+        started = time.perf_counter()
+        error = None
+        try:
+            with app.app_context():
+                func()
+        except Exception as e:
+            error = e
+            print(f"❌ 排程任務 {job_id} 執行失敗: {e}")
+        duration = time.perf_counter() - started
+        with _stats_lock:
+            stats = _stats_for(job_id)
+            lag = _submitted_lag.pop(job_id, 0.0)
+            stats["runs"] += 1
+            stats["last_started_at"] = started_at.isoformat()
+            stats["last_duration_seconds"] = round(duration, 3)
+            stats["last_lag_seconds"] = round(lag, 3)
+            stats["max_lag_seconds"] = round(max(stats["max_lag_seconds"], lag), 3)
+            if error is not None:
+                stats["failures"] += 1
+                stats["last_error"] = str(error)
+        logger.info("scheduled job %s finished in %.3fs (lag %.3fs)%s",
+                    job_id, duration, lag, " with error" if error else "")
+        _publish_stats(app)
+
+    return run
+
 
-def init_scheduler():
-    """初始化定時任務調度器"""
+def init_scheduler(app=None):
+    """初始化定時任務調度器（需在 app context 內呼叫，或傳入 app）"""
     if scheduler is not None and scheduler.running:
         return
 
-    current_scheduler = BackgroundScheduler()
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+
+    current_scheduler = BackgroundScheduler(job_defaults={
+        "coalesce": True,
+        "max_instances": 1,
+        "misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS,
+    })
+    current_scheduler.add_listener(_on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
 
     # 每小時檢查一次（可以根據需要調整）
     current_scheduler.add_job(
-        func=check_notifications_job,
+        func=_instrumented(app, "check_notifications", check_notifications_job),
         trigger=CronTrigger(minute="0"),
         id="check_notifications",
         name="檢查並發送到期通知",
@@ -27,41 +125,225 @@ def init_scheduler():
 
     # 每日 09:00 檢查逾期借出
     current_scheduler.add_job(
-        func=check_overdue_loans_job,
+        func=_instrumented(app, "check_overdue_loans", check_overdue_loans_job),
         trigger=CronTrigger(hour="9", minute="0"),
         id="check_overdue_loans",
         name="檢查逾期借出提醒",
         replace_existing=True,
     )
 
+    # 每 5 分鐘重算物品有異動的使用者推薦
+    current_scheduler.add_job(
+        func=_instrumented(app, "refresh_recommendations", refresh_recommendations_job),
+        trigger=CronTrigger(minute="*/5"),
+        id="refresh_recommendations",
+        name="重算使用者推薦",
+        replace_existing=True,
+    )
+
+    # 每日 03:30 讓全部推薦過期（保固過期、保養逾期等日期型規則每天變化），由上一個任務分批重算
+    current_scheduler.add_job(
+        func=_instrumented(app, "expire_recommendations", expire_recommendations_job),
+        trigger=CronTrigger(hour="3", minute="30"),
+        id="expire_recommendations",
+        name="每日重新整理使用者推薦",
+        replace_existing=True,
+    )
+
+    # 每日 03:40 重建到期提醒排程，補上即時重新排程失敗或遺漏的異動
+    current_scheduler.add_job(
+        func=_instrumented(app, "rebuild_alert_schedule", rebuild_alert_schedule_job),
+        trigger=CronTrigger(hour="3", minute="40"),
+        id="rebuild_alert_schedule",
+        name="重建到期提醒排程",
+        replace_existing=True,
+    )
+
+    # 每日 04:00 清除超過保留天數的已送達 / 放棄 webhook 事件
+    current_scheduler.add_job(
+        func=_instrumented(app, "purge_webhook_outbox", purge_webhook_outbox_job),
+        trigger=CronTrigger(hour="4", minute="0"),
+        id="purge_webhook_outbox",
+        name="清除已完成的 webhook 事件",
+        replace_existing=True,
+    )
+
+    # 每日 04:10 清除超過保留天數的已處理 / 放棄 bot 更新
+    current_scheduler.add_job(
+        func=_instrumented(app, "purge_bot_updates", purge_bot_updates_job),
+        trigger=CronTrigger(hour="4", minute="10"),
+        id="purge_bot_updates",
+        name="清除已處理的 bot 更新",
+        replace_existing=True,
+    )
+
     current_scheduler.start()
     globals()["scheduler"] = current_scheduler
     print(f"✅ 通知調度器已啟動 - {datetime.now()}")
 
 
-def shutdown_scheduler():
-    """關閉定時任務調度器"""
+def shutdown_scheduler(wait: bool = True):
+    """關閉定時任務調度器；wait=True 時等候執行中的任務完成"""
+    global scheduler
     if scheduler and scheduler.running:
-        scheduler.shutdown()
+        scheduler.shutdown(wait=wait)
         print("✅ 通知調度器已關閉")
+    scheduler = None
 
 
-def check_notifications_job():
-    """檢查並發送通知的定時任務"""
+def get_job_stats(local_only: bool = False) -> Dict[str, Dict[str, Any]]:
+    """各任務的執行次數、失敗、最近執行時間與延遲；本程序沒有資料時讀取 worker 發布的快取"""
+    with _stats_lock:
+        stats = {job_id: dict(values) for job_id, values in _job_stats.items()}
+    if stats or local_only:
+        return stats
     try:
-        results = notification_service.check_and_send_notifications()
+        from app import cache
+
+        return cache.get(JOB_STATS_CACHE_KEY) or {}
+    except Exception:
+        return {}
+
+
+class SchedulerRuntime:
+    """排程器執行環境：競選領導者，成為領導者才啟動排程，失去鎖即停止
+
+    run() 會阻塞在 threading.Event 上直到 stop()，不會空轉佔用 CPU。
+    """
+
+    def __init__(self, app, lock=None, renew_interval: float = LEADER_RENEW_SECONDS):
+        self.app = app
+        self.lock = lock
+        self.renew_interval = renew_interval
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_lock(self):
+        if self.lock is None:
+            from app.utils.leader import make_leader_lock
+
+            with self.app.app_context():
+                self.lock = make_leader_lock("scheduler")
+        return self.lock
+
+    def tick(self) -> bool:
+        """續約或嘗試取得領導權，並依結果啟停排程器；回傳目前是否為領導者"""
+        lock = self._ensure_lock()
+        if self.is_leader:
+            if not lock.refresh():
+                print("⚠️  失去排程領導權，停止本程序的排程器")
+                self.is_leader = False
+                # 等候執行中的任務完成才釋放鎖（若仍持有），避免與接手的副本同時執行同一任務
+                shutdown_scheduler(wait=True)
+                lock.release()
+        elif lock.acquire():
+            print(f"👑 取得排程領導權（{lock.backend}）")
+            self.is_leader = True
+            init_scheduler(self.app)
+        return self.is_leader
+
+    def run(self) -> None:
+        """阻塞直到 stop()；結束時等候執行中的任務並釋放鎖"""
+        self._stop.clear()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.tick()
+                except Exception as e:
+                    logger.warning("scheduler leadership check failed: %s", e)
+                self._stop.wait(self.renew_interval)
+        finally:
+            self._shutdown()
+
+    def start_background(self) -> "SchedulerRuntime":
+        self._thread = threading.Thread(target=self.run, name="scheduler-runtime", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _shutdown(self) -> None:
+        if self.is_leader:
+            shutdown_scheduler(wait=True)
+            self.is_leader = False
+        if self.lock is not None:
+            self.lock.release()
+
+
+_runtime: Optional[SchedulerRuntime] = None
+_runtime_lock = threading.Lock()
 
-        if results["total_notifications"] > 0:
-            print(f"📧 通知任務執行完成: 發送 {results['total_notifications']} 個通知給 {results['success_users']} 個使用者")
 
-    except Exception as e:
-        print(f"❌ 通知任務執行失敗: {e}")
+def start_runtime(app) -> SchedulerRuntime:
+    """在背景啟動（或取得）本程序唯一的排程執行環境"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = SchedulerRuntime(app).start_background()
+        return _runtime
+
+
+def stop_runtime(timeout: Optional[float] = None) -> None:
+    global _runtime
+    with _runtime_lock:
+        runtime, _runtime = _runtime, None
+    if runtime is not None:
+        runtime.stop(timeout)
+
+
+def check_notifications_job():
+    """檢查並發送通知的定時任務"""
+    results = notification_service.check_and_send_notifications()
+
+    if results["total_notifications"] > 0:
+        print(f"📧 通知任務執行完成: 發送 {results['total_notifications']} 個通知給 {results['success_users']} 個使用者")
+    for channel, stats in sorted(results.get("channel_stats", {}).items()):
+        logger.info(
+            "notification channel %s: sent=%d failed=%d avg_ms=%.2f max_ms=%.2f",
+            channel, stats["sent"], stats["failed"], stats["avg_ms"], stats["max_ms"],
+        )
 
 
 def check_overdue_loans_job():
     """每日檢查逾期借出並發出提醒"""
-    try:
-        from app.services.loan_service import check_and_notify_overdue
-        check_and_notify_overdue()
-    except Exception as e:
-        print(f"❌ 逾期借出檢查任務失敗: {e}")
+    from app.services.loan_service import check_and_notify_overdue
+    check_and_notify_overdue()
+
+
+def refresh_recommendations_job():
+    """重算被標記為 stale 的使用者推薦"""
+    from app.services import recommendation_service
+    recommendation_service.refresh_stale()
+
+
+def expire_recommendations_job():
+    """每日將全部推薦標記為需重算"""
+    from app.services import recommendation_service
+    recommendation_service.expire_all()
+
+
+def rebuild_alert_schedule_job():
+    """每日依全部物品重建到期提醒排程（保留發送狀態）"""
+    from app.services import alert_schedule_service
+    alert_schedule_service.rebuild_schedule()
+
+
+def purge_webhook_outbox_job():
+    """清除超過保留天數的已送達 / 放棄 webhook 事件"""
+    from app.services import webhook_service
+    deleted = webhook_service.purge_finished()
+    if deleted:
+        print(f"🧹 已清除 {deleted} 筆已完成的 webhook 事件")
+
+
+def purge_bot_updates_job():
+    """清除超過保留天數的已處理 / 放棄 bot 更新"""
+    from app.services import bot_service
+    deleted = bot_service.purge_finished()
+    if deleted:
+        print(f"🧹 已清除 {deleted} 筆已處理的 bot 更新")
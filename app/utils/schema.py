@@ -0,0 +1,223 @@
+"""資料庫結構遷移
+
+SQL 的資料表結構只由 alembic（alembic.ini、migrations/versions）定義；部署時以專用指令套用一次：
+
+    flask --app run.py schema-upgrade
+
+指令會在 advisory lock 下執行 `alembic upgrade head`，之後種入預設管理員與物品模板（皆為冪等）。
+尚未由 alembic 管理的資料庫（全新、或過去以 db.create_all 建立）先以 create_all 補齊缺少的資料表，
+標記為 BASELINE_REVISION 後再升級；BASELINE 之後的 revision 都能套用在 create_all 已建立的物件上。
+
+啟動時只查一次 alembic_version；落後時預設自動套用（開發環境方便），production、
+TEST_MODE 或 SCHEMA_AUTO_MIGRATE=false 時只記錄警告，交給部署流程執行指令。
+MongoDB 沒有結構遷移，指令只執行對應的資料回填並種入預設資料。
+"""
+import ast
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+# 過去由 db.create_all 建立結構時，資料庫至少已經有這個 revision 的內容
+BASELINE_REVISION = "20260318_000006"
+# PostgreSQL advisory lock 代號，避免多個程序同時套用遷移
+ADVISORY_LOCK_ID = 0x494D5301
+
+
+def alembic_config(connection=None):
+    """以專案根目錄的 alembic.ini 建立設定；傳入 connection 時 migrations/env.py 會沿用它"""
+    from alembic.config import Config
+
+    config = Config(str(PROJECT_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(PROJECT_ROOT / "migrations"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def head_revision() -> str:
+    """migrations/versions 的最新 revision
+
+    啟動檢查每個 worker 都會呼叫；只解析各檔案的 revision / down_revision，不載入 alembic 與 revision 模組。
+    """
+    revisions, parents = set(), set()
+    for path in (PROJECT_ROOT / "migrations" / "versions").glob("*.py"):
+        for node in ast.parse(path.read_text(encoding="utf-8")).body:
+            if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)):
+                continue
+            name = node.targets[0].id
+            if name == "revision":
+                revisions.add(ast.literal_eval(node.value))
+            elif name == "down_revision":
+                value = ast.literal_eval(node.value)
+                parents.update(value if isinstance(value, (tuple, list)) else [value])
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise RuntimeError(f"alembic revisions must have exactly one head, found {sorted(heads)}")
+    return heads.pop()
+
+
+def current_revision() -> Optional[str]:
+    """目前的 alembic revision（單一查詢）；尚未由 alembic 管理時為空字串，無法連線或非 SQL 時為 None"""
+    from app import db, get_db_type
+
+    if get_db_type() != "postgres":
+        return None
+    try:
+        return db.session.execute(text("SELECT version_num FROM alembic_version")).scalar() or ""
+    except RuntimeError:
+        # 測試環境會 monkeypatch db.init_app，此時沒有可用的引擎
+        return None
+    except Exception:
+        db.session.rollback()
+        return ""
+
+
+@contextmanager
+def _migration_connection():
+    """以專用連線執行遷移；PostgreSQL 在這條連線上持有 advisory lock"""
+    from app import db
+
+    with db.engine.connect() as conn:
+        locked = conn.dialect.name == "postgresql"
+        if locked:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            conn.commit()
+        try:
+            yield conn
+        finally:
+            if locked:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+                conn.commit()
+
+
+def _migrate(conn) -> List[str]:
+    from alembic import command
+    from alembic.script import ScriptDirectory
+
+    from app import db
+
+    config = alembic_config(conn)
+    script = ScriptDirectory.from_config(config)
+    # 取得鎖之後再讀一次版本，其他程序可能已經套用完
+    if inspect(conn).has_table("alembic_version"):
+        current = conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    else:
+        current = None
+    conn.commit()
+
+    if current is None:
+        db.metadata.create_all(bind=conn)
+        conn.commit()
+        command.stamp(config, BASELINE_REVISION)
+        conn.commit()
+        current = BASELINE_REVISION
+
+    pending = [rev.revision for rev in script.iterate_revisions("head", current)]
+    command.upgrade(config, "head")
+    conn.commit()
+    return list(reversed(pending))
+
+
+def _migrate_mongo() -> None:
+    """MongoDB 沒有結構遷移；只補上 SQL revision 中對應的資料回填（皆為冪等）"""
+    from app.repositories import item_repo
+
+    # 20261019_000009：MaintenanceDueDate
+    updated = item_repo.backfill_maintenance_due_dates()
+    if updated:
+        logger.info("backfilled MaintenanceDueDate on %d items", updated)
+
+
+def _seed() -> None:
+    from app import _ensure_default_admin, _seed_item_templates
+
+    _ensure_default_admin()
+    _seed_item_templates()
+
+
+def upgrade() -> List[str]:
+    """套用尚未套用的 alembic revision 並種入預設資料，回傳本次套用的 revision"""
+    from app import get_db_type
+
+    if get_db_type() != "postgres":
+        _migrate_mongo()
+        _seed()
+        return []
+    with _migration_connection() as conn:
+        applied = _migrate(conn)
+        for revision in applied:
+            logger.info("schema migration applied: %s", revision)
+        _seed()
+    return applied
+
+
+def auto_migrate_enabled() -> bool:
+    manual = os.environ.get("FLASK_ENV") == "production" or os.environ.get("TEST_MODE") == "true"
+    default = "false" if manual else "true"
+    return os.environ.get("SCHEMA_AUTO_MIGRATE", default).lower() == "true"
+
+
+def check(app) -> Optional[str]:
+    """啟動時的版本檢查：SQL 只查一次 alembic_version，落後時依設定自動套用或記錄警告"""
+    from app import get_db_type
+
+    revision = current_revision()
+    app.extensions["schema_revision"] = revision
+    if get_db_type() != "postgres":
+        # MongoDB 沒有結構遷移；自動套用時只補上預設管理員
+        if app.config.get("SCHEMA_AUTO_MIGRATE"):
+            _seed()
+        return None
+    if revision is None:
+        return None
+    head = head_revision()
+    if revision == head:
+        return revision
+    if app.config.get("SCHEMA_AUTO_MIGRATE"):
+        upgrade()
+        revision = head
+        app.extensions["schema_revision"] = revision
+    else:
+        logger.warning(
+            "database schema is at revision %r but %s is required; run `flask schema-upgrade`",
+            revision, head,
+        )
+    return revision
+
+
+@click.command("schema-upgrade")
+@with_appcontext
+def upgrade_command() -> None:
+    """套用尚未套用的資料庫結構遷移（alembic upgrade head）並種入預設資料"""
+    applied = upgrade()
+    if applied:
+        click.echo(f"已套用 {len(applied)} 個遷移：{', '.join(applied)}")
+    revision = current_revision()
+    if revision is not None:
+        click.echo(f"資料庫結構版本：{revision}")
+
+
+@click.command("schema-status")
+@with_appcontext
+def status_command() -> None:
+    """顯示資料庫結構版本"""
+    revision = current_revision()
+    if revision is None:
+        click.echo("此資料庫類型沒有結構遷移")
+        return
+    click.echo(f"目前版本：{revision or '（未由 alembic 管理）'}，最新版本：{head_revision()}")
+
+
+def init_app(app) -> None:
+    app.cli.add_command(upgrade_command)
+    app.cli.add_command(status_command)
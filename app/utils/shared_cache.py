@@ -0,0 +1,244 @@
+"""類型與位置等小型熱門資料的兩層快取
+
+每個命名空間（"types"、"locations"）對應一個 TwoTierCache：先查程序內 LRU，
+再查共用快取（Redis 或 SimpleCache），都沒有時由單一呼叫者重算。資料異動時
+呼叫 invalidate() 換新的命名空間版本，並透過廣播通道通知其他 worker：
+
+- 共用快取是 Redis 時使用 Redis pub/sub
+- 否則資料庫是 PostgreSQL 時使用 LISTEN/NOTIFY
+- 兩者皆無時，本機項目與版本號只保留 unsynced_ttl 秒
+
+其他程序內快取（例如登入者快取）可用 subscribe() / broadcast() 共用同一通道，
+收到事件時自行刪除對應項目。
+
+監聽執行緒在第一次使用快取時才啟動，gunicorn --preload 的 master 不會帶著
+連線或執行緒 fork。
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import current_app
+
+from app.utils.cache import TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "ims_cache_invalidate"
+DEFAULT_LOCAL_TTL = 60.0
+DEFAULT_SHARED_TTL = 300
+RECONNECT_SECONDS = 5.0
+
+
+class InvalidationBus:
+    """單一 app 的廣播通道與所有命名空間快取"""
+
+    def __init__(self, app):
+        self.app = app
+        self.caches: Dict[str, TwoTierCache] = {}
+        self.handlers: Dict[str, Tuple[Callable[[Dict[str, Any]], None], Optional[Callable[[], None]]]] = {}
+        self.backend: Optional[str] = None
+        self.synced = False
+        self._started = False
+        self._lock = threading.Lock()
+
+    # -- 命名空間 ----------------------------------------------------------
+
+    def cache(self, namespace: str) -> TwoTierCache:
+        namespace_cache = self.caches.get(namespace)
+        if namespace_cache is None:
+            from app import cache as shared
+
+            with self._lock:
+                namespace_cache = self.caches.get(namespace)
+                if namespace_cache is None:
+                    namespace_cache = TwoTierCache(
+                        namespace,
+                        shared,
+                        local_ttl=float(self.app.config.get("CACHE_LOCAL_TTL", DEFAULT_LOCAL_TTL)),
+                        shared_ttl=int(self.app.config.get("CACHE_DEFAULT_TIMEOUT", DEFAULT_SHARED_TTL)),
+                    )
+                    namespace_cache.synced = self.synced
+                    self.caches[namespace] = namespace_cache
+                    # 讓 /metrics 匯出命中率
+                    self.app.extensions[f"{namespace}_cache"] = namespace_cache
+        self._ensure_listener()
+        return namespace_cache
+
+    def subscribe(self, event: str, handler: Callable[[Dict[str, Any]], None],
+                  reset: Optional[Callable[[], None]] = None) -> None:
+        """收到 event 時以事件內容呼叫 handler；廣播中斷或恢復時呼叫 reset 清空本機項目"""
+        self.handlers[event] = (handler, reset)
+        self._ensure_listener()
+
+    def _set_synced(self, synced: bool) -> None:
+        # 訂閱前後都可能漏掉通知，切換時一律重新讀取版本
+        self.synced = synced
+        for namespace_cache in list(self.caches.values()):
+            namespace_cache.reset()
+            namespace_cache.synced = synced
+        for _, reset in list(self.handlers.values()):
+            if reset is not None:
+                reset()
+
+    def _apply(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except (TypeError, ValueError):
+            return
+        subscription = self.handlers.get(message.get("event"))
+        if subscription is not None:
+            try:
+                subscription[0](message.get("data") or {})
+            except Exception as e:
+                logger.warning("cache invalidation handler %s failed: %s", message.get("event"), e)
+            return
+        namespace_cache = self.caches.get(message.get("ns"))
+        if namespace_cache is not None and message.get("v"):
+            namespace_cache.apply_version(message["v"])
+
+    # -- 廣播 --------------------------------------------------------------
+
+    def _redis_client(self):
+        from app import cache as shared
+
+        try:
+            with self.app.app_context():
+                return getattr(shared.cache, "_write_client", None)
+        except Exception:
+            return None
+
+    def _postgres_engine(self):
+        from app import db, get_db_type
+
+        if get_db_type() != "postgres":
+            return None
+        try:
+            with self.app.app_context():
+                engine = db.engine
+        except Exception:
+            return None
+        return engine if engine.dialect.name == "postgresql" else None
+
+    def _detect_backend(self) -> Optional[str]:
+        if self._redis_client() is not None:
+            return "redis"
+        if self._postgres_engine() is not None:
+            return "postgres"
+        return None
+
+    def publish(self, namespace: str, version: str) -> None:
+        self._publish({"ns": namespace, "v": version})
+
+    def publish_event(self, event: str, data: Dict[str, Any]) -> None:
+        self._publish({"event": event, "data": data})
+
+    def _publish(self, message: Dict[str, Any]) -> None:
+        payload = json.dumps(dict(message, pid=os.getpid()))
+        backend = self.backend or self._detect_backend()
+        try:
+            if backend == "redis":
+                self._redis_client().publish(CHANNEL, payload)
+            elif backend == "postgres":
+                from sqlalchemy import text
+
+                with self._postgres_engine().begin() as conn:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+        except Exception as e:
+            # 其他 worker 會在 unsynced_ttl 內自行重新讀取版本
+            logger.warning("cache invalidation broadcast failed: %s", e)
+
+    # -- 監聽 --------------------------------------------------------------
+
+    def _ensure_listener(self) -> None:
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self.backend = self._detect_backend()
+            if self.backend is not None:
+                threading.Thread(target=self._listen, name="cache-invalidation", daemon=True).start()
+
+    def _listen(self) -> None:
+        listen = self._listen_redis if self.backend == "redis" else self._listen_postgres
+        while True:
+            try:
+                listen()
+            except Exception as e:
+                logger.warning("cache invalidation listener disconnected: %s", e)
+            self._set_synced(False)
+            time.sleep(RECONNECT_SECONDS)
+
+    def _listen_redis(self) -> None:
+        pubsub = self._redis_client().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        try:
+            self._set_synced(True)
+            while True:
+                message = pubsub.get_message(timeout=RECONNECT_SECONDS)
+                if message and message.get("type") == "message":
+                    data = message["data"]
+                    self._apply(data.decode() if isinstance(data, bytes) else data)
+        finally:
+            pubsub.close()
+
+    def _listen_postgres(self) -> None:
+        raw = self._postgres_engine().raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self._set_synced(True)
+            while True:
+                if select.select([conn], [], [], RECONNECT_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._apply(conn.notifies.pop(0).payload)
+        finally:
+            raw.invalidate()
+
+
+def _bus() -> InvalidationBus:
+    bus = current_app.extensions.get("cache_bus")
+    if bus is None:
+        bus = current_app.extensions.setdefault("cache_bus", InvalidationBus(current_app._get_current_object()))
+    return bus
+
+
+def get_cache(namespace: str) -> TwoTierCache:
+    return _bus().cache(namespace)
+
+
+def cached(namespace: str, key: str, compute: Callable[[], Any]) -> Any:
+    """取得命名空間內的快取值，不存在時以 compute() 重算"""
+    return get_cache(namespace).get(key, compute)
+
+
+def invalidate(namespace: str) -> None:
+    """資料異動後呼叫：換新版本並通知其他 worker"""
+    bus = _bus()
+    version = bus.cache(namespace).invalidate()
+    bus.publish(namespace, version)
+
+
+def subscribe(event: str, handler: Callable[[Dict[str, Any]], None], reset: Optional[Callable[[], None]] = None) -> None:
+    """註冊其他 worker 廣播的失效事件"""
+    _bus().subscribe(event, handler, reset)
+
+
+def broadcast(event: str, data: Dict[str, Any]) -> None:
+    """通知所有 worker（含本程序）處理失效事件"""
+    _bus().publish_event(event, data)
+
+
+def is_synced() -> bool:
+    """廣播通道是否正在監聽；False 時其他 worker 的失效通知可能收不到"""
+    return _bus().synced
@@ -0,0 +1,23 @@
+"""背景 worker：排程器執行環境與 webhook / bot 佇列投遞
+
+web 程序只寫入佇列，投遞與排程由 worker 執行：
+- 正式環境：`python run_worker.py`（Docker 映像檔預設在同一容器內與 gunicorn 一併啟動）
+- 開發伺服器：`python run.py` 在同一程序內啟動
+
+排程以領導者鎖確保只有一個程序執行；佇列以 SKIP LOCKED 認領，多個 worker 同時執行也不會重複投遞。
+"""
+from app.services import bot_service, webhook_service
+from app.utils import scheduler
+
+
+def start(app) -> None:
+    scheduler.start_runtime(app)
+    webhook_service.start_dispatcher(app)
+    bot_service.start_dispatcher(app)
+
+
+def stop() -> None:
+    """停止排程與投遞，等候執行中的任務完成"""
+    scheduler.stop_runtime()
+    webhook_service.stop_dispatcher()
+    bot_service.stop_dispatcher()
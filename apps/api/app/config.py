@@ -37,6 +37,11 @@ class Settings(BaseSettings):
     vapid_public_key: str = Field(default="")
     vapid_private_key: str = Field(default="")
     vapid_email: str = Field(default="admin@example.com")
+    # Prometheus inventory gauges are recomputed by a background task at this interval
+    metrics_inventory_refresh_seconds: float = Field(default=60.0)
+    # On-demand sampling profiler (admin-armed); disabled means the middleware is not installed
+    profiler_enabled: bool = Field(default=True)
+    profiler_output_dir: str = Field(default="instance/profiles")
 
     @model_validator(mode="after")
     def _ensure_production_secret(self) -> "Settings":
@@ -1,6 +1,11 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app import metrics as app_metrics
+from app import profiler as app_profiler
 from app.config import get_settings
 from app.routes import (
     admin,
@@ -20,7 +25,9 @@ from app.routes import (
     lists,
     loans,
     locations,
+    metrics,
     notifications,
+    profiler,
     stats,
     stocktake,
     tags,
@@ -31,9 +38,27 @@ from app.routes import (
 )
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.db.session import SessionLocal, engine
+
+    app_metrics.instrument_engine(engine)
+    app_profiler.register_engine(engine)
+    refresher = asyncio.create_task(
+        app_metrics.run_inventory_refresher(SessionLocal, get_settings().metrics_inventory_refresh_seconds)
+    )
+    try:
+        yield
+    finally:
+        refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await refresher
+
+
 def create_app() -> FastAPI:
     settings = get_settings()
     app = FastAPI(
+        lifespan=lifespan,
         title=settings.app_name,
         version="2.0.0a0",
         openapi_url="/api/openapi.json",
@@ -47,7 +72,12 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(app_metrics.MetricsMiddleware)
+    if settings.profiler_enabled:
+        app_profiler.configure(settings.profiler_output_dir)
+        app.add_middleware(app_profiler.ProfilerMiddleware)
     app.include_router(health.router)
+    app.include_router(metrics.router)
     app.include_router(auth.router)
     app.include_router(users.router)
     app.include_router(categories.router)
@@ -62,6 +92,7 @@ def create_app() -> FastAPI:
     app.include_router(loans.router)
     app.include_router(transfers.router)
     app.include_router(admin.router)
+    app.include_router(profiler.router)
     app.include_router(images.router)
     app.include_router(ai.router)
     app.include_router(customization.router)
@@ -0,0 +1,200 @@
+"""Prometheus metrics for the API.
+
+Request latency is labelled by route template (``/api/items/{item_id}``), not
+by raw path, so item ids never become label values. Query count/duration and
+pool checkout wait come from SQLAlchemy engine events on the async engine's
+sync core. Inventory gauges are refreshed by a background task started in the
+app lifespan; scrapes only read the last values and never run count queries.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, func, select
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_REFRESH_SECONDS = 60.0
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "ims_api_http_request_duration_seconds",
+    "HTTP request latency by route template and status",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "ims_api_http_request_db_queries",
+    "Database queries issued per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+DB_QUERY_SECONDS = Histogram(
+    "ims_api_db_query_duration_seconds",
+    "Database query duration",
+    ["operation"],
+    buckets=_QUERY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter(
+    "ims_api_db_query_errors_total",
+    "Failed database queries",
+    ["operation"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "ims_api_db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=_QUERY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "ims_api_db_pool_checked_out",
+    "Connections currently checked out",
+)
+INVENTORY = Gauge(
+    "ims_api_inventory",
+    "Inventory counts (refreshed in background)",
+    ["kind"],
+)
+INVENTORY_REFRESHED = Gauge(
+    "ims_api_inventory_refreshed_timestamp_seconds",
+    "Last inventory refresh",
+)
+
+_request_queries: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar(
+    "ims_request_queries", default=None
+)
+
+
+def _sql_operation(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    operation = head[0].upper() if head else ""
+    return operation if operation in _SQL_OPERATIONS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    DB_QUERY_SECONDS.labels(_sql_operation(statement)).observe(time.perf_counter() - started)
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _handle_error(exception_context):
+    DB_QUERY_ERRORS.labels(_sql_operation(exception_context.statement or "")).inc()
+
+
+def _instrument_pool(pool) -> None:
+    # There is no "checkout started" pool event, so time pool.connect() itself.
+    if getattr(pool, "_metrics_instrumented", False):
+        return
+    original = pool.connect
+
+    def connect():
+        started = time.perf_counter()
+        try:
+            return original()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+    pool.connect = connect
+    pool._metrics_instrumented = True
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+
+
+def instrument_engine(engine) -> None:
+    """Attach query and pool metrics to an (async) engine. Safe to call twice."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+        # dispose() swaps in a fresh pool.
+        event.listen(sync_engine, "engine_disposed", lambda eng: _instrument_pool(eng.pool))
+    _instrument_pool(sync_engine.pool)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: records latency and per-request query count."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _request_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "<unmatched>"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], template, str(status["code"])).observe(
+                time.perf_counter() - started
+            )
+            HTTP_REQUEST_QUERIES.labels(template).observe(counter[0])
+
+
+async def refresh_inventory(session_factory) -> dict[str, int]:
+    """Run the inventory count queries once and publish them as gauges."""
+    from app.models.item import Item
+    from app.models.loan import ItemLoan
+    from app.models.user import User
+    from app.models.webhook import WebhookDelivery
+
+    async with session_factory() as session:
+        counts = {
+            "items": (await session.execute(
+                select(func.count(Item.id)).where(Item.is_deleted.is_(False))
+            )).scalar_one(),
+            "deleted_items": (await session.execute(
+                select(func.count(Item.id)).where(Item.is_deleted.is_(True))
+            )).scalar_one(),
+            "users": (await session.execute(select(func.count(User.id)))).scalar_one(),
+            "open_loans": (await session.execute(
+                select(func.count(ItemLoan.id)).where(ItemLoan.returned_at.is_(None))
+            )).scalar_one(),
+            "webhook_retries_pending": (await session.execute(
+                select(func.count(WebhookDelivery.id)).where(WebhookDelivery.next_retry_at.is_not(None))
+            )).scalar_one(),
+        }
+    for kind, value in counts.items():
+        INVENTORY.labels(kind).set(value)
+    INVENTORY_REFRESHED.set(time.time())
+    return counts
+
+
+async def run_inventory_refresher(session_factory, interval: float = INVENTORY_REFRESH_SECONDS) -> None:
+    while True:
+        try:
+            await refresh_inventory(session_factory)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # keep refreshing; a failed tick just leaves stale gauges
+            logger.warning("inventory metrics refresh failed: %s", exc)
+        await asyncio.sleep(interval)
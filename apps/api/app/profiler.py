@@ -0,0 +1,334 @@
+"""On-demand sampling profiler.
+
+An admin arms a session for the next N requests matching a path (or a path
+template such as ``/api/items/{item_id}``) and/or a time window. While a
+matching request runs, a sampler thread snapshots the event-loop thread's
+stack every few milliseconds; the result is written as collapsed stacks
+(importable into speedscope or flamegraph.pl) next to a JSON file with the
+SQL the request executed.
+
+The event loop is shared, so samples of a profiled request can include
+frames from other coroutines that ran concurrently; the SQL list is exact
+because it is keyed on a context variable. State is per process: arm each
+worker (or run a single worker) when profiling behind a process manager.
+
+When nothing is armed the middleware costs one module-level check, and the
+SQL listeners are only attached while a session is armed or a profiled
+request is still running.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event
+
+DEFAULT_INTERVAL_MS = 5.0
+MIN_INTERVAL_MS = 1.0
+MAX_REQUESTS = 500
+MAX_SECONDS = 3600
+MAX_SQL_STATEMENTS = 500
+MAX_SQL_LENGTH = 2000
+PROFILE_NAME_RE = re.compile(r"^[\w.\-]+\.(collapsed|json)$")
+
+_active: dict[str, Any] | None = None
+_lock = threading.Lock()
+_inflight = 0
+_engines: list[Any] = []
+_attached: list[Any] = []
+_output_dir = Path("instance/profiles")
+_current: contextvars.ContextVar["RequestProfile | None"] = contextvars.ContextVar(
+    "ims_profile", default=None
+)
+
+
+class StackSampler(threading.Thread):
+    """Periodically snapshot one thread's stack and count collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter[str] = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join(timeout=1.0)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class RequestProfile:
+    def __init__(self, session: dict[str, Any], method: str, path: str):
+        self.session_id = session["id"]
+        self.method = method
+        self.path = path
+        self.route: str | None = None
+        self.status: int | None = None
+        self.sql: list[dict[str, Any]] = []
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), session["interval"])
+        self.sampler.start()
+
+    def finish(self, output_dir: Path) -> Path:
+        duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        label = self.route or self.path
+        if not self.sampler.samples:
+            # Shorter than one interval: still leave a non-empty profile.
+            self.sampler.counts[label] += 1
+        output_dir.mkdir(parents=True, exist_ok=True)
+        safe = re.sub(r"[^\w.\-]", "_", label).strip("_") or "root"
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(self.started_at))
+        stem = f"{stamp}-{os.getpid()}-{uuid.uuid4().hex[:6]}-{safe}"
+        collapsed = output_dir / f"{stem}.collapsed"
+        collapsed.write_text(self.sampler.collapsed(), encoding="utf-8")
+        meta = {
+            "session": self.session_id,
+            "route": self.route,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "samples": self.sampler.samples,
+            "interval_ms": round(self.sampler.interval * 1000, 3),
+            "sql_count": len(self.sql),
+            "sql_total_ms": round(sum(q["duration_ms"] for q in self.sql), 3),
+            "sql": self.sql[:MAX_SQL_STATEMENTS],
+        }
+        (output_dir / f"{stem}.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        return collapsed
+
+
+# --- SQL capture -------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = getattr(context, "_profiler_started", None)
+    if profile is None or started is None:
+        return
+    profile.sql.append({
+        "statement": statement[:MAX_SQL_LENGTH],
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        "executemany": bool(executemany),
+    })
+
+
+def register_engine(engine) -> None:
+    """Make an (async) engine's SQL visible to profiled requests."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    with _lock:
+        if sync_engine not in _engines:
+            _engines.append(sync_engine)
+    if _active is not None:
+        _attach()
+
+
+def _attach() -> None:
+    with _lock:
+        for engine in _engines:
+            if engine not in _attached:
+                event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+                _attached.append(engine)
+
+
+def _detach() -> None:
+    with _lock:
+        if _active is not None or _inflight:
+            return
+        while _attached:
+            engine = _attached.pop()
+            event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+            event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- arming ------------------------------------------------------------------
+
+def configure(output_dir: str | Path) -> None:
+    global _output_dir
+    _output_dir = Path(output_dir)
+
+
+def arm(
+    route: str | None = None,
+    requests: int | None = None,
+    seconds: float | None = None,
+    interval_ms: float = DEFAULT_INTERVAL_MS,
+) -> dict[str, Any]:
+    """Arm a session; whichever of ``requests``/``seconds`` runs out first ends it."""
+    global _active
+    if not requests and not seconds:
+        raise ValueError("requests or seconds is required")
+    if requests is not None and not 0 < requests <= MAX_REQUESTS:
+        raise ValueError(f"requests must be between 1 and {MAX_REQUESTS}")
+    if seconds is not None and not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"seconds must be between 1 and {MAX_SECONDS}")
+    route = (route or "").strip() or None
+    now = time.time()
+    session = {
+        "id": uuid.uuid4().hex,
+        "route": route,
+        "requests": requests or None,
+        "taken": 0,
+        "armed_at": now,
+        "expires_at": now + (seconds or MAX_SECONDS),
+        "interval": max(MIN_INTERVAL_MS, interval_ms) / 1000.0,
+        "pattern": _route_pattern(route),
+    }
+    with _lock:
+        _active = session
+    _attach()
+    return public_session(session)
+
+
+def disarm() -> None:
+    global _active
+    with _lock:
+        _active = None
+    _detach()
+
+
+def public_session(session: dict[str, Any] | None = None) -> dict[str, Any] | None:
+    session = _active if session is None else session
+    if session is None:
+        return None
+    return {k: v for k, v in session.items() if k != "pattern"}
+
+
+def _route_pattern(route: str | None) -> re.Pattern[str] | None:
+    if not route or "{" not in route:
+        return None
+    parts = re.split(r"\{[^}/]+\}", route)
+    return re.compile("^" + "[^/]+".join(re.escape(p) for p in parts) + "$")
+
+
+def _claim(path: str) -> dict[str, Any] | None:
+    """Take one slot of the armed session if ``path`` matches it."""
+    global _active
+    with _lock:
+        session = _active
+        if session is None:
+            return None
+        if time.time() > session["expires_at"]:
+            _active = None
+            expired = True
+        else:
+            expired = False
+            route, pattern = session["route"], session["pattern"]
+            if route and not (pattern.match(path) if pattern else path == route):
+                return None
+            session["taken"] += 1
+            if session["requests"] and session["taken"] >= session["requests"]:
+                _active = None
+    if expired:
+        _detach()
+        return None
+    return session
+
+
+# --- output files --------------------------------------------------------------
+
+def output_dir() -> Path:
+    return _output_dir
+
+
+def list_profiles(limit: int = 100) -> list[dict[str, Any]]:
+    if not _output_dir.is_dir():
+        return []
+    files = sorted(_output_dir.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+    profiles = []
+    for collapsed in files:
+        meta_path = collapsed.with_suffix(".json")
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+        meta.pop("sql", None)
+        profiles.append({"name": collapsed.name, "meta": meta_path.name, **meta})
+    return profiles
+
+
+def profile_path(name: str) -> Path | None:
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = _output_dir / name
+    return path if path.is_file() else None
+
+
+# --- middleware ------------------------------------------------------------------
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware; a no-op unless a session is armed."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _active is None or scope["type"] != "http" or scope["path"].startswith("/api/admin/profiler"):
+            await self.app(scope, receive, send)
+            return
+        session = _claim(scope["path"])
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        await self._profile(session, scope, receive, send)
+
+    async def _profile(self, session, scope, receive, send):
+        global _inflight
+        with _lock:
+            _inflight += 1
+        _attach()
+        profile = RequestProfile(session, scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            try:
+                profile.finish(_output_dir)
+            finally:
+                with _lock:
+                    _inflight -= 1
+                _detach()
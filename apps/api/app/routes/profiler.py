@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app import profiler
+from app.auth.dependencies import get_current_admin
+from app.models.user import User
+from app.schemas.profiler import ProfilerArm
+
+router = APIRouter(prefix="/api/admin/profiler", tags=["admin"])
+
+
+@router.get("")
+async def profiler_status(admin: User = Depends(get_current_admin)) -> dict:
+    return {"session": profiler.public_session(), "profiles": profiler.list_profiles()}
+
+
+@router.post("")
+async def arm_profiler(body: ProfilerArm, admin: User = Depends(get_current_admin)) -> dict:
+    try:
+        session = profiler.arm(body.route, body.requests, body.seconds, body.interval_ms)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"session": session}
+
+
+@router.delete("")
+async def disarm_profiler(admin: User = Depends(get_current_admin)) -> dict:
+    profiler.disarm()
+    return {"session": None}
+
+
+@router.get("/{name}")
+async def download_profile(name: str, admin: User = Depends(get_current_admin)) -> FileResponse:
+    path = profiler.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain" if name.endswith(".collapsed") else "application/json"
+    return FileResponse(path, media_type=media_type, filename=name)
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, Field
+
+
+class ProfilerArm(BaseModel):
+    route: str | None = Field(default=None, description="Exact path or path template, e.g. /api/items/{item_id}")
+    requests: int | None = Field(default=None, ge=1, le=500)
+    seconds: float | None = Field(default=None, gt=0, le=3600)
+    interval_ms: float = Field(default=5.0, ge=1, le=1000)
@@ -0,0 +1,62 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import metrics
+from app.models import Item, User
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+async def test_metrics_endpoint_exposes_latency_by_route_template(client):
+    await client.get("/api/health")
+
+    response = await client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/api/health",status="200"' in response.text
+
+
+async def test_unmatched_paths_share_one_label(client):
+    before = _sample("ims_api_http_request_duration_seconds_count", method="GET", route="<unmatched>", status="404")
+
+    await client.get("/api/no-such-thing/123")
+    await client.get("/api/no-such-thing/456")
+
+    after = _sample("ims_api_http_request_duration_seconds_count", method="GET", route="<unmatched>", status="404")
+    assert after == before + 2
+
+
+async def test_engine_events_record_queries_and_pool_wait(test_engine, db_session):
+    metrics.instrument_engine(test_engine)
+    metrics.instrument_engine(test_engine)  # idempotent
+    selects = _sample("ims_api_db_query_duration_seconds_count", operation="SELECT")
+    checkouts = _sample("ims_api_db_pool_checkout_seconds_count")
+
+    await db_session.execute(select(User))
+
+    assert _sample("ims_api_db_query_duration_seconds_count", operation="SELECT") == selects + 1
+    assert _sample("ims_api_db_pool_checkout_seconds_count") >= checkouts + 1
+
+
+async def test_inventory_gauges_refresh_in_background_task(test_engine, db_session):
+    user = User(email="m@t.io", username="m_user", password_hash="x", is_active=True, is_admin=False)
+    db_session.add(user)
+    await db_session.commit()
+    db_session.add_all([
+        Item(owner_id=user.id, name="kept"),
+        Item(owner_id=user.id, name="gone", is_deleted=True),
+    ])
+    await db_session.commit()
+
+    counts = await metrics.refresh_inventory(
+        async_sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
+    )
+
+    assert counts["items"] == 1
+    assert counts["deleted_items"] == 1
+    assert _sample("ims_api_inventory", kind="users") == 1
+    assert _sample("ims_api_inventory_refreshed_timestamp_seconds") > 0
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import profiler
+
+
+async def _register_and_login(client, username):
+    await client.post("/api/auth/register", json={"email": f"{username}@t.io", "username": username, "password": "secret1234"})
+    r = await client.post("/api/auth/login", json={"username": username, "password": "secret1234"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def profile_dir(tmp_path, test_engine):
+    profiler.configure(tmp_path)
+    profiler.register_engine(test_engine)
+    yield tmp_path
+    profiler.disarm()
+    profiler._engines.clear()
+
+
+async def test_profiles_next_matching_requests_with_sql(client, profile_dir):
+    admin = await _register_and_login(client, "admin_user")
+    assert (await client.post("/api/auth/bootstrap-admin", headers=admin)).status_code == 200
+    user = await _register_and_login(client, "reg_user")
+
+    r = await client.post(
+        "/api/admin/profiler",
+        headers=admin,
+        json={"route": "/api/users/me", "requests": 2, "interval_ms": 1},
+    )
+    assert r.status_code == 200
+    assert r.json()["session"]["requests"] == 2
+
+    await client.get("/api/health")
+    for _ in range(3):
+        await client.get("/api/users/me", headers=user)
+
+    files = sorted(profile_dir.glob("*.collapsed"))
+    assert len(files) == 2
+    meta = json.loads(files[0].with_suffix(".json").read_text())
+    assert meta["path"] == "/api/users/me"
+    assert meta["status"] == 200
+    assert meta["sql_count"] >= 1
+    assert profiler.public_session() is None
+
+    sync_engine = profiler._engines[0]
+    assert not event.contains(sync_engine, "after_cursor_execute", profiler._after_cursor_execute)
+
+    status = (await client.get("/api/admin/profiler", headers=admin)).json()
+    assert len(status["profiles"]) == 2
+    download = await client.get(f"/api/admin/profiler/{files[0].name}", headers=admin)
+    assert download.status_code == 200
+    assert (await client.get("/api/admin/profiler/nope.collapsed", headers=admin)).status_code == 404
+
+
+async def test_route_templates_match_concrete_paths(profile_dir):
+    profiler.arm(route="/api/items/{item_id}", seconds=60)
+
+    assert profiler._claim("/api/items/42") is not None
+    assert profiler._claim("/api/items/42/history") is None
+    assert profiler._claim("/api/items") is None
+
+
+async def test_profiler_admin_endpoints_require_admin(client, profile_dir):
+    user = await _register_and_login(client, "reg_user")
+
+    r = await client.post("/api/admin/profiler", headers=user, json={"requests": 1})
+
+    assert r.status_code == 403
+    assert profiler.public_session() is None
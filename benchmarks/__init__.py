@@ -0,0 +1 @@
+"""效能基準測試與合成資料產生器"""
@@ -0,0 +1,151 @@
+"""效能基準測試設定：依參數建立 SQL / MongoDB 後端並載入合成資料
+
+    python -m pytest benchmarks --bench-scale 10k --benchmark-json=benchmarks/baseline-10k.json
+
+- SQL：預設 SQLite 記憶體資料庫；設定 BENCH_DATABASE_URL 可對本機 PostgreSQL 測試
+  （會建立並刪除資料表，請使用測試資料庫）
+- MongoDB：預設使用 mongomock；設定 BENCH_MONGO_URI 可對本機 MongoDB 測試（結束時會刪除該資料庫）
+
+每個後端只建立一次 app 並載入一次資料；輸出的 JSON 會附上資料規模、seed 與日期基準，
+不同次的結果可用 `pytest-benchmark compare` 比較。
+"""
+import os
+from datetime import date
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-32chars-minimum-123456")
+os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("LIMITER_STORAGE_URI", "memory://")
+os.environ.setdefault("TEST_MODE", "true")
+
+from benchmarks import synthetic  # noqa: E402
+
+BACKENDS = ("sql", "mongo")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench", "合成資料效能基準")
+    group.addoption(
+        "--bench-scale",
+        default=os.environ.get("BENCH_SCALE", "1k"),
+        help=f"合成資料規模：{', '.join(synthetic.SCALES)} 或物品筆數（預設 BENCH_SCALE 或 1k）",
+    )
+    group.addoption(
+        "--bench-backend",
+        choices=BACKENDS + ("all",),
+        default=os.environ.get("BENCH_BACKEND", "all"),
+        help="要測試的後端（預設兩者都測）",
+    )
+    group.addoption("--bench-seed", type=int, default=synthetic.DEFAULT_SEED, help="合成資料 seed")
+    group.addoption(
+        "--bench-anchor",
+        type=date.fromisoformat,
+        default=None,
+        help="合成資料的日期基準（YYYY-MM-DD，預設今天）",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "bench_app" in metafunc.fixturenames:
+        selected = metafunc.config.getoption("--bench-backend")
+        backends = BACKENDS if selected == "all" else (selected,)
+        metafunc.parametrize("bench_app", backends, indirect=True, scope="session")
+
+
+def _settings(config):
+    return {
+        "scale": config.getoption("--bench-scale"),
+        "items": synthetic.resolve_scale(config.getoption("--bench-scale")),
+        "seed": config.getoption("--bench-seed"),
+        "anchor": config.getoption("--bench-anchor") or date.today(),
+    }
+
+
+def _sql_app(monkeypatch):
+    monkeypatch.setenv("DB_TYPE", "postgres")
+    monkeypatch.setenv("DATABASE_URL", os.environ.get("BENCH_DATABASE_URL", "sqlite:///:memory:"))
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    def teardown():
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+    return app, teardown
+
+
+def _mongo_app(monkeypatch):
+    monkeypatch.setenv("DB_TYPE", "mongo")
+    uri = os.environ.get("BENCH_MONGO_URI", "")
+    if uri:
+        monkeypatch.setenv("MONGO_URI", uri)
+    else:
+        mongomock = pytest.importorskip("mongomock")
+        import flask_pymongo
+
+        monkeypatch.setenv("MONGO_URI", "mongodb://localhost:27017/itemman_bench")
+        # flask_pymongo 以模組內的 MongoClient 建立連線；換成 mongomock 的記憶體實作
+        monkeypatch.setattr(flask_pymongo, "MongoClient", lambda uri, *args, **kwargs: mongomock.MongoClient(uri))
+    from app import create_app, mongo
+
+    app = create_app()
+    with app.app_context():
+        mongo.cx.drop_database(mongo.db.name)
+
+    def teardown():
+        with app.app_context():
+            mongo.cx.drop_database(mongo.db.name)
+
+    return app, teardown
+
+
+@pytest.fixture(scope="session")
+def bench_settings(request):
+    return _settings(request.config)
+
+
+@pytest.fixture(scope="session")
+def bench_app(request, bench_settings):
+    """建立指定後端的 app 並載入合成資料（每個後端整個 session 只做一次）"""
+    monkeypatch = pytest.MonkeyPatch()
+    try:
+        app, teardown = (_sql_app if request.param == "sql" else _mongo_app)(monkeypatch)
+        app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        with app.app_context():
+            synthetic.load(bench_settings["items"], seed=bench_settings["seed"], anchor=bench_settings["anchor"])
+        app.config["BENCH_BACKEND"] = request.param
+        app.config["BENCH_MONGOMOCK"] = request.param == "mongo" and not os.environ.get("BENCH_MONGO_URI")
+        yield app
+        teardown()
+    finally:
+        monkeypatch.undo()
+
+
+@pytest.fixture
+def app_ctx(bench_app, benchmark):
+    """每個基準測試使用新的 app context，並在結果中記錄後端與資料規模"""
+    benchmark.extra_info["backend"] = bench_app.config["BENCH_BACKEND"]
+    with bench_app.app_context():
+        yield bench_app
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    settings = _settings(config)
+    output_json["synthetic"] = {
+        "scale": settings["scale"],
+        "items": settings["items"],
+        "seed": settings["seed"],
+        "anchor": settings["anchor"].isoformat(),
+        "tables": synthetic.table_sizes(settings["items"]),
+        "sql_url": os.environ.get("BENCH_DATABASE_URL", "sqlite:///:memory:").split("@")[-1],
+        "mongo": "mongodb" if os.environ.get("BENCH_MONGO_URI") else "mongomock",
+    }
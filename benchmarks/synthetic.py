@@ -0,0 +1,456 @@
+"""可重現的合成庫存資料產生器（效能基準測試用）
+
+同一組 (scale, seed, anchor) 一定產生相同的資料：物品（含照片欄位與搬移紀錄）、位置、類型、
+使用者、群組與成員、借出紀錄與操作日誌。物品、借出與日誌以產生器逐筆輸出，1M 規模也不需要
+一次放進記憶體；寫入時依 get_db_type() 分別以多列 INSERT 或 insert_many 分批寫入。
+
+日期以 anchor（預設今天）為基準往前後分布，讓到期、保養與借出逾期等查詢每天都有相同比例的命中。
+
+用法：
+    python benchmarks/synthetic.py --scale 10k [--seed 42] [--anchor 2026-01-01] [--dry-run]
+
+會寫入 DATABASE_URL / MONGO_URI 指定的資料庫（請使用測試資料庫）；--dry-run 只列出各表筆數。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SEED = 42
+CHUNK_SIZE = 5_000
+# 合成使用者共用的密碼（雜湊只算一次）
+SYNTHETIC_PASSWORD = "bench-password"
+
+TYPES = {
+    "家電": ["吸塵器", "電風扇", "除濕機", "空氣清淨機", "電鍋"],
+    "工具": ["螺絲起子", "電鑽", "扳手", "捲尺", "鐵鎚"],
+    "耗材": ["電池", "燈泡", "濾網", "垃圾袋", "膠帶"],
+    "廚具": ["平底鍋", "湯鍋", "砧板", "保鮮盒", "刀具組"],
+    "衣物": ["羽絨外套", "雨衣", "登山鞋", "圍巾", "毛衣"],
+    "文具": ["釘書機", "剪刀", "筆記本", "計算機", "印表機墨水"],
+    "戶外": ["帳篷", "睡袋", "露營燈", "折疊椅", "冰桶"],
+    "3C": ["行動電源", "延長線", "充電器", "路由器", "硬碟"],
+    "藥品": ["感冒藥", "OK 繃", "酒精", "體溫計", "維他命"],
+    "清潔": ["清潔劑", "拖把", "抹布", "漂白水", "菜瓜布"],
+    "寵物": ["飼料", "貓砂", "牽繩", "寵物床", "逗貓棒"],
+    "收納": ["收納箱", "掛勾", "真空袋", "置物架", "抽屜盒"],
+}
+BRANDS = ["大同", "國際", "象印", "小米", "3M", "無印", "宜家", "虎牌", "飛利浦", "歌林"]
+DESCRIPTIONS = [
+    "平常放在固定位置", "借給朋友後已歸還", "需要定期檢查", "備用品", "家人共用",
+    "保固卡放在文件夾", "搬家時新買的", "附原廠盒子", "常用", "季節性使用",
+]
+FLOORS = ["1F", "2F", "3F", "B1"]
+ROOMS = ["客廳", "主臥", "次臥", "書房", "廚房", "浴室", "車庫", "儲藏室", "陽台", "玄關"]
+ZONES = ["上層櫃", "下層櫃", "抽屜", "層架", "衣櫃", "箱子"]
+CONDITIONS = ["new", "good", "good", "good", "fair", "poor"]
+DEPRECIATION_METHODS = ["straight_line", "declining_balance", None]
+MAINTENANCE_INTERVALS = [30, 90, 180, 365]
+LOG_ACTIONS = ["新增物品", "編輯物品", "移動物品", "刪除物品", "調整數量", "登入"]
+
+ITEM_DATE_FIELDS = (
+    "WarrantyExpiry", "UsageExpiry", "LastMaintenanceDate", "MaintenanceDueDate", "insurance_expiry",
+)
+LOAN_DATE_FIELDS = ("lent_date", "expected_return", "actual_return")
+
+
+def resolve_scale(scale: Union[str, int]) -> int:
+    """'10k' / '1m' / 數字字串或整數轉成物品筆數"""
+    if isinstance(scale, int):
+        return scale
+    key = str(scale).strip().lower()
+    if key in SCALES:
+        return SCALES[key]
+    if key.isdigit():
+        return int(key)
+    raise ValueError(f"未知的資料規模：{scale}（可用 {', '.join(SCALES)} 或筆數）")
+
+
+def table_sizes(count: int) -> Dict[str, int]:
+    """依物品數推算其他表的筆數"""
+    users = min(500, max(5, count // 200))
+    return {
+        "items": count,
+        "users": users,
+        "groups": max(1, users // 5),
+        "types": len(TYPES),
+        "locations": len(FLOORS) * len(ROOMS) * len(ZONES),
+        "loans": max(1, count // 20),
+        "logs": max(1, count // 2),
+    }
+
+
+def build_reference(count: int, seed: int = DEFAULT_SEED, anchor: Optional[date] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """使用者、群組、成員、類型與位置（規模較小，一次產生）"""
+    rng = random.Random(f"reference:{seed}")
+    anchor = anchor or date.today()
+    sizes = table_sizes(count)
+
+    users = []
+    for index in range(sizes["users"]):
+        name = "admin" if index == 0 else f"user{index:03d}"
+        users.append({
+            "User": name,
+            "admin": index == 0,
+            "email": f"{name}@example.com",
+            # 前幾位使用者啟用通知，通知基準測試才有固定的發送對象
+            "notify_enabled": index < 5,
+            "notify_days": rng.choice([7, 14, 30]),
+            "notify_time": "00:00",
+            "notify_channels": ["email"],
+            "reminder_ladder": "30,14,7,3,1",
+            "last_notification_date": "",
+            "replacement_enabled": True,
+            "password_changed": True,
+        })
+
+    groups = []
+    members = []
+    for index in range(sizes["groups"]):
+        owner = users[(index * 5) % len(users)]["User"]
+        groups.append({
+            "id": index + 1,
+            "name": f"家庭群組 {index + 1}",
+            "owner": owner,
+            "created_at": datetime.combine(anchor, datetime.min.time()) - timedelta(days=rng.randint(30, 900)),
+        })
+        roster = {owner} | {rng.choice(users)["User"] for _ in range(rng.randint(1, 4))}
+        for username in sorted(roster):
+            members.append({
+                "group_id": index + 1,
+                "username": username,
+                "role": "admin" if username == owner else rng.choice(["member", "viewer"]),
+            })
+
+    types = []
+    for index, name in enumerate(TYPES):
+        types.append({"id": index + 1, "name": name, "parent_id": None})
+
+    locations = []
+    order = 0
+    for floor in FLOORS:
+        for room in ROOMS:
+            for zone in ZONES:
+                order += 1
+                locations.append({"id": order, "floor": floor, "room": room, "zone": zone, "order": order})
+
+    return {
+        "users": users,
+        "groups": groups,
+        "group_members": members,
+        "types": types,
+        "locations": locations,
+    }
+
+
+def _owner_weights(users: List[Dict[str, Any]]) -> List[float]:
+    """物品擁有者呈長尾分布：少數使用者擁有大部分物品"""
+    weights = [1.0 / (rank + 1) for rank in range(len(users))]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _place(location: Dict[str, Any]) -> str:
+    return f"{location['floor']}/{location['room']}/{location['zone']}"
+
+
+def iter_items(
+    count: int,
+    reference: Dict[str, List[Dict[str, Any]]],
+    seed: int = DEFAULT_SEED,
+    anchor: Optional[date] = None,
+) -> Iterator[Dict[str, Any]]:
+    """逐筆產生物品（日期欄位為 date 物件，寫入 MongoDB 前再轉字串）"""
+    rng = random.Random(f"items:{seed}")
+    anchor = anchor or date.today()
+    owners = [user["User"] for user in reference["users"]]
+    cumulative = _owner_weights(reference["users"])
+    locations = reference["locations"]
+    type_names = list(TYPES)
+
+    for index in range(count):
+        item_id = f"SYN{index:07d}"
+        item_type = rng.choice(type_names)
+        location = rng.choice(locations)
+        item = {
+            "ItemID": item_id,
+            "ItemName": f"{rng.choice(BRANDS)} {rng.choice(TYPES[item_type])} {index}",
+            "ItemDesc": "，".join(rng.sample(DESCRIPTIONS, 2)),
+            "ItemType": item_type,
+            "ItemOwner": rng.choices(owners, cum_weights=cumulative)[0],
+            "ItemGetDate": (anchor - timedelta(days=rng.randint(0, 3650))).strftime("%Y-%m-%d"),
+            "ItemFloor": location["floor"],
+            "ItemRoom": location["room"],
+            "ItemZone": location["zone"],
+            "ItemStorePlace": _place(location),
+            "visibility": rng.choices(["private", "shared", "public"], weights=[70, 20, 10])[0],
+            "shared_with": [],
+            "Quantity": rng.randint(0, 20),
+            "SafetyStock": 0,
+            "ReorderLevel": rng.randint(1, 5) if rng.random() < 0.25 else 0,
+            "condition": rng.choice(CONDITIONS),
+            "sort_order": index,
+            "favorites": [],
+            "related_items": [],
+            "size_notes": {},
+            "currency": "TWD",
+        }
+
+        # 照片：多數物品有主圖與縮圖，部分另有多張附圖
+        if rng.random() < 0.7:
+            item["ItemPic"] = f"synthetic/{item_id}.jpg"
+            item["ItemThumb"] = f"synthetic/thumb_{item_id}.jpg"
+            item["ItemPics"] = [f"synthetic/{item_id}_{n}.jpg" for n in range(rng.randint(0, 4))]
+        else:
+            item["ItemPic"] = ""
+            item["ItemThumb"] = ""
+            item["ItemPics"] = []
+
+        item["WarrantyExpiry"] = anchor + timedelta(days=rng.randint(-365, 730)) if rng.random() < 0.5 else None
+        item["UsageExpiry"] = anchor + timedelta(days=rng.randint(-60, 180)) if rng.random() < 0.2 else None
+        if rng.random() < 0.15:
+            interval = rng.choice(MAINTENANCE_INTERVALS)
+            last = anchor - timedelta(days=rng.randint(0, 400))
+            item["MaintenanceIntervalDays"] = interval
+            item["LastMaintenanceDate"] = last
+            item["MaintenanceDueDate"] = last + timedelta(days=interval)
+        else:
+            item["MaintenanceIntervalDays"] = None
+            item["LastMaintenanceDate"] = None
+            item["MaintenanceDueDate"] = None
+        item["MaintenanceCategory"] = ""
+
+        if rng.random() < 0.6:
+            item["purchase_price"] = round(rng.uniform(50, 50_000), 2)
+            item["depreciation_method"] = rng.choice(DEPRECIATION_METHODS)
+            item["depreciation_rate"] = rng.choice([10, 15, 20, 25]) if item["depreciation_method"] else None
+        else:
+            item["purchase_price"] = None
+            item["depreciation_method"] = None
+            item["depreciation_rate"] = None
+        item["insurance_expiry"] = anchor + timedelta(days=rng.randint(-30, 365)) if rng.random() < 0.05 else None
+
+        moves = []
+        when = datetime.combine(anchor, datetime.min.time()) - timedelta(days=rng.randint(0, 720))
+        previous = item["ItemStorePlace"]
+        for _ in range(rng.choices(range(6), weights=[50, 20, 12, 8, 6, 4])[0]):
+            when += timedelta(days=rng.randint(1, 60), minutes=rng.randint(0, 1439))
+            destination = _place(rng.choice(locations))
+            moves.append({
+                "date": when.strftime("%Y-%m-%d %H:%M"),
+                "from_location": previous,
+                "to_location": destination,
+            })
+            previous = destination
+        item["move_history"] = moves
+        yield item
+
+
+def iter_loans(count: int, seed: int = DEFAULT_SEED, anchor: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+    """借出紀錄：約一半已歸還，其餘中約三成已逾期"""
+    rng = random.Random(f"loans:{seed}")
+    anchor = anchor or date.today()
+    sizes = table_sizes(count)
+    owners = [f"user{index:03d}" for index in range(1, sizes["users"])] or ["admin"]
+
+    for index in range(sizes["loans"]):
+        item_index = rng.randrange(count)
+        lent = anchor - timedelta(days=rng.randint(0, 180))
+        expected = lent + timedelta(days=rng.randint(7, 60))
+        returned = rng.random() < 0.5
+        yield {
+            "item_id": f"SYN{item_index:07d}",
+            "item_name": f"借出物品 {item_index}",
+            "borrower": f"借用人 {rng.randint(1, 200)}",
+            "borrower_contact": None,
+            "lent_date": lent,
+            "expected_return": expected,
+            "actual_return": min(anchor, expected + timedelta(days=rng.randint(-5, 10))) if returned else None,
+            "status": "returned" if returned else "active",
+            "notes": None,
+            "lent_by": rng.choice(owners),
+            "created_at": datetime.combine(lent, datetime.min.time()),
+        }
+
+
+def iter_logs(
+    count: int,
+    reference: Dict[str, List[Dict[str, Any]]],
+    seed: int = DEFAULT_SEED,
+    anchor: Optional[date] = None,
+) -> Iterator[Dict[str, Any]]:
+    """操作日誌（時間由舊到新）"""
+    rng = random.Random(f"logs:{seed}")
+    anchor = anchor or date.today()
+    total = table_sizes(count)["logs"]
+    users = [user["User"] for user in reference["users"]]
+    start = datetime.combine(anchor, datetime.min.time()) - timedelta(days=365)
+    step = timedelta(days=365) / total
+
+    for index in range(total):
+        item_index = rng.randrange(count)
+        yield {
+            "action": rng.choice(LOG_ACTIONS),
+            "user": rng.choice(users),
+            "item_id": f"SYN{item_index:07d}",
+            "item_name": f"物品 {item_index}",
+            "details": {"source": "synthetic"},
+            "created_at": start + step * index,
+        }
+
+
+def generate(scale: Union[str, int], seed: int = DEFAULT_SEED, anchor: Optional[date] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """產生整組資料並放進記憶體（小規模與測試用；大規模請用 load 逐批寫入）"""
+    count = resolve_scale(scale)
+    anchor = anchor or date.today()
+    dataset: Dict[str, List[Dict[str, Any]]] = dict(build_reference(count, seed, anchor))
+    dataset["items"] = list(iter_items(count, dataset, seed, anchor))
+    dataset["loans"] = list(iter_loans(count, seed, anchor))
+    dataset["logs"] = list(iter_logs(count, dataset, seed, anchor))
+    return dataset
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _date_strings(row: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """MongoDB 的日期欄位存 YYYY-MM-DD 字串，空值存空字串"""
+    row = dict(row)
+    for field in fields:
+        value = row.get(field)
+        row[field] = value.strftime("%Y-%m-%d") if value else ""
+    return row
+
+
+def _load_sql(count: int, reference: Dict[str, List[Dict[str, Any]]], seed: int, anchor: date, chunk_size: int) -> None:
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from app import db
+    from app.models import Group, GroupMember, Item, ItemLoan, ItemType, Location, Log, User
+
+    password = generate_password_hash(SYNTHETIC_PASSWORD)
+    session = db.session
+    session.execute(insert(User), [dict(user, Password=password) for user in reference["users"]])
+    session.execute(insert(Group), reference["groups"])
+    session.execute(insert(GroupMember), reference["group_members"])
+    session.execute(insert(ItemType), reference["types"])
+    session.execute(insert(Location), reference["locations"])
+    session.commit()
+
+    for chunk in _chunks(iter_items(count, reference, seed, anchor), chunk_size):
+        session.execute(insert(Item), chunk)
+        session.commit()
+    for chunk in _chunks(iter_loans(count, seed, anchor), chunk_size):
+        session.execute(insert(ItemLoan), chunk)
+        session.commit()
+    for chunk in _chunks(iter_logs(count, reference, seed, anchor), chunk_size):
+        rows = []
+        for entry in chunk:
+            row = {k: v for k, v in entry.items() if k != "created_at"}
+            row["timestamp"] = entry["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+            rows.append(row)
+        session.execute(insert(Log), rows)
+        session.commit()
+
+
+def _load_mongo(count: int, reference: Dict[str, List[Dict[str, Any]]], seed: int, anchor: date, chunk_size: int) -> None:
+    from bson import ObjectId
+    from werkzeug.security import generate_password_hash
+
+    from app import mongo
+
+    database = mongo.db
+    password = generate_password_hash(SYNTHETIC_PASSWORD)
+    database.user.insert_many([dict(user, Password=password) for user in reference["users"]])
+    # 群組以固定的 ObjectId 寫入，成員的 group_id 才能重現
+    group_ids = {group["id"]: ObjectId(f"{group['id']:024x}") for group in reference["groups"]}
+    database.groups.insert_many([
+        {"_id": group_ids[group["id"]], "name": group["name"], "owner": group["owner"], "created_at": group["created_at"]}
+        for group in reference["groups"]
+    ])
+    database.group_members.insert_many([
+        {"group_id": str(group_ids[member["group_id"]]), "username": member["username"], "role": member["role"]}
+        for member in reference["group_members"]
+    ])
+    database.type.insert_many([{"name": item_type["name"]} for item_type in reference["types"]])
+    database.locations.insert_many([
+        {key: value for key, value in location.items() if key != "id"} for location in reference["locations"]
+    ])
+
+    for chunk in _chunks(iter_items(count, reference, seed, anchor), chunk_size):
+        database.item.insert_many([_date_strings(item, ITEM_DATE_FIELDS) for item in chunk], ordered=False)
+    for chunk in _chunks(iter_loans(count, seed, anchor), chunk_size):
+        database.item_loans.insert_many([_date_strings(loan, LOAN_DATE_FIELDS) for loan in chunk], ordered=False)
+    for chunk in _chunks(iter_logs(count, reference, seed, anchor), chunk_size):
+        database.activity_logs.insert_many(chunk, ordered=False)
+
+
+def load(
+    scale: Union[str, int],
+    seed: int = DEFAULT_SEED,
+    anchor: Optional[date] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, int]:
+    """將合成資料分批寫入目前的資料庫（需在 app context 內呼叫），回傳各表筆數"""
+    from app import get_db_type
+
+    count = resolve_scale(scale)
+    anchor = anchor or date.today()
+    reference = build_reference(count, seed, anchor)
+    if get_db_type() == "postgres":
+        _load_sql(count, reference, seed, anchor, chunk_size)
+    else:
+        _load_mongo(count, reference, seed, anchor, chunk_size)
+    sizes = table_sizes(count)
+    sizes["group_members"] = len(reference["group_members"])
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="10k", help=f"資料規模（{', '.join(SCALES)} 或物品筆數）")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--anchor", type=date.fromisoformat, default=None, help="日期基準（YYYY-MM-DD，預設今天）")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="只列出各表筆數，不寫入資料庫")
+    args = parser.parse_args()
+
+    count = resolve_scale(args.scale)
+    if args.dry_run:
+        for table, rows in table_sizes(count).items():
+            print(f"{table:<14} {rows:>10,}")
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app, db, get_db_type
+
+    app = create_app()
+    with app.app_context():
+        if get_db_type() == "postgres":
+            db.create_all()
+        started = time.perf_counter()
+        sizes = load(count, seed=args.seed, anchor=args.anchor, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+    for table, rows in sizes.items():
+        print(f"{table:<14} {rows:>10,}")
+    print(f"已寫入（{elapsed:.1f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
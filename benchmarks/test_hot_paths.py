@@ -0,0 +1,199 @@
+"""熱門路徑效能基準：清單與欄位投影、全文搜尋、儀表板、匯出、匯入、資產報表、保養提醒、通知排程與郵件發送
+
+使用合成資料的測試會在 SQL 與 MongoDB 兩個後端各跑一次（見 conftest.py）；郵件發送對本機
+aiosmtpd 伺服器量測每秒送出的通知數，不分後端。需要 pytest-benchmark。
+"""
+import functools
+import itertools
+import socket
+from unittest.mock import patch
+
+import pymongo
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app import db, get_db_type  # noqa: E402
+from app.repositories import alert_schedule_repo, item_repo, user_repo  # noqa: E402
+from app.services import alert_schedule_service, email_service, item_service, notification_service  # noqa: E402
+
+from benchmarks import synthetic  # noqa: E402
+
+IMPORT_BATCH = 200
+# 匯入檔常見的欄位（日期欄位在兩個後端的型別不同，不放進匯入基準）
+IMPORT_FIELDS = (
+    "ItemID", "ItemName", "ItemDesc", "ItemType", "ItemOwner", "ItemFloor", "ItemRoom", "ItemZone",
+    "ItemStorePlace", "Quantity", "ReorderLevel", "visibility",
+)
+NOTIFY_USERS = 5
+# 資產報表在 10 萬筆以內須於 1 秒內完成
+ASSET_REPORT_SECONDS_BUDGET = 1.0
+ASSET_REPORT_BUDGET_ITEMS = 100_000
+# 郵件發送基準每輪的通知數
+EMAIL_BENCH_MESSAGES = 200
+_import_rounds = itertools.count()
+
+
+def _login(app, username="admin"):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["UserID"] = username
+    return client
+
+
+def test_list_items_first_page(app_ctx, benchmark):
+    result = benchmark(item_service.list_items, {}, 1, item_service.DEFAULT_PAGE_SIZE, "admin")
+    assert len(result["items"]) == item_service.DEFAULT_PAGE_SIZE
+
+
+def test_list_items_filtered(app_ctx, benchmark):
+    filters = {"type": "工具", "floor": "2F", "sort": "name"}
+    result = benchmark(item_service.list_items, filters, 2, item_service.DEFAULT_PAGE_SIZE, "admin")
+    assert all(item["ItemType"] == "工具" for item in result["items"])
+
+
+@pytest.mark.parametrize("columns", ["full", "list-projection"])
+def test_item_list_projection(app_ctx, benchmark, columns):
+    """清單頁欄位投影：完整 ORM + to_dict 與只查 ITEM_LIST_PROJECTION 欄位（不含移動歷史、圖片等大欄位）"""
+    projection = {"_id": 0} if columns == "full" else item_service.ITEM_LIST_PROJECTION
+
+    def load():
+        if get_db_type() == "postgres":
+            # 不讓上一輪留在 session 的物件影響 ORM 載入成本
+            db.session.expunge_all()
+        return len(list(item_repo.list_items({}, projection)))
+
+    rows = benchmark(load)
+    assert rows > 0
+    benchmark.extra_info["rows"] = rows
+    if benchmark.stats is not None:
+        benchmark.extra_info["rows_per_second"] = round(rows / benchmark.stats.stats.mean)
+
+
+def test_full_text_search(app_ctx, benchmark):
+    if get_db_type() == "postgres" and db.engine.dialect.name != "postgresql":
+        pytest.skip("全文搜尋使用 PostgreSQL 的 ILIKE / pg_trgm；請以 BENCH_DATABASE_URL 指向 PostgreSQL")
+    result = benchmark(item_service.full_text_search, "延長線", 1, 20)
+    assert result["total"] > 0
+
+
+def test_dashboard(app_ctx, benchmark):
+    client = _login(app_ctx)
+    response = benchmark(client.get, "/dashboard")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("export_format", ["csv", "json"])
+def test_export_items(app_ctx, benchmark, export_format):
+    client = _login(app_ctx)
+    response = benchmark(client.get, f"/export/{export_format}")
+    assert response.status_code == 200
+
+
+def test_import_items(app_ctx, benchmark, bench_settings):
+    """每輪匯入一半既有物品（更新）與一半新物品（新增）"""
+    generated = synthetic.iter_items(
+        IMPORT_BATCH // 2, synthetic.build_reference(IMPORT_BATCH // 2), bench_settings["seed"], bench_settings["anchor"],
+    )
+    existing = [{field: item[field] for field in IMPORT_FIELDS} for item in generated]
+
+    def batch():
+        round_id = next(_import_rounds)
+        fresh = [dict(item, ItemID=f"IMP{round_id:04d}{n:04d}") for n, item in enumerate(existing)]
+        return ([existing + fresh], {})
+
+    success, failed = benchmark.pedantic(item_service.import_items, setup=batch, rounds=5, iterations=1)
+    assert (success, failed) == (IMPORT_BATCH, 0)
+
+
+def test_asset_report(app_ctx, benchmark, bench_settings):
+    report = benchmark(item_service.get_asset_report)
+    assert report["items_with_value"]
+    if benchmark.stats is not None and bench_settings["items"] <= ASSET_REPORT_BUDGET_ITEMS:
+        assert benchmark.stats.stats.min < ASSET_REPORT_SECONDS_BUDGET
+
+
+def test_get_replacement_items(app_ctx, benchmark):
+    result = benchmark(item_service.get_replacement_items, {"replacement_enabled": True})
+    assert result["enabled"]
+
+
+def test_rebuild_alert_schedule(app_ctx, benchmark):
+    rows = benchmark.pedantic(alert_schedule_service.rebuild_schedule, rounds=3, iterations=1)
+    assert rows > 0
+
+
+def test_notification_run(app_ctx, benchmark):
+    """完整的通知排程一輪；每輪前重建提醒排程並清除今日已發送紀錄，郵件改為直接回報成功"""
+    if app_ctx.config.get("BENCH_MONGOMOCK") and pymongo.version_tuple >= (4, 11):
+        pytest.skip("mongomock 的 bulk_write 不接受 pymongo 4.11+ 的 UpdateOne 參數；請以 BENCH_MONGO_URI 指向 MongoDB")
+    notify_users = [user["User"] for user in user_repo.get_all_users_for_notification()]
+    assert len(notify_users) == NOTIFY_USERS
+
+    def reset():
+        for username in notify_users:
+            user_repo.update_last_notification_date(username, "")
+        alert_schedule_repo.replace_entries([])
+        alert_schedule_service.rebuild_schedule()
+
+    with patch.object(email_service, "send_expiry_notification", return_value=True):
+        result = benchmark.pedantic(
+            notification_service.check_and_send_notifications, setup=reset, rounds=3, iterations=1,
+        )
+    assert result["success_users"] == NOTIFY_USERS
+
+
+@pytest.fixture(scope="module")
+def smtp_port():
+    """本機 SMTP 接收端（接受任何帳密、直接丟棄郵件），回傳連接埠"""
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    from aiosmtpd.smtp import AuthResult
+
+    class Sink:
+        async def handle_DATA(self, server, session, envelope):
+            return "250 OK"
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    controller = controller_module.Controller(
+        Sink(),
+        hostname="127.0.0.1",
+        port=port,
+        authenticator=lambda *_args: AuthResult(success=True),
+        auth_require_tls=False,
+    )
+    controller.start()
+    yield port
+    controller.stop()
+
+
+@pytest.mark.parametrize("pooled", [True, False], ids=["session-pool", "connection-per-message"])
+def test_notification_email_throughput(smtp_port, benchmark, monkeypatch, pooled):
+    """以通知排程的 worker pool 發送 EMAIL_BENCH_MESSAGES 封到期提醒；比較共用 SMTP 工作階段與每封一條連線"""
+    for name, value in {
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": smtp_port, "MAIL_USE_TLS": False,
+        "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench",
+    }.items():
+        monkeypatch.setattr(email_service, name, value)
+    items = [{"ItemName": f"物品 {n}", "UsageExpiry": "2026-01-01"} for n in range(5)]
+
+    def send_round():
+        pool = email_service.SMTPSessionPool() if pooled else None
+        send = functools.partial(email_service.send_expiry_notification, pool=pool)
+        tasks = [
+            (f"user{n}", "email", functools.partial(send, f"user{n}@example.com", items, []))
+            for n in range(EMAIL_BENCH_MESSAGES)
+        ]
+        try:
+            _, stats = notification_service._deliver_all(tasks)
+        finally:
+            if pool is not None:
+                pool.close()
+        return stats["email"]["sent"]
+
+    sent = benchmark.pedantic(send_round, rounds=3, iterations=1)
+    assert sent == EMAIL_BENCH_MESSAGES
+    benchmark.extra_info["messages"] = EMAIL_BENCH_MESSAGES
+    if benchmark.stats is not None:
+        benchmark.extra_info["messages_per_second"] = round(EMAIL_BENCH_MESSAGES / benchmark.stats.stats.mean, 1)
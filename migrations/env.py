@@ -14,8 +14,11 @@ from app.models import User, Item, ItemType, Log, Location
 # this is the Alembic Config object
 config = context.config
 
+# app.utils.schema 會傳入已持有遷移鎖的連線；此時沿用 app 的 logging 設定
+external_connection = config.attributes.get("connection")
+
 # Interpret the config file for Python logging
-if config.config_file_name is not None:
+if config.config_file_name is not None and external_connection is None:
     fileConfig(config.config_file_name)
 
 # Set sqlalchemy.url from DATABASE_URL environment variable
@@ -57,6 +60,17 @@ def run_migrations_online() -> None:
     In this scenario we need to create an Engine
     and associate a connection with the context.
     """
+    if external_connection is not None:
+        context.configure(
+            connection=external_connection,
+            target_metadata=target_metadata,
+            render_as_batch=True,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -2,7 +2,7 @@ from alembic import op
 import sqlalchemy as sa
 
 revision = "20260117_000003_travel_and_shopping"
-down_revision = "20260115_000002_add_notification_settings"
+down_revision = "20260115_000002"
 branch_labels = None
 depends_on = None
 
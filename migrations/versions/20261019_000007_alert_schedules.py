@@ -0,0 +1,41 @@
+"""add alert_schedules table
+
+Revision ID: 20261019_000007
+Revises: 20260318_000006
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000007"
+down_revision = "20260318_000006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 以 db.create_all 建立過結構的資料庫可能已經有這張表
+    if sa.inspect(op.get_bind()).has_table("alert_schedules"):
+        return
+    op.create_table(
+        "alert_schedules",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(length=50), nullable=False),
+        sa.Column("item_id", sa.String(length=50), nullable=False),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("label", sa.String(length=100), nullable=True, server_default=""),
+        sa.Column("due_date", sa.Date(), nullable=False),
+        sa.Column("next_offset", sa.Integer(), nullable=True),
+        sa.Column("next_alert_at", sa.DateTime(), nullable=True),
+        sa.Column("last_offset", sa.Integer(), nullable=True),
+        sa.Column("last_sent_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("username", "item_id", "kind", name="uq_alert_schedule_entry"),
+    )
+    op.create_index("ix_alert_schedules_item_id", "alert_schedules", ["item_id"])
+    op.create_index("ix_alert_schedules_due", "alert_schedules", ["next_alert_at", "username"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alert_schedules_due", table_name="alert_schedules")
+    op.drop_index("ix_alert_schedules_item_id", table_name="alert_schedules")
+    op.drop_table("alert_schedules")
@@ -0,0 +1,42 @@
+"""add webhook_outbox table
+
+Revision ID: 20261019_000008
+Revises: 20261019_000007
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000008"
+down_revision = "20261019_000007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 以 db.create_all 建立過結構的資料庫可能已經有這張表
+    if sa.inspect(op.get_bind()).has_table("webhook_outbox"):
+        return
+    op.create_table(
+        "webhook_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("webhook_id", sa.String(length=50), nullable=False),
+        sa.Column("event", sa.String(length=100), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("claim_token", sa.String(length=32), nullable=True),
+        sa.Column("claimed_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_webhook_outbox_webhook_id", "webhook_outbox", ["webhook_id"])
+    op.create_index("ix_webhook_outbox_due", "webhook_outbox", ["status", "next_attempt_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_webhook_outbox_due", table_name="webhook_outbox")
+    op.drop_index("ix_webhook_outbox_webhook_id", table_name="webhook_outbox")
+    op.drop_table("webhook_outbox")
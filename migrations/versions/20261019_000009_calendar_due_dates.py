@@ -0,0 +1,34 @@
+"""add items.MaintenanceDueDate and calendar date indexes
+
+Revision ID: 20261019_000009
+Revises: 20261019_000008
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000009"
+down_revision = "20261019_000008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 以 db.create_all 建立過結構的資料庫可能已經有這些欄位與索引
+    inspector = sa.inspect(op.get_bind())
+    if "MaintenanceDueDate" not in {column["name"] for column in inspector.get_columns("items")}:
+        op.add_column("items", sa.Column("MaintenanceDueDate", sa.Date(), nullable=True))
+        op.execute(
+            'UPDATE items SET "MaintenanceDueDate" = "LastMaintenanceDate" + "MaintenanceIntervalDays" '
+            'WHERE "LastMaintenanceDate" IS NOT NULL AND "MaintenanceIntervalDays" > 0'
+        )
+    if "ix_items_MaintenanceDueDate" not in {index["name"] for index in inspector.get_indexes("items")}:
+        op.create_index("ix_items_MaintenanceDueDate", "items", ["MaintenanceDueDate"])
+    if "ix_item_loans_expected_return" not in {index["name"] for index in inspector.get_indexes("item_loans")}:
+        op.create_index("ix_item_loans_expected_return", "item_loans", ["expected_return"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_item_loans_expected_return", table_name="item_loans")
+    op.drop_index("ix_items_MaintenanceDueDate", table_name="items")
+    op.drop_column("items", "MaintenanceDueDate")
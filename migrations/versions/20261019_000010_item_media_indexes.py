@@ -0,0 +1,25 @@
+"""index items.ItemPic / items.ItemThumb for upload authorization lookups
+
+Revision ID: 20261019_000010
+Revises: 20261019_000009
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000010"
+down_revision = "20261019_000009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("items")}
+    for name, column in (("ix_items_ItemPic", "ItemPic"), ("ix_items_ItemThumb", "ItemThumb")):
+        if name not in existing:
+            op.create_index(name, "items", [column])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_items_ItemThumb", table_name="items")
+    op.drop_index("ix_items_ItemPic", table_name="items")
@@ -0,0 +1,42 @@
+"""add bot_updates table
+
+Revision ID: 20261019_000011
+Revises: 20261019_000010
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000011"
+down_revision = "20261019_000010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 以 db.create_all 建立過結構的資料庫可能已經有這張表
+    if sa.inspect(op.get_bind()).has_table("bot_updates"):
+        return
+    op.create_table(
+        "bot_updates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("channel", sa.String(length=20), nullable=False),
+        sa.Column("update_key", sa.String(length=100), nullable=False),
+        sa.Column("chat_id", sa.String(length=100), nullable=False, server_default=""),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("claim_token", sa.String(length=32), nullable=True),
+        sa.Column("claimed_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("processed_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("channel", "update_key", name="uq_bot_updates_channel_key"),
+    )
+    op.create_index("ix_bot_updates_due", "bot_updates", ["status", "next_attempt_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_bot_updates_due", table_name="bot_updates")
+    op.drop_table("bot_updates")
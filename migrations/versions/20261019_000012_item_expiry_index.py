@@ -0,0 +1,28 @@
+"""index items by LEAST(WarrantyExpiry, UsageExpiry), ItemID for the expiring feed
+
+Revision ID: 20261019_000012
+Revises: 20261019_000011
+"""
+from alembic import op
+
+
+revision = "20261019_000012"
+down_revision = "20261019_000011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 運算式索引只用於 PostgreSQL 的 LEAST()；其他方言沒有對應的查詢
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS "ix_items_earliest_expiry" '
+        'ON items (LEAST("WarrantyExpiry", "UsageExpiry"), "ItemID")'
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute('DROP INDEX IF EXISTS "ix_items_earliest_expiry"')
@@ -0,0 +1,32 @@
+"""add user_recommendations table
+
+Revision ID: 20261019_000013
+Revises: 20261019_000012
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000013"
+down_revision = "20261019_000012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 以 db.create_all 建立過結構的資料庫可能已經有這張表
+    if sa.inspect(op.get_bind()).has_table("user_recommendations"):
+        return
+    op.create_table(
+        "user_recommendations",
+        sa.Column("user_id", sa.String(length=50), primary_key=True),
+        sa.Column("recommendations", sa.JSON(), nullable=True),
+        sa.Column("stale", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("computed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_user_recommendations_stale", "user_recommendations", ["stale"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_recommendations_stale", table_name="user_recommendations")
+    op.drop_table("user_recommendations")
@@ -0,0 +1,23 @@
+"""index items.ItemOwner for per-owner recommendation refreshes
+
+Revision ID: 20261019_000014
+Revises: 20261019_000013
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000014"
+down_revision = "20261019_000013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("items")}
+    if "ix_items_ItemOwner" not in existing:
+        op.create_index("ix_items_ItemOwner", "items", ["ItemOwner"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_items_ItemOwner", table_name="items")
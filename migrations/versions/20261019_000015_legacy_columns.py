@@ -0,0 +1,78 @@
+"""add columns that used to be patched in at boot, and the pg_trgm extension
+
+Before alembic drove the Flask app's schema, create_app ran a series of
+_ensure_* helpers that inspected each table and issued ALTER TABLE for
+missing columns. This revision carries the same checks so databases built
+by db.create_all (at any point in time) converge on the current models.
+
+Revision ID: 20261019_000015
+Revises: 20261019_000014
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000015"
+down_revision = "20261019_000014"
+branch_labels = None
+depends_on = None
+
+
+# (資料表, 欄位, 欄位定義)；與原本啟動時補欄位的 ALTER TABLE 相同
+LEGACY_COLUMNS = [
+    ("items", "MaintenanceCategory", "VARCHAR(50) DEFAULT ''"),
+    ("items", "MaintenanceIntervalDays", "INTEGER"),
+    ("items", "LastMaintenanceDate", "DATE"),
+    ("users", "display_name", "VARCHAR(100)"),
+    ("users", "theme_preference", "VARCHAR(20) DEFAULT 'light'"),
+    ("users", "language", "VARCHAR(10) DEFAULT 'zh_TW'"),
+    ("users", "dashboard_widgets", "TEXT"),
+    ("item_types", "parent_id", "INTEGER REFERENCES item_types(id) ON DELETE SET NULL"),
+    ("items", "condition", "VARCHAR(20) DEFAULT 'good'"),
+    ("items", "purchase_price", "NUMERIC(10,2)"),
+    ("items", "current_value", "NUMERIC(10,2)"),
+    ("items", "depreciation_method", "VARCHAR(20)"),
+    ("items", "depreciation_rate", "NUMERIC(5,2)"),
+    ("items", "warehouse_id", "INTEGER"),
+    ("items", "map_x", "INTEGER"),
+    ("items", "map_y", "INTEGER"),
+    ("locations", "floor_plan_image", "VARCHAR(255)"),
+    ("items", "purchase_url", "VARCHAR(500)"),
+    ("items", "preferred_store", "VARCHAR(100)"),
+    ("items", "currency", "VARCHAR(5) DEFAULT 'TWD'"),
+    ("users", "email_verified", "BOOLEAN DEFAULT FALSE"),
+    ("users", "email_verify_token", "VARCHAR(100)"),
+    ("items", "is_deleted", "BOOLEAN NOT NULL DEFAULT FALSE"),
+    ("items", "deleted_at", "TIMESTAMP"),
+    ("items", "sort_order", "INTEGER NOT NULL DEFAULT 0"),
+    ("items", "insurance_provider", "VARCHAR(100)"),
+    ("items", "insurance_policy", "VARCHAR(100)"),
+    ("items", "insurance_expiry", "DATE"),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = {}
+    for table, column, definition in LEGACY_COLUMNS:
+        if table not in existing:
+            existing[table] = (
+                {col["name"] for col in inspector.get_columns(table)} if inspector.has_table(table) else None
+            )
+        if existing[table] is None or column in existing[table]:
+            continue
+        op.execute(f'ALTER TABLE {table} ADD COLUMN "{column}" {definition}')
+
+    # 模糊全文搜尋用的 pg_trgm；連線帳號沒有權限時全文搜尋會退回 ILIKE，不讓遷移失敗
+    if bind.dialect.name == "postgresql":
+        try:
+            with bind.begin_nested():
+                op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except sa.exc.DBAPIError:
+            pass
+
+
+def downgrade() -> None:
+    # 這些欄位屬於模型的一部分，降版時保留
+    pass
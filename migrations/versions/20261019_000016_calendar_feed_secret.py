@@ -0,0 +1,25 @@
+"""add users.calendar_feed_secret for revocable calendar feed URLs
+
+Revision ID: 20261019_000016
+Revises: 20261019_000015
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261019_000016"
+down_revision = "20261019_000015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 以 db.create_all 建立過結構的資料庫可能已經有這個欄位
+    inspector = sa.inspect(op.get_bind())
+    if "calendar_feed_secret" in {col["name"] for col in inspector.get_columns("users")}:
+        return
+    op.add_column("users", sa.Column("calendar_feed_secret", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "calendar_feed_secret")
@@ -17,6 +17,15 @@ if __name__ == "__main__":
     print("👤 預設登入帳號: admin / admin")
     print("-" * 50)
 
+    # 開發伺服器在同一程序內執行排程與 webhook / bot 佇列投遞（reloader 的監看程序不啟動）；
+    # gunicorn 部署需另外執行 run_worker.py
+    from werkzeug.serving import is_running_from_reloader
+
+    if is_running_from_reloader():
+        from app.utils import worker
+
+        worker.start(app)
+
     try:
         app.run(debug=True, host="0.0.0.0", port=8080)
     except Exception as e:
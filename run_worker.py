@@ -1,34 +1,37 @@
 #!/usr/bin/env python3
-"""Worker process for scheduled tasks"""
-import os
-import sys
+"""Worker process for scheduled tasks
+
+多個副本可同時執行：只有取得領導者鎖的程序會執行排程任務，其餘待命接手。
+主執行緒阻塞在 Event 上等待 SIGTERM / SIGINT，收到後等候執行中的任務完成再結束。
+"""
 import signal
+import threading
 
 from app import create_app
-from app.utils.scheduler import init_scheduler, shutdown_scheduler
+from app.services import log_service
+from app.utils import worker
 
 
 def main():
     app = create_app()
+    stop = threading.Event()
+
+    def signal_handler(sig, frame):
+        print("🛑 Received shutdown signal...")
+        stop.set()
 
-    with app.app_context():
-        print("🚀 Starting scheduler worker...")
-        init_scheduler()
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
 
-        def signal_handler(sig, frame):
-            print("🛑 Received shutdown signal...")
-            shutdown_scheduler()
-            sys.exit(0)
+    print("🚀 Starting scheduler worker...")
+    # webhook / bot 佇列只由 worker 投遞；web 程序只寫入佇列，不啟動投遞執行緒
+    worker.start(app)
 
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+    stop.wait()
 
-        try:
-            while True:
-                pass
-        except KeyboardInterrupt:
-            shutdown_scheduler()
-            sys.exit(0)
+    worker.stop()
+    log_service.shutdown()
+    print("👋 Scheduler worker stopped")
 
 
 if __name__ == "__main__":
@@ -196,6 +196,12 @@ echo "👤 預設登入帳號: admin / admin"
 echo "--------------------------------------------------"
 echo ""
 
+# Prometheus 多 worker 指標目錄：每次啟動清空，避免累積舊程序的數值
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 # 執行傳入的命令，或預設啟動 Flask
 exec "$@"
 
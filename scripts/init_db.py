@@ -13,15 +13,16 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app import create_app, db, mongo, get_db_type
+from app.utils import schema
 
 
 def init_postgres_database():
     """初始化 PostgreSQL 資料庫"""
     from app.models import User, ItemType
 
-    print("   📋 建立資料表...")
-    db.create_all()
-    print("   ✓ 資料表建立完成")
+    print("   📋 套用資料庫結構遷移（alembic upgrade head）...")
+    applied = schema.upgrade()
+    print(f"   ✓ 資料庫結構版本 {schema.current_revision()}（本次套用 {len(applied)} 個）")
 
     print("   👤 檢查管理員帳號...")
     if not User.query.filter_by(User="admin").first():
@@ -52,6 +53,9 @@ def init_postgres_database():
 
 def init_mongo_database():
     """初始化 MongoDB 資料庫"""
+    print("   📋 種入預設資料...")
+    schema.upgrade()
+
     print("   📋 建立索引...")
     try:
         mongo.db.item.create_index("ItemID", unique=True, sparse=True, background=True)
@@ -0,0 +1,154 @@
+"""操作日誌批次寫入測試（批次 INSERT、依筆數/時間觸發、背壓丟棄、失敗重試、嚴格模式）"""
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models.log import Log
+from app.services import log_service
+
+
+def _entry(i):
+    return {
+        "action": "update",
+        "user": "alice",
+        "item_id": f"I{i}",
+        "item_name": f"item {i}",
+        "details": {"n": i},
+        "created_at": datetime(2026, 1, 2, 3, 4, 5),
+    }
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class ActivityLogBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self._db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self._db_file.close()
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = f"sqlite:///{self._db_file.name}"
+        self.app = create_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+
+    def tearDown(self):
+        log_service.shutdown()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+        os.unlink(self._db_file.name)
+
+    def _buffer(self, **kwargs):
+        buffer = log_service.ActivityLogBuffer(app=self.app, **kwargs)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test_flush_writes_in_multi_row_batches(self):
+        buffer = self._buffer(batch_size=50)
+        for i in range(120):
+            buffer.append(_entry(i))
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            written = buffer.flush()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(written, 120)
+        self.assertEqual(len([s for s in statements if s.startswith("INSERT")]), 3)
+        self.assertEqual(Log.query.count(), 120)
+        # 保留排入佇列時的時間，而非寫入時間
+        self.assertEqual(Log.query.first().timestamp, "2026-01-02 03:04:05")
+
+    def test_background_writer_flushes_on_batch_size(self):
+        buffer = self._buffer(batch_size=10, flush_ms=60_000).start()
+        for i in range(10):
+            buffer.append(_entry(i))
+
+        self.assertTrue(_wait_for(lambda: buffer.stats()["written"] == 10))
+        self.assertEqual(buffer.pending, 0)
+
+    def test_background_writer_flushes_on_interval(self):
+        buffer = self._buffer(batch_size=1000, flush_ms=50).start()
+        for i in range(3):
+            buffer.append(_entry(i))
+
+        self.assertTrue(_wait_for(lambda: buffer.stats()["written"] == 3))
+
+    def test_full_queue_drops_and_counts(self):
+        buffer = self._buffer(max_pending=5)
+        results = [buffer.append(_entry(i)) for i in range(8)]
+
+        self.assertEqual(results.count(False), 3)
+        self.assertEqual(buffer.stats()["dropped"], 3)
+        self.assertEqual(buffer.flush(), 5)
+
+    def test_failed_batch_is_retried_once_then_dropped(self):
+        buffer = self._buffer()
+        buffer.append(_entry(1))
+
+        with patch("app.repositories.log_repo.insert_logs", side_effect=RuntimeError("db down")):
+            self.assertEqual(buffer.flush(), 0)
+            self.assertEqual(buffer.pending, 1)
+            buffer.flush()
+        stats = buffer.stats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["dropped"], 1)
+        self.assertEqual(stats["failed_batches"], 2)
+
+        buffer.append(_entry(2))
+        with patch("app.repositories.log_repo.insert_logs", side_effect=[RuntimeError("blip"), None]):
+            buffer.flush()
+            self.assertEqual(buffer.flush(), 1)
+
+    def test_stop_flushes_remaining_entries(self):
+        buffer = self._buffer(batch_size=1000, flush_ms=60_000).start()
+        for i in range(7):
+            buffer.append(_entry(i))
+
+        buffer.stop()
+
+        self.assertEqual(Log.query.count(), 7)
+
+    def test_reads_see_entries_still_in_buffer(self):
+        with self.app.test_request_context():
+            log_service.log_item_create("alice", "A1", "Lamp")
+            logs = log_service.get_recent_logs()
+
+        self.assertEqual([log["item_id"] for log in logs], ["A1"])
+
+    def test_strict_mode_flushes_at_request_end(self):
+        with patch.object(log_service, "ACTIVITY_LOG_STRICT", True):
+            app = create_app()
+        FlaskSQLAlchemy.init_app(db, app)
+        log_service._buffer = log_service.ActivityLogBuffer(app=app, flush_ms=60_000)
+
+        with app.test_request_context():
+            log_service.log_item_delete("alice", "A2", "Chair")
+            self.assertEqual(log_service.get_buffer_stats()["pending"], 1)
+
+        self.assertEqual(log_service.get_buffer_stats()["pending"], 0)
+        self.assertEqual(Log.query.one().item_id, "A2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+"""到期提醒排程測試（提醒階梯、物品排程與使用者人數無關、讀取時依可見性展開、只讀到期項目、發送後推進、編輯後重排）"""
+import importlib.util
+import os
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import AlertSchedule, Item
+from app.services import alert_schedule_service
+
+
+def _real_item_repo():
+    """conftest 將 item_repo 的部分查詢換成空結果，這裡載入一份未修改的模組"""
+    spec = importlib.util.find_spec("app.repositories.item_repo")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _user(name, **overrides):
+    user = {
+        "User": name,
+        "notify_days": 30,
+        "reminder_ladder": "30,7,1",
+        "replacement_enabled": False,
+        "replacement_intervals": [],
+    }
+    user.update(overrides)
+    return user
+
+
+class NextAlertTestCase(unittest.TestCase):
+    ladder = [30, 7, 1, 0]
+
+    def test_future_due_date_schedules_first_rung(self):
+        today = date(2026, 1, 1)
+        offset, at = alert_schedule_service.next_alert(date(2026, 3, 1), self.ladder, None, today)
+
+        self.assertEqual(offset, 30)
+        self.assertEqual(at.date(), date(2026, 1, 30))
+
+    def test_missed_rungs_collapse_to_most_recent(self):
+        today = date(2026, 1, 1)
+        offset, at = alert_schedule_service.next_alert(date(2026, 1, 5), self.ladder, None, today)
+
+        self.assertEqual(offset, 7)
+        self.assertEqual(at.date(), today)
+
+    def test_sent_rungs_are_not_repeated(self):
+        today = date(2026, 1, 25)
+        due = date(2026, 1, 30)
+
+        self.assertEqual(alert_schedule_service.next_alert(due, self.ladder, 7, today)[0], 1)
+        self.assertEqual(alert_schedule_service.next_alert(due, self.ladder, 0, today), (None, None))
+
+    def test_ladder_is_capped_by_notify_days(self):
+        ladder = alert_schedule_service.user_ladder({"reminder_ladder": "30,14,7", "notify_days": 10})
+
+        self.assertEqual(ladder, [7, 0])
+
+
+class AlertScheduleTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+
+        self.today = date.today()
+        self.users = [_user("alice"), _user("bob")]
+        self.visibility = ({"alice", "bob"}, {"alice": {"alice"}, "bob": {"bob"}})
+        real_item_repo = _real_item_repo()
+        self._patches = [
+            patch("app.repositories.item_repo.list_items", real_item_repo.list_items),
+            patch("app.repositories.item_repo.find_item_by_id", real_item_repo.find_item_by_id),
+            patch("app.repositories.user_repo.get_all_users_for_notification", side_effect=lambda: self.users),
+            patch("app.repositories.user_repo.get_notification_settings",
+                  side_effect=lambda name: next((dict(u) for u in self.users if u["User"] == name), {})),
+            patch("app.services.notification_service._build_visibility_context",
+                  side_effect=lambda: self.visibility),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _add_item(self, item_id, owner="", **fields):
+        db.session.add(Item(ItemID=item_id, ItemName=item_id, ItemOwner=owner, **fields))
+        db.session.commit()
+
+    def _rows(self, **filters):
+        return AlertSchedule.query.filter_by(**filters).order_by(AlertSchedule.username).all()
+
+    @staticmethod
+    def _at(day):
+        return datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+
+    def _due(self, day=None, users=None):
+        return alert_schedule_service.get_due_alerts(users or self.users, now=self._at(day or self.today))
+
+    def _send(self, entries, day=None):
+        ladders = {u["User"]: alert_schedule_service.user_ladder(u) for u in self.users}
+        alert_schedule_service.mark_sent(entries, ladders, now=self._at(day or self.today))
+
+    def test_rebuild_stores_one_row_per_item_regardless_of_user_count(self):
+        self.users = [_user(f"user{i}") for i in range(50)]
+        self._add_item("HOUSE", WarrantyExpiry=self.today + timedelta(days=10), UsageExpiry=self.today)
+
+        alert_schedule_service.rebuild_schedule()
+
+        rows = self._rows(item_id="HOUSE")
+        self.assertEqual(sorted(r.kind for r in rows), ["usage", "warranty"])
+        self.assertEqual({r.username for r in rows}, {alert_schedule_service.ITEM_SCOPE})
+
+    def test_due_alerts_fan_out_by_current_visibility(self):
+        self._add_item("PRIVATE", owner="alice", visibility="private", UsageExpiry=self.today + timedelta(days=5))
+        self._add_item("SHARED", owner="alice", visibility="shared", UsageExpiry=self.today + timedelta(days=5))
+        self._add_item("HOUSE", UsageExpiry=self.today + timedelta(days=5))
+        alert_schedule_service.rebuild_schedule()
+
+        due = self._due()
+        self.assertEqual(sorted(e["item_id"] for e in due["alice"]), ["HOUSE", "PRIVATE", "SHARED"])
+        self.assertEqual([e["item_id"] for e in due["bob"]], ["HOUSE"])
+
+        # 新使用者、新群組成員不需要重建排程
+        self.users.append(_user("carol"))
+        self.visibility = ({"alice", "bob", "carol"}, {"alice": {"alice", "carol"}, "carol": {"alice", "carol"}})
+        due = self._due()
+        self.assertEqual(sorted(e["item_id"] for e in due["carol"]), ["HOUSE", "SHARED"])
+
+    def test_tick_reads_only_due_entries_and_advances_them(self):
+        due = self.today + timedelta(days=5)
+        self._add_item("SOON", UsageExpiry=due)
+        for i in range(50):
+            self._add_item(f"LATER{i}", UsageExpiry=self.today + timedelta(days=200))
+        alert_schedule_service.rebuild_schedule()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            due_by_user = self._due(users=[self.users[0]])
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        # 排程、個人排程、物品各一次查詢，與物品總數無關
+        self.assertEqual(len(statements), 3)
+        self.assertEqual([e["item_id"] for e in due_by_user["alice"]], ["SOON"])
+        self.assertEqual(due_by_user["alice"][0]["next_offset"], 7)
+
+        self._send(due_by_user["alice"])
+
+        self.assertNotIn("alice", self._due())
+        row = self._rows(username="alice", item_id="SOON")[0]
+        self.assertEqual(row.last_offset, 7)
+        self.assertEqual(row.next_offset, 1)
+        self.assertEqual(row.next_alert_at.date(), due - timedelta(days=1))
+        self.assertEqual([e["item_id"] for e in self._due()["bob"]], ["SOON"])
+
+        later = self._due(due - timedelta(days=1))
+        self.assertEqual([e["next_offset"] for e in later["alice"]], [1])
+
+    def test_reschedule_keeps_sent_state_unless_due_date_changes(self):
+        due = self.today + timedelta(days=5)
+        self._add_item("MILK", UsageExpiry=due)
+        alert_schedule_service.rebuild_schedule()
+        self._send(self._due()["alice"])
+
+        alert_schedule_service.reschedule_items(["MILK"])
+        self.assertEqual(self._rows(username="alice")[0].last_offset, 7)
+
+        Item.query.filter_by(ItemID="MILK").update({"UsageExpiry": self.today + timedelta(days=3)})
+        db.session.commit()
+        alert_schedule_service.reschedule_items(["MILK"])
+
+        self.assertEqual(self._rows(username="alice"), [])
+        self.assertEqual([e["next_offset"] for e in self._due()["alice"]], [7])
+
+    def test_long_expired_items_are_not_fanned_out(self):
+        self._add_item("ANCIENT", UsageExpiry=self.today - timedelta(days=alert_schedule_service.ALERT_GRACE_DAYS + 1))
+        self._add_item("RECENT", UsageExpiry=self.today - timedelta(days=3))
+        alert_schedule_service.rebuild_schedule()
+
+        self.assertEqual([e["item_id"] for e in self._due()["alice"]], ["RECENT"])
+
+    def test_deleting_item_removes_its_schedule(self):
+        from app.services import item_service
+
+        self._add_item("OLD", UsageExpiry=self.today - timedelta(days=3))
+        alert_schedule_service.rebuild_schedule()
+        self._send(self._due()["alice"])
+        self.assertEqual(len(self._rows(item_id="OLD")), 2)
+
+        ok, _ = item_service.delete_item("OLD")
+
+        self.assertTrue(ok)
+        self.assertEqual(self._rows(item_id="OLD"), [])
+
+    def test_failed_reschedule_is_rolled_back_and_logged(self):
+        from app.services import item_service
+
+        def broken(item_ids):
+            db.session.add(AlertSchedule(username="alice", item_id="X", kind="usage", due_date=self.today))
+            raise RuntimeError("boom")
+
+        with patch.object(alert_schedule_service, "reschedule_items", side_effect=broken), \
+                self.assertLogs("app.services.item_service", level="WARNING"):
+            item_service._refresh_due_dates(["X"])
+
+        self.assertEqual(self._rows(item_id="X"), [])
+
+    def test_user_ladder_change_reschedules_only_that_user(self):
+        due = self.today + timedelta(days=100)
+        self._add_item("TV", WarrantyExpiry=due)
+        alert_schedule_service.rebuild_schedule()
+        self.users[1] = _user("bob", reminder_ladder="90,30", notify_days=90)
+
+        first = self._due(due - timedelta(days=90))
+        self.assertEqual(list(first), ["bob"])
+        self._send(first["bob"], due - timedelta(days=90))
+
+        self.users[1] = _user("bob", reminder_ladder="14", notify_days=30)
+        alert_schedule_service.reschedule_users(["bob"])
+
+        row = self._rows(username="bob", item_id="TV")[0]
+        self.assertEqual((row.last_offset, row.next_offset), (90, 14))
+        self.assertEqual([e["next_offset"] for e in self._due(due - timedelta(days=30))["alice"]], [30])
+
+    def test_reschedule_removes_deleted_users_rows(self):
+        self._add_item("MILK", UsageExpiry=self.today + timedelta(days=5))
+        alert_schedule_service.rebuild_schedule()
+        self._send(self._due()["bob"])
+
+        self.users = [self.users[0]]
+        alert_schedule_service.reschedule_users(["bob"])
+
+        self.assertEqual(self._rows(username="bob"), [])
+        self.assertEqual(len(self._rows(item_id="MILK")), 1)
+
+    def test_maintenance_entries_follow_item_interval(self):
+        self.users = [_user("alice", replacement_enabled=True)]
+        self._add_item(
+            "FILTER",
+            ItemGetDate=(self.today - timedelta(days=100)).strftime("%Y-%m-%d"),
+            MaintenanceCategory="濾網",
+            MaintenanceIntervalDays=90,
+        )
+        alert_schedule_service.rebuild_schedule()
+
+        due_by_user = self._due()
+        expiry_info, replacement_info = alert_schedule_service.summarize_due(due_by_user["alice"], self.today)
+
+        self.assertEqual(expiry_info["total_alerts"], 0)
+        self.assertEqual(replacement_info["due"][0]["replacement_rule_name"], "濾網")
+        self.assertEqual(replacement_info["due"][0]["days_overdue"], 10)
+
+
+class RescheduleTriggerTestCase(unittest.TestCase):
+    @patch("app.services.alert_schedule_service.users_changed")
+    @patch("app.services.group_service.group_repo")
+    def test_group_membership_changes_reschedule_the_member(self, group_repo, users_changed):
+        from app.services import group_service
+
+        group_repo.get_group.return_value = {"id": 1, "owner": "alice"}
+        group_repo.get_group_members.return_value = [{"username": "alice", "role": "admin"}]
+        group_repo.is_member.return_value = False
+        group_repo.remove_member.return_value = True
+
+        self.assertTrue(group_service.invite_member(1, "bob", "member", "alice")[0])
+        self.assertTrue(group_service.remove_member(1, "bob", "alice")[0])
+
+        self.assertEqual(users_changed.call_args_list, [((["bob"],),), ((["bob"],),)])
+
+    def test_failed_user_reschedule_is_rolled_back_and_logged(self):
+        with patch.object(alert_schedule_service, "reschedule_users", side_effect=RuntimeError("boom")), \
+                patch.object(alert_schedule_service.alert_schedule_repo, "rollback") as rollback, \
+                self.assertLogs("app.services.alert_schedule_service", level="WARNING"):
+            alert_schedule_service.users_changed(["bob"])
+
+        rollback.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
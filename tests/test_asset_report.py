@@ -0,0 +1,123 @@
+"""資產報表測試（整批估值與逐筆算法一致、類別小計、未來 10 年預估、排除回收桶、單一查詢；效能預算見 benchmarks/test_hot_paths.py）"""
+import os
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Item
+from app.repositories import item_repo
+from app.services import item_service
+
+
+def _bought(years_ago):
+    return (date.today() - timedelta(days=round(years_ago * 365.25))).strftime("%Y-%m-%d")
+
+
+def _held(years_ago):
+    return (date.today() - date.fromisoformat(_bought(years_ago))).days / 365.25
+
+
+class AssetReportTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self._db_type = patch.object(item_repo, "get_db_type", return_value="postgres")
+        self._db_type.start()
+
+    def tearDown(self):
+        self._db_type.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _seed(self):
+        db.session.add_all([
+            Item(ItemID="L1", ItemName="Laptop", ItemType="3C", ItemGetDate=_bought(2), purchase_price=30000,
+                 depreciation_method="straight_line", depreciation_rate=20),
+            Item(ItemID="L2", ItemName="Phone", ItemType="3C", ItemGetDate=_bought(0.5), purchase_price=20000,
+                 depreciation_method="straight_line", depreciation_rate=33.3),
+            Item(ItemID="D1", ItemName="Sofa", ItemType="家具", ItemGetDate=_bought(3), purchase_price=15000,
+                 depreciation_method="declining_balance", depreciation_rate=25),
+            Item(ItemID="F1", ItemName="Painting", ItemType="家具", purchase_price=5000),
+            Item(ItemID="O1", ItemName="Old", ItemType="3C", ItemGetDate=_bought(8), purchase_price=1000,
+                 depreciation_method="straight_line", depreciation_rate=20),
+            Item(ItemID="N1", ItemName="No price", ItemType="3C"),
+            Item(ItemID="T1", ItemName="Trashed", ItemType="3C", purchase_price=9999, is_deleted=True),
+        ])
+        db.session.commit()
+
+    def test_bulk_values_match_per_item_calculation(self):
+        self._seed()
+        report = item_service.get_asset_report()
+
+        by_id = {i["ItemID"]: i for i in report["items_with_value"]}
+        self.assertEqual(set(by_id), {"L1", "L2", "D1", "F1", "O1"})
+        for item_id, item in by_id.items():
+            expected = item_service.calculate_current_value(item)
+            self.assertEqual(item["calculated_current_value"], item["purchase_price"] if expected is None else expected)
+        self.assertEqual(by_id["O1"]["calculated_current_value"], 0)
+        self.assertEqual(report["items_with_value"][0]["ItemID"], "L1")
+        self.assertAlmostEqual(report["total_current_value"], sum(i["calculated_current_value"] for i in by_id.values()))
+
+    def test_category_totals_and_schedule(self):
+        self._seed()
+        report = item_service.get_asset_report()
+
+        categories = {c["category"]: c for c in report["by_category"]}
+        self.assertEqual((categories["3C"]["count"], categories["家具"]["count"]), (3, 2))
+        self.assertEqual(categories["3C"]["purchase_value"], 51000)
+        self.assertAlmostEqual(
+            sum(c["current_value"] for c in report["by_category"]), report["total_current_value"], places=2
+        )
+
+        self.assertEqual([row["year"] for row in report["schedule"]], list(range(1, 11)))
+        for row in report["schedule"]:
+            k = row["year"]
+            expected = 5000 + 15000 * 0.75 ** (_held(3) + k)
+            for price, rate, years in ((30000, 20, 2), (20000, 33.3, 0.5), (1000, 20, 8)):
+                expected += max(0.0, price - price * rate / 100 * (_held(years) + k))
+            self.assertAlmostEqual(row["value"], expected, delta=1)
+        values = [row["value"] for row in report["schedule"]]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_assets_page_renders_breakdown(self):
+        self._seed()
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = "boss"
+
+        response = self.client.get("/assets")
+
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+        self.assertIn("類別小計", page)
+        self.assertIn("未來價值預估", page)
+
+    def test_report_runs_a_single_query(self):
+        self._seed()
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            report = item_service.get_asset_report()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(len(report["items_with_value"]), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""登入者快取測試（請求內 memo 與跨請求 TTL 快取）"""
+import os
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask import g
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User
+from app.services import api_token_service, user_service
+from app.utils.auth import invalidate_principal
+
+
+class AuthCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+
+        db.session.add(User(User="boss", Password=generate_password_hash("Secret123"), admin=True))
+        db.session.commit()
+
+        # conftest 將 user_repo 導向假的 Mongo，這裡改回真實 SQL 以計算查詢數
+        self._db_type_patch = patch("app.repositories.user_repo.get_db_type", return_value="postgres")
+        self._db_type_patch.start()
+
+    def tearDown(self):
+        self._db_type_patch.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    @contextmanager
+    def _count_queries(self, table: str):
+        statements = []
+
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            if f"FROM {table}" in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", _before_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _before_execute)
+
+    def _get(self, path: str, **kwargs):
+        # 測試持有外層 app context，g 會跨請求共用；清掉 memo 以模擬獨立請求
+        g.pop("_current_user", None)
+        return self.client.get(path, **kwargs)
+
+    def _login(self, username: str = "boss"):
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = username
+
+    def test_admin_page_loads_user_once_per_request_and_caches_across_requests(self):
+        self._login()
+
+        with self._count_queries("users") as first:
+            response = self._get("/types")
+        self.assertEqual(response.status_code, 200)
+        # admin_required 與路由本體共用同一次查詢
+        self.assertEqual(len(first), 1)
+
+        with self._count_queries("users") as second:
+            response = self._get("/types")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(second), 0)
+
+    def test_password_change_invalidates_cached_user(self):
+        self._login()
+        self._get("/types")
+
+        with self.app.test_request_context("/"):
+            ok, _ = user_service.force_change_password("boss", "NewSecret456")
+        self.assertTrue(ok)
+
+        with self._count_queries("users") as statements:
+            self._get("/types")
+        self.assertEqual(len(statements), 1)
+
+    def test_invalidation_is_broadcast_and_applied_from_other_workers(self):
+        self._login()
+        self._get("/types")
+        bus = self.app.extensions["cache_bus"]
+
+        with patch.object(bus, "publish_event") as publish:
+            invalidate_principal(token_id=7)
+        publish.assert_called_once_with("principal", {"username": None, "token_id": "7"})
+
+        # 其他 worker 廣播的失效事件
+        with self._count_queries("users") as cached:
+            self._get("/types")
+        self.assertEqual(len(cached), 0)
+        bus._apply('{"event": "principal", "data": {"username": "boss", "token_id": null}}')
+        with self._count_queries("users") as statements:
+            self._get("/types")
+        self.assertEqual(len(statements), 1)
+
+    def test_disabled_ttl_still_memoizes_within_request(self):
+        self.app.config["PRINCIPAL_CACHE_TTL"] = 0
+        self._login()
+
+        for _ in range(2):
+            with self._count_queries("users") as statements:
+                self._get("/types")
+            self.assertEqual(len(statements), 1)
+
+    def test_api_token_validated_once_then_served_from_cache(self):
+        plaintext, token_id = api_token_service.generate_token("boss", "scanner")
+        headers = {"Authorization": f"Bearer {plaintext}"}
+
+        with patch("app.services.item_service.list_items", return_value={"items": [], "total": 0}):
+            with self._count_queries("api_tokens") as first:
+                response = self._get("/api/v1/items", headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreaterEqual(len(first), 1)
+
+            with self._count_queries("api_tokens") as second:
+                response = self._get("/api/v1/items", headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(second), 0)
+
+            with self.app.test_request_context("/"):
+                self.assertTrue(api_token_service.revoke_token(token_id, "boss"))
+
+            response = self._get("/api/v1/items", headers=headers)
+            self.assertEqual(response.status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
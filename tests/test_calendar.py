@@ -0,0 +1,207 @@
+"""行事曆測試（區間查詢、下次保養日維護、可見性、ICS 訂閱快取與 ETag）"""
+import os
+import unittest
+from datetime import date, timedelta
+from unittest.mock import Mock, patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_caching import Cache
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import cache, create_app, db
+from app.models import Item
+from app.models.item_loan import ItemLoan
+from app.repositories import item_repo
+from app.services import calendar_service
+
+ALICE = {"User": "alice", "admin": False}
+
+
+class CalendarTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        if "cache" not in self.app.extensions:
+            Cache.init_app(cache, self.app, config={"CACHE_TYPE": "SimpleCache"})
+        cache.clear()
+        self._visibility = patch(
+            "app.services.notification_service._build_visibility_context",
+            return_value=({"alice", "bob"}, {"alice": {"alice"}, "bob": {"bob"}}),
+        )
+        self._visibility.start()
+
+    def tearDown(self):
+        self._visibility.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _add(self, item_id, **fields):
+        item_repo.insert_item({"ItemID": item_id, "ItemName": item_id, **fields})
+
+    def test_maintenance_due_date_follows_last_date_and_interval(self):
+        self._add("FILTER", LastMaintenanceDate=date(2026, 1, 1), MaintenanceIntervalDays=90)
+        self.assertEqual(Item.query.one().MaintenanceDueDate, date(2026, 4, 1))
+
+        item_repo.update_item_by_id("FILTER", {"MaintenanceIntervalDays": 30})
+        self.assertEqual(Item.query.one().MaintenanceDueDate, date(2026, 1, 31))
+
+        item_repo.update_item_by_id("FILTER", {"LastMaintenanceDate": None})
+        self.assertIsNone(Item.query.one().MaintenanceDueDate)
+
+    def test_range_query_returns_only_dates_inside_window(self):
+        self._add("TV", WarrantyExpiry=date(2026, 3, 10), UsageExpiry=date(2027, 1, 1))
+        self._add("MILK", UsageExpiry=date(2026, 3, 31))
+        self._add("AC", LastMaintenanceDate=date(2026, 1, 1), MaintenanceIntervalDays=70)
+        self._add("OLD", WarrantyExpiry=date(2025, 3, 10))
+        for i in range(30):
+            self._add(f"FAR{i}", WarrantyExpiry=date(2030, 1, 1))
+        db.session.add(ItemLoan(item_id="TV", item_name="TV", borrower="bob", lent_date=date(2026, 3, 1),
+                                expected_return=date(2026, 3, 15), status="active", lent_by="alice"))
+        db.session.commit()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            events = calendar_service.get_events({"User": "admin", "admin": True}, date(2026, 3, 1), date(2026, 3, 31))
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(
+            [(e["date"], e["type"], e["item_id"]) for e in events],
+            [
+                ("2026-03-10", "warranty", "TV"),
+                ("2026-03-12", "maintenance", "AC"),
+                ("2026-03-15", "loan_return", "TV"),
+                ("2026-03-31", "usage", "MILK"),
+            ],
+        )
+        # 物品一次、借出一次，與物品總數無關
+        self.assertEqual(len(statements), 2)
+
+    def test_events_respect_item_visibility(self):
+        day = date(2026, 5, 1)
+        self._add("MINE", ItemOwner="alice", WarrantyExpiry=day)
+        self._add("BOBS", ItemOwner="bob", visibility="private", WarrantyExpiry=day)
+        self._add("HOUSE", WarrantyExpiry=day)
+
+        events = calendar_service.get_events(ALICE, day, day)
+
+        self.assertEqual(sorted(e["item_id"] for e in events), ["HOUSE", "MINE"])
+
+    def test_month_and_range_parsing(self):
+        self.assertEqual(calendar_service.month_range("2026-12"), (date(2026, 12, 1), date(2026, 12, 31)))
+        with self.assertRaises(ValueError):
+            calendar_service.parse_range("2026-01-01", "2028-01-01")
+
+    def test_ics_feed_is_cached_until_dates_change(self):
+        soon = date.today() + timedelta(days=10)
+        self._add("LAMP", ItemOwner="alice", WarrantyExpiry=soon)
+
+        with patch.object(calendar_service, "get_events", wraps=calendar_service.get_events) as spy:
+            body, etag = calendar_service.get_ics_feed(ALICE)
+            again, same_etag = calendar_service.get_ics_feed(ALICE)
+            self.assertEqual(spy.call_count, 1)
+            self.assertEqual((again, same_etag), (body, etag))
+
+            calendar_service.invalidate_feeds()
+            calendar_service.get_ics_feed(ALICE)
+            self.assertEqual(spy.call_count, 2)
+
+        self.assertIn(f"DTSTART;VALUE=DATE:{soon:%Y%m%d}", body)
+        self.assertIn("SUMMARY:保固到期：LAMP", body)
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+
+    def test_ics_escapes_and_folds_long_lines(self):
+        events = [{"date": "2026-01-01", "type": "usage", "item_id": "X", "label": "使用期限：" + "牛奶,優格;" * 20}]
+        body = calendar_service.build_ics(events)
+
+        self.assertIn("\\,", body)
+        self.assertTrue(all(len(line.encode("utf-8")) <= 75 for line in body.split("\r\n")))
+
+    def _feed_users(self):
+        users = {"alice": dict(ALICE)}
+        return users, (
+            patch("app.repositories.user_repo.find_by_username", side_effect=users.get),
+            patch(
+                "app.repositories.user_repo.set_calendar_feed_secret",
+                side_effect=lambda username, secret: users[username].update(calendar_feed_secret=secret),
+            ),
+        )
+
+    def test_feed_route_uses_signed_token_and_etag(self):
+        self._add("LAMP", ItemOwner="alice", WarrantyExpiry=date.today() + timedelta(days=3))
+        users, (find, store) = self._feed_users()
+        client = self.app.test_client()
+
+        with find, store:
+            token = calendar_service.make_feed_token("alice")
+            self.assertEqual(calendar_service.make_feed_token("alice"), token)
+            first = client.get(f"/calendar/feed/{token}.ics")
+            cached = client.get(f"/calendar/feed/{token}.ics", headers={"If-None-Match": first.headers["ETag"]})
+            forged = client.get("/calendar/feed/alice.ics")
+            # 舊版只簽使用者名稱、沒有密鑰的 token 不再有效
+            legacy = client.get(f"/calendar/feed/{calendar_service._serializer().dumps('alice')}.ics")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.mimetype, "text/calendar")
+        self.assertIn(b"LAMP", first.data)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(forged.status_code, 404)
+        self.assertEqual(legacy.status_code, 404)
+        self.assertTrue(users["alice"]["calendar_feed_secret"])
+
+    def test_reset_revokes_previous_feed_url(self):
+        users, (find, store) = self._feed_users()
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess["UserID"] = "alice"
+
+        with find, store:
+            old = calendar_service.make_feed_token("alice")
+            response = client.post("/api/calendar/feed-url/reset")
+            new = response.get_json()["url"].rsplit("/", 1)[-1][:-len(".ics")]
+
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(new, old)
+            self.assertIsNone(calendar_service.resolve_feed_token(old))
+            self.assertEqual(calendar_service.resolve_feed_token(new)["User"], "alice")
+            self.assertEqual(client.get(f"/calendar/feed/{old}.ics").status_code, 404)
+            self.assertEqual(client.get(f"/calendar/feed/{new}.ics").status_code, 200)
+
+
+class MongoMaintenanceBackfillTestCase(unittest.TestCase):
+    def test_backfill_sets_due_dates_on_items_missing_the_field(self):
+        from pymongo import UpdateOne
+
+        fake_mongo = Mock()
+        fake_mongo.db.item.find.return_value = [
+            {"_id": 1, "LastMaintenanceDate": "2026-01-01", "MaintenanceIntervalDays": 30},
+            {"_id": 2},
+        ]
+        fake_mongo.db.item.bulk_write.return_value.modified_count = 1
+
+        with patch.object(item_repo, "get_db_type", return_value="mongo"), \
+             patch.object(item_repo, "mongo", fake_mongo):
+            updated = item_repo.backfill_maintenance_due_dates(batch_size=1)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(fake_mongo.db.item.find.call_args.args[0], {"MaintenanceDueDate": {"$exists": False}})
+        batches = [call.args[0] for call in fake_mongo.db.item.bulk_write.call_args_list]
+        self.assertEqual(batches, [
+            [UpdateOne({"_id": 1}, {"$set": {"MaintenanceDueDate": "2026-01-31"}})],
+            [UpdateOne({"_id": 2}, {"$set": {"MaintenanceDueDate": ""}})],
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Email 發送測試（本機 SMTP stub：連線重用、每連線上限、斷線重連、範本快取）"""
+import smtplib
+import socket
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+
+from app.services import email_service
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:  # pragma: no cover - 未安裝時跳過
+    Controller = None
+
+
+class _RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope.rcpt_tos[0])
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipIf(Controller is None, "需要 aiosmtpd")
+class SMTPDeliveryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.handler = _RecordingHandler()
+        port = _free_port()
+        self.controller = Controller(
+            self.handler,
+            hostname="127.0.0.1",
+            port=port,
+            authenticator=lambda *_args: AuthResult(success=True),
+            auth_require_tls=False,
+        )
+        self.controller.start()
+        self._patches = [
+            patch.object(email_service, "MAIL_SERVER", "127.0.0.1"),
+            patch.object(email_service, "MAIL_PORT", port),
+            patch.object(email_service, "MAIL_USE_TLS", False),
+            patch.object(email_service, "MAIL_USERNAME", "mailer"),
+            patch.object(email_service, "MAIL_PASSWORD", "secret"),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        self.controller.stop()
+
+    @staticmethod
+    def _send(to_email, pool=None):
+        return email_service.send_expiry_notification(
+            to_email,
+            expired_items=[{"ItemName": "牛奶", "UsageExpiry": "2026-01-01"}],
+            near_expiry_items=[],
+            pool=pool,
+        )
+
+    def test_batch_reuses_one_authenticated_connection(self):
+        with email_service.SMTPSessionPool(size=1) as pool:
+            for i in range(20):
+                self.assertTrue(self._send(f"user{i}@example.com", pool=pool))
+            stats = pool.stats()
+
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["sent"], 20)
+        self.assertEqual(len(self.handler.messages), 20)
+        self.assertEqual(len(self.handler.sessions), 1)
+
+    def test_per_connection_cap_triggers_reconnect(self):
+        with email_service.SMTPSessionPool(size=1, max_messages=10) as pool:
+            for i in range(25):
+                self._send(f"user{i}@example.com", pool=pool)
+            stats = pool.stats()
+
+        self.assertEqual(stats["connects"], 3)
+        self.assertEqual(len(self.handler.messages), 25)
+
+    def test_dropped_connection_is_reopened_and_message_retried(self):
+        with email_service.SMTPDeliverySession() as session:
+            session.send(email_service.build_expiry_message("a@example.com", [], []))
+            # 模擬伺服器閒置斷線
+            session._server.close()
+            session.send(email_service.build_expiry_message("b@example.com", [], []))
+
+            self.assertEqual(session.connects, 2)
+        self.assertEqual(self.handler.messages, ["a@example.com", "b@example.com"])
+
+    def test_pool_opens_one_connection_instead_of_one_per_message(self):
+        count = 50
+
+        with patch.object(smtplib, "SMTP", side_effect=smtplib.SMTP) as single:
+            for i in range(count):
+                self._send(f"single{i}@example.com")
+
+        with patch.object(smtplib, "SMTP", side_effect=smtplib.SMTP) as pooled:
+            with email_service.SMTPSessionPool(size=1) as pool:
+                for i in range(count):
+                    self._send(f"pooled{i}@example.com", pool=pool)
+
+        self.assertEqual(len(self.handler.messages), count * 2)
+        self.assertEqual(single.call_count, count)
+        self.assertEqual(pooled.call_count, 1)
+
+
+class EmailTemplateCacheTestCase(unittest.TestCase):
+    def test_templates_compiled_once(self):
+        email_service._template.cache_clear()
+        for _ in range(3):
+            email_service.generate_text_content([], [])
+            email_service.generate_html_content([], [])
+
+        info = email_service._template.cache_info()
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.hits, 4)
+
+    def test_html_escapes_item_fields(self):
+        content = email_service.generate_html_content([{"ItemName": "<script>x</script>"}], [])
+
+        self.assertIn("&lt;script&gt;", content)
+        self.assertNotIn("<script>", content)
+
+
+if __name__ == "__main__":
+    unittest.main()
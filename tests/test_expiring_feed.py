@@ -0,0 +1,123 @@
+"""到期清單測試（單一查詢、依最早到期日排序、剩餘天數與類型、可見範圍、排除回收桶、分頁）"""
+import os
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Item
+from app.repositories import item_repo
+from app.services import item_service
+
+
+def _days(n):
+    return date.today() + timedelta(days=n)
+
+
+class ExpiringFeedTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self._patches = [
+            patch.object(item_repo, "get_db_type", return_value="postgres"),
+            patch(
+                "app.services.notification_service._build_visibility_context",
+                return_value=({"alice", "bob", "carol"}, {"alice": {"alice", "bob"}}),
+            ),
+        ]
+        for p in self._patches:
+            p.start()
+        db.session.add_all([
+            Item(ItemID="W", ItemName="Warranty soon", ItemOwner="alice", WarrantyExpiry=_days(10)),
+            Item(ItemID="U", ItemName="Usage expired", ItemOwner="alice", UsageExpiry=_days(-3), WarrantyExpiry=_days(400)),
+            Item(ItemID="B", ItemName="Both", ItemOwner="bob", visibility="shared",
+                 WarrantyExpiry=_days(5), UsageExpiry=_days(5)),
+            Item(ItemID="P", ItemName="Bob private", ItemOwner="bob", visibility="private", UsageExpiry=_days(1)),
+            Item(ItemID="S", ItemName="Carol shared with alice", ItemOwner="carol", shared_with=["alice"],
+                 UsageExpiry=_days(2)),
+            Item(ItemID="F", ItemName="Family", ItemOwner="", WarrantyExpiry=_days(-1)),
+            Item(ItemID="L", ItemName="Later", ItemOwner="alice", WarrantyExpiry=_days(90)),
+            Item(ItemID="T", ItemName="Trashed", ItemOwner="alice", WarrantyExpiry=_days(-10), is_deleted=True),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def test_single_query_ordered_by_earliest_expiry(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = item_repo.list_expiring_items(30)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([i["ItemID"] for i in result["items"]], ["U", "F", "P", "S", "B", "W"])
+        self.assertEqual((result["total"], result["expired_count"]), (6, 2))
+        by_id = {i["ItemID"]: i for i in result["items"]}
+        self.assertEqual((by_id["U"]["days_left"], by_id["U"]["expiry_kind"]), (-3, "usage"))
+        self.assertEqual((by_id["W"]["days_left"], by_id["W"]["expiry_kind"]), (10, "warranty"))
+        self.assertEqual(by_id["B"]["expiry_kind"], "both")
+        self.assertEqual(by_id["B"]["earliest_expiry"], _days(5).strftime("%Y-%m-%d"))
+
+    def test_service_splits_and_scopes_to_visible_owners(self):
+        result = item_service.get_expiring_items(30, user={"User": "alice", "admin": False})
+
+        self.assertEqual([i["ItemID"] for i in result["expired"]], ["U", "F"])
+        self.assertEqual([i["ItemID"] for i in result["near_expiry"]], ["S", "B", "W"])
+        self.assertEqual((result["expired_count"], result["near_count"], result["total_alerts"]), (2, 3, 5))
+        self.assertEqual(result["expired"][0]["expiry_types"], ["usage_expired"])
+        self.assertEqual(result["near_expiry"][1]["expiry_types"], ["warranty_near", "usage_near"])
+
+        admin = item_service.get_expiring_items(30, user={"User": "root", "admin": True})
+        self.assertEqual(admin["total_alerts"], 6)
+
+    def test_threshold_controls_near_window(self):
+        result = item_service.get_expiring_items(120)
+
+        self.assertIn("L", [i["ItemID"] for i in result["near_expiry"]])
+        self.assertEqual(result["near_expiry"][-1]["expiry_types"], ["warranty_near"])
+
+    def test_paginated_counts_cover_all_pages(self):
+        first = item_service.get_expiring_items(30, page=1, page_size=4)
+        last = item_service.get_expiring_items(30, page=2, page_size=4)
+        beyond = item_service.get_expiring_items(30, page=5, page_size=4)
+
+        self.assertEqual([i["ItemID"] for i in first["expired"] + first["near_expiry"]], ["U", "F", "P", "S"])
+        self.assertEqual([i["ItemID"] for i in last["expired"] + last["near_expiry"]], ["B", "W"])
+        self.assertEqual((last["expired_count"], last["near_count"], last["total_pages"]), (2, 4, 2))
+        self.assertEqual((beyond["expired"], beyond["near_expiry"], beyond["total_alerts"]), ([], [], 6))
+
+    def test_feed_endpoint(self):
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = "alice"
+
+        with patch("app.items.routes.get_current_user", return_value={"User": "alice", "admin": False}):
+            response = self.client.get("/api/expiring?page_size=2&page=2")
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([i["ItemID"] for i in body["items"]], ["S", "B"])
+        self.assertEqual((body["total"], body["total_pages"]), (5, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
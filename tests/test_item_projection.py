@@ -0,0 +1,109 @@
+"""清單頁欄位投影測試（只查需要的欄位、不載入大型 JSON 欄位、格式與 to_dict 一致）"""
+import importlib.util
+import os
+import unittest
+from datetime import date
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Item
+from app.services.item_service import ASSET_PROJECTION, ITEM_LIST_PROJECTION, ITEM_PROJECTION
+
+
+def _real_item_repo():
+    """conftest 將 item_repo 的部分查詢換成空結果，這裡載入一份未修改的模組"""
+    spec = importlib.util.find_spec("app.repositories.item_repo")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.get_db_type = lambda: "postgres"
+    return module
+
+
+item_repo = _real_item_repo()
+
+
+class ItemProjectionTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        history = [{"from": f"A{i}", "to": f"B{i}", "date": "2026-01-01"} for i in range(50)]
+        db.session.add_all([
+            Item(ItemID="I1", ItemName="Drill", ItemType="tool", ItemDesc="cordless drill",
+                 WarrantyExpiry=date(2027, 1, 31), Quantity=2, ReorderLevel=3,
+                 move_history=history, ItemPics=["a.jpg", "b.jpg"], size_notes={"w": 10},
+                 purchase_price=1200, depreciation_method="straight_line", depreciation_rate=10),
+            Item(ItemID="I2", ItemName="Hammer", ItemType="tool", move_history=history),
+            Item(ItemID="I3", ItemName="Gone", is_deleted=True),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _selects(self, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        return result, [s for s in statements if "FROM items" in s]
+
+    def test_list_projection_leaves_json_columns_unloaded(self):
+        items, statements = self._selects(lambda: item_repo.list_items({}, ITEM_LIST_PROJECTION))
+
+        self.assertEqual([item["ItemID"] for item in items], ["I1", "I2"])
+        self.assertEqual(len(statements), 1)
+        for column in ("move_history", "ItemPics", "size_notes", "related_items", "insurance_policy"):
+            self.assertNotIn(column, statements[0])
+            self.assertNotIn(column, items[0])
+        self.assertEqual(items[0]["Quantity"], 2)
+
+    def test_projected_rows_match_to_dict_format(self):
+        full = Item.query.filter_by(ItemID="I1").one().to_dict()
+
+        projected = item_repo.list_items({"ItemType": "tool"}, ITEM_LIST_PROJECTION)[0]
+
+        self.assertEqual(projected, {key: full[key] for key in projected})
+        self.assertEqual(projected["WarrantyExpiry"], "2027-01-31")
+        self.assertEqual(projected["ItemDesc"], "cordless drill")
+
+    def test_no_projection_still_returns_full_items(self):
+        items = item_repo.list_items({}, {"_id": 0})
+
+        self.assertEqual(len(items[0]["move_history"]), 50)
+        self.assertEqual(items[0], Item.query.filter_by(ItemID="I1").one().to_dict())
+
+    def test_export_uses_projection(self):
+        exported, statements = self._selects(
+            lambda: item_repo.get_all_items_for_export(projection=ASSET_PROJECTION)
+        )
+
+        self.assertEqual({item["ItemID"] for item in exported}, {"I1", "I2", "I3"})
+        self.assertEqual(exported[0]["purchase_price"], 1200.0)
+        self.assertNotIn("move_history", exported[0])
+        self.assertNotIn("move_history", statements[0])
+
+    def test_find_items_by_ids_accepts_projection(self):
+        items = item_repo.find_items_by_ids(["I1", "I3"], ITEM_PROJECTION)
+
+        self.assertEqual([item["ItemID"] for item in items], ["I1"])
+        self.assertEqual(items[0]["ItemPics"], ["a.jpg", "b.jpg"])
+        self.assertNotIn("Quantity", items[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -77,9 +77,15 @@ class FakeItemRepo:
                 return True
         return False
 
-    def soft_delete_item(self, item_id):
+    def soft_delete_item(self, item_id, commit=True):
         return self.delete_item_by_id(item_id)
 
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
     def add_move_history(self, item_id, old_location, new_location):
         history = self.updated_items.get(item_id, {})
         history["_move_history_called"] = True
@@ -118,6 +124,9 @@ class ItemServiceTestCase(unittest.TestCase):
         ]
         self._orig_repo = item_service.item_repo
         item_service.item_repo = FakeItemRepo(self.sample_items)
+        fire_patch = mock.patch("app.services.webhook_service.fire_event", return_value=0)
+        self.fire_event = fire_patch.start()
+        self.addCleanup(fire_patch.stop)
 
     def tearDown(self):
         item_service.item_repo = self._orig_repo
@@ -0,0 +1,179 @@
+"""標籤測試（單一 IN 查詢、內容雜湊快取、process pool、頁面引用快取網址、ETag 與 SVG）"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import Item, User
+from app.services import label_service
+
+
+class LabelServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config["LABEL_CACHE_DIR"] = self.cache_dir
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        label_service.shutdown_pool()
+        self.ctx.pop()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_images_are_rendered_once_per_content(self):
+        specs = [("qr", f"item:I{i}", 6, "png") for i in range(5)]
+
+        with patch.object(label_service, "render", wraps=label_service.render) as spy:
+            first = label_service.ensure_images(specs)
+            second = label_service.ensure_images(specs + [specs[0]])
+
+        self.assertEqual(spy.call_count, 5)
+        self.assertEqual(first, second)
+        path = label_service.cached_path(first[specs[0]])
+        self.assertTrue(path.read_bytes().startswith(b"\x89PNG"))
+
+    def test_svg_output_is_deterministic(self):
+        for kind in label_service.KINDS:
+            svg = label_service.render(kind, "item:S1", 6, "svg")
+            self.assertIn(b"<svg", svg)
+            self.assertEqual(svg, label_service.render(kind, "item:S1", 6, "svg"))
+        with self.assertRaises(ValueError):
+            label_service.render("qr", "item:S1", 6, "gif")
+
+    def test_key_depends_on_payload_and_size(self):
+        keys = {
+            label_service.image_key("qr", "item:A", 6),
+            label_service.image_key("qr", "item:A", 8),
+            label_service.image_key("qr", "item:B", 6),
+            label_service.image_key("barcode", "item:A", 6),
+            label_service.image_key("qr", "item:A", 6, "svg"),
+        }
+        self.assertEqual(len(keys), 5)
+
+    def test_large_batches_render_on_process_pool(self):
+        specs = [("qr", f"item:P{i}", 4, "png") for i in range(6)]
+
+        with patch.object(label_service, "LABEL_POOL_THRESHOLD", 2), \
+                patch.object(label_service, "LABEL_RENDER_WORKERS", 2):
+            keys = label_service.ensure_images(specs)
+
+        self.assertIsNotNone(label_service._pool)
+        for spec in specs:
+            self.assertEqual(
+                label_service.cached_path(keys[spec]).read_bytes(),
+                label_service.render(*spec),
+            )
+
+
+class PrintLabelsRouteTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.cache_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, LABEL_CACHE_DIR=self.cache_dir)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        db.session.add(User(User="boss", Password=generate_password_hash("Secret123"), admin=True))
+        for i in range(40):
+            db.session.add(Item(ItemID=f"L{i:03d}", ItemName=f"Label {i}"))
+        db.session.commit()
+        self._user_db = patch("app.repositories.user_repo.get_db_type", return_value="postgres")
+        self._user_db.start()
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = "boss"
+
+    def tearDown(self):
+        self._user_db.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _print(self, ids):
+        return self.client.post("/print-labels", data={"item_ids": ",".join(ids), "label_size": "small"})
+
+    def test_print_uses_one_item_query_and_cached_image_urls(self):
+        ids = [f"L{i:03d}" for i in range(40)] + ["MISSING"]
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            response = self._print(ids)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(response.status_code, 200)
+        html = response.get_data(as_text=True)
+        self.assertNotIn("data:image/png;base64", html)
+        self.assertEqual(html.count('src="/labels/'), 40)
+        self.assertEqual(len([s for s in statements if "FROM items" in s]), 1)
+
+        key = label_service.image_key("qr", "item:L000", label_service.QR_BOX_SIZES["small"])
+        image = self.client.get(f"/labels/{key}.png")
+        self.assertEqual(image.status_code, 200)
+        self.assertIn("immutable", image.headers["Cache-Control"])
+        self.assertEqual(self.client.get(f"/labels/{'0' * 64}.png").status_code, 404)
+
+    def test_repeat_print_reuses_rendered_images(self):
+        ids = [f"L{i:03d}" for i in range(5)]
+        self._print(ids)
+
+        with patch.object(label_service, "render") as render:
+            response = self._print(ids)
+
+        self.assertEqual(response.status_code, 200)
+        render.assert_not_called()
+
+    def test_item_qrcode_has_strong_etag_and_answers_304(self):
+        with patch("app.services.item_service.get_item", return_value={"ItemID": "L001"}) as get_item:
+            first = self.client.get("/items/L001/qrcode")
+            etag = first.headers["ETag"]
+            with patch.object(label_service, "render") as render:
+                cached = self.client.get("/items/L001/qrcode", headers={"If-None-Match": etag})
+                render.assert_not_called()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(etag.startswith("W/"))
+        self.assertIn("max-age=31536000", first.headers["Cache-Control"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers["ETag"], etag)
+        # 命中 ETag 時不再查詢物品
+        self.assertEqual(get_item.call_count, 1)
+
+    def test_item_images_available_as_svg(self):
+        with patch("app.services.item_service.get_item", return_value={"ItemID": "L001"}):
+            qr = self.client.get("/items/L001/qrcode?format=svg")
+            barcode = self.client.get("/items/L001/barcode?format=svg")
+            png = self.client.get("/items/L001/barcode")
+            bad = self.client.get("/items/L001/qrcode?format=gif")
+
+        self.assertEqual(qr.mimetype, "image/svg+xml")
+        self.assertEqual(barcode.mimetype, "image/svg+xml")
+        self.assertEqual(png.mimetype, "image/png")
+        self.assertNotEqual(barcode.headers["ETag"], png.headers["ETag"])
+        self.assertEqual(bad.status_code, 400)
+
+    def test_cached_label_url_answers_304(self):
+        self._print(["L001"])
+        key = label_service.image_key("qr", "item:L001", label_service.QR_BOX_SIZES["small"])
+
+        response = self.client.get(f"/labels/{key}.png", headers={"If-None-Match": f'"{key}"'})
+
+        self.assertEqual(response.status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,19 +3,26 @@ import hashlib
 import hmac
 import json
 import os
+import tempfile
+import time
 import unittest
 from unittest import mock
 
 import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
 from itsdangerous import URLSafeSerializer
 
 from app import create_app, db
+from app.models import BotUpdate
+from app.services import bot_service
 
 
 class LineWebhookTestCase(unittest.TestCase):
     def setUp(self):
+        self._db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self._db_file.close()
         os.environ["DB_TYPE"] = "postgres"
-        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        os.environ["DATABASE_URL"] = f"sqlite:///{self._db_file.name}"
         os.environ["REDIS_URL"] = "redis://localhost:6379/0"
         self.app = create_app()
         self.app.config["TESTING"] = True
@@ -24,9 +31,26 @@ class LineWebhookTestCase(unittest.TestCase):
         self.client = self.app.test_client()
         self.ctx = self.app.app_context()
         self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self.dispatcher = bot_service.BotDispatcher(self.app, max_workers=1, chat_rate=0)
 
     def tearDown(self):
+        self.dispatcher.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
         self.ctx.pop()
+        os.unlink(self._db_file.name)
+
+    def _post(self, payload: dict):
+        body = json.dumps(payload)
+        return self.client.post(
+            "/line/webhook",
+            data=body,
+            content_type="application/json",
+            headers={"X-Line-Signature": self._signature(body)},
+        )
 
     def _signature(self, body: str) -> str:
         digest = hmac.new(
@@ -51,53 +75,93 @@ class LineWebhookTestCase(unittest.TestCase):
             "events": [
                 {
                     "type": "postback",
+                    "webhookEventId": "EV_POSTBACK",
+                    "timestamp": int(time.time() * 1000),
                     "replyToken": "reply-token",
                     "source": {"type": "user", "userId": "U_LINE_123"},
                     "postback": {"data": "cmd=my_trips"},
                 }
             ]
         }
-        body = json.dumps(payload)
         with mock.patch("app.line.routes._handle_postback", return_value=("ok", [], None)) as mocked_handler, mock.patch(
             "app.line.routes._reply_message"
         ) as mocked_reply:
-            response = self.client.post(
-                "/line/webhook",
-                data=body,
-                content_type="application/json",
-                headers={"X-Line-Signature": self._signature(body)},
-            )
+            response = self._post(payload)
+            # webhook 只入列，回覆由 dispatcher 處理
+            self.assertEqual(response.status_code, 200)
+            mocked_handler.assert_not_called()
+            self.assertTrue(self.dispatcher.drain())
 
-        self.assertEqual(response.status_code, 200)
         mocked_handler.assert_called_once_with("U_LINE_123", "cmd=my_trips")
-        mocked_reply.assert_called_once_with("reply-token", "ok", [], None)
+        mocked_reply.assert_called_once_with("reply-token", "ok", [], None, push_to=None)
+        self.assertEqual(BotUpdate.query.one().status, "done")
 
     def test_text_event_dispatches_flex_reply(self):
         payload = {
             "events": [
                 {
                     "type": "message",
+                    "webhookEventId": "EV_TEXT",
+                    "timestamp": int(time.time() * 1000),
                     "replyToken": "reply-token",
                     "source": {"type": "user", "userId": "U_LINE_123"},
                     "message": {"type": "text", "text": "我的旅行"},
                 }
             ]
         }
-        body = json.dumps(payload)
         flex = {"type": "flex", "altText": "demo", "contents": {"type": "bubble", "body": {"type": "box", "layout": "vertical", "contents": []}}}
         with mock.patch("app.line.routes._handle_text_message", return_value=("ok", [], flex)) as mocked_handler, mock.patch(
             "app.line.routes._reply_message"
         ) as mocked_reply:
-            response = self.client.post(
-                "/line/webhook",
-                data=body,
-                content_type="application/json",
-                headers={"X-Line-Signature": self._signature(body)},
-            )
+            response = self._post(payload)
+            self.assertTrue(self.dispatcher.drain())
 
         self.assertEqual(response.status_code, 200)
         mocked_handler.assert_called_once_with("U_LINE_123", "我的旅行")
-        mocked_reply.assert_called_once_with("reply-token", "ok", [], flex)
+        mocked_reply.assert_called_once_with("reply-token", "ok", [], flex, push_to=None)
+
+    def test_redelivered_event_is_processed_once(self):
+        event = {
+            "type": "postback",
+            "webhookEventId": "EV_DUP",
+            "timestamp": int(time.time() * 1000),
+            "replyToken": "reply-token",
+            "source": {"type": "user", "userId": "U_LINE_123"},
+            "postback": {"data": "cmd=my_trips"},
+        }
+        with mock.patch("app.line.routes._handle_postback", return_value=("ok", [], None)) as mocked_handler, mock.patch(
+            "app.line.routes._reply_message"
+        ):
+            self.assertEqual(self._post({"events": [event]}).status_code, 200)
+            redelivered = dict(event, deliveryContext={"isRedelivery": True})
+            self.assertEqual(self._post({"events": [redelivered]}).status_code, 200)
+            self.assertTrue(self.dispatcher.drain())
+
+        self.assertEqual(mocked_handler.call_count, 1)
+        self.assertEqual(BotUpdate.query.count(), 1)
+
+    def test_expired_reply_token_falls_back_to_push(self):
+        payload = {
+            "events": [
+                {
+                    "type": "postback",
+                    "webhookEventId": "EV_LATE",
+                    "timestamp": int((time.time() - 120) * 1000),
+                    "replyToken": "stale-token",
+                    "source": {"type": "group", "groupId": "C_GROUP", "userId": "U_LINE_123"},
+                    "postback": {"data": "cmd=my_trips"},
+                }
+            ]
+        }
+        with mock.patch("app.line.routes._handle_postback", return_value=("ok", [], None)), mock.patch(
+            "app.line.routes._line_api_post", return_value=(True, {})
+        ) as mocked_post:
+            self._post(payload)
+            self.assertTrue(self.dispatcher.drain())
+
+        path, body = mocked_post.call_args.args
+        self.assertEqual(path, "/v2/bot/message/push")
+        self.assertEqual(body["to"], "C_GROUP")
 
     def test_account_link_event_creates_mapping(self):
         serializer = URLSafeSerializer(self.app.config["SECRET_KEY"], salt="line-account-link")
@@ -112,13 +176,8 @@ class LineWebhookTestCase(unittest.TestCase):
                 }
             ]
         }
-        body = json.dumps(payload)
         with mock.patch("app.line.routes._upsert_link") as mocked_upsert:
-            response = self.client.post(
-                "/line/webhook",
-                data=body,
-                content_type="application/json",
-                headers={"X-Line-Signature": self._signature(body)},
-            )
+            response = self._post(payload)
             self.assertEqual(response.status_code, 200)
+            self.assertTrue(self.dispatcher.drain())
             mocked_upsert.assert_called_once_with("testuser", "U_LINE_123")
@@ -0,0 +1,99 @@
+"""位置階層測試（預先計算的 樓層 → 房間 → 區域、物品數、版本失效、ETag / 304）"""
+import os
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+
+from app import create_app, db
+from app.models import Item
+from app.models.location import Location
+from app.repositories import location_repo
+from app.services import location_service
+
+
+class LocationHierarchyTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self._db_type = patch.object(location_repo, "get_db_type", return_value="postgres")
+        self._db_type.start()
+        db.session.add_all([
+            Location(floor="1F", room="書房", zone="書桌", order=1),
+            Location(floor="1F", room="書房", zone="書櫃", order=2),
+            Location(floor="1F", room="客廳", zone="", order=3),
+            Location(floor="2F", room="書房", zone="抽屜", order=4),
+            Item(ItemID="A", ItemName="A", ItemFloor="1F", ItemRoom="書房", ItemZone="書桌"),
+            Item(ItemID="B", ItemName="B", ItemFloor="1F", ItemRoom="書房", ItemZone="書桌"),
+            Item(ItemID="C", ItemName="C", ItemFloor="1F", ItemRoom="客廳"),
+            Item(ItemID="D", ItemName="D", ItemFloor="1F", ItemRoom="書房", ItemZone="書桌", is_deleted=True),
+        ])
+        db.session.commit()
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = "boss"
+
+    def tearDown(self):
+        self._db_type.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def test_hierarchy_nests_locations_with_item_counts(self):
+        hierarchy = location_service.get_hierarchy()
+
+        first = hierarchy["floors"][0]
+        self.assertEqual([f["name"] for f in hierarchy["floors"]], ["1F", "2F"])
+        self.assertEqual(first["count"], 3)
+        study = next(r for r in first["rooms"] if r["name"] == "書房")
+        self.assertEqual(study["count"], 2)
+        self.assertEqual({z["name"]: z["count"] for z in study["zones"]}, {"書櫃": 0, "書桌": 2})
+        self.assertEqual(hierarchy["rooms_by_floor"], {"1F": sorted(["客廳", "書房"]), "2F": ["書房"]})
+        self.assertEqual(hierarchy["zones_by_room"], {"書房": sorted(["抽屜", "書櫃", "書桌"])})
+
+    def test_hierarchy_is_recomputed_only_when_locations_change(self):
+        with patch.object(location_repo, "_load_locations", wraps=location_repo._load_locations) as load:
+            first = location_service.get_hierarchy()
+            location_service.cascade_options(floor="1F")
+            location_service.cascade_options(room="書房")
+            self.assertEqual(load.call_count, 1)
+
+            location_repo.insert_location({"floor": "3F", "room": "閣樓", "zone": "", "order": 5})
+            second = location_service.get_hierarchy()
+
+        self.assertEqual(load.call_count, 2)
+        self.assertNotEqual(first["etag"], second["etag"])
+        self.assertEqual(second["rooms_by_floor"]["3F"], ["閣樓"])
+
+    def test_hierarchy_endpoint_revalidates_with_etag(self):
+        response = self.client.get("/api/locations/hierarchy")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"].strip('"')
+        self.assertEqual(response.get_json()["etag"], etag)
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+
+        cached = self.client.get("/api/locations/hierarchy", headers={"If-None-Match": f'"{etag}"'})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b"")
+
+    def test_cascade_endpoint_uses_hierarchy(self):
+        rooms = self.client.get("/api/locations/cascade?floor=1F")
+        zones = self.client.get("/api/locations/cascade?room=書房")
+
+        self.assertEqual(rooms.get_json(), {"rooms": sorted(["客廳", "書房"])})
+        self.assertEqual(zones.get_json(), {"zones": sorted(["抽屜", "書櫃", "書桌"])})
+        self.assertNotEqual(rooms.headers["ETag"], zones.headers["ETag"])
+        again = self.client.get("/api/locations/cascade?floor=1F", headers={"If-None-Match": rooms.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
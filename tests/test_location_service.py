@@ -177,14 +177,14 @@ class LocationRepoCacheInvalidationTestCase(unittest.TestCase):
 
         with patch("app.repositories.location_repo.get_db_type", return_value="mongo"), \
              patch("app.repositories.location_repo.mongo", fake_mongo), \
-             patch("app.repositories.location_repo.cache") as mock_cache:
+             patch("app.repositories.location_repo.shared_cache") as mock_cache:
             location_repo.insert_location({"floor": "1F"})
             location_repo.update_location(ObjectId(), {"room": "書房"})
             location_repo.delete_location(ObjectId())
             location_repo.update_order(ObjectId(), 3)
 
-        self.assertEqual(mock_cache.delete.call_count, 4)
-        mock_cache.delete.assert_called_with("locations_list_mongo")
+        self.assertEqual(mock_cache.invalidate.call_count, 4)
+        mock_cache.invalidate.assert_called_with("locations")
 
 
 if __name__ == "__main__":
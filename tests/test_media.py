@@ -0,0 +1,134 @@
+"""上傳圖片測試（簽章網址免查資料庫、索引查詢退路、X-Accel-Redirect、ETag / 304）"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask import session, url_for
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event, inspect
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import Item, User
+from app.services import media_service
+
+
+class MediaTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.upload_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config.update(TESTING=True, UPLOAD_FOLDER=self.upload_dir)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        for name in ("alice", "bob"):
+            db.session.add(User(User=name, Password=generate_password_hash("Secret123"), admin=False))
+        db.session.add(Item(ItemID="SAFE", ItemName="Safe", ItemOwner="bob", visibility="private",
+                            ItemPic="secret.jpg", ItemThumb="secret_thumb.jpg"))
+        db.session.add(Item(ItemID="LAMP", ItemName="Lamp", ItemOwner="bob", visibility="public", ItemPic="lamp.jpg"))
+        db.session.commit()
+        for filename in ("secret.jpg", "secret_thumb.jpg", "lamp.jpg"):
+            with open(os.path.join(self.upload_dir, filename), "wb") as fh:
+                fh.write(b"\xff\xd8" + filename.encode())
+        self._user_db = patch("app.repositories.user_repo.get_db_type", return_value="postgres")
+        self._user_db.start()
+
+    def tearDown(self):
+        self._user_db.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+    def _login(self, username):
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = username
+
+    def _signed_url(self, filename, username):
+        with self.app.test_request_context():
+            session["UserID"] = username
+            return url_for("items.uploaded_file", filename=filename)
+
+    def _item_queries(self, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        return result, [s for s in statements if "FROM items" in s]
+
+    def test_filename_columns_are_indexed(self):
+        indexed = {tuple(ix["column_names"]) for ix in inspect(db.engine).get_indexes("items")}
+        self.assertIn(("ItemPic",), indexed)
+        self.assertIn(("ItemThumb",), indexed)
+
+    def test_unsigned_requests_fall_back_to_item_lookup(self):
+        self._login("alice")
+        self.assertEqual(self.client.get("/uploads/secret_thumb.jpg").status_code, 403)
+        self.assertEqual(self.client.get("/uploads/lamp.jpg").status_code, 200)
+
+        self._login("bob")
+        self.assertEqual(self.client.get("/uploads/secret.jpg").status_code, 200)
+
+    def test_signed_url_skips_database_lookup(self):
+        self._login("bob")
+        url = self._signed_url("secret.jpg", "bob")
+        self.assertIn("s=", url)
+
+        response, queries = self._item_queries(lambda: self.client.get(url))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"\xff\xd8secret.jpg")
+        self.assertEqual(queries, [])
+
+    def test_signature_is_bound_to_user_filename_and_expiry(self):
+        url = self._signed_url("secret.jpg", "bob")
+        self._login("alice")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        params = media_service.signed_params("secret.jpg", "bob", now=1000)
+        self.assertTrue(media_service.verify_signature("secret.jpg", "bob", params["e"], params["s"], now=1000))
+        self.assertFalse(media_service.verify_signature("lamp.jpg", "bob", params["e"], params["s"], now=1000))
+        self.assertFalse(media_service.verify_signature("secret.jpg", "bob", params["e"], params["s"], now=params["e"] + 1))
+        self.assertFalse(media_service.verify_signature("secret.jpg", "bob", params["e"], "forged", now=1000))
+        # 同一個 TTL 區間內網址不變，瀏覽器快取才會命中
+        self.assertEqual(params, media_service.signed_params("secret.jpg", "bob", now=1001))
+
+    def test_conditional_requests_return_304(self):
+        self._login("bob")
+        url = self._signed_url("lamp.jpg", "bob")
+        first = self.client.get(url)
+
+        by_etag = self.client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        by_date = self.client.get(url, headers={"If-Modified-Since": first.headers["Last-Modified"]})
+
+        self.assertEqual(first.headers["Cache-Control"], "private, max-age=3600")
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_accel_redirect_hands_file_to_proxy(self):
+        self.app.config["MEDIA_ACCEL_REDIRECT"] = "/_protected_uploads/"
+        self._login("bob")
+
+        response = self.client.get(self._signed_url("lamp.jpg", "bob"))
+        missing = self.client.get(self._signed_url("gone.jpg", "bob"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Accel-Redirect"], "/_protected_uploads/lamp.jpg")
+        self.assertEqual(response.mimetype, "image/jpeg")
+        self.assertEqual(response.data, b"")
+        self.assertEqual(missing.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""Prometheus 指標測試（請求延遲依路由樣板、SQL / Mongo 查詢、連線池等待、快取命中、背景庫存快照）"""
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from prometheus_client import REGISTRY
+from prometheus_client.parser import text_string_to_metric_families
+
+from app import create_app, db
+from app.utils import metrics
+
+SNAPSHOT = {
+    "refreshed_at": 1000.0,
+    "counts": {"total_items": 42, "types": 3},
+    "webhook_outbox": {"pending": 5, "dead": 1},
+}
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        metrics.instrument_engine(db.engine)
+        metrics._inventory.clear()
+        self._refresher = patch.object(metrics, "start_inventory_refresher")
+        self._refresher.start()
+
+    def tearDown(self):
+        self._refresher.stop()
+        metrics._inventory.clear()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        return {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(response.get_data(as_text=True))
+            for sample in family.samples
+        }
+
+    def test_request_latency_is_labelled_by_route_template(self):
+        status = str(self.client.get("/health").status_code)
+        before = _sample("ims_http_request_duration_seconds_count", method="GET", route="/health", status=status)
+        unmatched = _sample("ims_http_request_duration_seconds_count", method="GET", route="<unmatched>", status="404")
+
+        self.client.get("/health")
+        self.client.get("/no/such/page/123")
+
+        self.assertEqual(
+            _sample("ims_http_request_duration_seconds_count", method="GET", route="/health", status=status), before + 1
+        )
+        self.assertEqual(
+            _sample("ims_http_request_duration_seconds_count", method="GET", route="<unmatched>", status="404"),
+            unmatched + 1,
+        )
+
+    def test_sql_queries_and_pool_checkout_are_recorded(self):
+        selects = _sample("ims_db_query_duration_seconds_count", backend="sql", operation="SELECT")
+        checkouts = _sample("ims_db_pool_checkout_seconds_count")
+        per_request = _sample("ims_http_request_db_queries_sum", route="/health")
+
+        self.client.get("/health")
+
+        self.assertGreater(_sample("ims_db_query_duration_seconds_count", backend="sql", operation="SELECT"), selects)
+        self.assertGreater(_sample("ims_db_pool_checkout_seconds_count"), checkouts)
+        self.assertGreaterEqual(_sample("ims_http_request_db_queries_sum", route="/health"), per_request + 1)
+
+    def test_mongo_commands_are_recorded(self):
+        before = _sample("ims_db_query_duration_seconds_count", backend="mongo", operation="find")
+        listener = metrics._mongo_listener()
+
+        listener.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+        listener.failed(SimpleNamespace(command_name="find", duration_micros=800))
+
+        self.assertEqual(_sample("ims_db_query_duration_seconds_count", backend="mongo", operation="find"), before + 2)
+        self.assertGreaterEqual(_sample("ims_db_query_errors_total", backend="mongo", operation="find"), 1)
+
+    def test_scrape_reads_inventory_snapshot_without_querying(self):
+        with patch.object(metrics, "compute_inventory", return_value=dict(SNAPSHOT)):
+            self.assertTrue(metrics.refresh_inventory(self.app, force=True))
+
+        with patch("app.repositories.item_repo.get_stats") as get_stats:
+            samples = self._scrape()
+            get_stats.assert_not_called()
+
+        self.assertEqual(samples[("ims_inventory", (("kind", "total_items"),))], 42)
+        self.assertEqual(samples[("ims_webhook_outbox", (("status", "pending"),))], 5)
+        self.assertEqual(samples[("ims_inventory_refreshed_timestamp_seconds", ())], 1000.0)
+
+    def test_cache_hit_ratio_is_exported(self):
+        from app.utils.auth import _principal_cache
+
+        principal_cache = _principal_cache()
+        principal_cache.set("user:x", {"User": "x"})
+        principal_cache.get("user:x")
+        principal_cache.get("user:y")
+
+        samples = self._scrape()
+
+        self.assertGreaterEqual(samples[("ims_cache_hits_total", (("cache", "principal_cache"),))], 1)
+        self.assertGreaterEqual(samples[("ims_cache_misses_total", (("cache", "principal_cache"),))], 1)
+        self.assertIn(("ims_cache_hit_ratio", (("cache", "principal_cache"),)), samples)
+
+    def test_json_format_uses_snapshot(self):
+        with patch.object(metrics, "compute_inventory", return_value=dict(SNAPSHOT)):
+            metrics.refresh_inventory(self.app, force=True)
+
+        response = self.client.get("/metrics?format=json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["counts"]["total_items"], 42)
+
+    def test_refresh_is_skipped_while_snapshot_is_fresh(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"refreshed_at": time.time(), "counts": {}}
+
+        with patch.object(metrics, "compute_inventory", side_effect=compute):
+            self.assertTrue(metrics.refresh_inventory(self.app))
+            self.assertFalse(metrics.refresh_inventory(self.app))
+
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
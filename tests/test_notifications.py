@@ -264,6 +264,19 @@ class NotificationsTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         mock_update.assert_called_once()
 
+    @patch('app.services.user_service._invalidate_cached_user')
+    @patch('app.repositories.user_repo.update_notification_settings')
+    def test_update_settings_invalidates_cached_user(self, mock_update, mock_invalidate):
+        """測試更新通知設定後使登入者快取失效"""
+        with self.client.session_transaction() as sess:
+            sess['UserID'] = 'testuser'
+
+        response = self.client.post('/notifications/api/settings',
+                                    json={'email': 'new@example.com'})
+        self.assertEqual(response.status_code, 200)
+        mock_update.assert_called_once()
+        mock_invalidate.assert_called_once_with('testuser')
+
     @patch('app.repositories.user_repo.update_notification_settings')
     def test_update_settings_parse_replacement_intervals(self, mock_update):
         """測試解析替換間隔字串"""
@@ -444,5 +457,166 @@ class NotificationsTestCase(unittest.TestCase):
         mock_tg_link.query.filter_by.assert_not_called()
 
 
+class NotificationRunTestCase(unittest.TestCase):
+    """批次通知執行測試（依排程讀取到期項目、並行發送、發送後推進）"""
+
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    @staticmethod
+    def _user(name, **overrides):
+        user = {
+            "User": name,
+            "email": f"{name}@example.com",
+            "notify_days": 30,
+            "notify_time": "00:00",
+            "notify_channels": ["email"],
+            "reminder_ladder": "30,14,7,3,1",
+            "last_notification_date": "",
+            "replacement_enabled": True,
+            "replacement_intervals": [],
+        }
+        user.update(overrides)
+        return user
+
+    @staticmethod
+    def _entry(username, item_id, due_date, kind="usage", entry_id=None):
+        return {
+            "id": entry_id or f"{username}:{item_id}:{kind}",
+            "username": username,
+            "item_id": item_id,
+            "kind": kind,
+            "label": "",
+            "due_date": due_date,
+            "next_offset": 0,
+            "item": {"ItemID": item_id, "ItemName": item_id, "UsageExpiry": due_date.strftime("%Y-%m-%d")},
+        }
+
+    def _run(self, users, due_by_user, send_email):
+        from app.services import notification_service
+
+        with patch('app.repositories.user_repo.get_all_users_for_notification', return_value=users), \
+             patch('app.repositories.user_repo.update_last_notification_date') as mock_update_date, \
+             patch('app.services.alert_schedule_service.ensure_schedule'), \
+             patch('app.services.alert_schedule_service.get_due_alerts', return_value=due_by_user) as mock_due, \
+             patch('app.services.alert_schedule_service.mark_sent') as mock_mark_sent, \
+             patch('app.services.item_service.get_expiring_items') as mock_expiring, \
+             patch('app.services.email_service.send_expiry_notification', side_effect=send_email):
+            results = notification_service.check_and_send_notifications()
+        mock_expiring.assert_not_called()
+        return results, mock_due, mock_mark_sent, mock_update_date
+
+    def test_only_due_schedule_entries_are_sent_and_advanced(self):
+        from datetime import date, timedelta
+
+        today = date.today()
+        due_by_user = {
+            "alice": [
+                self._entry("alice", "A1", today - timedelta(days=2)),
+                self._entry("alice", "A2", today + timedelta(days=7), kind="warranty"),
+            ],
+            "bob": [self._entry("bob", "B1", today + timedelta(days=1))],
+        }
+        received = {}
+
+        def send_email(to_email, expired_items, near_expiry_items, **_kwargs):
+            received[to_email] = (
+                sorted(it["ItemID"] for it in expired_items),
+                sorted(it["ItemID"] for it in near_expiry_items),
+            )
+            return True
+
+        users = [self._user("alice"), self._user("bob"), self._user("carol")]
+        results, mock_due, mock_mark_sent, mock_update_date = self._run(users, due_by_user, send_email)
+
+        mock_due.assert_called_once()
+        self.assertEqual(received["alice@example.com"], (["A1"], ["A2"]))
+        self.assertEqual(received["bob@example.com"], ([], ["B1"]))
+        self.assertNotIn("carol@example.com", received)
+        self.assertEqual(results["success_users"], 2)
+        self.assertEqual(mock_update_date.call_count, 2)
+        sent_entries, ladders = mock_mark_sent.call_args[0]
+        self.assertEqual(len(sent_entries), 3)
+        self.assertEqual(ladders["alice"], [30, 14, 7, 3, 1, 0])
+        self.assertEqual(results["channel_stats"]["email"]["sent"], 2)
+        self.assertEqual(results["channel_stats"]["email"]["failed"], 0)
+
+    def test_failed_channel_is_counted_and_user_not_marked_sent(self):
+        from datetime import date
+
+        users = [self._user("alice"), self._user("bob")]
+        due_by_user = {u["User"]: [self._entry(u["User"], "H1", date.today())] for u in users}
+
+        def send_email(to_email, **_kwargs):
+            if to_email.startswith("bob"):
+                raise RuntimeError("smtp down")
+            return True
+
+        from prometheus_client import REGISTRY
+
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+
+        sent = sample("ims_notification_sends_total", channel="email", outcome="sent")
+        failed = sample("ims_notification_sends_total", channel="email", outcome="failed")
+        timed = sample("ims_notification_send_duration_seconds_count", channel="email")
+
+        results, _, mock_mark_sent, mock_update_date = self._run(users, due_by_user, send_email)
+
+        self.assertEqual(sample("ims_notification_sends_total", channel="email", outcome="sent"), sent + 1)
+        self.assertEqual(sample("ims_notification_sends_total", channel="email", outcome="failed"), failed + 1)
+        self.assertEqual(sample("ims_notification_send_duration_seconds_count", channel="email"), timed + 2)
+        self.assertEqual(results["success_users"], 1)
+        self.assertEqual(results["failed_users"], 1)
+        mock_update_date.assert_called_once()
+        # 發送失敗的排程不推進，下次執行會再嘗試
+        sent_entries, _ = mock_mark_sent.call_args[0]
+        self.assertEqual([e["username"] for e in sent_entries], ["alice"])
+        self.assertEqual(results["channel_stats"]["email"]["failed"], 1)
+        bob = next(d for d in results["details"] if d["username"] == "bob")
+        self.assertEqual(bob["reason"], "發送失敗")
+
+    def test_job_logs_channel_stats(self):
+        from app.utils import scheduler
+
+        results = {
+            "total_notifications": 0,
+            "success_users": 0,
+            "channel_stats": {"email": {"sent": 3, "failed": 1, "avg_ms": 12.5, "max_ms": 40.0}},
+        }
+        with patch("app.services.notification_service.check_and_send_notifications", return_value=results), \
+             self.assertLogs("app.utils.scheduler", level="INFO") as logs:
+            scheduler.check_notifications_job()
+
+        self.assertIn("notification channel email: sent=3 failed=1", logs.output[0])
+
+    def test_thousand_users_are_delivered_concurrently(self):
+        import time
+
+        from datetime import date
+
+        users = [self._user(f"user{i}") for i in range(1000)]
+        due_by_user = {u["User"]: [self._entry(u["User"], "H1", date.today())] for u in users}
+
+        def send_email(**_kwargs):
+            time.sleep(0.01)  # 模擬 SMTP 往返延遲
+            return True
+
+        started = time.perf_counter()
+        results, _, _, _ = self._run(users, due_by_user, send_email)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results["success_users"], 1000)
+        # 循序發送至少需 10 秒
+        self.assertLess(elapsed, 5)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,111 @@
+"""取樣分析器測試（只取樣符合路由的前 N 個請求、附上 SQL、用完自動關閉並移除監聽器、僅限管理員）"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User
+from app.utils import profiler
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.output_dir = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, PROFILER_OUTPUT_DIR=self.output_dir)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        db.session.add(User(User="admin", Password=generate_password_hash("Secret123"), admin=True))
+        db.session.add(User(User="alice", Password=generate_password_hash("Secret123"), admin=False))
+        db.session.commit()
+        self._user_db = patch("app.repositories.user_repo.get_db_type", return_value="postgres")
+        self._user_db.start()
+
+    def tearDown(self):
+        profiler.disarm()
+        self._user_db.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def _login(self, username):
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = username
+
+    def _files(self, suffix):
+        return sorted(Path(self.output_dir).glob(f"*{suffix}"))
+
+    def test_profiles_only_the_next_matching_requests(self):
+        profiler.arm(route="/health", requests=2, interval_ms=1)
+
+        self.client.get("/ready")
+        for _ in range(3):
+            self.client.get("/health")
+
+        collapsed = self._files(".collapsed")
+        self.assertEqual(len(collapsed), 2)
+        self.assertIsNone(profiler.current_session())
+        for path in collapsed:
+            self.assertTrue(path.read_text(encoding="utf-8").strip())
+            meta = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+            self.assertEqual(meta["path"], "/health")
+            self.assertGreaterEqual(meta["sql_count"], 1)
+            self.assertTrue(all("statement" in q for q in meta["sql"]))
+
+    def test_sql_listeners_are_removed_when_disarmed(self):
+        profiler.arm(route="/health", requests=1)
+        self.client.get("/health")
+
+        self.assertFalse(event.contains(db.engine, "after_cursor_execute", profiler._sql_after))
+        self.assertEqual(profiler._inflight, 0)
+
+    def test_disabled_profiler_does_not_hook_requests(self):
+        with patch.dict(os.environ, {"PROFILER_ENABLED": "false"}):
+            app = create_app()
+        hooks = app.before_request_funcs.get(None, [])
+        self.assertNotIn(profiler._before_request, hooks)
+
+    def test_admin_endpoints_arm_list_and_download(self):
+        self._login("admin")
+        response = self.client.post("/admin/profiler", json={"route": "/health", "requests": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["session"]["requests"], 1)
+
+        self.client.get("/health")
+
+        status = self.client.get("/admin/profiler").get_json()
+        self.assertIsNone(status["session"])
+        self.assertEqual(len(status["profiles"]), 1)
+        name = status["profiles"][0]["name"]
+        download = self.client.get(f"/admin/profiler/{name}")
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(b" ", download.data)
+        self.assertEqual(self.client.get("/admin/profiler/..%2Fsecret.collapsed").status_code, 404)
+        self.assertEqual(self.client.post("/admin/profiler", json={}).status_code, 400)
+
+    def test_non_admin_cannot_arm(self):
+        self._login("alice")
+        response = self.client.post("/admin/profiler", json={"requests": 1})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNone(profiler.current_session())
+
+
+if __name__ == "__main__":
+    unittest.main()
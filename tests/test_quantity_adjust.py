@@ -0,0 +1,141 @@
+"""原子數量調整測試（單一 UPDATE ... RETURNING、不小於 0、日誌同交易、批次 API）"""
+import os
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import Item, QuantityLog, User
+from app.repositories import item_repo
+from app.services import item_service
+
+
+class QuantityAdjustTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self._patches = [
+            patch.object(item_repo, "get_db_type", return_value="postgres"),
+            patch("app.repositories.user_repo.get_db_type", return_value="postgres"),
+        ]
+        for p in self._patches:
+            p.start()
+        db.session.add_all([
+            User(User="boss", Password=generate_password_hash("Secret123"), admin=True),
+            Item(ItemID="A", ItemName="Apple", Quantity=5, SafetyStock=3),
+            Item(ItemID="B", ItemName="Bolt", Quantity=1),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _statements(self, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        return result, [s.lstrip().split()[0].upper() for s in statements]
+
+    def _quantities(self):
+        db.session.expire_all()
+        return {i.ItemID: i.Quantity for i in Item.query.all()}
+
+    def test_adjust_is_single_update_returning_and_logs(self):
+        result, statements = self._statements(
+            lambda: item_service.adjust_quantity("A", -2, user="boss", reason="scan")
+        )
+
+        self.assertEqual(result, (True, 3, "數量已更新為 3"))
+        self.assertEqual(statements[0], "UPDATE")
+        self.assertEqual(self._quantities()["A"], 3)
+        log = QuantityLog.query.one()
+        self.assertEqual((log.old_quantity, log.new_quantity, log.delta, log.user, log.reason), (5, 3, -2, "boss", "scan"))
+
+    def test_adjust_never_goes_below_zero(self):
+        ok, qty, message = item_service.adjust_quantity("B", -2)
+
+        self.assertFalse(ok)
+        self.assertEqual((qty, message), (1, "庫存不足"))
+        self.assertEqual(self._quantities()["B"], 1)
+        self.assertEqual(QuantityLog.query.count(), 0)
+        self.assertEqual(item_service.adjust_quantity("missing", 1), (False, 0, "找不到該物品"))
+
+    def test_batch_merges_repeated_scans(self):
+        results = item_service.adjust_quantities([("A", -1), ("B", -1), ("A", -1), ("B", -1), ("X", 1)], user="boss")
+
+        by_id = {r["item_id"]: r for r in results}
+        self.assertEqual([r["item_id"] for r in results], ["A", "B", "X"])
+        self.assertEqual((by_id["A"]["success"], by_id["A"]["quantity"], by_id["A"]["status"]), (True, 3, "low"))
+        self.assertFalse(by_id["B"]["success"])
+        self.assertFalse(by_id["X"]["success"])
+        self.assertEqual(self._quantities(), {"A": 3, "B": 1})
+        self.assertEqual([log.delta for log in QuantityLog.query.all()], [-2])
+
+    def test_uncommitted_deltas_roll_back_with_their_logs(self):
+        results = item_repo.apply_quantity_deltas([("A", -1), ("B", 1)], user="boss", commit=False)
+
+        self.assertEqual([r["ok"] for r in results], [True, True])
+        item_repo.rollback()
+        self.assertEqual(self._quantities(), {"A": 5, "B": 1})
+        self.assertEqual(QuantityLog.query.count(), 0)
+
+    def test_quantity_change_webhook_is_staged_in_same_transaction(self):
+        with patch("app.services.webhook_service.fire_event") as fire:
+            item_service.adjust_quantity("A", 4)
+
+        fire.assert_called_once()
+        name, payload = fire.call_args.args
+        self.assertEqual(name, "item.quantity.changed")
+        self.assertEqual((payload["old_quantity"], payload["new_quantity"], payload["delta"]), (5, 9, 4))
+        self.assertEqual(fire.call_args.kwargs, {"commit": False})
+
+    def test_failed_webhook_staging_rolls_back_quantity_change(self):
+        with patch("app.services.webhook_service.fire_event", side_effect=RuntimeError("boom")), \
+             self.assertLogs("app.services.item_service", level="ERROR"):
+            with self.assertRaises(RuntimeError):
+                item_service.adjust_quantity("A", 4)
+
+        self.assertEqual(self._quantities(), {"A": 5, "B": 1})
+        self.assertEqual(QuantityLog.query.count(), 0)
+
+    def test_batch_endpoint(self):
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = "boss"
+
+        response = self.client.post("/api/quantity/batch", json={
+            "adjustments": [{"item_id": "A", "delta": 2}, {"item_id": "B", "delta": -5}],
+            "reason": "掃描",
+        })
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((body["success_count"], body["failed_ids"]), (1, ["B"]))
+        self.assertEqual(self._quantities(), {"A": 7, "B": 1})
+        self.assertEqual(QuantityLog.query.one().user, "boss")
+
+        bad = self.client.post("/api/quantity/batch", json={"adjustments": [{"item_id": "A", "delta": "x"}]})
+        self.assertEqual(bad.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+"""預先計算的使用者推薦測試（規則與歸位建議、主鍵讀取、異動後標記重算、Mongo 集合名稱）"""
+import os
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock, patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Item, UserRecommendation
+from app.repositories import item_repo, recommendation_repo
+from app.services import item_service, recommendation_service
+
+
+def _days(n):
+    return date.today() + timedelta(days=n)
+
+
+def _moved(days_ago, to_location):
+    when = datetime.now() - timedelta(days=days_ago)
+    return {"date": when.strftime("%Y-%m-%d %H:%M"), "from_location": "", "to_location": to_location}
+
+
+class BuildRecommendationsTestCase(unittest.TestCase):
+    def test_rules_relocation_and_ranking(self):
+        today = date(2026, 6, 1)
+        items = [
+            {"ItemID": "T1", "ItemName": "螺絲起子", "ItemType": "工具", "ItemFloor": "1F", "ItemRoom": "車庫"},
+            {"ItemID": "T2", "ItemName": "扳手", "ItemType": "工具", "ItemFloor": "1F", "ItemRoom": "車庫"},
+            {"ItemID": "T3", "ItemName": "鐵鎚", "ItemType": "工具", "ItemFloor": "1F", "ItemRoom": "車庫"},
+            {"ItemID": "T4", "ItemName": "電鑽", "ItemType": "工具", "ItemFloor": "2F", "ItemRoom": "臥室"},
+            {"ItemID": "T5", "ItemName": "捲尺", "ItemType": "工具", "ItemFloor": "2F", "ItemRoom": "書房",
+             "move_history": [{"date": "2026-05-20 10:00", "to_location": "2F/書房"}]},
+            {"ItemID": "B1", "ItemName": "電池", "ItemType": "耗材", "Quantity": 1, "ReorderLevel": 2,
+             "WarrantyExpiry": "2026-01-01"},
+            {"ItemID": "D1", "ItemName": "舊燈", "ItemType": "家電", "Quantity": 0, "ItemGetDate": "2025-01-01"},
+        ]
+
+        result = recommendation_service.build_recommendations(items, today=today)
+
+        kinds = [(r["item_id"], r["type"]) for r in result]
+        self.assertEqual(kinds[:2], [("B1", "low_stock"), ("B1", "warranty_expired")])
+        self.assertIn(("T4", "relocate"), kinds)
+        self.assertNotIn(("T5", "relocate"), kinds)  # 近期刻意移動過的物品不建議移回
+        self.assertEqual(kinds[-1], ("D1", "declutter"))
+        relocate = next(r for r in result if r["type"] == "relocate")
+        self.assertIn("1F/車庫（3/5 件）", relocate["detail"])
+        self.assertEqual([r["score"] for r in result], sorted((r["score"] for r in result), reverse=True))
+
+
+class RecommendationStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self._patches = [
+            patch.object(item_repo, "get_db_type", return_value="postgres"),
+            patch.object(recommendation_repo, "get_db_type", return_value="postgres"),
+        ]
+        for p in self._patches:
+            p.start()
+        db.session.add_all([
+            Item(ItemID="A", ItemName="Apple", ItemOwner="alice", Quantity=5, ReorderLevel=2),
+            Item(ItemID="W", ItemName="Washer", ItemOwner="alice", WarrantyExpiry=_days(-3)),
+            Item(ItemID="B", ItemName="Bolt", ItemOwner="bob", Quantity=0, ReorderLevel=1,
+                 move_history=[_moved(2, "1F/車庫")]),
+            Item(ItemID="X", ItemName="Trashed", ItemOwner="alice", Quantity=0, ReorderLevel=1, is_deleted=True),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _statements(self, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        return result, statements
+
+    def test_first_read_computes_then_reads_snapshot_by_key(self):
+        first = recommendation_service.get_recommendations("alice")
+        self.assertEqual([(r["item_id"], r["type"]) for r in first], [("W", "warranty_expired")])
+
+        second, statements = self._statements(lambda: recommendation_service.get_recommendations("alice"))
+        self.assertEqual(second, first)
+        self.assertEqual(len(statements), 1)
+        self.assertIn("user_recommendations", statements[0])
+
+    def test_item_changes_mark_only_the_owner_stale(self):
+        recommendation_service.refresh_user("alice")
+        recommendation_service.refresh_user("bob")
+
+        item_service.adjust_quantity("A", -4)
+
+        stale = {row.user_id: row.stale for row in UserRecommendation.query.all()}
+        self.assertEqual(stale, {"alice": True, "bob": False})
+        self.assertEqual(recommendation_service.refresh_stale(), 1)
+        kinds = {(r["item_id"], r["type"]) for r in recommendation_service.get_recommendations("alice")}
+        self.assertIn(("A", "low_stock"), kinds)
+        self.assertFalse(db.session.get(UserRecommendation, "alice").stale)
+
+    def test_owner_change_marks_previous_owner_stale(self):
+        recommendation_service.refresh_user("alice")
+        recommendation_service.refresh_user("bob")
+
+        with patch.object(item_repo, "find_item_by_id", return_value={"ItemID": "A", "ItemOwner": "alice"}):
+            item_service.import_items([{"ItemID": "A", "ItemName": "Apple", "ItemOwner": "bob"}])
+
+        stale = {row.user_id: row.stale for row in UserRecommendation.query.all()}
+        self.assertEqual(stale, {"alice": True, "bob": True})
+
+    def test_failing_user_is_deferred_without_blocking_the_batch(self):
+        recommendation_service.refresh_user("alice")
+        recommendation_service.refresh_user("bob")
+        recommendation_service.expire_all()
+        before = db.session.get(UserRecommendation, "alice").computed_at
+        real_list = item_repo.list_items_by_owner
+
+        def list_items_by_owner(owner, projection=None):
+            if owner == "alice":
+                raise RuntimeError("boom")
+            return real_list(owner, projection)
+
+        with patch.object(item_repo, "list_items_by_owner", side_effect=list_items_by_owner), \
+                self.assertLogs("app.services.recommendation_service", level="WARNING"):
+            self.assertEqual(recommendation_service.refresh_stale(), 2)
+
+        db.session.expire_all()
+        alice = db.session.get(UserRecommendation, "alice")
+        self.assertTrue(alice.stale)
+        self.assertGreater(alice.computed_at, before)
+        self.assertFalse(db.session.get(UserRecommendation, "bob").stale)
+        self.assertEqual(recommendation_repo.list_stale_users(10), ["alice"])
+
+    def test_daily_expiry_marks_everyone_for_refresh(self):
+        recommendation_service.refresh_user("alice")
+        recommendation_service.refresh_user("bob")
+
+        self.assertEqual(recommendation_service.expire_all(), 2)
+        self.assertEqual(sorted(recommendation_repo.list_stale_users(10)), ["alice", "bob"])
+        self.assertEqual(recommendation_service.refresh_stale(limit=1), 1)
+        self.assertEqual(len(recommendation_repo.list_stale_users(10)), 1)
+
+    def test_endpoint_returns_snapshot(self):
+        with self.client.session_transaction() as sess:
+            sess["UserID"] = "bob"
+
+        response = self.client.get("/api/recommendations")
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["type"] for r in body["recommendations"]], ["low_stock"])
+        self.assertGreater(body["recommendations"][0]["score"], 60)
+
+
+class MongoRecommendationTestCase(unittest.TestCase):
+    def test_mongo_reads_owner_items_from_item_collection(self):
+        fake_mongo = Mock()
+        fake_mongo.db.item.find.return_value = [
+            {"ItemID": "A", "ItemName": "Apple", "Quantity": 0, "ReorderLevel": 1},
+        ]
+        fake_mongo.db.user_recommendations.find_one.return_value = None
+
+        with patch.object(item_repo, "get_db_type", return_value="mongo"), \
+             patch.object(recommendation_repo, "get_db_type", return_value="mongo"), \
+             patch.object(item_repo, "mongo", fake_mongo), \
+             patch.object(recommendation_repo, "mongo", fake_mongo):
+            result = recommendation_service.get_recommendations("alice")
+
+        self.assertEqual([r["type"] for r in result], ["low_stock"])
+        self.assertEqual(fake_mongo.db.item.find.call_args.args[0]["ItemOwner"], "alice")
+        saved = fake_mongo.db.user_recommendations.update_one.call_args
+        self.assertEqual(saved.args[0], {"user_id": "alice"})
+        self.assertTrue(saved.kwargs["upsert"])
+
+
+if __name__ == "__main__":
+    unittest.main()
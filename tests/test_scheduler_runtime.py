@@ -0,0 +1,177 @@
+"""排程 worker 測試（領導者選舉、失去鎖時停止、阻塞不空轉、任務執行時間與延遲）"""
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import tests.fixtures_env  # noqa: F401
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from flask import Flask, current_app
+
+from app.utils import leader, scheduler
+
+
+class _FakeRedis:
+    """只實作租約鎖用到的指令；eval 依腳本內容分派"""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token, *args):
+        if self.data.get(key) != token:
+            return 0
+        if script == leader._RELEASE_SCRIPT:
+            del self.data[key]
+        return 1
+
+
+class RedisLeaderLockTestCase(unittest.TestCase):
+    def test_only_one_holder_until_released(self):
+        client = _FakeRedis()
+        first = leader.RedisLeaderLock(client, "scheduler")
+        second = leader.RedisLeaderLock(client, "scheduler")
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(first.refresh())
+
+        first.release()
+        self.assertTrue(second.acquire())
+
+    def test_expired_lease_is_not_renewed_by_old_holder(self):
+        client = _FakeRedis()
+        first = leader.RedisLeaderLock(client, "scheduler")
+        second = leader.RedisLeaderLock(client, "scheduler")
+        first.acquire()
+
+        # 模擬租約過期並被其他程序取得
+        client.data.clear()
+        second.acquire()
+
+        self.assertFalse(first.refresh())
+        first.release()
+        self.assertEqual(client.data[second.key], second.token)
+
+    def test_auto_backend_without_redis_or_postgres_falls_back_to_local(self):
+        with patch.object(leader, "_redis_client", return_value=None), \
+                patch.object(leader, "_postgres_engine", return_value=None):
+            lock = leader.make_leader_lock("scheduler")
+
+        self.assertEqual(lock.backend, "none")
+        with patch.object(leader, "_redis_client", return_value=None):
+            with self.assertRaises(RuntimeError):
+                leader.make_leader_lock("scheduler", backend="redis")
+
+
+class SchedulerRuntimeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.started = []
+        self.stopped = []
+        self._patches = [
+            patch.object(scheduler, "init_scheduler", side_effect=self.started.append),
+            patch.object(scheduler, "shutdown_scheduler", side_effect=lambda wait=True: self.stopped.append(wait)),
+        ]
+        for p in self._patches:
+            p.start()
+        self.redis = _FakeRedis()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+
+    def _runtime(self, **kwargs):
+        return scheduler.SchedulerRuntime(self.app, lock=leader.RedisLeaderLock(self.redis, "scheduler"), **kwargs)
+
+    def test_exactly_one_replica_runs_the_scheduler(self):
+        replicas = [self._runtime() for _ in range(3)]
+
+        leaders = [runtime.tick() for runtime in replicas]
+        leaders += [runtime.tick() for runtime in replicas]
+
+        self.assertEqual(leaders, [True, False, False, True, False, False])
+        self.assertEqual(len(self.started), 1)
+
+    def test_standby_takes_over_after_leader_loses_lock(self):
+        active, standby = self._runtime(), self._runtime()
+        active.tick()
+        standby.tick()
+
+        self.redis.data.clear()
+        self.assertTrue(standby.tick())
+        self.assertFalse(active.tick())
+
+        self.assertEqual(len(self.started), 2)
+        self.assertEqual(self.stopped, [True])
+
+    def test_lock_is_released_only_after_running_jobs_finish(self):
+        events = []
+        lock = Mock(backend="redis")
+        lock.acquire.return_value = True
+        lock.refresh.return_value = False
+        lock.release.side_effect = lambda: events.append("release")
+        runtime = scheduler.SchedulerRuntime(self.app, lock=lock)
+        runtime.tick()
+
+        with patch.object(scheduler, "shutdown_scheduler", side_effect=lambda wait=True: events.append(("shutdown", wait))):
+            self.assertFalse(runtime.tick())
+
+        self.assertEqual(events, [("shutdown", True), "release"])
+
+    def test_run_blocks_without_spinning_and_releases_on_stop(self):
+        runtime = self._runtime(renew_interval=0.05).start_background()
+        time.sleep(0.01)
+        cpu_before = time.process_time()
+        time.sleep(0.3)
+        cpu_used = time.process_time() - cpu_before
+
+        runtime.stop(timeout=2)
+
+        self.assertLess(cpu_used, 0.1)
+        self.assertEqual(self.stopped, [True])
+        self.assertEqual(self.redis.data, {})
+        self.assertFalse(any(t.name == "scheduler-runtime" for t in threading.enumerate()))
+
+
+class JobInstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        scheduler._job_stats.clear()
+        scheduler._submitted_lag.clear()
+
+    def test_records_duration_lag_and_app_context(self):
+        seen = []
+        job = scheduler._instrumented(self.app, "demo", lambda: seen.append(current_app.name))
+        scheduled = datetime.now(timezone.utc) - timedelta(seconds=4)
+        scheduler._on_job_event(SimpleNamespace(code=EVENT_JOB_SUBMITTED, job_id="demo", scheduled_run_times=[scheduled]))
+
+        job()
+
+        stats = scheduler.get_job_stats(local_only=True)["demo"]
+        self.assertEqual(seen, [self.app.name])
+        self.assertEqual(stats["runs"], 1)
+        self.assertGreaterEqual(stats["last_lag_seconds"], 4)
+        self.assertIsNotNone(stats["last_duration_seconds"])
+
+    def test_failures_and_missed_runs_are_counted(self):
+        def boom():
+            raise ValueError("smtp down")
+
+        scheduler._instrumented(self.app, "demo", boom)()
+        scheduler._on_job_event(SimpleNamespace(code=EVENT_JOB_MISSED, job_id="demo"))
+
+        stats = scheduler.get_job_stats(local_only=True)["demo"]
+        self.assertEqual((stats["runs"], stats["failures"], stats["missed"]), (1, 1, 1))
+        self.assertEqual(stats["last_error"], "smtp down")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""資料庫結構遷移測試（alembic upgrade head 套用一次、啟動時只查一次版本）"""
+import os
+import shutil
+import tempfile
+import unittest
+from functools import partial
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
+
+from app import create_app, db
+from app.utils import schema
+
+
+class SchemaVersionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(self.tmpdir, 'schema.db')}"
+        # conftest 將 db.init_app / create_all 換成 no-op，這裡需要真正的資料庫
+        self._patches = [
+            patch.object(db, "init_app", partial(FlaskSQLAlchemy.init_app, db)),
+            patch.object(db, "create_all", partial(FlaskSQLAlchemy.create_all, db)),
+        ]
+        for p in self._patches:
+            p.start()
+        self.apps = []
+
+    def tearDown(self):
+        for app in self.apps:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        for p in self._patches:
+            p.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _boot(self, auto_migrate):
+        with patch.dict(os.environ, {"SCHEMA_AUTO_MIGRATE": "true" if auto_migrate else "false"}):
+            app = create_app()
+        self.apps.append(app)
+        return app
+
+    def _count_statements(self, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(Engine, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(Engine, "before_cursor_execute", listener)
+        return result, statements
+
+    def test_first_boot_applies_migrations_once(self):
+        app = self._boot(auto_migrate=True)
+
+        with app.app_context():
+            self.assertEqual(schema.current_revision(), schema.head_revision())
+            self.assertTrue(inspect(db.engine).has_table("items"))
+            self.assertFalse(inspect(db.engine).has_table("schema_version"))
+            admins = db.session.execute(text("SELECT COUNT(*) FROM users WHERE \"User\" = 'admin'")).scalar()
+            self.assertEqual(admins, 1)
+            self.assertEqual(schema.upgrade(), [])
+
+    def test_boot_at_head_issues_a_single_query(self):
+        self._boot(auto_migrate=True)
+
+        app, statements = self._count_statements(lambda: self._boot(auto_migrate=True))
+
+        self.assertEqual(len(statements), 1, statements)
+        self.assertIn("alembic_version", statements[0])
+        self.assertEqual(app.extensions["schema_revision"], schema.head_revision())
+
+    def test_boot_without_auto_migrate_only_warns(self):
+        with self.assertLogs("app.utils.schema", level="WARNING"):
+            app, statements = self._count_statements(lambda: self._boot(auto_migrate=False))
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(app.extensions["schema_revision"], "")
+        with app.app_context():
+            self.assertFalse(inspect(db.engine).has_table("items"))
+
+    def test_head_revision_matches_alembic(self):
+        from alembic.script import ScriptDirectory
+
+        script = ScriptDirectory.from_config(schema.alembic_config())
+        self.assertEqual(schema.head_revision(), script.get_current_head())
+
+    def test_create_all_database_is_adopted_and_upgraded(self):
+        app = self._boot(auto_migrate=False)
+        with app.app_context():
+            # 由 alembic 接手前以 create_all 建立、缺少後來補上的欄位
+            db.create_all()
+            db.session.execute(text("DROP INDEX IF EXISTS \"ix_items_ItemOwner\""))
+            db.session.execute(text("ALTER TABLE items DROP COLUMN sort_order"))
+            db.session.commit()
+
+            applied = schema.upgrade()
+
+            self.assertEqual(applied[-1], schema.head_revision())
+            self.assertNotIn(schema.BASELINE_REVISION, applied)
+            inspector = inspect(db.engine)
+            self.assertIn("sort_order", {column["name"] for column in inspector.get_columns("items")})
+            self.assertIn("ix_items_ItemOwner", {index["name"] for index in inspector.get_indexes("items")})
+
+    def test_cli_applies_pending_migrations(self):
+        app = self._boot(auto_migrate=False)
+
+        result = app.test_cli_runner().invoke(args=["schema-upgrade"])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        with app.app_context():
+            head = schema.head_revision()
+        self.assertIn(head, result.output)
+        status = app.test_cli_runner().invoke(args=["schema-status"])
+        self.assertIn(f"目前版本：{head}", status.output)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""兩層快取測試（本機 LRU、版本號失效、跨 worker 廣播、單一重算、命中計數）"""
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+
+from app.utils.cache import TwoTierCache
+
+
+class FakeShared:
+    """模擬 Flask-Caching：記錄往返次數，值以複本保存"""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        self.calls += 1
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.calls += 1
+        self.data[key] = value
+        return True
+
+    def add(self, key, value, timeout=None):
+        self.calls += 1
+        with self._lock:
+            if key in self.data:
+                return False
+            self.data[key] = value
+            return True
+
+    def delete(self, key):
+        self.calls += 1
+        self.data.pop(key, None)
+        return True
+
+
+class TwoTierCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.shared = FakeShared()
+
+    def _worker(self, **kwargs):
+        cache = TwoTierCache("types", self.shared, **kwargs)
+        cache.synced = True
+        return cache
+
+    def test_local_hits_skip_shared_round_trip(self):
+        cache = self._worker()
+        self.assertEqual(cache.get("list", lambda: ["a"]), ["a"])
+        calls = self.shared.calls
+
+        for _ in range(10):
+            self.assertEqual(cache.get("list", lambda: ["b"]), ["a"])
+
+        self.assertEqual(self.shared.calls, calls)
+        stats = cache.stats()
+        self.assertEqual(stats["local_hits"], 10)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_broadcast_version_invalidates_other_workers(self):
+        writer, reader = self._worker(), self._worker()
+        source = ["v1"]
+        self.assertEqual(reader.get("list", lambda: list(source)), ["v1"])
+        self.assertEqual(writer.get("list", lambda: list(source)), ["v1"])
+        self.assertEqual(writer.stats()["shared_hits"], 1)
+
+        source[0] = "v2"
+        version = writer.invalidate()
+        reader.apply_version(version)  # 廣播送達
+
+        self.assertEqual(reader.get("list", lambda: list(source)), ["v2"])
+        self.assertEqual(writer.get("list", lambda: list(source)), ["v2"])
+
+    def test_unsynced_worker_rereads_version_after_short_ttl(self):
+        writer = self._worker()
+        reader = TwoTierCache("types", self.shared, unsynced_ttl=0.05)
+        source = ["v1"]
+        reader.get("list", lambda: list(source))
+
+        source[0] = "v2"
+        writer.invalidate()
+        time.sleep(0.06)
+
+        self.assertEqual(reader.get("list", lambda: list(source)), ["v2"])
+
+    def test_concurrent_misses_compute_once(self):
+        cache = self._worker()
+        computed = []
+        release = threading.Event()
+
+        def compute():
+            computed.append(1)
+            release.wait(1)
+            return ["slow"]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("list", compute))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(results, [["slow"]] * 8)
+
+    def test_shared_cache_failure_falls_back_to_compute(self):
+        class Broken:
+            def __getattr__(self, name):
+                def fail(*args, **kwargs):
+                    raise ConnectionError("redis down")
+                return fail
+
+        cache = TwoTierCache("types", Broken())
+        self.assertEqual(cache.get("list", lambda: [1]), [1])
+        self.assertEqual(cache.get("list", lambda: [2]), [1])
+
+
+class SharedCacheAppTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        from app import create_app
+
+        self.app = create_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_invalidate_bumps_version_and_publishes(self):
+        from app.utils import shared_cache
+
+        self.assertEqual(shared_cache.cached("locations", "list", lambda: ["old"]), ["old"])
+        bus = self.app.extensions["cache_bus"]
+        with patch.object(bus, "publish") as publish:
+            shared_cache.invalidate("locations")
+
+        namespace, version = publish.call_args.args
+        self.assertEqual(namespace, "locations")
+        self.assertEqual(shared_cache.get_cache("locations").version(), version)
+        self.assertEqual(shared_cache.cached("locations", "list", lambda: ["new"]), ["new"])
+        self.assertIs(self.app.extensions["locations_cache"], shared_cache.get_cache("locations"))
+
+    def test_received_message_applies_version(self):
+        from app.utils import shared_cache
+
+        shared_cache.cached("types", "list", lambda: ["old"])
+        self.app.extensions["cache_bus"]._apply('{"ns": "types", "v": "remote"}')
+
+        self.assertEqual(shared_cache.get_cache("types")._version, "remote")
+        self.assertEqual(shared_cache.cached("types", "list", lambda: ["new"]), ["new"])
+
+
+    def test_events_reach_subscribers_and_reset_on_resync(self):
+        from app.utils import shared_cache
+
+        received, resets = [], []
+        shared_cache.subscribe("principal", received.append, lambda: resets.append(True))
+        bus = self.app.extensions["cache_bus"]
+        with patch.object(bus, "_publish") as publish:
+            shared_cache.broadcast("principal", {"username": "boss"})
+        self.assertEqual(publish.call_args.args[0], {"event": "principal", "data": {"username": "boss"}})
+
+        bus._apply('{"event": "principal", "data": {"username": "boss"}, "pid": 1}')
+        bus._set_synced(True)
+
+        self.assertEqual(received, [{"username": "boss"}])
+        self.assertEqual(resets, [True])
+
+if __name__ == "__main__":
+    unittest.main()
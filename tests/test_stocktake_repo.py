@@ -0,0 +1,107 @@
+"""盤點集合式操作測試（一次 INSERT ... SELECT 填入、一次 UPDATE 標記差異與寫回庫存、批次寫入數量日誌）"""
+import os
+import unittest
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Item, QuantityLog
+from app.models.stocktake import StocktakeItem
+from app.repositories import stocktake_repo
+
+
+class StocktakeRepoTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self._db_type = patch.object(stocktake_repo, "get_db_type", return_value="postgres")
+        self._db_type.start()
+        db.session.add_all([
+            Item(ItemID=f"I{i}", ItemName=f"Item {i}", Quantity=i) for i in range(1, 6)
+        ] + [Item(ItemID="T1", ItemName="Trashed", Quantity=9, is_deleted=True)])
+        db.session.commit()
+        self.session_id = stocktake_repo.create_session("Q3", created_by="admin")
+
+    def tearDown(self):
+        self._db_type.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+
+    def _statements(self, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        return result, [s for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE", "SELECT"))]
+
+    def test_populate_is_one_insert_select_excluding_trash(self):
+        count, statements = self._statements(lambda: stocktake_repo.populate_session(self.session_id))
+
+        self.assertEqual(count, 5)
+        self.assertEqual(len(statements), 1)
+        self.assertIn("INSERT INTO stocktake_items", statements[0])
+        rows = StocktakeItem.query.filter_by(session_id=self.session_id).order_by(StocktakeItem.item_id).all()
+        self.assertEqual([r.item_id for r in rows], ["I1", "I2", "I3", "I4", "I5"])
+        self.assertEqual([r.expected_qty for r in rows], [1, 2, 3, 4, 5])
+        self.assertTrue(all(r.status == "pending" and r.actual_qty is None for r in rows))
+
+    def test_mark_discrepancies_is_one_update(self):
+        stocktake_repo.populate_session(self.session_id)
+        StocktakeItem.query.filter_by(item_id="I1").update({"actual_qty": 1, "status": "discrepancy"})
+        StocktakeItem.query.filter_by(item_id="I2").update({"actual_qty": 7, "status": "counted"})
+        StocktakeItem.query.filter_by(item_id="I3").update({"actual_qty": 0, "status": "discrepancy"})
+        db.session.commit()
+
+        changed, statements = self._statements(lambda: stocktake_repo.mark_discrepancies(self.session_id))
+
+        self.assertEqual(changed, 2)
+        self.assertEqual(len(statements), 1)
+        status = {r.item_id: r.status for r in StocktakeItem.query.all()}
+        self.assertEqual(status, {"I1": "counted", "I2": "discrepancy", "I3": "discrepancy",
+                                  "I4": "pending", "I5": "pending"})
+
+    def test_apply_counts_updates_inventory_and_logs_in_batch(self):
+        stocktake_repo.populate_session(self.session_id)
+        stocktake_repo.record_count(self.session_id, "I1", 1, "admin")
+        stocktake_repo.record_count(self.session_id, "I2", 10, "admin")
+        stocktake_repo.record_count(self.session_id, "I3", 0, "admin")
+
+        updated, statements = self._statements(
+            lambda: stocktake_repo.apply_counts_to_inventory(self.session_id, user="admin", reason="盤點：Q3")
+        )
+
+        self.assertEqual(updated, 3)
+        self.assertEqual(len(statements), 2)
+        self.assertEqual({i.ItemID: i.Quantity for i in Item.query.all()},
+                         {"I1": 1, "I2": 10, "I3": 0, "I4": 4, "I5": 5, "T1": 9})
+        logs = {log.item_id: log for log in QuantityLog.query.all()}
+        self.assertEqual(sorted(logs), ["I2", "I3"])
+        self.assertEqual((logs["I2"].old_quantity, logs["I2"].new_quantity, logs["I2"].delta), (2, 10, 8))
+        self.assertEqual((logs["I3"].delta, logs["I3"].user, logs["I3"].reason), (-3, "admin", "盤點：Q3"))
+
+    def test_status_checks_do_not_load_items(self):
+        stocktake_repo.populate_session(self.session_id)
+        db.session.expire_all()
+
+        sess = stocktake_repo.get_session(self.session_id, include_items=False)
+
+        self.assertEqual(sess["item_count"], 5)
+        self.assertNotIn("items", sess)
+
+
+if __name__ == "__main__":
+    unittest.main()
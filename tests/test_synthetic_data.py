@@ -0,0 +1,51 @@
+"""合成資料產生器測試（可重現、規模換算、各表之間的參照一致）"""
+import unittest
+from datetime import date
+
+from benchmarks import synthetic
+
+ANCHOR = date(2026, 6, 1)
+
+
+class SyntheticDataTestCase(unittest.TestCase):
+    def test_same_seed_generates_identical_data(self):
+        first = synthetic.generate(300, seed=7, anchor=ANCHOR)
+        second = synthetic.generate(300, seed=7, anchor=ANCHOR)
+        other = synthetic.generate(300, seed=8, anchor=ANCHOR)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first["items"], other["items"])
+
+    def test_scale_names_and_table_sizes(self):
+        self.assertEqual(synthetic.resolve_scale("100k"), 100_000)
+        self.assertEqual(synthetic.resolve_scale("1M"), 1_000_000)
+        self.assertEqual(synthetic.resolve_scale("2500"), 2500)
+        with self.assertRaises(ValueError):
+            synthetic.resolve_scale("huge")
+
+        sizes = synthetic.table_sizes(1_000_000)
+        self.assertEqual((sizes["users"], sizes["loans"], sizes["logs"]), (500, 50_000, 500_000))
+
+    def test_records_reference_generated_users_items_and_locations(self):
+        data = synthetic.generate(400, anchor=ANCHOR)
+        users = {user["User"] for user in data["users"]}
+        item_ids = {item["ItemID"] for item in data["items"]}
+        places = {f"{loc['floor']}/{loc['room']}/{loc['zone']}" for loc in data["locations"]}
+
+        self.assertEqual(len(item_ids), 400)
+        self.assertTrue({item["ItemOwner"] for item in data["items"]} <= users)
+        self.assertTrue({item["ItemStorePlace"] for item in data["items"]} <= places)
+        self.assertTrue({loan["item_id"] for loan in data["loans"]} <= item_ids)
+        self.assertTrue({log["user"] for log in data["logs"]} <= users)
+        self.assertTrue({m["username"] for m in data["group_members"]} <= users)
+        for item in data["items"]:
+            if item["MaintenanceIntervalDays"]:
+                self.assertEqual(
+                    (item["MaintenanceDueDate"] - item["LastMaintenanceDate"]).days, item["MaintenanceIntervalDays"]
+                )
+            for move in item["move_history"]:
+                self.assertIn(move["to_location"], places)
+
+
+if __name__ == "__main__":
+    unittest.main()
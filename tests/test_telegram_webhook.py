@@ -1,23 +1,57 @@
 import json
 import os
+import tempfile
 import unittest
+from datetime import datetime, timedelta
 from unittest import mock
 
 import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
 
-from app import create_app
+from app import create_app, db
+from app.models import BotUpdate
+from app.services import bot_service
 
 
 class TelegramWebhookTestCase(unittest.TestCase):
     def setUp(self):
+        self._db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self._db_file.close()
         os.environ["DB_TYPE"] = "postgres"
-        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        os.environ["DATABASE_URL"] = f"sqlite:///{self._db_file.name}"
         os.environ["REDIS_URL"] = "redis://localhost:6379/0"
         self.app = create_app()
         self.app.config["TESTING"] = True
         self.app.config["WTF_CSRF_ENABLED"] = False
         self.app.config["TELEGRAM_WEBHOOK_SECRET"] = "tg-secret"
         self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self.dispatcher = bot_service.BotDispatcher(self.app, max_workers=1, chat_rate=0)
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+        os.unlink(self._db_file.name)
+
+    def _post(self, payload: dict):
+        return self.client.post(
+            "/telegram/webhook",
+            data=json.dumps(payload),
+            content_type="application/json",
+            headers={"X-Telegram-Bot-Api-Secret-Token": "tg-secret"},
+        )
+
+    def _message(self, update_id: int, chat_id: int = 222) -> dict:
+        return {
+            "update_id": update_id,
+            "message": {"message_id": update_id, "from": {"id": 111}, "chat": {"id": chat_id}, "text": "我的旅行"},
+        }
 
     def test_webhook_rejects_invalid_secret(self):
         response = self.client.post(
@@ -40,14 +74,13 @@ class TelegramWebhookTestCase(unittest.TestCase):
         with mock.patch("app.telegram.routes._handle_text", return_value=("ok", None)) as mocked_handle, mock.patch(
             "app.telegram.routes._send_message"
         ) as mocked_send:
-            response = self.client.post(
-                "/telegram/webhook",
-                data=json.dumps(payload),
-                content_type="application/json",
-                headers={"X-Telegram-Bot-Api-Secret-Token": "tg-secret"},
-            )
+            response = self._post(payload)
+            # webhook 只入列，回覆由 dispatcher 處理
+            self.assertEqual(response.status_code, 200)
+            mocked_handle.assert_not_called()
+            self.assertEqual(BotUpdate.query.one().chat_id, "222")
+            self.assertTrue(self.dispatcher.drain())
 
-        self.assertEqual(response.status_code, 200)
         mocked_handle.assert_called_once_with("111", "222", "我的旅行")
         mocked_send.assert_called_once_with("222", "ok", None)
 
@@ -64,13 +97,87 @@ class TelegramWebhookTestCase(unittest.TestCase):
         with mock.patch("app.telegram.routes._handle_callback", return_value=("ok", [[{"text": "X", "callback_data": "cmd:my_trips"}]])) as mocked_handle, mock.patch(
             "app.telegram.routes._send_message"
         ) as mocked_send:
-            response = self.client.post(
-                "/telegram/webhook",
-                data=json.dumps(payload),
-                content_type="application/json",
-                headers={"X-Telegram-Bot-Api-Secret-Token": "tg-secret"},
-            )
+            response = self._post(payload)
+            self.assertTrue(self.dispatcher.drain())
 
         self.assertEqual(response.status_code, 200)
         mocked_handle.assert_called_once_with("111", "cmd:common")
         mocked_send.assert_called_once()
+
+    def test_webhook_does_not_start_a_dispatcher_in_web_process(self):
+        with mock.patch("app.telegram.routes._handle_text") as mocked_handle:
+            self._post(self._message(3))
+
+        self.assertIsNone(bot_service._dispatcher)
+        mocked_handle.assert_not_called()
+        self.assertEqual(BotUpdate.query.one().status, "pending")
+
+    def test_purge_removes_only_old_finished_updates(self):
+        old = datetime.utcnow() - timedelta(days=bot_service.BOT_UPDATE_RETENTION_DAYS + 1)
+        for n, (status, created_at) in enumerate(
+            [("done", old), ("dead", old), ("pending", old), ("done", datetime.utcnow())]
+        ):
+            db.session.add(BotUpdate(channel="telegram", update_key=f"k{n}", chat_id="222", payload="{}",
+                                     status=status, created_at=created_at))
+        db.session.commit()
+
+        self.assertEqual(bot_service.purge_finished(), 2)
+        self.assertEqual(sorted(row.update_key for row in BotUpdate.query.all()), ["k2", "k3"])
+
+    def test_retried_update_is_processed_once(self):
+        with mock.patch("app.telegram.routes._handle_text", return_value=("ok", None)) as mocked_handle, mock.patch(
+            "app.telegram.routes._send_message"
+        ):
+            self._post(self._message(5))
+            self._post(self._message(5))
+            self.assertTrue(self.dispatcher.drain())
+
+        self.assertEqual(mocked_handle.call_count, 1)
+        self.assertEqual(BotUpdate.query.count(), 1)
+
+    def test_failed_reply_is_retried_then_dead(self):
+        with mock.patch("app.telegram.routes._handle_text", return_value=("ok", None)), mock.patch(
+            "app.telegram.routes._telegram_api", return_value=(False, {"error": "timeout"})
+        ):
+            self._post(self._message(6))
+            self.assertTrue(self.dispatcher.drain())
+            row = BotUpdate.query.one()
+            self.assertEqual((row.status, row.attempts), ("pending", 1))
+            self.assertGreater(row.next_attempt_at, datetime.utcnow())
+
+            with mock.patch.object(bot_service, "BOT_MAX_ATTEMPTS", 2):
+                BotUpdate.query.update({"next_attempt_at": datetime.utcnow()})
+                db.session.commit()
+                self.assertTrue(self.dispatcher.drain())
+
+        db.session.expire_all()
+        row = BotUpdate.query.one()
+        self.assertEqual((row.status, row.attempts, row.last_error), ("dead", 2, "timeout"))
+
+    def test_client_error_is_not_retried(self):
+        with mock.patch("app.telegram.routes._handle_text", return_value=("ok", None)), mock.patch(
+            "app.telegram.routes._telegram_api", return_value=(False, {"error": "chat not found", "status": 400})
+        ) as mocked_api:
+            self._post(self._message(7))
+            self.assertTrue(self.dispatcher.drain())
+
+        self.assertEqual(mocked_api.call_count, 1)
+        self.assertEqual(BotUpdate.query.one().status, "dead")
+
+    def test_per_chat_rate_limit_defers_without_counting_attempt(self):
+        dispatcher = bot_service.BotDispatcher(self.app, max_workers=1, chat_rate=0.01, chat_burst=2)
+        try:
+            with mock.patch("app.telegram.routes._handle_text", return_value=("ok", None)), mock.patch(
+                "app.telegram.routes._send_message"
+            ) as mocked_send:
+                for update_id in (10, 11, 12):
+                    self._post(self._message(update_id))
+                self._post(self._message(13, chat_id=333))
+                self.assertTrue(dispatcher.drain())
+        finally:
+            dispatcher.stop()
+
+        self.assertEqual(sorted(c.args[0] for c in mocked_send.call_args_list), ["222", "222", "333"])
+        deferred = BotUpdate.query.filter_by(status="pending").one()
+        self.assertEqual((deferred.chat_id, deferred.attempts, deferred.last_error), ("222", 0, "rate limited"))
+        self.assertEqual(dispatcher.counters["deferred"], 1)
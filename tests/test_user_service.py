@@ -59,8 +59,12 @@ class UserServiceTestCase(unittest.TestCase):
         self.fake_repo = FakeUserRepo()
         self._orig_repo = user_service.user_repo
         user_service.user_repo = self.fake_repo
+        # 帳號新增 / 刪除會重新排程到期提醒
+        self._users_changed = patch("app.services.alert_schedule_service.users_changed")
+        self.users_changed = self._users_changed.start()
 
     def tearDown(self):
+        self._users_changed.stop()
         user_service.user_repo = self._orig_repo
 
     def test_authenticate_with_hashed_password(self):
@@ -132,6 +136,7 @@ class UserServiceTestCase(unittest.TestCase):
 
         result = user_service.create_user(username, password, admin=False)
         self.assertTrue(result)
+        self.users_changed.assert_called_once_with([username])
 
         user = self.fake_repo.find_by_username(username)
         self.assertIsNotNone(user)
@@ -200,6 +205,7 @@ class UserServiceTestCase(unittest.TestCase):
         with patch("app.services.user_service.log_service.log_action"):
             ok, msg = user_service.delete_user("admin", "user1")
         self.assertTrue(ok)
+        self.users_changed.assert_called_once_with(["user1"])
         self.assertIn("已刪除", msg)
         self.assertIsNone(self.fake_repo.find_by_username("user1"))
 
@@ -0,0 +1,264 @@
+"""Webhook outbox 與 dispatcher 測試（同交易寫入、連線重用、每主機併發上限、重試、斷路器）"""
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import tests.fixtures_env  # noqa: F401
+from flask_sqlalchemy import SQLAlchemy as FlaskSQLAlchemy
+
+from app import create_app, db
+from app.models import Webhook, WebhookDelivery
+from app.services import webhook_service
+
+
+class _Receiver:
+    """本機 webhook 接收端：記錄請求、連線埠與最大同時請求數"""
+
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.requests = []
+        self.client_ports = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                with receiver.lock:
+                    receiver.active += 1
+                    receiver.max_active = max(receiver.max_active, receiver.active)
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(receiver.delay)
+                with receiver.lock:
+                    receiver.active -= 1
+                    receiver.requests.append((dict(self.headers), body))
+                    receiver.client_ports.add(self.client_address[1])
+                self.send_response(receiver.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *_args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WebhookOutboxTestCase(unittest.TestCase):
+    def setUp(self):
+        self._db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self._db_file.close()
+        os.environ["DB_TYPE"] = "postgres"
+        os.environ["DATABASE_URL"] = f"sqlite:///{self._db_file.name}"
+        self.app = create_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        if self.app not in db._app_engines:
+            FlaskSQLAlchemy.init_app(db, self.app)
+        FlaskSQLAlchemy.create_all(db)
+        self.receivers = []
+
+    def tearDown(self):
+        for receiver in self.receivers:
+            receiver.close()
+        db.session.remove()
+        FlaskSQLAlchemy.drop_all(db)
+        self.ctx.pop()
+        os.unlink(self._db_file.name)
+
+    def _receiver(self, **kwargs):
+        receiver = _Receiver(**kwargs)
+        self.receivers.append(receiver)
+        return receiver
+
+    def _webhook(self, url, secret="s3cret", events=None):
+        wh = Webhook(user_id="admin", url=url, secret=secret, events=json.dumps(events or []), is_active=True)
+        db.session.add(wh)
+        db.session.commit()
+        return wh.id
+
+    def _dispatcher(self, **kwargs):
+        dispatcher = webhook_service.WebhookDispatcher(self.app, **kwargs)
+        self.addCleanup(dispatcher.stop)
+        return dispatcher
+
+    def test_staged_event_commits_and_rolls_back_with_caller_transaction(self):
+        self._webhook("http://127.0.0.1:1/hook")
+
+        webhook_service.fire_event("item.created", {"item_id": "X1"}, commit=False)
+        db.session.rollback()
+        self.assertEqual(WebhookDelivery.query.count(), 0)
+
+        webhook_service.fire_event("item.created", {"item_id": "X1"}, commit=False)
+        db.session.commit()
+        self.assertEqual(WebhookDelivery.query.count(), 1)
+        self.assertEqual(webhook_service.get_metrics()["queue_depth"], 1)
+
+    def test_firing_events_does_not_start_a_dispatcher_in_web_process(self):
+        self._webhook("http://127.0.0.1:1/hook")
+
+        webhook_service.fire_event("item.created", {"item_id": "X1"})
+
+        self.assertIsNone(webhook_service._dispatcher)
+        self.assertFalse(any(t.name == "webhook-dispatcher" for t in threading.enumerate()))
+
+    def test_failed_delete_does_not_leave_a_staged_event(self):
+        from app.models import Item
+        from app.services import item_service
+
+        self._webhook("http://127.0.0.1:1/hook")
+        db.session.add(Item(ItemID="D1", ItemName="Drill"))
+        db.session.commit()
+        found = {"ItemID": "D1", "ItemName": "Drill"}
+
+        with patch("app.repositories.item_repo.find_item_by_id", return_value=found), \
+             patch("app.repositories.item_repo.soft_delete_item", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                item_service.delete_item("D1")
+        db.session.commit()
+        self.assertEqual(WebhookDelivery.query.count(), 0)
+
+        with patch("app.repositories.item_repo.find_item_by_id", return_value=found), \
+             patch("app.repositories.item_repo.get_db_type", return_value="postgres"), \
+             patch("app.services.item_service._refresh_due_dates"):
+            self.assertEqual(item_service.delete_item("D1"), (True, "物品已移至回收站"))
+        self.assertEqual([row.event for row in WebhookDelivery.query.all()], ["item.deleted"])
+        self.assertTrue(db.session.get(Item, 1).is_deleted)
+
+    def test_purge_removes_only_old_finished_events(self):
+        from datetime import datetime, timedelta
+
+        wh_id = self._webhook("http://127.0.0.1:1/hook")
+        old = datetime.utcnow() - timedelta(days=30)
+        for status, created_at in [("delivered", old), ("dead", old), ("pending", old), ("delivered", datetime.utcnow())]:
+            db.session.add(WebhookDelivery(
+                webhook_id=str(wh_id), event="item.updated", body="{}", status=status, created_at=created_at,
+            ))
+        db.session.commit()
+
+        self.assertEqual(webhook_service.purge_finished(retention_days=14), 2)
+        self.assertEqual(sorted(row.status for row in WebhookDelivery.query.all()), ["delivered", "pending"])
+
+    def test_deliveries_are_signed_and_reuse_keepalive_connections(self):
+        receiver = self._receiver()
+        self._webhook(receiver.url, secret="abc")
+        for i in range(20):
+            webhook_service.fire_event("item.updated", {"item_id": f"I{i}"})
+
+        dispatcher = self._dispatcher(max_workers=4, per_host_limit=2)
+        self.assertTrue(dispatcher.drain())
+
+        self.assertEqual(len(receiver.requests), 20)
+        headers, body = receiver.requests[0]
+        expected = hmac.new(b"abc", body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers["X-Webhook-Signature"], f"sha256={expected}")
+        # 連線數受每主機上限約束，而非每個事件一條
+        self.assertLessEqual(len(receiver.client_ports), 2)
+        self.assertEqual(dispatcher.counters["delivered"], 20)
+        self.assertEqual(webhook_service.get_metrics()["by_status"], {"delivered": 20})
+
+    def test_per_host_concurrency_is_capped(self):
+        receiver = self._receiver(delay=0.05)
+        self._webhook(receiver.url)
+        for i in range(12):
+            webhook_service.fire_event("item.updated", {"item_id": f"I{i}"})
+
+        dispatcher = self._dispatcher(max_workers=8, per_host_limit=2)
+        self.assertTrue(dispatcher.drain())
+
+        self.assertEqual(len(receiver.requests), 12)
+        self.assertLessEqual(receiver.max_active, 2)
+
+    def test_busy_host_does_not_hold_pool_threads(self):
+        slow = self._receiver(delay=0.5)
+        fast = self._receiver()
+        self._webhook(slow.url, events=["item.updated"])
+        self._webhook(fast.url, events=["item.created"])
+        for i in range(3):
+            webhook_service.fire_event("item.updated", {"item_id": f"S{i}"})
+        webhook_service.fire_event("item.created", {"item_id": "F1"})
+
+        dispatcher = self._dispatcher(max_workers=2, per_host_limit=1)
+        self.assertEqual(dispatcher.run_once(), 2)
+
+        # 慢主機已滿的事件放回 outbox，另一個 worker 立即投遞快主機
+        deadline = time.time() + 0.3
+        while not fast.requests and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(fast.requests), 1)
+        self.assertEqual(len(slow.requests), 0)
+        self.assertEqual(WebhookDelivery.query.filter_by(status="pending").count(), 2)
+        self.assertEqual({row.attempts for row in WebhookDelivery.query.filter_by(status="pending")}, {0})
+
+        self.assertTrue(dispatcher.drain())
+        self.assertEqual(len(slow.requests), 3)
+        self.assertEqual(slow.max_active, 1)
+
+    def test_failures_back_off_then_dead_letter(self):
+        receiver = self._receiver(status=500)
+        self._webhook(receiver.url)
+        webhook_service.fire_event("item.deleted", {"item_id": "D1"})
+        dispatcher = self._dispatcher(max_workers=1)
+
+        with patch.object(webhook_service, "WEBHOOK_MAX_ATTEMPTS", 3):
+            dispatcher.drain()
+            row = WebhookDelivery.query.one()
+            self.assertEqual((row.status, row.attempts), ("pending", 1))
+            self.assertGreater(row.next_attempt_at, row.created_at)
+            self.assertEqual(row.last_error, "HTTP 500")
+
+            # 逐次讓重試到期
+            for _ in range(2):
+                WebhookDelivery.query.update({"next_attempt_at": row.created_at})
+                db.session.commit()
+                dispatcher.drain()
+
+        db.session.expire_all()
+        row = WebhookDelivery.query.one()
+        self.assertEqual((row.status, row.attempts), ("dead", 3))
+        self.assertEqual(len(receiver.requests), 3)
+        self.assertEqual(db.session.get(Webhook, int(row.webhook_id)).failure_count, 1)
+
+    def test_circuit_opens_after_repeated_host_failures(self):
+        receiver = self._receiver(status=503)
+        self._webhook(receiver.url)
+        for i in range(webhook_service.CIRCUIT_FAILURE_THRESHOLD + 3):
+            webhook_service.fire_event("item.updated", {"item_id": f"I{i}"})
+
+        dispatcher = self._dispatcher(max_workers=1)
+        dispatcher.drain()
+
+        self.assertEqual(len(receiver.requests), webhook_service.CIRCUIT_FAILURE_THRESHOLD)
+        self.assertEqual(dispatcher.counters["deferred"], 3)
+        self.assertEqual(dispatcher.breaker.open_hosts(), [webhook_service._host_of(receiver.url)])
+        self.assertEqual(webhook_service.get_metrics()["queue_depth"], webhook_service.CIRCUIT_FAILURE_THRESHOLD + 3)
+
+    def test_removed_webhook_is_dead_lettered_without_request(self):
+        wh_id = self._webhook("http://127.0.0.1:1/hook")
+        webhook_service.fire_event("item.created", {"item_id": "X1"})
+        db.session.delete(db.session.get(Webhook, wh_id))
+        db.session.commit()
+
+        self._dispatcher().drain()
+
+        self.assertEqual(WebhookDelivery.query.one().status, "dead")
+
+
+if __name__ == "__main__":
+    unittest.main()
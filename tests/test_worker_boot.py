@@ -0,0 +1,105 @@
+"""worker 啟動測試（重量級套件延後載入、gunicorn --preload fork 前不留執行緒與連線）
+
+在獨立的子程序中匯入並建立 app，才能量到乾淨的 sys.modules、執行緒與 RSS。
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import tests.fixtures_env  # noqa: F401
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 約為實測值的 1.5 倍（匯入並建立 app 約 1.4 秒、RSS 約 84MB），新增的頂層匯入會直接超出
+IMPORT_SECONDS_BUDGET = 2.2
+RSS_MB_BUDGET = 125
+
+LAZY_MODULES = ["PIL", "requests", "qrcode", "barcode", "pymongo", "openpyxl", "reportlab", "numpy", "pandas"]
+
+PROBE = r"""
+import json, os, resource, sys, threading, time
+
+started = time.perf_counter()
+from app import create_app, db
+app = create_app()
+elapsed = time.perf_counter() - started
+
+# ru_maxrss 在 exec 後仍保留父程序（pytest）的高水位，Linux 上改讀目前的 VmRSS
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+if os.path.exists("/proc/self/status"):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                rss_mb = int(line.split()[1]) / 1024
+
+sockets = []
+if os.path.isdir("/proc/self/fd"):
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            target = os.readlink(os.path.join("/proc/self/fd", fd))
+        except OSError:
+            continue
+        if target.startswith("socket:"):
+            sockets.append(target)
+
+with app.app_context():
+    pooled = sum(engine.pool.checkedin() for engine in db.engines.values())
+
+print(json.dumps({
+    "elapsed": elapsed,
+    "rss_mb": rss_mb,
+    "modules": [m for m in %(modules)r if m in sys.modules],
+    "threads": [t.name for t in threading.enumerate()],
+    "sockets": sockets,
+    "pooled": pooled,
+}))
+"""
+
+
+class WorkerBootTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tmpdir = tempfile.mkdtemp()
+        env = dict(os.environ)
+        env.update({
+            "DB_TYPE": "postgres",
+            # 檔案型 SQLite 才會使用一般連線池（:memory: 是 StaticPool）
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmpdir, 'boot.db')}",
+            "SCHEMA_AUTO_MIGRATE": "false",
+            # 排程器與 dispatcher 只由 run_worker.py 啟動，即使設定了舊的開關也不應在 create_app 建立執行緒
+            "ENABLE_SCHEDULER": "true",
+            "PYTHONPATH": ROOT,
+        })
+        try:
+            result = subprocess.run(
+                [sys.executable, "-c", PROBE % {"modules": LAZY_MODULES}],
+                cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+            )
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        if result.returncode != 0:
+            raise AssertionError(result.stderr[-2000:])
+        cls.report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_heavy_modules_are_not_imported_at_boot(self):
+        self.assertEqual(self.report["modules"], [])
+
+    def test_no_threads_before_fork(self):
+        self.assertEqual(self.report["threads"], ["MainThread"])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "需要 /proc")
+    def test_no_open_sockets_or_pooled_connections_before_fork(self):
+        self.assertEqual(self.report["sockets"], [])
+        self.assertEqual(self.report["pooled"], 0)
+
+    def test_boot_time_and_memory_budget(self):
+        self.assertLess(self.report["elapsed"], IMPORT_SECONDS_BUDGET)
+        self.assertLess(self.report["rss_mb"], RSS_MB_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()